@@ -1,4 +1,4 @@
-import os, json, uuid, time, hmac, base64, hashlib
+import os, json, uuid, time, hmac, base64, hashlib, threading
 from faucet import bp_faucet
 from flask import current_app
 from flask_cors import CORS
@@ -10,15 +10,14 @@ import requests
 import mimetypes
 mimetypes.add_type("image/svg+xml", ".svg")
 from io import BytesIO
-from PIL import Image
 from werkzeug.utils import secure_filename
+from markupsafe import Markup
 from flask import (
     Flask, request, render_template, render_template_string,
     redirect, session, abort, Response, Blueprint, jsonify
 )
 # ---- Auth helper for Pi-token routes ----
 from dotenv import load_dotenv
-from emailer import send_email
 from payments import split_amounts
 from staking import bp_stake
 from nft_api import bp_nft
@@ -62,69 +61,108 @@ except ImportError:
                   qty INTEGER NOT NULL
                 )
             """)
-
-def ensure_voucher_tables():
-    with conn() as cx:
-        cx.execute("""
-            CREATE TABLE IF NOT EXISTS voucher_redirects (
-                token TEXT PRIMARY KEY,
-                session_id TEXT NOT NULL,
-                payment_id TEXT NOT NULL,
-                created_at INTEGER NOT NULL,
-                used INTEGER NOT NULL DEFAULT 0
-            )
-        """)
-        cx.execute("""
-            CREATE TABLE IF NOT EXISTS mint_codes (
-                code TEXT PRIMARY KEY,
-                credits INTEGER NOT NULL DEFAULT 1,
-                status TEXT NOT NULL DEFAULT 'issued',  -- 'issued' | 'consumed'
-                payment_id TEXT,
-                session_id TEXT,
-                created_at INTEGER NOT NULL,
-                consumed_at INTEGER
-            )
-        """)
-        # --- NEW: add columns for dynamic value (idempotent) ---
-        cols = {r["name"] for r in cx.execute("PRAGMA table_info(mint_codes)")}
-        if "value_pi" not in cols:
-            cx.execute("ALTER TABLE mint_codes ADD COLUMN value_pi REAL")
-        if "value_ic" not in cols:
-            cx.execute("ALTER TABLE mint_codes ADD COLUMN value_ic INTEGER")
-
-# Create the “already-claimed” ledger once on boot (not inside other functions)
-with conn() as cx:
+from db import conn_ro, start_checkpointer, register_schema, ensure_registered
+from db import query_stats, reset_query_stats
+from db import from_stroops, quantize_pi
+from backups import BACKUP_DIR, list_backups, run_backup, start_backup_async, start_backup_scheduler
+from backups import status as backup_status
+from identity import user_by_id, invalidate_user, stats as identity_stats
+from entity_cache import merchant_by_id, merchant_by_slug, item_by_id, checkout_item, \
+    invalidate_item, invalidate_merchant, stats as entity_stats
+from i18n_boot import I18N_BOOT_TAG, install as install_i18n_boot
+from file_serving import send_local, content_etag
+from image_variants import parse_params as variant_params, get_variant, thumb_url, stats as variant_stats
+from pagination import encode_cursor, decode_cursor, page_of
+from merchant_stats import record_session as stats_record_session, window as stats_window
+from fulfillment import write_paid_session
+from jobs import enqueue as enqueue_job, wake as wake_jobs, start_workers as start_job_workers, \
+    stats as job_stats, list_jobs, retry_dead as retry_dead_jobs
+from page_cache import cached as page_cached, bump as bump_pages, fill as page_fill, slot as page_slot, \
+    merchant_scope, CATALOG, stats as page_cache_stats
+from search import search_items, search_merchants, suggest as search_suggest
+from upload_pipeline import store_upload, write_atomic, UploadRejected, stats as upload_stats
+from uimg_cache import get as uimg_cache_get, stats as uimg_cache_stats
+from translation_memory import translate_many as tm_translate_many, warm_catalog as tm_warm_catalog, stats as tm_stats
+from retention import POLICIES as RETENTION_POLICIES, last_report as retention_report, list_archives, start_retention_scheduler
+
+# Handler-side DDL: registered here so init_db() below applies it once at boot.
+@register_schema("app.vouchers")
+def _voucher_schema(cx):
+    cx.execute("""
+        CREATE TABLE IF NOT EXISTS voucher_redirects (
+            token TEXT PRIMARY KEY,
+            session_id TEXT NOT NULL,
+            payment_id TEXT NOT NULL,
+            created_at INTEGER NOT NULL,
+            used INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    cx.execute("CREATE INDEX IF NOT EXISTS idx_voucher_redirects_session ON voucher_redirects(session_id, used, created_at DESC)")
     cx.execute("""
-      CREATE TABLE IF NOT EXISTS crafting_credit_claims(
-        order_id   INTEGER PRIMARY KEY,   -- 1 row per order, prevents duplicates
-        user_id    INTEGER NOT NULL,
-        claimed_at INTEGER NOT NULL
-      )
+        CREATE TABLE IF NOT EXISTS mint_codes (
+            code TEXT PRIMARY KEY,
+            credits INTEGER NOT NULL DEFAULT 1,
+            status TEXT NOT NULL DEFAULT 'issued',  -- 'issued' | 'consumed'
+            payment_id TEXT,
+            session_id TEXT,
+            created_at INTEGER NOT NULL,
+            consumed_at INTEGER
+        )
     """)
-with conn() as cx:
+    # --- NEW: add columns for dynamic value (idempotent) ---
+    cols = {r["name"] for r in cx.execute("PRAGMA table_info(mint_codes)")}
+    if "value_pi" not in cols:
+        cx.execute("ALTER TABLE mint_codes ADD COLUMN value_pi REAL")
+    if "value_ic" not in cols:
+        cx.execute("ALTER TABLE mint_codes ADD COLUMN value_ic INTEGER")
+
+@register_schema("app.crafting_credits_v2")
+def _credit_v2_schema(cx):
     cx.execute("""
-        CREATE TABLE IF NOT EXISTS collectible_claims(
+        CREATE TABLE IF NOT EXISTS crafting_credits_v2(
           id INTEGER PRIMARY KEY AUTOINCREMENT,
-          order_id INTEGER NOT NULL,
           user_id INTEGER NOT NULL,
-          claimed_at INTEGER NOT NULL
+          value_ic INTEGER NOT NULL,
+          tier TEXT,
+          caps TEXT,
+          state TEXT NOT NULL DEFAULT 'available',
+          reserved_draft_id INTEGER,
+          source TEXT,
+          uniq TEXT UNIQUE,
+          created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+          used_at TIMESTAMP
         )
     """)
+    cx.execute("CREATE INDEX IF NOT EXISTS idx_crafting_credits_v2_user ON crafting_credits_v2(user_id, state)")
 
-with conn() as cx:
+@register_schema("app.crafting_grants")
+def _crafting_grants_schema(cx):
     cx.execute("""
-      CREATE TABLE IF NOT EXISTS dynamic_overrides(
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        user_id INTEGER NOT NULL,
-        link_id TEXT NOT NULL,
-        price_pi REAL NOT NULL,
-        ctx TEXT,
-        created_at INTEGER NOT NULL,
-        UNIQUE(user_id, link_id)
-      )
+        CREATE TABLE IF NOT EXISTS crafting_grants(
+          id INTEGER PRIMARY KEY AUTOINCREMENT,
+          user_id INTEGER NOT NULL,
+          crafted_item_id TEXT NOT NULL,
+          qty INTEGER NOT NULL,
+          created_at INTEGER NOT NULL
+        )
     """)
-    
-    cx.execute("CREATE UNIQUE INDEX IF NOT EXISTS uniq_collectible_claims ON collectible_claims(order_id, user_id)")
+
+@register_schema("app.items_dynamic")
+def _items_dynamic_schema(cx):
+    cols = [r[1] for r in cx.execute("PRAGMA table_info(items)").fetchall()]
+    # Pricing/routing fields used by dynamic checkout
+    if "dynamic_price_mode" not in cols:
+        cx.execute("ALTER TABLE items ADD COLUMN dynamic_price_mode TEXT")  # e.g. 'pi_dynamic', 'fixed' (NULL means fixed)
+    if "dynamic_payload_json" not in cols:
+        cx.execute("ALTER TABLE items ADD COLUMN dynamic_payload_json TEXT")  # optional JSON (caps, kind, etc.)
+    if "min_pi_price" not in cols:
+        cx.execute("ALTER TABLE items ADD COLUMN min_pi_price REAL")         # optional floor for dynamic override
+    if "max_pi_price" not in cols:
+        cx.execute("ALTER TABLE items ADD COLUMN max_pi_price REAL")         # optional ceiling for dynamic override
+
+def ensure_voucher_tables():
+    ensure_registered("app.vouchers")
+
 # ----------------- ENV -----------------
 load_dotenv()
 PI_SANDBOX    = os.getenv("PI_SANDBOX", "false").lower() == "true"
@@ -194,10 +232,12 @@ def well_known(filename):
 # Serve static token and asset files (like izza.png)
 @app.route('/assets/<path:filename>')
 def serve_assets(filename):
-    directory = os.path.join(app.root_path, 'static/assets')
-    resp = make_response(send_from_directory(directory, filename))
+    directory = os.path.abspath(os.path.join(app.root_path, 'static/assets'))
+    path = os.path.abspath(os.path.normpath(os.path.join(directory, filename)))
+    if not path.startswith(directory + os.sep) or not os.path.isfile(path):
+        abort(404)
+    resp = send_local(path, max_age=86400)
     resp.headers['Access-Control-Allow-Origin'] = '*'
-    resp.headers['Cache-Control'] = 'public, max-age=86400'
     return resp
 
 # ---- TRUST PAGE + LOGGING ----
@@ -289,11 +329,13 @@ def trust_https_redirect():
 
   <!-- 5) hidden iframe (some webviews still honor this) -->
   <iframe src="%(deep)s" style="display:none;width:0;height:0;border:0;"></iframe>
+%(i18n)s
 </body>
 </html>
 """ % {
         "deep": deep,
-        "deep_json": json.dumps(deep)
+        "deep_json": json.dumps(deep),
+        "i18n": I18N_BOOT_TAG,
     }
 
     resp = make_response(html)
@@ -384,41 +426,6 @@ def _normalize_ext(fmt: str) -> str:
     return "jpg" if fmt == "jpeg" else fmt
 
 # ---- Simple SQLite snapshot backups on boot ----
-def _detect_db_file() -> str | None:
-    try:
-        with conn() as cx:
-            info = cx.execute("PRAGMA database_list").fetchone()
-            return (info["file"] if info and "file" in info.keys() else None) or None
-    except Exception:
-        return None
-
-def _backup_now(db_path: str, backups_dir: str) -> str | None:
-    try:
-        os.makedirs(backups_dir, exist_ok=True)
-        ts = datetime.utcnow().strftime("%Y%m%d-%H%M%S")
-        dest = os.path.join(backups_dir, f"app-{ts}.sqlite")
-        shutil.copy2(db_path, dest)
-        return dest
-    except Exception:
-        return None
-
-def _prune_old_backups(backups_dir: str, keep: int = 10):
-    try:
-        files = [f for f in os.listdir(backups_dir) if f.endswith(".sqlite")]
-        files.sort(reverse=True)
-        for f in files[keep:]:
-            try: os.remove(os.path.join(backups_dir, f))
-            except Exception: pass
-    except Exception:
-        pass
-
-def setup_backups():
-    backups_dir = os.path.join(os.getenv("DATA_ROOT", "/var/data/izzapay"), "backups")
-    db_path = _detect_db_file()
-    if db_path and os.path.exists(db_path):
-        _backup_now(db_path, backups_dir)
-        _prune_old_backups(backups_dir, keep=10)
-
 # ----------------- BLUEPRINTS & HELPERS -----------------
 crafting_api = Blueprint("crafting_api", __name__, url_prefix="/api/crafting")
 merchant_api = Blueprint("merchant_api", __name__, url_prefix="/api/merchant")
@@ -434,16 +441,8 @@ def _grant_crafting_item(to_user_id: int | None, crafted_id: str | None, qty: in
     if not (to_user_id and crafted_id and qty > 0):
         return
     try:
+        ensure_registered("app.crafting_grants")
         with conn() as cx:
-            cx.execute("""
-                CREATE TABLE IF NOT EXISTS crafting_grants(
-                  id INTEGER PRIMARY KEY AUTOINCREMENT,
-                  user_id INTEGER NOT NULL,
-                  crafted_item_id TEXT NOT NULL,
-                  qty INTEGER NOT NULL,
-                  created_at INTEGER NOT NULL
-                )
-            """)
             cx.execute(
                 "INSERT INTO crafting_grants(user_id, crafted_item_id, qty, created_at) VALUES(?,?,?,?)",
                 (to_user_id, str(crafted_id), int(qty), int(time.time()))
@@ -946,18 +945,9 @@ def media(filename):
     try:
         safe_base = os.path.abspath(UPLOAD_DIR)
         safe_path = os.path.abspath(os.path.normpath(os.path.join(safe_base, filename)))
-        if not safe_path.startswith(safe_base) or not os.path.exists(safe_path):
+        if not safe_path.startswith(safe_base + os.sep) or not os.path.isfile(safe_path):
             return Response(_tiny, headers={"Content-Type": "image/png", "Cache-Control": "public, max-age=86400"})
-        ctype = mimetypes.guess_type(safe_path)[0] or "application/octet-stream"
-        with open(safe_path, "rb") as f:
-            data = f.read()
-        return Response(
-            data,
-            headers={
-                "Content-Type": ctype,
-                "Cache-Control": "public, max-age=31536000, immutable"
-            }
-        )
+        return send_local(safe_path, max_age=31536000, immutable=True)
     except Exception:
         return Response(_tiny, headers={"Content-Type": "image/png", "Cache-Control": "public, max-age=86400"})
 
@@ -1014,6 +1004,7 @@ def voucher_page():
       }}
       { 'reconcile();' if craft_paid else '' }
       </script>
+    {I18N_BOOT_TAG}
     </body>
     </html>
     """
@@ -1028,146 +1019,11 @@ def inject_globals():
         "PI_USD_RATE": PI_USD_RATE,
         "MEDIA_PREFIX": MEDIA_PREFIX,  # handy in templates if you ever need it
     }
-# -------- Auto-translate injector (global) --------
-I18N_SNIPPET = r"""
-<script>
-if(!window.__IZZA_I18N_BOOTED__){
-  window.__IZZA_I18N_BOOTED__=true;
-
-  // Same-origin proxy Ã¢ÂÂ main app serves /api/translate
-  window.TRANSLATE_TEXT = async (text, from, to) => {
-    try {
-      const r = await fetch('/api/translate', {
-        method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ text, from, to })
-      });
-      const j = await r.json();
-      return (j && j.ok && typeof j.text === 'string') ? j.text : text;
-    } catch {
-      return text;
-    }
-  };
-
-  (function(){
-    const LANG_KEY='izzaLang';
-
-    // >>> ONLY RUN IF USER PICKED A LANGUAGE <<<
-    const raw = localStorage.getItem(LANG_KEY);
-    if (!raw) return; // user hasn't chosen Ã¢ÂÂ do nothing
-
-    const to   = String(raw).slice(0,5);
-    const from = (document.documentElement.getAttribute('lang')||'en').slice(0,5);
-    if (!to || to === from) return; // nothing to translate Ã¢ÂÂ do nothing
-
-    if (typeof window.TRANSLATE_TEXT!=='function'){ window.TRANSLATE_TEXT=async t=>t; }
-
-    // Elements to always skip
-    const SKIP_TAGS=new Set(['SCRIPT','STYLE','NOSCRIPT','CODE','PRE','TEXTAREA','INPUT','SELECT','OPTION']);
-
-    // --- Sensitive text detectors (avoid touching keys / hashes) ---
-    function isLikelyStellarPubKey(s){
-      const t=s.replace(/\s+/g,'').trim();
-      return /^G[A-Z2-7]{55}$/.test(t);
-    }
-    function isLongBase32ish(s){
-      const t=s.replace(/\s+/g,'').trim();
-      return /^[A-Z0-9]{30,}$/.test(t);
-    }
-    function isLongHexHash(s){
-      const t=s.replace(/\s+/g,'').trim();
-      return /^[a-fA-F0-9]{40,}$/.test(t);
-    }
-    function isSensitiveText(s){
-      if(!s || s.length<10) return false;
-      return isLikelyStellarPubKey(s) || isLongBase32ish(s) || isLongHexHash(s);
-    }
-
-    function collect(root){
-      const nodes=[];
-      const w=document.createTreeWalker(
-        root,
-        NodeFilter.SHOW_TEXT,
-        { acceptNode(n){
-            const p=n.parentElement;
-            if(!p) return NodeFilter.FILTER_REJECT;
-            if(SKIP_TAGS.has(p.tagName)) return NodeFilter.FILTER_REJECT;
-            if(p.closest('[data-no-i18n="1"]')) return NodeFilter.FILTER_REJECT;
-
-            const s=n.nodeValue;
-            if(!s || !s.trim()) return NodeFilter.FILTER_REJECT;
-
-            if(isSensitiveText(s)) return NodeFilter.FILTER_REJECT;
-
-            return NodeFilter.FILTER_ACCEPT;
-          }
-        }
-      );
-      let n; while((n=w.nextNode())) nodes.push(n);
-      return nodes;
-    }
-
-    async function translate(nodes){
-      for(const n of nodes){
-        try{
-          const p=n.parentElement;
-          if(!p || p.closest('[data-no-i18n="1"]')) continue;
-          if(isSensitiveText(n.nodeValue)) continue;
-
-          const orig=(p?.dataset?.i18nOriginal) ?? n.nodeValue;
-          const out=await window.TRANSLATE_TEXT(orig,from,to);
-          if(p && p.dataset && !p.dataset.i18nOriginal) p.dataset.i18nOriginal=orig;
-          if(typeof out==='string' && out && out!==n.nodeValue) n.nodeValue=out;
-        }catch{}
-      }
-    }
-
-    async function run(){ await translate(collect(document.body)); }
-
-    const mo=new MutationObserver(muts=>{
-      const batch=[];
-      for(const m of muts){
-        if(m.type==='childList'){
-          m.addedNodes && m.addedNodes.forEach(nd=>{
-            if(nd.nodeType===1) batch.push(...collect(nd));
-            else if(nd.nodeType===3) batch.push(nd);
-          });
-        } else if(m.type==='characterData' && m.target && m.target.nodeType===3){
-          batch.push(m.target);
-        }
-      }
-      if(batch.length) translate(batch);
-    });
-
-    function arm(){ try{ mo.observe(document.body,{childList:true,characterData:true,subtree:true}); }catch{} }
-
-    if(document.readyState==='loading'){
-      document.addEventListener('DOMContentLoaded',()=>{ run(); arm(); },{once:true});
-    } else { run(); arm(); }
-  })();
-}
-</script>
-"""
-@app.after_request
-def _inject_i18n(resp):
-    try:
-        ctype = resp.headers.get("Content-Type", "")
-        if resp.status_code == 200 and "text/html" in ctype:
-            body = resp.get_data(as_text=True)
-            # allow page-level opt-out via data-no-global-i18n="1"
-            if 'data-no-global-i18n="1"' not in body and "__IZZA_I18N_BOOTED__" not in body:
-                i = body.lower().rfind("</body>")
-                if i != -1:
-                    body = body[:i] + I18N_SNIPPET + body[i:]
-                    resp.set_data(body)
-                    try:
-                        resp.headers["Content-Length"] = str(len(body.encode("utf-8")))
-                    except Exception:
-                        pass
-    except Exception:
-        pass
-    return resp
-# -------- /Auto-translate injector --------
+# -------- Auto-translate bootstrap --------
+# static/js/i18n-boot.js, included by templates via {{ i18n_boot_tag }}
+install_i18n_boot(app, serve=True)
+app.jinja_env.filters["thumb"] = thumb_url
+app.jinja_env.globals["slot"] = page_slot
 # --- Admin ENV ---
 ADMIN_PI_USERNAME = (os.getenv("ADMIN_PI_USERNAME") or "").lstrip("@").strip()
 ADMIN_PI_WALLET   = (os.getenv("ADMIN_PI_WALLET") or "").strip()
@@ -1197,101 +1053,12 @@ def require_admin():
 
 # ----------------- DB & SCHEMA -----------------
 init_db()
-setup_backups()
+start_checkpointer()
+start_backup_scheduler()
+start_retention_scheduler()
+start_job_workers()
 ensure_schema()
 
-# --- Users & merchants table patches ---
-with conn() as cx:
-    # users table patch for in-game credits
-    u_cols = {r["name"] for r in cx.execute("PRAGMA table_info(users)")}
-    if "ic_credits" not in u_cols:
-        cx.execute("ALTER TABLE users ADD COLUMN ic_credits INTEGER DEFAULT 0")
-
-    # merchants patches
-    m_cols = {r["name"] for r in cx.execute("PRAGMA table_info(merchants)")}
-    if "pi_wallet_address" not in m_cols:
-        cx.execute("ALTER TABLE merchants ADD COLUMN pi_wallet_address TEXT")
-    if "pi_handle" not in m_cols:
-        cx.execute("ALTER TABLE merchants ADD COLUMN pi_handle TEXT")
-    if "colorway" not in m_cols:
-        cx.execute("ALTER TABLE merchants ADD COLUMN colorway TEXT")
-
-# --- Carts & cart_items must ALWAYS exist (not gated on colorway) ---
-with conn() as cx:
-    cx.execute("""
-        CREATE TABLE IF NOT EXISTS carts(
-          id TEXT PRIMARY KEY,
-          merchant_id INTEGER NOT NULL,
-          created_at INTEGER NOT NULL
-        )
-    """)
-    cx.execute("""
-        CREATE TABLE IF NOT EXISTS cart_items(
-          id INTEGER PRIMARY KEY AUTOINCREMENT,
-          cart_id TEXT NOT NULL,
-          item_id INTEGER NOT NULL,
-          qty INTEGER NOT NULL
-        )
-    """)
-
-with conn() as cx:
-    it_cols = {r["name"] for r in cx.execute("PRAGMA table_info(items)")}
-    if "description" not in it_cols:
-        cx.execute("ALTER TABLE items ADD COLUMN description TEXT")
-    if "fulfillment_kind" not in it_cols:
-        cx.execute("ALTER TABLE items ADD COLUMN fulfillment_kind TEXT DEFAULT 'physical'")
-    if "crafted_item_id" not in it_cols:
-        cx.execute("ALTER TABLE items ADD COLUMN crafted_item_id TEXT")
-    # ⬇️ NEW: persist inline SVG for crafted items
-    if "svg_code" not in it_cols:
-        cx.execute("ALTER TABLE items ADD COLUMN svg_code TEXT")
-
-    # sessions table patches (ALWAYS run; do NOT nest under crafted_item_id)
-    scols = {r["name"] for r in cx.execute("PRAGMA table_info(sessions)")}
-    if "pi_payment_id" not in scols:
-        cx.execute("ALTER TABLE sessions ADD COLUMN pi_payment_id TEXT")
-    if "cart_id" not in scols:
-        cx.execute("ALTER TABLE sessions ADD COLUMN cart_id TEXT")
-    if "line_items_json" not in scols:
-        cx.execute("ALTER TABLE sessions ADD COLUMN line_items_json TEXT")
-    if "user_id" not in scols:
-        cx.execute("ALTER TABLE sessions ADD COLUMN user_id INTEGER")
-
-    # orders table patches
-    ocols = {r["name"] for r in cx.execute("PRAGMA table_info(orders)")}
-    if "buyer_user_id" not in ocols:
-        cx.execute("ALTER TABLE orders ADD COLUMN buyer_user_id INTEGER")
-
-    # payout_requests throttle log (one row per request)
-    cx.execute("""
-        CREATE TABLE IF NOT EXISTS payout_requests(
-          id INTEGER PRIMARY KEY,
-          merchant_id INTEGER NOT NULL,
-          requested_at INTEGER NOT NULL,
-          FOREIGN KEY(merchant_id) REFERENCES merchants(id)
-        )
-    """)
-    cx.execute("CREATE INDEX IF NOT EXISTS idx_payout_requests_merchant_time ON payout_requests(merchant_id, requested_at)")
-
-ensure_schema()
-with conn() as cx:
-    cx.execute("""
-        CREATE TABLE IF NOT EXISTS crafted_items(
-          id INTEGER PRIMARY KEY AUTOINCREMENT,
-          user_id INTEGER NOT NULL,
-          name TEXT NOT NULL,
-          sku TEXT,
-          image TEXT,
-          meta_json TEXT,
-          created_at INTEGER NOT NULL
-        )
-    """)
-    cx.execute("CREATE INDEX IF NOT EXISTS idx_crafted_items_user ON crafted_items(user_id)")
-# Detect if orders.created_at exists (for 30-day filters)
-with conn() as cx:
-    _ORDERS_COLS = {r["name"] for r in cx.execute("PRAGMA table_info(orders)")}
-HAS_ORDER_CREATED_AT = ("created_at" in _ORDERS_COLS)
-
 # ----------------- SHORT-LIVED BEARER TOKENS -----------------
 TOKEN_TTL = 60 * 10
 def _b64url(b: bytes) -> str:
@@ -1453,23 +1220,8 @@ def _available_v2_credits_count(user_id: int) -> int:
         ).fetchone()
     return int(row["n"] or 0)
 # === Crafting v2 per-credit helpers (purchase vouchers) =======================
-def _ensure_credit_tables_v2(cx):
-    cx.executescript("""
-    CREATE TABLE IF NOT EXISTS crafting_credits_v2(
-      id INTEGER PRIMARY KEY AUTOINCREMENT,
-      user_id INTEGER NOT NULL,
-      value_ic INTEGER NOT NULL,
-      tier TEXT,
-      caps TEXT,
-      state TEXT NOT NULL DEFAULT 'available',
-      reserved_draft_id INTEGER,
-      source TEXT,
-      uniq TEXT UNIQUE,
-      created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-      used_at TIMESTAMP
-    );
-    CREATE INDEX IF NOT EXISTS idx_crafting_credits_v2_user ON crafting_credits_v2(user_id, state);
-    """)
+def _ensure_credit_tables_v2(cx=None):
+    ensure_registered("app.crafting_credits_v2")
 
 def _issue_credit_v2(cx, user_id:int, *, value_ic:int, tier:str="pro",
                      caps:dict|None=None, source:str="purchase", uniq:str|None=None):
@@ -1489,8 +1241,7 @@ def current_user_row():
             uid = verify_login_token(tok)
     if not uid:
         return None
-    with conn() as cx:
-        return cx.execute("SELECT * FROM users WHERE id=?", (uid,)).fetchone()
+    return user_by_id(uid)
 
 def require_user():
     row = current_user_row()
@@ -1513,16 +1264,16 @@ def add_ic_credits(user_id: int, delta: int) -> int:
         cur = int((row["ic_credits"] if row else 0) or 0)
         new = max(0, cur + int(delta))
         cx.execute("UPDATE users SET ic_credits=? WHERE id=?", (new, user_id))
+    invalidate_user(user_id)
     return new
 
-def resolve_merchant_by_slug(slug):
-    with conn() as cx:
-        return cx.execute("SELECT * FROM merchants WHERE slug=?", (slug,)).fetchone()
+def resolve_merchant_by_slug(slug, fresh=False):
+    return merchant_by_slug(slug, fresh=fresh)
 
 def require_merchant_owner(slug):
     u = require_user()
     if isinstance(u, Response): return u, None
-    m = resolve_merchant_by_slug(slug)
+    m = resolve_merchant_by_slug(slug, fresh=True)  # owner routes write back what they read
     if not m: abort(404)
     if m["owner_user_id"] != u["id"]: abort(403)
     return u, m
@@ -1604,147 +1355,6 @@ def require_live_auction_owner():
     return u, m, None
 
 
-# ----------------- LIVE AUCTION SCHEMA PATCHES -----------------
-
-with conn() as cx:
-    cx.execute("""
-        CREATE TABLE IF NOT EXISTS live_auctions(
-          id INTEGER PRIMARY KEY AUTOINCREMENT,
-          merchant_id INTEGER NOT NULL,
-          slug TEXT UNIQUE NOT NULL,
-          title TEXT NOT NULL,
-          description TEXT,
-          tcg_type TEXT,
-          starts_at INTEGER,
-          scheduled_length_minutes INTEGER DEFAULT 60,
-          status TEXT NOT NULL DEFAULT 'scheduled',
-          stream_status TEXT NOT NULL DEFAULT 'offline',
-          playback_url TEXT,
-          created_by_username TEXT,
-          image_url TEXT,
-          created_at INTEGER NOT NULL,
-          updated_at INTEGER NOT NULL
-        )
-    """)
-
-    la_cols = _row_cols(cx, "live_auctions")
-    if "image_url" not in la_cols:
-        cx.execute("ALTER TABLE live_auctions ADD COLUMN image_url TEXT")
-    if "playback_url" not in la_cols:
-        cx.execute("ALTER TABLE live_auctions ADD COLUMN playback_url TEXT")
-    if "stream_status" not in la_cols:
-        cx.execute("ALTER TABLE live_auctions ADD COLUMN stream_status TEXT DEFAULT 'offline'")
-    if "created_by_username" not in la_cols:
-        cx.execute("ALTER TABLE live_auctions ADD COLUMN created_by_username TEXT")
-
-    cx.execute("""
-        CREATE TABLE IF NOT EXISTS live_auction_signups(
-          id INTEGER PRIMARY KEY AUTOINCREMENT,
-          username TEXT UNIQUE NOT NULL,
-          pi_uid TEXT,
-          interest_one_piece INTEGER NOT NULL DEFAULT 0,
-          interest_pokemon INTEGER NOT NULL DEFAULT 0,
-          email TEXT,
-          created_at INTEGER NOT NULL,
-          updated_at INTEGER NOT NULL
-        )
-    """)
-
-    cx.execute("""
-        CREATE TABLE IF NOT EXISTS live_auction_lots(
-          id INTEGER PRIMARY KEY AUTOINCREMENT,
-          auction_id INTEGER NOT NULL,
-          lot_number INTEGER,
-          title TEXT NOT NULL,
-          description TEXT,
-          starting_bid_pi REAL DEFAULT 0,
-          status TEXT DEFAULT 'scheduled',
-          created_at INTEGER
-        )
-    """)
-
-    cx.execute("""
-        CREATE TABLE IF NOT EXISTS live_auction_wins(
-          id INTEGER PRIMARY KEY AUTOINCREMENT,
-          auction_id INTEGER NOT NULL,
-          lot_id INTEGER DEFAULT 0,
-          user_id INTEGER,
-          username TEXT NOT NULL,
-          card_title TEXT,
-          card_description TEXT,
-          card_image_url TEXT,
-          winning_bid_pi REAL DEFAULT 0,
-          status TEXT NOT NULL DEFAULT 'won',
-          checkout_id INTEGER,
-          created_at INTEGER,
-          updated_at INTEGER
-        )
-    """)
-
-    law_cols = _row_cols(cx, "live_auction_wins")
-    if "lot_id" not in law_cols:
-        cx.execute("ALTER TABLE live_auction_wins ADD COLUMN lot_id INTEGER DEFAULT 0")
-    if "user_id" not in law_cols:
-        cx.execute("ALTER TABLE live_auction_wins ADD COLUMN user_id INTEGER")
-    if "card_title" not in law_cols:
-        cx.execute("ALTER TABLE live_auction_wins ADD COLUMN card_title TEXT")
-    if "card_description" not in law_cols:
-        cx.execute("ALTER TABLE live_auction_wins ADD COLUMN card_description TEXT")
-    if "card_image_url" not in law_cols:
-        cx.execute("ALTER TABLE live_auction_wins ADD COLUMN card_image_url TEXT")
-    if "winning_bid_pi" not in law_cols:
-        cx.execute("ALTER TABLE live_auction_wins ADD COLUMN winning_bid_pi REAL DEFAULT 0")
-    if "status" not in law_cols:
-        cx.execute("ALTER TABLE live_auction_wins ADD COLUMN status TEXT DEFAULT 'won'")
-    if "checkout_id" not in law_cols:
-        cx.execute("ALTER TABLE live_auction_wins ADD COLUMN checkout_id INTEGER")
-    if "created_at" not in law_cols:
-        cx.execute("ALTER TABLE live_auction_wins ADD COLUMN created_at INTEGER")
-    if "updated_at" not in law_cols:
-        cx.execute("ALTER TABLE live_auction_wins ADD COLUMN updated_at INTEGER")
-
-    cx.execute("""
-        CREATE TABLE IF NOT EXISTS live_auction_checkouts(
-          id INTEGER PRIMARY KEY AUTOINCREMENT,
-          auction_id INTEGER NOT NULL,
-          user_id INTEGER,
-          username TEXT NOT NULL,
-          merchant_id INTEGER NOT NULL,
-          item_id INTEGER,
-          link_id TEXT,
-          total_pi REAL NOT NULL DEFAULT 0,
-          wins_json TEXT NOT NULL DEFAULT '[]',
-          status TEXT NOT NULL DEFAULT 'pending',
-          created_at INTEGER,
-          updated_at INTEGER,
-          UNIQUE(auction_id, username)
-        )
-    """)
-
-    lac_cols = _row_cols(cx, "live_auction_checkouts")
-    if "user_id" not in lac_cols:
-        cx.execute("ALTER TABLE live_auction_checkouts ADD COLUMN user_id INTEGER")
-    if "merchant_id" not in lac_cols:
-        cx.execute("ALTER TABLE live_auction_checkouts ADD COLUMN merchant_id INTEGER")
-    if "item_id" not in lac_cols:
-        cx.execute("ALTER TABLE live_auction_checkouts ADD COLUMN item_id INTEGER")
-    if "link_id" not in lac_cols:
-        cx.execute("ALTER TABLE live_auction_checkouts ADD COLUMN link_id TEXT")
-    if "total_pi" not in lac_cols:
-        cx.execute("ALTER TABLE live_auction_checkouts ADD COLUMN total_pi REAL DEFAULT 0")
-    if "wins_json" not in lac_cols:
-        cx.execute("ALTER TABLE live_auction_checkouts ADD COLUMN wins_json TEXT DEFAULT '[]'")
-    if "status" not in lac_cols:
-        cx.execute("ALTER TABLE live_auction_checkouts ADD COLUMN status TEXT DEFAULT 'pending'")
-    if "created_at" not in lac_cols:
-        cx.execute("ALTER TABLE live_auction_checkouts ADD COLUMN created_at INTEGER")
-    if "updated_at" not in lac_cols:
-        cx.execute("ALTER TABLE live_auction_checkouts ADD COLUMN updated_at INTEGER")
-
-    cx.execute("CREATE INDEX IF NOT EXISTS idx_live_auction_wins_auction_user ON live_auction_wins(auction_id, username)")
-    cx.execute("CREATE INDEX IF NOT EXISTS idx_live_auction_checkouts_auction_user ON live_auction_checkouts(auction_id, username)")
-
-
 def _auction_checkout_title(auction, username):
     return f"IZZA Live Auction Wins — @{username}"
 
@@ -2350,7 +1960,7 @@ from flask import jsonify, send_file
 def admin_export_json():
     u = require_admin()
     if isinstance(u, Response): return u
-    with conn() as cx:
+    with conn_ro() as cx:
         users     = [dict(r) for r in cx.execute("SELECT * FROM users").fetchall()]
         merchants = [dict(r) for r in cx.execute("SELECT * FROM merchants").fetchall()]
         items     = [dict(r) for r in cx.execute("SELECT * FROM items").fetchall()]
@@ -2376,64 +1986,113 @@ def admin_export_json():
 def admin_backup_now():
     u = require_admin()
     if isinstance(u, Response): return u
-    backups_dir = os.path.join(os.getenv("DATA_ROOT", "/var/data/izzapay"), "backups")
-    db_path = _detect_db_file()
-    if not (db_path and os.path.exists(db_path)):
-        return {"ok": False, "error": "db_not_found"}, 404
-    snap = _backup_now(db_path, backups_dir)
-    if not snap:
-        return {"ok": False, "error": "backup_failed"}, 500
-    _prune_old_backups(backups_dir, keep=10)
-    # Return a link to fetch raw file (local file send)
-    return {"ok": True, "snapshot": os.path.basename(snap)}
+    # ?wait=1 keeps the old synchronous behaviour; default runs in the background.
+    if request.args.get("wait") == "1":
+        res = run_backup(reason="admin")
+        if res is None:
+            return {"ok": False, "error": "backup_in_progress", "status": backup_status()}, 409
+        if not res.get("ok"):
+            return {"ok": False, "error": "backup_failed", "result": res}, 500
+        return {"ok": True, "snapshot": res["name"], "result": res}
+    if not start_backup_async(reason="admin"):
+        return {"ok": False, "error": "backup_in_progress", "status": backup_status()}, 409
+    return {"ok": True, "started": True, "status": backup_status()}, 202
+
+@app.get("/admin/backup/status")
+def admin_backup_status():
+    u = require_admin()
+    if isinstance(u, Response): return u
+    return jsonify({"ok": True, "status": backup_status(), "backups": list_backups()})
+
+@app.get("/admin/retention/status")
+def admin_retention_status():
+    u = require_admin()
+    if isinstance(u, Response): return u
+    return jsonify({"ok": True, "policies": RETENTION_POLICIES, "last": retention_report(), "archives": list_archives()})
+
+@app.get("/admin/jobs")
+def admin_jobs():
+    u = require_admin()
+    if isinstance(u, Response): return u
+    state = request.args.get("state", "dead")
+    return jsonify({"ok": True, "stats": job_stats(),
+                    "jobs": list_jobs(state, kind=request.args.get("kind") or None)})
+
+@app.post("/admin/jobs/retry")
+def admin_jobs_retry():
+    u = require_admin()
+    if isinstance(u, Response): return u
+    job_id = request.args.get("id", type=int)
+    return {"ok": True, "requeued": retry_dead_jobs(kind=request.args.get("kind") or None, job_id=job_id)}
 
 @app.get("/admin/backup/download/<name>")
 def admin_backup_download(name):
     u = require_admin()
     if isinstance(u, Response): return u
-    backups_dir = os.path.join(os.getenv("DATA_ROOT", "/var/data/izzapay"), "backups")
+    backups_dir = os.path.abspath(BACKUP_DIR)
     safe = os.path.abspath(os.path.join(backups_dir, name))
-    if not safe.startswith(os.path.abspath(backups_dir)) or not os.path.exists(safe):
+    if not safe.startswith(backups_dir + os.sep) or not os.path.exists(safe):
         abort(404)
     return send_file(safe, as_attachment=True, download_name=name, mimetype="application/octet-stream")
 
+@app.get("/admin/db/stats")
+def admin_db_stats():
+    u = require_admin()
+    if isinstance(u, Response): return u
+    try:
+        top = max(1, min(200, int(request.args.get("n", "20"))))
+    except ValueError:
+        top = 20
+    out = query_stats(top=top)
+    out["identity_cache"] = identity_stats()
+    out["uimg_cache"] = uimg_cache_stats()
+    out["image_variants"] = variant_stats()
+    out["upload_pipeline"] = upload_stats()
+    out["page_cache"] = page_cache_stats()
+    out["entity_cache"] = entity_stats()
+    out["jobs"] = job_stats()
+    return jsonify(out)
+
+@app.post("/admin/db/stats/reset")
+def admin_db_stats_reset():
+    u = require_admin()
+    if isinstance(u, Response): return u
+    reset_query_stats()
+    return {"ok": True}
+
+@app.get("/admin/translate/stats")
+def admin_translate_stats():
+    u = require_admin()
+    if isinstance(u, Response): return u
+    return jsonify(tm_stats())
+
+@app.post("/admin/translate/warm")
+def admin_translate_warm():
+    """Pre-translate the catalog in the background: ?to=es,fr[&from=en]"""
+    u = require_admin()
+    if isinstance(u, Response): return u
+    targets = [t.strip()[:5] for t in (request.args.get("to") or request.form.get("to") or "").split(",") if t.strip()]
+    if not targets:
+        return {"ok": False, "error": "missing_to"}, 400
+    src = (request.args.get("from") or "auto").strip()[:5] or "auto"
+    threading.Thread(target=tm_warm_catalog, args=(targets, src), name="tm-warm", daemon=True).start()
+    return {"ok": True, "started": True, "targets": targets}, 202
+
 # ----------------- EXPLORE -----------------
 @app.get("/explore")
 def explore():
     q = (request.args.get("q") or "").strip()
-    try:
-        page = max(1, int(request.args.get("page", "1")))
-    except ValueError:
-        page = 1
+    cursor = request.args.get("cursor") or ""
+    return page_cached(("explore", q, cursor), [CATALOG], lambda: _render_explore(q, cursor))
+
+def _render_explore(q, cursor):
     PAGE_SIZE = 12
-    offset = (page - 1) * PAGE_SIZE
 
-    with conn() as cx:
+    with conn_ro() as cx:
         if q:
-            like = f"%{q}%"
-            merchants = cx.execute(
-                """SELECT slug, business_name, logo_url, theme_mode, colorway
-                   FROM merchants
-                   WHERE business_name LIKE ? OR slug LIKE ?
-                   ORDER BY id DESC
-                   LIMIT 50""",
-                (like, like)
-            ).fetchall()
-
-            products = cx.execute(
-                """SELECT items.*,
-                          merchants.slug          AS m_slug,
-                          merchants.business_name AS m_name,
-                          merchants.colorway      AS m_colorway,
-                          merchants.theme_mode    AS m_theme
-                   FROM items
-                   JOIN merchants ON merchants.id = items.merchant_id
-                   WHERE items.active=1
-                     AND (items.title LIKE ? OR merchants.business_name LIKE ?)
-                   ORDER BY items.id DESC
-                   LIMIT ? OFFSET ?""",
-                (like, like, PAGE_SIZE, offset)
-            ).fetchall()
+            merchants = search_merchants(cx, q, 50)
+            products, next_key = search_items(cx, q, PAGE_SIZE, decode_cursor(cursor, "explore_q", 3))
+            next_cursor = encode_cursor("explore_q", next_key) if next_key else None
         else:
             merchants = cx.execute(
                 """SELECT slug, business_name, logo_url, theme_mode, colorway
@@ -2442,7 +2101,8 @@ def explore():
                    LIMIT 50"""
             ).fetchall()
 
-            products = cx.execute(
+            after = decode_cursor(cursor, "explore")
+            rows = cx.execute(
                 """SELECT items.*,
                           merchants.slug          AS m_slug,
                           merchants.business_name AS m_name,
@@ -2450,23 +2110,38 @@ def explore():
                           merchants.theme_mode    AS m_theme
                    FROM items
                    JOIN merchants ON merchants.id = items.merchant_id
-                   WHERE items.active=1
+                   WHERE items.active=1 AND items.id < ?
                    ORDER BY items.id DESC
-                   LIMIT ? OFFSET ?""",
-                (PAGE_SIZE, offset)
+                   LIMIT ?""",
+                (after[0] if after else 1 << 62, PAGE_SIZE + 1)
             ).fetchall()
+            products, next_cursor = page_of(rows, PAGE_SIZE, "explore", lambda r: (r["id"],))
 
-    has_more_products = len(products) == PAGE_SIZE
     return render_template(
         "explore.html",
         merchants=merchants,
         products=products,
         q=q,
-        page=page,
-        has_more_products=has_more_products,
+        next_cursor=next_cursor,
         app_base=APP_BASE_URL,
     )
 
+@app.get("/api/explore/suggest")
+def explore_suggest():
+    q = (request.args.get("q") or "").strip()[:100]
+    try:
+        limit = max(1, min(20, int(request.args.get("limit", "8"))))
+    except ValueError:
+        limit = 8
+    if len(q) < 2:
+        out = {"stores": [], "products": []}
+    else:
+        with conn_ro() as cx:
+            out = search_suggest(cx, q, limit)
+    resp = jsonify({"ok": True, "q": q, **out})
+    resp.headers["Cache-Control"] = "public, max-age=30"
+    return resp
+
 # ----------------- GENERAL SIGN-IN -----------------
 @app.get("/")
 def home():
@@ -2603,18 +2278,22 @@ def api_auth_pi_verify():
                 cx.execute("ALTER TABLE users ADD COLUMN ic_credits INTEGER DEFAULT 0")
 
         # Upsert by pi_uid (fallback by username)
+        backfilled = None
         with conn() as cx:
             row = cx.execute("SELECT * FROM users WHERE pi_uid=?", (uid,)).fetchone()
             if not row:
                 alt = cx.execute("SELECT * FROM users WHERE pi_username=?", (uname,)).fetchone()
                 if alt:
                     cx.execute("UPDATE users SET pi_uid=? WHERE id=?", (uid, alt["id"]))
+                    backfilled = alt["id"]
                     row = cx.execute("SELECT * FROM users WHERE id=?", (alt["id"],)).fetchone()
             if not row:
                 cx.execute("""INSERT INTO users(pi_uid, pi_username, role, created_at)
                               VALUES(?, ?, 'buyer', ?)""",
                            (uid, uname, int(time.time())))
                 row = cx.execute("SELECT * FROM users WHERE pi_uid=?", (uid,)).fetchone()
+        if backfilled:
+            invalidate_user(backfilled)  # after the commit, so no one re-caches the old row
 
         # Start a session
         try:
@@ -2645,20 +2324,61 @@ def api_translate():
         if not q:
             return {"ok": False, "error": "empty_text"}, 400
 
-        r = requests.post(
-            f"{LIBRE_EP}/translate",
-            json={"q": q, "source": src, "target": tgt, "format": "text"},
-            timeout=15,
-        )
-        if r.status_code != 200:
-            return {"ok": False, "error": "upstream_error", "status": r.status_code}, 502
-
-        j = r.json()
-        out = j.get("translatedText") or j.get("translated_text") or q
+        failed = set()
+        out = tm_translate_many([q], src, tgt, failed=failed)[0]
+        if failed:
+            return {"ok": False, "error": "upstream_error"}, 502
         return {"ok": True, "text": out, "source": src, "target": tgt}
     except Exception:
         return {"ok": False, "error": "server_error"}, 500
 
+# Batch form used by static/js/i18n-boot.js: one request per DOM mutation burst.
+TRANSLATE_BATCH_MAX = int(os.getenv("TRANSLATE_BATCH_MAX", "200"))
+TRANSLATE_BATCH_MAX_CHARS = int(os.getenv("TRANSLATE_BATCH_MAX_CHARS", "20000"))
+
+@app.post("/api/translate/batch")
+def api_translate_batch():
+    """
+    Accepts JSON: { "texts": ["...", ...], "from": "auto"|lang, "to": "lang" }
+    Returns: { ok:true, texts:[...same order and length...], source, target, failed }
+    failed lists the indexes LibreTranslate didn't answer; those come back untranslated.
+    """
+    data = request.get_json(silent=True) or {}
+    texts = data.get("texts") or data.get("q")
+    src = (data.get("from") or data.get("source") or "auto").strip() or "auto"
+    tgt = (data.get("to") or data.get("target") or "en").strip() or "en"
+    if not isinstance(texts, list) or not texts:
+        return {"ok": False, "error": "empty_texts"}, 400
+    if len(texts) > TRANSLATE_BATCH_MAX:
+        return {"ok": False, "error": "too_many_texts", "max": TRANSLATE_BATCH_MAX}, 413
+    texts = [t if isinstance(t, str) else "" for t in texts]
+    if sum(len(t) for t in texts) > TRANSLATE_BATCH_MAX_CHARS:
+        return {"ok": False, "error": "batch_too_large", "max_chars": TRANSLATE_BATCH_MAX_CHARS}, 413
+
+    # De-duplicate on the stripped text; keep each original's surrounding whitespace.
+    uniq, seen = [], set()
+    for t in texts:
+        k = t.strip()
+        if k and k not in seen:
+            seen.add(k)
+            uniq.append(k)
+    missed = set()
+    done = dict(zip(uniq, tm_translate_many(uniq, src, tgt, failed=missed)))
+    missed = {uniq[i] for i in missed}
+
+    out, failed = [], []
+    for i, t in enumerate(texts):
+        k = t.strip()
+        if not k:
+            out.append(t)
+            continue
+        if k in missed:
+            failed.append(i)
+        lead = t[:len(t) - len(t.lstrip())]
+        trail = t[len(t.rstrip()):]
+        out.append(lead + done.get(k, k) + trail)
+    return {"ok": True, "texts": out, "source": src, "target": tgt, "unique": len(uniq), "failed": failed}
+
 from urllib.parse import urlparse
 
 def _safe_next_path(raw):
@@ -2770,6 +2490,7 @@ def auth_exchange():
                     cols.append("ic_credits")
 
             # Upsert user
+            backfilled = None
             with conn() as cx:
                 row = None
                 try:
@@ -2789,6 +2510,7 @@ def auth_exchange():
                         # Backfill missing pi_uid on existing record
                         try:
                             cx.execute("UPDATE users SET pi_uid=? WHERE id=?", (uid, alt["id"]))
+                            backfilled = alt["id"]
                             row = cx.execute("SELECT * FROM users WHERE id=?", (alt["id"],)).fetchone()
                             print("AUTH_EXCHANGE_BACKFILL_UID_ON_EXISTING", {"id": int(row["id"])})
                         except Exception as e:
@@ -2801,6 +2523,8 @@ def auth_exchange():
                         (uid, username, int(time.time()))
                     )
                     row = cx.execute("SELECT * FROM users WHERE pi_uid=?", (uid,)).fetchone()
+            if backfilled:
+                invalidate_user(backfilled)  # after the commit, so no one re-caches the old row
 
             # Log resulting DB row id
             try:
@@ -2908,6 +2632,7 @@ def admin_exchange():
                 row = cx.execute("SELECT * FROM users WHERE pi_username=?", (username,)).fetchone()
             else:
                 cx.execute("UPDATE users SET role='admin' WHERE id=?", (row["id"],))
+        invalidate_user(row["id"])  # after the commit, so no one re-caches the old role
 
         # log them in if not already
         try:
@@ -3059,6 +2784,7 @@ def merchant_setup():
                 pi_handle, colorway
             )
         )
+        bump_pages(cx)
 
     # 3) redirect after successful insert
     tok = get_bearer_token_from_request()
@@ -3084,6 +2810,8 @@ def merchant_update(slug):
                    (fields["business_name"], fields["logo_url"], fields["theme_mode"],
                     fields["reply_to_email"], fields["pi_handle"], fields["pi_wallet_address"],
                     fields["colorway"], m["id"]))
+        bump_pages(cx, m["id"])
+    invalidate_merchant(m["id"])
     tok = get_bearer_token_from_request()
     return redirect(f"/merchant/{slug}/items{('?t='+tok) if tok else ''}")
 
@@ -3114,17 +2842,7 @@ def merchant_items(slug):
 
 # ===== MERCHANT & ITEM SCHEMA UPGRADES (dynamic pricing + browse visibility) =====
 def _ensure_items_dynamic_columns():
-    with conn() as cx:
-        cols = [r[1] for r in cx.execute("PRAGMA table_info(items)").fetchall()]
-        # Pricing/routing fields used by dynamic checkout
-        if "dynamic_price_mode" not in cols:
-            cx.execute("ALTER TABLE items ADD COLUMN dynamic_price_mode TEXT")  # e.g. 'pi_dynamic', 'fixed' (NULL means fixed)
-        if "dynamic_payload_json" not in cols:
-            cx.execute("ALTER TABLE items ADD COLUMN dynamic_payload_json TEXT")  # optional JSON (caps, kind, etc.)
-        if "min_pi_price" not in cols:
-            cx.execute("ALTER TABLE items ADD COLUMN min_pi_price REAL")         # optional floor for dynamic override
-        if "max_pi_price" not in cols:
-            cx.execute("ALTER TABLE items ADD COLUMN max_pi_price REAL")         # optional ceiling for dynamic override
+    ensure_registered("app.items_dynamic")
 
 def _ensure_merchants_visibility_column():
     with conn() as cx:
@@ -3317,6 +3035,7 @@ def merchant_new_item(slug):
             "SELECT id FROM items WHERE link_id=?",
             (link_id,)
         ).fetchone()["id"]
+        bump_pages(cx, m["id"])
 
         # 2) If NFT, derive collection+token and create listing
         if is_nft:
@@ -3508,6 +3227,8 @@ def merchant_update_item(slug):
                 m["id"],
             )
         )
+        bump_pages(cx, m["id"])
+    invalidate_item(item_id)
 
     tok = get_bearer_token_from_request()
     return redirect(f"/merchant/{slug}/items{('?t='+tok) if tok else ''}")
@@ -3523,6 +3244,8 @@ def merchant_delete_item(slug):
         it = cx.execute("SELECT * FROM items WHERE id=? AND merchant_id=?", (item_id, m["id"])).fetchone()
         if not it: abort(404)
         cx.execute("UPDATE items SET active=0 WHERE id=? AND merchant_id=?", (item_id, m["id"]))
+        bump_pages(cx, m["id"])
+    invalidate_item(item_id)
     tok = get_bearer_token_from_request()
     return redirect(f"/merchant/{slug}/items{('?t='+tok) if tok else ''}")
 
@@ -3638,12 +3361,15 @@ def merchant_delete_store(slug):
         cx.execute("DELETE FROM items WHERE merchant_id=?", (m["id"],))
         cx.execute("DELETE FROM orders WHERE merchant_id=?", (m["id"],))
         cx.execute("DELETE FROM payout_requests WHERE merchant_id=?", (m["id"],))  # harmless if none
+        cx.execute("DELETE FROM merchant_daily_stats WHERE merchant_id=?", (m["id"],))
         cx.execute("DELETE FROM merchants WHERE id=?", (m["id"],))
+        bump_pages(cx, m["id"])
 
         # Opportunistically purge any expired archives
         cx.execute("DELETE FROM deleted_merchants WHERE purge_after < ?", (now,))
 
         # Clear session
+    invalidate_merchant(m["id"], items=True)
     try:
         session.clear()
     except Exception:
@@ -3728,21 +3454,22 @@ def storefront(slug):
     if not m: abort(404)
     u = current_user_row()
     if not u: return redirect(f"/store/{slug}/signin?next=/store/{slug}")
-    tok = get_bearer_token_from_request()
     cid = request.args.get("cid")
     cid = get_or_create_cart(m["id"], cid)
-    with conn() as cx:
-        items = cx.execute(
-            "SELECT * FROM items WHERE merchant_id=? AND active=1 ORDER BY id DESC",
-            (m["id"],)
-        ).fetchall()
-        cnt = cx.execute(
-            "SELECT COALESCE(SUM(qty),0) as n FROM cart_items WHERE cart_id=?",
-            (cid,)
-        ).fetchone()["n"]
-    return render_template("store.html", m=m, items=items, cid=cid, cart_count=cnt,
-                           app_base=APP_BASE_URL, username=u["pi_username"], t=tok,
-                           colorway=m["colorway"])
+
+    def render():
+        with conn_ro() as cx:
+            items = cx.execute(
+                "SELECT * FROM items WHERE merchant_id=? AND active=1 ORDER BY id DESC",
+                (m["id"],)
+            ).fetchall()
+        return render_template("store.html", m=m, items=items, app_base=APP_BASE_URL,
+                               colorway=m["colorway"])
+
+    html = page_cached(("store", m["id"], m["colorway"], m["theme_mode"]), [merchant_scope(m["id"])], render)
+    qt = request.args.get("t")
+    return page_fill(html, cid=cid, t_qs=(f"?t={qt}" if qt else ""),
+                     t_input=(Markup('<input type="hidden" name="t" value="%s">') % qt if qt else ""))
 
 @app.post("/store/<slug>/add")
 def store_add(slug):
@@ -3754,12 +3481,9 @@ def store_add(slug):
     cid = get_or_create_cart(m["id"], cid)
     item_id = int(request.form.get("item_id"))
     qty = max(1, int(request.form.get("qty", "1")))
+    it = item_by_id(item_id, fresh=True)
+    if not it or it["merchant_id"] != m["id"] or not it["active"]: abort(400)
     with conn() as cx:
-        it = cx.execute(
-            "SELECT * FROM items WHERE id=? AND merchant_id=? AND active=1",
-            (item_id, m["id"])
-        ).fetchone()
-        if not it: abort(400)
         cx.execute("INSERT INTO cart_items(cart_id, item_id, qty) VALUES(?,?,?)",
                    (cid, item_id, qty))
     tok = get_bearer_token_from_request()
@@ -3774,7 +3498,7 @@ def cart_view(cid):
     with conn() as cx:
         cart = cx.execute("SELECT * FROM carts WHERE id=?", (cid,)).fetchone()
         if not cart: abort(404)
-        m = cx.execute("SELECT * FROM merchants WHERE id=?", (cart["merchant_id"],)).fetchone()
+        m = merchant_by_id(cart["merchant_id"])
         rows = cx.execute("""
           SELECT cart_items.id as cid, cart_items.qty, items.*
           FROM cart_items JOIN items ON items.id=cart_items.item_id
@@ -3797,8 +3521,8 @@ def cart_remove(cid):
 # ---- Pi amount rounding helpers (7 dp) ----
 PI_QUANT = Decimal("0.0000001")
 def qpi(x) -> float:
-    """Quantize/round to 7 decimal places using Decimal; return float for storage/JSON."""
-    return float(Decimal(str(x)).quantize(PI_QUANT, rounding=ROUND_HALF_UP))
+    """Quantize/round to 7 decimal places (half-up); return float for storage/JSON."""
+    return quantize_pi(x)
 
 
 @app.get("/checkout/cart/<cid>")
@@ -3813,7 +3537,7 @@ def checkout_cart(cid):
         if not cart:
             abort(404)
 
-        m = cx.execute("SELECT * FROM merchants WHERE id=?", (cart["merchant_id"],)).fetchone()
+        m = merchant_by_id(cart["merchant_id"])
         rows = cx.execute("""
             SELECT cart_items.qty, items.*
             FROM cart_items
@@ -3846,6 +3570,7 @@ def checkout_cart(cid):
                 int(time.time()), cid, line_items, u["id"]
             )
         )
+        stats_record_session(cx, m["id"])
 
     i = {
         "business_name": m["business_name"],
@@ -3879,18 +3604,7 @@ MAX_PI_DEFAULT = Decimal("1000000")
 
 @app.get("/checkout/<link_id>")
 def checkout(link_id):
-    with conn() as cx:
-        i = cx.execute("""
-           SELECT items.*,
-                  merchants.business_name,
-                  merchants.logo_url,
-                  merchants.id          AS mid,
-                  merchants.slug        AS mslug,
-                  merchants.colorway    AS colorway
-           FROM items
-           JOIN merchants ON merchants.id = items.merchant_id
-           WHERE link_id=? AND active=1
-        """, (link_id,)).fetchone()
+    i = checkout_item(link_id)
     if not i:
         abort(404)
 
@@ -3907,6 +3621,14 @@ def checkout(link_id):
         wrapped  = quote(next_url, safe="")              # keep whole URL inside ?next=
         return redirect(f"/store/{i['mslug']}/signin?next={wrapped}")
 
+    # Price, bounds and availability of the session come from the database:
+    # entity_cache invalidation only reaches the worker that made the edit.
+    i = checkout_item(link_id, fresh=True)
+    if not i:
+        abort(404)
+    if i["stock_qty"] <= 0 and not i["allow_backorder"]:
+        return render_template("checkout.html", sold_out=True, i=i, colorway=i["colorway"])
+
     # Create a session tied to this user
     sid = uuid.uuid4().hex
 
@@ -4004,6 +3726,7 @@ def checkout(link_id):
             (sid, i["mid"], i["id"], qty, expected, "initiated",
              int(time.time()), line_items, u["id"])
         )
+        stats_record_session(cx, i["mid"])
 
     return render_template(
         "checkout.html",
@@ -4304,6 +4027,7 @@ def voucher_new():
     frame();
   })();
   </script>
+__I18N__
 </body>
 </html>"""
 
@@ -4341,6 +4065,7 @@ def voucher_new():
         .replace("__PI__", f"{float(paid_pi):.4f}")
         .replace("__BACK__", back_to_game)
         .replace("__SVG_BLOCK__", svg_block)
+        .replace("__I18N__", I18N_BOOT_TAG)
     )
     return Response(html, headers={"Content-Type": "text/html; charset=utf-8"})
 # ----------------- PI PAYMENTS (approve/complete) -----------------
@@ -4434,178 +4159,61 @@ def pi_complete():
     except Exception as e:
         print(f"[pi_complete] voucher token creation failed: {e}")
 
-    # Hand off to fulfillment (creates orders, marks NFT listings sold, issues claimables)
+    # Hand off to fulfillment (creates orders, marks NFT listings sold, queues claimables)
     return fulfill_session(s, txid, buyer, shipping)
 
 
-# ========================================================================== #
-# ===================== NFT PENDING-CLAIM INSERT HELPER ===================== #
-# ========================================================================== #
-def _insert_nft_pending_claim(cx, order_id: int) -> bool:
-    """
-    Enqueue pending NFT claims for an order.
-    Stores assets_json as an array of strings like ["CODE001","CODE002",...].
-    If only username is known at checkout, we set buyer_pub='' and backfill later.
-    """
-    import json, time, re
-
-    # All listings sold by this order
-    rows = cx.execute(
-        """
-        SELECT nl.id AS listing_id,
-               nl.serial AS serial,
-               COALESCE(nl.buyer_user_id, 0) AS buyer_user_id,
-               nl.buyer_username AS buyer_username,
-               nc.code AS collection_code,
-               nc.issuer AS issuer
-        FROM nft_listings nl
-        JOIN nft_collections nc ON nc.id = nl.collection_id
-        WHERE nl.order_id = ? AND nl.status='sold'
-        ORDER BY nl.id ASC
-        """,
-        (order_id,)
-    ).fetchall()
-
-    if not rows:
-        return False
-
-    def _san(s: str) -> str:
-        return re.sub(r"[^A-Z0-9]", "", (s or "").upper())
-
-    # Group codes by issuer
-    by_issuer = {}
-    for r in rows:
-        issuer = r["issuer"]
-        code   = _san(r["collection_code"])
-        serial = r["serial"]
-        token_code = f"{code}{int(serial):03d}" if serial is not None else code
-        slot = by_issuer.setdefault(issuer, {
-            "assets": [],
-            "buyer_user_id": r["buyer_user_id"] or None,
-            "buyer_username": (r["buyer_username"] or "").strip() or None
-        })
-        slot["assets"].append(token_code)
-
-    now = int(time.time())
-
-    for issuer, info in by_issuer.items():
-        assets_json    = json.dumps(info["assets"], separators=(",",":"))
-        buyer_user_id  = info["buyer_user_id"]
-        buyer_username = info["buyer_username"] or None
-
-        # Try to resolve a pub now (ok to leave empty; we backfill on read)
-        buyer_pub = ''
-        try:
-            if buyer_user_id:
-                w = cx.execute(
-                    """
-                    SELECT uw.pub
-                    FROM user_wallets uw
-                    JOIN users u
-                      ON u.username = uw.username
-                      OR u.pi_username = uw.username
-                    WHERE u.id=? LIMIT 1
-                    """,
-                    (buyer_user_id,)
-                ).fetchone()
-                if w and w["pub"]:
-                    buyer_pub = w["pub"]
-        except Exception:
-            pass
-
-        # One row per (order_id, issuer); ignore if already present
-        cx.execute(
-            """
-            INSERT OR IGNORE INTO nft_pending_claims
-              (order_id, buyer_user_id, buyer_username, buyer_pub,
-               issuer, assets_json, status, created_at)
-            VALUES (?, ?, ?, ?, ?, ?, 'pending', ?)
-            """,
-            (order_id, buyer_user_id, buyer_username, buyer_pub, issuer, assets_json, now)
-        )
-
-    return True
-
+# ----------------- FULFILLMENT + EMAIL -----------------
+def _order_email(m, lines, by_id, gross_total):
+    """(subject, html) of the buyer's order confirmation."""
+    display_rows = []
+    for li in lines:
+        it = by_id.get(int(li["item_id"]))
+        title = (it["title"] if it else f"Item {li['item_id']}")
+        qty = int(li["qty"])
+        gross = float(li["price"]) * qty
+        display_rows.append({"title": title, "qty": qty, "gross": gross})
+
+    line_html = "".join(
+        f"<tr><td style='padding:6px 8px'>{dr['title']}</td>"
+        f"<td style='padding:6px 8px; text-align:right'>{dr['qty']}</td>"
+        f"<td style='padding:6px 8px; text-align:right'>{dr['gross']:.7f} π</td></tr>"
+        for dr in display_rows
+    )
+    items_table = (
+        "<table style='border-collapse:collapse; width:100%; max-width:560px'>"
+        "<thead><tr>"
+        "<th style='text-align:left; padding:6px 8px'>Item</th>"
+        "<th style='text-align:right; padding:6px 8px'>Qty</th>"
+        "<th style='text-align:right; padding:6px 8px'>Line Total</th>"
+        "</tr></thead>"
+        f"<tbody>{line_html}</tbody>"
+        "<tfoot>"
+        f"<tr><td></td><td style='padding:6px 8px; text-align:right'><strong>Total</strong></td>"
+        f"<td style='padding:6px 8px; text-align:right'><strong>{gross_total:.7f} π</strong></td></tr>"
+        "</tfoot>"
+        "</table>"
+    )
 
-# --- NFT helper: create on-chain claimables for purchased NFTs -------------
-def _issue_nft_claimables_for_order(order_id: int, buyer_user_id: int) -> bool:
-    """
-    Optional on-chain step (e.g., claimable balances). If you don't want this yet,
-    you can return True early — but don't overwrite this function later.
+    suffix = f" [{len(display_rows)} items]" if len(display_rows) > 1 else ""
+    subj_buyer = f"Your order at {m['business_name']} is confirmed{suffix}" if suffix else f"Your order at {m['business_name']} is confirmed"
+    html = f"""
+        <h2>Thanks for your order!</h2>
+        <p><strong>Store:</strong> {m['business_name']}</p>
+        {items_table}
+        <p style="margin-top:12px">
+          You’ll receive updates from the merchant if anything changes.
+        </p>
     """
-    try:
-        import json, re, requests
-
-        # Resolve buyer pub (match on either username or pi_username)
-        with conn() as cx:
-            w = cx.execute(
-                """
-                SELECT uw.pub
-                FROM user_wallets uw
-                JOIN users u
-                  ON u.username = uw.username
-                  OR u.pi_username = uw.username
-                WHERE u.id=? LIMIT 1
-                """,
-                (buyer_user_id,)
-            ).fetchone()
-        if not w or not (w["pub"] or "").startswith("G"):
-            print(f"[nft_claimables] no buyer pub for user_id={buyer_user_id}")
-            return False
-        buyer_pub = w["pub"]
-
-        # Gather assets for this order (same mapping as insert helper)
-        with conn() as cx:
-            rows = cx.execute(
-                """
-                SELECT t.serial, c.code AS collection_code, c.issuer AS issuer
-                FROM nft_listings l
-                JOIN nft_collections c ON c.id = l.collection_id
-                JOIN nft_tokens t      ON t.collection_id = c.id AND t.serial = l.serial
-                WHERE l.order_id=? AND l.status='sold'
-                """,
-                (order_id,)
-            ).fetchall()
+    return subj_buyer, html
 
-        if not rows:
-            print(f"[nft_claimables] order_id={order_id} has no sold rows")
-            return False
-
-        def _san(s: str) -> str:
-            return re.sub(r"[^A-Z0-9]", "", (s or "").upper())
-
-        by_issuer = {}
-        for r in rows:
-            code = f"{_san(r['collection_code'])}{int(r['serial']):03d}"
-            by_issuer.setdefault(r["issuer"], []).append(code[:12])
-
-        for issuer_g, codes in by_issuer.items():
-            try:
-                print(f"[nft_claimables] POST /api/nft/claim order_id={order_id} "
-                      f"buyer_pub={buyer_pub} issuer={issuer_g} assets={codes}")
-                requests.post(
-                    f"{APP_BASE_URL}/api/nft/claim",
-                    json={"buyer_pub": buyer_pub, "assets": codes, "issuer": issuer_g, "as_claimable": True},
-                    timeout=12
-                )
-            except Exception as e:
-                print(f"[nft_claimables] soft-fail issuer={issuer_g} order_id={order_id}: {e}")
-        return True
-    except Exception as e:
-        print(f"[nft_claimables] exception order_id={order_id}: {e}")
-        return False
-# ========================================================================== #
-# ================== END NFT PENDING-CLAIM INSERT HELPER ==================== #
-# ========================================================================== #
-# ========================================================================== #
-# ----------------- FULFILLMENT + EMAIL -----------------
 def fulfill_session(s, tx_hash, buyer, shipping):
     """
     Creates order rows, marks stock, marks NFT listings sold when applicable,
-    then issues claimables for NFTs. Emits verbose Render logs for diagnosis.
+    and queues the buyer email and NFT claimables. Emits verbose Render logs
+    for diagnosis.
     """
-    with conn() as cx:
-        m = cx.execute("SELECT * FROM merchants WHERE id=?", (s["merchant_id"],)).fetchone()
+    m = merchant_by_id(s["merchant_id"])
 
     amt = float(s["expected_pi"])
     gross_total, fee_total, net_total = split_amounts(amt)
@@ -4632,275 +4240,40 @@ def fulfill_session(s, tx_hash, buyer, shipping):
     if not lines:
         with conn() as cx:
             cx.execute("UPDATE sessions SET state='paid', pi_tx_hash=? WHERE id=?", (tx_hash, s["id"]))
-        try:
-            send_email(
-                (m["reply_to_email"] or DEFAULT_ADMIN_EMAIL),
-                f"Order paid but no lines captured (session {s['id']})",
-                "<p>The session was paid, but no line items snapshot was present.</p>"
-            )
-        except Exception:
-            pass
+            enqueue_job(cx, "email", {
+                "to": (m["reply_to_email"] or DEFAULT_ADMIN_EMAIL),
+                "subject": f"Order paid but no lines captured (session {s['id']})",
+                "html": "<p>The session was paid, but no line items snapshot was present.</p>"
+            })
+        wake_jobs()
         return {"ok": True, "redirect_url": f"{BASE_ORIGIN}/store/{m['slug']}?success=1"}
 
-    item_ids = [int(li["item_id"]) for li in lines]
+    # One transaction for every row the session writes (see fulfillment.py).
+    # The buyer email and NFT claimables go out as jobs committed with it, so
+    # the redirect doesn't wait on SMTP or Horizon (see jobs.py).
+    # Voucher tables first: ensure_registered may run DDL on its own connection.
+    ensure_registered("fulfillment.vouchers")
+    ensure_registered("app.vouchers")
     with conn() as cx:
-        placeholders = ",".join("?" for _ in item_ids)
-        items = cx.execute(f"SELECT * FROM items WHERE id IN ({placeholders})", item_ids).fetchall()
-        by_id = {int(r["id"]): r for r in items}
-
-    created_order_ids = []
-    total_snapshot_gross = sum(float(li["price"]) * int(li["qty"]) for li in lines) or 1.0
-
-    # we’ll collect NFT-listing ids we mark sold, per order
-    nft_marked_sold = []
-
-    with conn() as cx:
-        for li in lines:
-            it = by_id.get(int(li["item_id"]))
-            qty = int(li["qty"])
-            snap_price = float(li["price"])
-
-            line_gross = snap_price * qty
-            # Split the session-level fee proportionally across lines
-            line_fee   = float(fee_total) * (line_gross / total_snapshot_gross)
-            line_net   = line_gross - line_fee
-
-            if it and not it["allow_backorder"]:
-                cx.execute(
-                    "UPDATE items SET stock_qty=? WHERE id=?",
-                    (max(0, it["stock_qty"] - qty), it["id"])
-                )
-
-            # ----------------- Create order row -----------------
-            buyer_token = uuid.uuid4().hex
-            cur = cx.execute(
-                """INSERT INTO orders(
-                     merchant_id, item_id, qty, buyer_email, buyer_name, shipping_json,
-                     pi_amount, pi_fee, pi_merchant_net, pi_tx_hash,
-                     payout_status, status, buyer_token, buyer_user_id
-                   )
-                   VALUES (?,?,?,?,?,?,?,?,?,?,'pending','paid',?,?)""",
-                (
-                    s["merchant_id"], (it["id"] if it else None), qty,
-                    buyer_email, buyer_name, json.dumps(shipping),
-                    float(line_gross), float(line_fee), float(line_net), tx_hash,
-                    buyer_token, buyer_user_id,
-                ),
-            )
-            order_id = cur.lastrowid
-            created_order_ids.append(order_id)
-            print(f"[fulfill] order_id={order_id} item_id={it['id'] if it else None} qty={qty} "
-                  f"gross={line_gross:.7f} fee={line_fee:.7f} net={line_net:.7f}")
-
-            # ----------------- MARK NFT LISTINGS AS SOLD -----------------
-            try:
-                # We treat status 'active' or 'listed' as available
-                avail = cx.execute(
-                    "SELECT id FROM nft_listings WHERE item_id=? AND status IN ('active','listed') "
-                    "ORDER BY id ASC LIMIT ?",
-                    (it["id"] if it else None, qty)
-                ).fetchall()
-
-                if avail and len(avail) == qty:
-                    now = int(time.time())
-                    # Optional: capture buyer username for auditing (fallback to pi_username)
-                    buyer_un = None
-                    try:
-                        urow = cx.execute("""
-                            SELECT COALESCE(NULLIF(username,''), NULLIF(pi_username,'')) AS un
-                            FROM users
-                            WHERE id=?
-                        """, (buyer_user_id,)).fetchone()
-                        buyer_un = (urow["un"] if urow and urow["un"] else None)
-                    except Exception:
-                        buyer_un = None
-
-                    ids = [r["id"] for r in avail]
-                    cx.executemany(
-                        "UPDATE nft_listings "
-                        "SET status='sold', order_id=?, buyer_user_id=?, buyer_username=?, sold_at=? "
-                        "WHERE id=?",
-                        [(order_id, buyer_user_id, buyer_un, now, nid) for nid in ids]
-                    )
-                    nft_marked_sold.extend([(order_id, nid) for nid in ids])
-                    print(f"[fulfill][nft] marked SOLD {len(ids)} listings item_id={it['id'] if it else None} "
-                          f"order_id={order_id} ids={ids}")
-                else:
-                    if qty > 0:
-                        found = len(avail) if avail else 0
-                        print(f"[fulfill][nft] expected {qty} listings but found {found} "
-                              f"for item_id={it['id'] if it else None} — nothing marked sold")
-            except Exception as e:
-                # Use a safe message; 'ids' might not exist if the error happened earlier
-                print(f"[fulfill][nft] SOLD mark error item_id={it['id'] if it else None} "
-                      f"order_id={order_id}: {e}")
-
-            # >>> NEW: ensure a pending NFT claim row exists for this order
-            try:
-                _insert_nft_pending_claim(cx, order_id=order_id)
-                print(f"[fulfill][nft] claim row ensured for order_id={order_id}")
-            except Exception as e:
-                print(f"[fulfill][nft] pending-claim insert failed order_id={order_id}: {e}")
-
-            # ----------------- CRAFTED ITEM → voucher creation (as before) -----------------
-            if it and (it["fulfillment_kind"] == "crafting") and it["crafted_item_id"]:
-                try:
-                    crafted_id = str(it["crafted_item_id"]).strip()
-
-                    with conn() as cx2:
-                        c_row = cx2.execute(
-                            "SELECT id, name, COALESCE(svg,'') AS svg, COALESCE(meta,'{}') AS meta "
-                            "FROM crafted_items WHERE id=?", (crafted_id,)
-                        ).fetchone()
-
-                    c_svg = (c_row["svg"] if c_row else "") or ""
-                    try:
-                        c_meta = json.loads(c_row["meta"]) if c_row and c_row["meta"] else {}
-                    except Exception:
-                        c_meta = {}
-
-                    ic_needed = int(c_meta.get("price_ic") or 500)
-
-                    for _ in range(qty):
-                        token = uuid.uuid4().hex
-                        payload = {
-                            "kind": "crafted_item",
-                            "title": it.get("title") or (c_row and c_row["name"]) or "Crafted Item",
-                            "crafted_item_id": crafted_id,
-                            "ic": ic_needed,
-                            "meta": c_meta,
-                            "svg": c_svg
-                        }
-
-                        with conn() as cx2:
-                            cx2.execute("""
-                                CREATE TABLE IF NOT EXISTS vouchers(
-                                  id INTEGER PRIMARY KEY AUTOINCREMENT,
-                                  token TEXT UNIQUE NOT NULL,
-                                  user_id INTEGER,
-                                  kind TEXT NOT NULL,
-                                  payload TEXT NOT NULL,
-                                  used INTEGER NOT NULL DEFAULT 0,
-                                  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                                  used_at TIMESTAMP
-                                )
-                            """)
-                            cx2.execute(
-                                "INSERT INTO vouchers(token, user_id, kind, payload) VALUES(?,?,?,?)",
-                                (token, int(buyer_user_id) if buyer_user_id else None,
-                                 "crafted_item", json.dumps(payload))
-                            )
-
-                            cx2.execute("""
-                                CREATE TABLE IF NOT EXISTS voucher_redirects(
-                                  id INTEGER PRIMARY KEY AUTOINCREMENT,
-                                  session_id INTEGER NOT NULL,
-                                  token TEXT NOT NULL,
-                                  used INTEGER NOT NULL DEFAULT 0,
-                                  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                                )
-                            """)
-                            cx2.execute(
-                                "INSERT INTO voucher_redirects(session_id, token) VALUES(?,?)",
-                                (s["id"], token)
-                            )
-                    print(f"[fulfill][craft] vouchers created item_id={it['id']} qty={qty}")
-                except Exception as e:
-                    print(f"[fulfill][craft] voucher create error item_id={it['id'] if it else None}: {e}")
-
-            # ----------------- IC CREDITS awarding (unchanged) -----------------
-            try:
-                cid = (it["crafted_item_id"] or "").strip().lower() if it else ""
-                awarded = 0
-                if cid.startswith("ic:"):
-                    try:
-                        unit = int(cid.split(":", 1)[1] or "0")
-                    except Exception:
-                        unit = 0
-                    if unit > 0 and buyer_user_id:
-                        awarded = unit * qty
-                        add_ic_credits(int(buyer_user_id), awarded)
-
-                if not awarded:
-                    sku = (it["sku"] or "").strip().lower() if it else ""
-                    if sku.startswith("ic"):
-                        import re
-                        match = re.search(r"(\d+)", sku)
-                        if match and buyer_user_id:
-                            unit = int(match.group(1))
-                            if unit > 0:
-                                awarded = unit * qty
-                                add_ic_credits(int(buyer_user_id), awarded)
-                if awarded:
-                    print(f"[fulfill][ic] awarded={awarded} user_id={buyer_user_id}")
-            except Exception as e:
-                print(f"[fulfill][ic] award error: {e}")
-
-        # Mark the session as paid (after loop)
-        cx.execute(
-            "UPDATE sessions SET state='paid', pi_tx_hash=? WHERE id=?",
-            (tx_hash, s["id"])
-        )
-    # ===== Emails (buyer) — unchanged except for logging =====
-    try:
-        display_rows = []
-        for li in lines:
-            it = by_id.get(int(li["item_id"]))
-            title = (it["title"] if it else f"Item {li['item_id']}")
-            qty = int(li["qty"])
-            gross = float(li["price"]) * qty
-            display_rows.append({"title": title, "qty": qty, "gross": gross})
-
-        line_html = "".join(
-            f"<tr><td style='padding:6px 8px'>{dr['title']}</td>"
-            f"<td style='padding:6px 8px; text-align:right'>{dr['qty']}</td>"
-            f"<td style='padding:6px 8px; text-align:right'>{dr['gross']:.7f} π</td></tr>"
-            for dr in display_rows
-        )
-        items_table = (
-            "<table style='border-collapse:collapse; width:100%; max-width:560px'>"
-            "<thead><tr>"
-            "<th style='text-align:left; padding:6px 8px'>Item</th>"
-            "<th style='text-align:right; padding:6px 8px'>Qty</th>"
-            "<th style='text-align:right; padding:6px 8px'>Line Total</th>"
-            "</tr></thead>"
-            f"<tbody>{line_html}</tbody>"
-            "<tfoot>"
-            f"<tr><td></td><td style='padding:6px 8px; text-align:right'><strong>Total</strong></td>"
-            f"<td style='padding:6px 8px; text-align:right'><strong>{gross_total:.7f} π</strong></td></tr>"
-            "</tfoot>"
-            "</table>"
-        )
-
-        merchant_mail = (m["reply_to_email"] or "").strip() or DEFAULT_ADMIN_EMAIL
-        suffix = f" [{len(display_rows)} items]" if len(display_rows) > 1 else ""
-        subj_buyer = f"Your order at {m['business_name']} is confirmed{suffix}" if suffix else f"Your order at {m['business_name']} is confirmed"
-        if buyer_email:
-            send_email(
-                buyer_email,
-                subj_buyer,
-                f"""
-                    <h2>Thanks for your order!</h2>
-                    <p><strong>Store:</strong> {m['business_name']}</p>
-                    {items_table}
-                    <p style="margin-top:12px">
-                      You’ll receive updates from the merchant if anything changes.
-                    </p>
-                """,
-                reply_to=merchant_mail
-            )
-        print("[fulfill] buyer email attempted")
-    except Exception as e:
-        print(f"[fulfill] email section error: {e}")
-
-    # --- After orders saved + listings marked, create NFT claimables now ---
-    try:
-        if created_order_ids and buyer_user_id:
-            for oid in created_order_ids:
-                _issue_nft_claimables_for_order(int(oid), int(buyer_user_id))
-        print(f"[fulfill][nft] claimables attempted for orders={created_order_ids}")
-    except Exception as e:
-        print(f"[fulfill][nft] claimable creation error: {e}")
+        done = write_paid_session(cx, s, tx_hash, lines, fee_total, buyer_email, buyer_name, shipping, buyer_user_id)
+        by_id = done["items"]
+        try:
+            if buyer_email:
+                subj_buyer, html = _order_email(m, lines, by_id, gross_total)
+                merchant_mail = (m["reply_to_email"] or "").strip() or DEFAULT_ADMIN_EMAIL
+                enqueue_job(cx, "email", {"to": buyer_email, "subject": subj_buyer, "html": html,
+                                          "reply_to": merchant_mail})
+            if buyer_user_id:
+                for oid in done["nft_order_ids"]:
+                    enqueue_job(cx, "nft_claimables", {"order_id": int(oid), "buyer_user_id": int(buyer_user_id)})
+        except Exception as e:
+            print(f"[fulfill] job enqueue error: {e}")
+    wake_jobs()
+    print(f"[fulfill] queued buyer email={bool(buyer_email)} claimables for orders={done['nft_order_ids']}")
+    for iid in done["stock_items"]:
+        invalidate_item(iid)
+    if done["ic_awarded"]:
+        invalidate_user(buyer_user_id)
 
     # ---- Redirect back to storefront (voucher redirect preserved) ----
     u = current_user_row()
@@ -5012,10 +4385,7 @@ def upload():
         except Exception:
             digest = uuid.uuid4().hex
         name = secure_filename(f"{digest[:32]}.{ext.lower().lstrip('.')}")
-        path = os.path.join(UPLOAD_DIR, name)
-        if not os.path.exists(path):
-            with open(path, "wb") as out:
-                out.write(data)
+        write_atomic(os.path.join(UPLOAD_DIR, name), data)
         return f"{MEDIA_PREFIX}/{name}"
 
     def _sanitize_svg_bytes(b: bytes) -> bytes:
@@ -5083,72 +4453,13 @@ def upload():
         url = _save_bytes(raw, "svg")
         return {"ok": True, "url": url}, 200
 
-    # ---- Bitmap path (use Pillow, like original) ----
-    from io import BytesIO
-    bio = BytesIO(raw)
-
+    # ---- Bitmap path: decode/resize/encode in the upload worker pool ----
     try:
-        img = Image.open(bio)
-        img.verify()
-    except Exception:
-        return {"ok": False, "error": "invalid_image"}, 400
-
-    bio.seek(0)
-    try:
-        img = Image.open(bio)
-    except Exception:
-        return {"ok": False, "error": "reopen_failed"}, 400
-
-    fmt = (img.format or "").upper()
-    ext = "jpg" if fmt == "JPEG" else fmt.lower()
-    if ext not in ALLOWED_EXTENSIONS:
-        return {"ok": False, "error": "unsupported_format"}, 400
-
-    # Correct orientation & strip EXIF
-    try:
-        from PIL import ImageOps
-        img = ImageOps.exif_transpose(img)
-    except Exception:
-        pass
-
-    # Downscale if too large
-    MAX_DIM = 2048
-    try:
-        if max(img.size) > MAX_DIM:
-            img.thumbnail((MAX_DIM, MAX_DIM))
-    except Exception:
-        pass
-
-    is_animated_gif = (fmt == "GIF" and getattr(img, "is_animated", False))
-    if is_animated_gif:
-        out_bytes = raw
-        ext = "gif"
-    else:
-        mode = img.mode
-        has_alpha = ("A" in mode) or (mode in ("RGBA", "LA", "P"))
-        buf = BytesIO()
-        save_kwargs = {}
-        if ext == "jpg":
-            if has_alpha or mode not in ("RGB",):
-                img = img.convert("RGB")
-            save_kwargs.update(dict(quality=85, optimize=True, progressive=True))
-            img.save(buf, format="JPEG", **save_kwargs)
-        elif ext == "png":
-            if mode == "P":
-                img = img.convert("RGBA" if has_alpha else "RGB")
-            save_kwargs.update(dict(optimize=True))
-            img.save(buf, format="PNG", **save_kwargs)
-        elif ext == "webp":
-            if mode not in ("RGB", "RGBA"):
-                img = img.convert("RGBA" if has_alpha else "RGB")
-            save_kwargs.update(dict(quality=85, method=4))
-            img.save(buf, format="WEBP", **save_kwargs)
-        else:
-            buf = BytesIO(raw)
-        out_bytes = buf.getvalue()
-
-    url = _save_bytes(out_bytes, ext)
-    return {"ok": True, "url": url}, 200
+        name = store_upload(raw, UPLOAD_DIR)
+    except UploadRejected as e:
+        code = e.args[0]
+        return {"ok": False, "error": code}, (503 if code == "busy" else 400)
+    return {"ok": True, "url": f"{MEDIA_PREFIX}/{name}"}, 200
 
 
 # Helper to normalize inline SVG / data: URL into /media URL for items
@@ -5266,23 +4577,26 @@ def uimg():
 
         safe_base = os.path.abspath(base_root)
         safe_path = os.path.abspath(os.path.normpath(os.path.join(safe_base, rel_path)))
-        if not safe_path.startswith(safe_base) or not os.path.exists(safe_path):
+        if not safe_path.startswith(safe_base + os.sep) or not os.path.isfile(safe_path):
             return Response(_TRANSPARENT_PNG, headers={
                 "Content-Type": "image/png",
                 "Cache-Control": "public, max-age=86400"
             })
 
+        params = variant_params(request.args)
+        if params:
+            v = get_variant(safe_path, params)
+            if v:
+                # hashed uploads never change, so neither do their derivatives
+                hashed = src.startswith("/media/") and content_etag(safe_path)
+                return send_local(v[0], mimetype=v[2], etag=v[1],
+                                  max_age=31536000 if hashed else 86400, immutable=bool(hashed))
+
         try:
             ctype = mimetypes.guess_type(safe_path)[0] or "image/png"
         except Exception:
             ctype = "image/png"
-
-        with open(safe_path, "rb") as f:
-            data = f.read()
-        return Response(data, headers={
-            "Content-Type": ctype,
-            "Cache-Control": "public, max-age=86400"
-        })
+        return send_local(safe_path, mimetype=ctype, max_age=86400)
 
     # ---- SAME-ORIGIN ABSOLUTE URL (e.g., https://izzapay.onrender.com/media/...) ----
     if u.scheme in ("http", "https"):
@@ -5292,19 +4606,22 @@ def uimg():
             app_host = request.host
         if u.netloc and u.netloc.lower().startswith(app_host.lower()) and u.path.startswith(("/media/", "/static/")):
             # Redirect directly to local path instead of proxying
+            if variant_params(request.args):
+                q = request.args.to_dict()
+                q["src"] = u.path
+                return redirect("/uimg?" + urlencode(q), code=302)
             return redirect(u.path, code=302)
 
         # ---- Remote fetch fallback (proxy external HTTPS only) ----
         if u.scheme == "https" or (u.scheme == "http" and u.netloc == app_host):
             try:
-                r = requests.get(src, stream=True, timeout=10, headers={"User-Agent": "izzapay-image-proxy"})
-                if r.status_code != 200:
-                    raise ValueError("bad status")
-                ctype = r.headers.get("Content-Type", "image/png")
-                return Response(r.content, headers={
-                    "Content-Type": ctype,
-                    "Cache-Control": "public, max-age=86400"
-                })
+                hit = uimg_cache_get(src)
+                if hit:
+                    params = variant_params(request.args)
+                    v = get_variant(hit["path"], params, src_id=hit["etag"]) if params else None
+                    if v:
+                        return send_local(v[0], mimetype=v[2], max_age=86400, etag=v[1])
+                    return send_local(hit["path"], mimetype=hit["ctype"], max_age=86400, etag=hit["etag"])
             except Exception:
                 pass
 
@@ -5336,45 +4653,13 @@ def _merchant_30d_stats(merchant_id: int):
     Returns dict with:
       gross_30, fee_30, app_fee_30 (1% of gross), net_30 (gross - fee - app_fee),
       sessions_30, usd_rate, usd_estimate (net_30 * usd_rate or None)
-    Time window uses orders.created_at if available; otherwise sessions.created_at via join.
+    Window is the last 30 UTC days from merchant_daily_stats, today included.
     """
-    now = int(time.time())
-    since = now - 30 * 24 * 3600
-    gross = 0.0
-    fee   = 0.0
-
-    with conn() as cx:
-        if HAS_ORDER_CREATED_AT:
-            row = cx.execute(
-                """
-                SELECT COALESCE(SUM(pi_amount),0) AS gross,
-                       COALESCE(SUM(pi_fee),0)    AS fee
-                FROM orders
-                WHERE merchant_id=? AND status='paid' AND created_at>=?
-                """,
-                (merchant_id, since)
-            ).fetchone()
-        else:
-            # Fallback: derive time from session timestamp
-            row = cx.execute(
-                """
-                SELECT COALESCE(SUM(o.pi_amount),0) AS gross,
-                       COALESCE(SUM(o.pi_fee),0)    AS fee
-                FROM orders o
-                JOIN sessions s ON s.pi_tx_hash = o.pi_tx_hash
-                WHERE o.merchant_id=? AND o.status='paid' AND s.created_at>=?
-                """,
-                (merchant_id, since)
-            ).fetchone()
-
-        gross = float(row["gross"] or 0.0)
-        fee   = float(row["fee"] or 0.0)
-
-        sess = cx.execute(
-            "SELECT COUNT(*) AS n FROM sessions WHERE merchant_id=? AND created_at>=?",
-            (merchant_id, since)
-        ).fetchone()
-        sessions_30 = int(sess["n"] or 0)
+    w = stats_window(merchant_id, 30)
+    since = w["since_ts"]
+    gross = w["gross"]
+    fee   = w["fee"]
+    sessions_30 = w["sessions"]
 
     app_fee_30 = 0.01 * gross
     net_30 = max(0.0, gross - fee - app_fee_30)
@@ -5394,6 +4679,49 @@ def _merchant_30d_stats(merchant_id: int):
     }
 
 
+ORDERS_PAGE_SIZE = 100
+
+def _purchases_page(cx, uid, limit, cursor=None):
+    """Buyer's orders, newest first: (rows, next_cursor). Seeks idx_orders_buyer_user."""
+    after = decode_cursor(cursor, "purchases")
+    rows = cx.execute(
+        """
+        SELECT o.id, o.item_id, o.qty, o.pi_amount AS amount, o.status, o.pi_tx_hash,
+               i.title, m.business_name AS store
+        FROM orders o
+        JOIN items i      ON i.id = o.item_id
+        JOIN merchants m  ON m.id = o.merchant_id
+        WHERE o.buyer_user_id = ? AND o.id < ?
+        ORDER BY o.id DESC
+        LIMIT ?
+        """,
+        (uid, after[0] if after else 1 << 62, limit + 1),
+    ).fetchall()
+    return page_of(rows, limit, "purchases", lambda r: (r["id"],))
+
+def _sales_page(cx, uid, limit, cursor=None):
+    """Orders across the user's stores, newest first: (rows, next_cursor). Seeks idx_orders_merchant_id."""
+    after = decode_cursor(cursor, "sales")
+    mids = [r["id"] for r in cx.execute("SELECT id FROM merchants WHERE owner_user_id=?", (uid,))]
+    if not mids:
+        return [], None
+    marks = ",".join("?" * len(mids))
+    rows = cx.execute(
+        f"""
+        SELECT o.id, o.item_id, o.qty, o.pi_amount AS amount, o.status, o.pi_tx_hash,
+               i.title, m.business_name AS store, m.slug AS slug, m.id AS m_id,
+               m.pi_wallet_address AS wallet
+        FROM orders o
+        JOIN items i      ON i.id = o.item_id
+        JOIN merchants m  ON m.id = o.merchant_id
+        WHERE o.merchant_id IN ({marks}) AND o.id < ?
+        ORDER BY o.id DESC
+        LIMIT ?
+        """,
+        (*mids, after[0] if after else 1 << 62, limit + 1),
+    ).fetchall()
+    return page_of(rows, limit, "sales", lambda r: (r["id"],))
+
 @app.get("/orders")
 def orders_page():
     u = current_user_row()
@@ -5402,35 +4730,11 @@ def orders_page():
 
     uid = int(u["id"])
 
-    with conn() as cx:
-        purchases = cx.execute(
-            """
-            SELECT o.id, o.item_id, o.qty, o.pi_amount AS amount, o.status, o.pi_tx_hash,
-                   i.title, m.business_name AS store
-            FROM orders o
-            JOIN items i      ON i.id = o.item_id
-            JOIN merchants m  ON m.id = o.merchant_id
-            WHERE o.buyer_user_id = ?
-            ORDER BY o.id DESC
-            LIMIT 100
-            """,
-            (uid,),
-        ).fetchall()
-
-        sales = cx.execute(
-            """
-            SELECT o.id, o.item_id, o.qty, o.pi_amount AS amount, o.status, o.pi_tx_hash,
-                   i.title, m.business_name AS store, m.slug AS slug, m.id AS m_id,
-                   m.pi_wallet_address AS wallet
-            FROM orders o
-            JOIN items i      ON i.id = o.item_id
-            JOIN merchants m  ON m.id = o.merchant_id
-            WHERE m.owner_user_id = ?
-            ORDER BY o.id DESC
-            LIMIT 200
-            """,
-            (uid,),
-        ).fetchall()
+    with conn_ro() as cx:
+        purchases, purchases_next = _purchases_page(cx, uid, ORDERS_PAGE_SIZE, request.args.get("cursor"))
+        # the page links to /merchant/<slug>/orders for sales (paged via /api/orders?kind=sales);
+        # the newest sale only picks which store to show
+        sales, _ = _sales_page(cx, uid, 1)
 
         merchant = None
         stats = None
@@ -5457,7 +4761,7 @@ def orders_page():
         mode="list",
         user=u,
         purchases=[dict(r) for r in purchases],
-        sales=[dict(r) for r in sales],
+        purchases_next=purchases_next,
         merchant=merchant,
         stats=stats,
         sandbox=PI_SANDBOX,
@@ -5465,6 +4769,27 @@ def orders_page():
         t=tok,   # <-- pass token
     )
 
+@app.get("/api/orders")
+def api_orders():
+    """GET /api/orders?kind=purchases|sales&limit=50&cursor=... -> {orders, next_cursor}"""
+    u = current_user_row()
+    if not u:
+        return jsonify(ok=False, error="auth_required"), 401
+    kind = request.args.get("kind", "purchases")
+    if kind not in ("purchases", "sales"):
+        return jsonify(ok=False, error="bad_kind"), 400
+    try:
+        limit = max(1, min(200, int(request.args.get("limit", "50"))))
+    except ValueError:
+        limit = 50
+    cursor = request.args.get("cursor")
+    if cursor and decode_cursor(cursor, kind) is None:
+        return jsonify(ok=False, error="bad_cursor"), 400
+    with conn_ro() as cx:
+        fetch = _purchases_page if kind == "purchases" else _sales_page
+        rows, next_cursor = fetch(cx, int(u["id"]), limit, cursor)
+    return jsonify(ok=True, orders=[dict(r) for r in rows], next_cursor=next_cursor)
+
 
 # Trigger payout email (manual payout by app owner)
 @app.post("/merchant/<slug>/payout")
@@ -5523,27 +4848,25 @@ def merchant_payout(slug):
         <p><em>Note: Merchant UI informs payout may take up to 24 hours.</em></p>
     """.strip()
 
+    # The request row and its email job commit together; the throttle starts
+    # now and a jobs worker retries the email until SMTP takes it.
     ok = False
     try:
-        ok = send_email(
-            DEFAULT_ADMIN_EMAIL,
-            f"[Payout] {m['business_name']} Ã¢ÂÂ {net_30:.7f} ÃÂ",
-            body,
-            reply_to=(m["reply_to_email"] or None),
-        )
-    except Exception:
-        ok = False
-
-    # Log the request only if we actually sent the email
-    if ok:
-        try:
-            with conn() as cx:
-                cx.execute(
-                    "INSERT INTO payout_requests(merchant_id, requested_at) VALUES(?,?)",
-                    (m["id"], now),
-                )
-        except Exception:
-            pass
+        with conn() as cx:
+            enqueue_job(cx, "email", {
+                "to": DEFAULT_ADMIN_EMAIL,
+                "subject": f"[Payout] {m['business_name']} Ã¢ÂÂ {net_30:.7f} ÃÂ",
+                "html": body,
+                "reply_to": (m["reply_to_email"] or None),
+            })
+            cx.execute(
+                "INSERT INTO payout_requests(merchant_id, requested_at) VALUES(?,?)",
+                (m["id"], now),
+            )
+        wake_jobs()
+        ok = True
+    except Exception as e:
+        print(f"[payout] request failed merchant_id={m['id']}: {e}")
 
     # Redirect back to Sales with success or error flag (and preserve token)
     if ok:
@@ -5558,13 +4881,12 @@ def merchant_payout(slug):
 # ----------------- BUYER STATUS / SUCCESS -----------------
 @app.get("/o/<token>")
 def buyer_status(token):
-    with conn() as cx:
+    with conn_ro() as cx:
         o = cx.execute("SELECT * FROM orders WHERE buyer_token=?", (token,)).fetchone()
     if not o:
         abort(404)
-    with conn() as cx:
-        i = cx.execute("SELECT * FROM items WHERE id=?", (o["item_id"],)).fetchone()
-        m = cx.execute("SELECT * FROM merchants WHERE id=?", (o["merchant_id"],)).fetchone()
+    i = item_by_id(o["item_id"])
+    m = merchant_by_id(o["merchant_id"])
     return render_template("buyer_status.html", o=o, i=i, m=m, colorway=m["colorway"])
 
 
@@ -0,0 +1,286 @@
+# backups.py
+# Online, compressed database backups.
+#
+# A backup is an SQLite online-backup copy (db.snapshot_to) taken a few
+# hundred pages at a time so writers are never blocked for long. The copy is
+# then compressed (zstd if the `zstandard` package is installed, else gzip)
+# and old files are pruned. A background thread keeps the schedule; nothing
+# runs on the boot path.
+#
+# Progress is published to <BACKUP_DIR>/status.json so /admin/backup/status
+# shows the same backup whichever gunicorn worker answers.
+import os, json, time, gzip, socket, shutil, threading
+from collections import deque
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+from db import snapshot_to
+
+DATA_ROOT = os.getenv("DATA_ROOT", "/var/data/izzapay")
+BACKUP_DIR = os.getenv("BACKUP_DIR", os.path.join(DATA_ROOT, "backups"))
+BACKUP_KEEP = int(os.getenv("BACKUP_KEEP", "10"))
+# Hours between scheduled backups; 0 turns the scheduler off.
+BACKUP_INTERVAL_HOURS = float(os.getenv("BACKUP_INTERVAL_HOURS", "24"))
+# Pages copied per backup step and pause between steps (throttling).
+BACKUP_PAGES_PER_STEP = int(os.getenv("BACKUP_PAGES_PER_STEP", "256"))
+BACKUP_STEP_SLEEP_MS = float(os.getenv("BACKUP_STEP_SLEEP_MS", "5"))
+# Writers restart a stepped copy; after this many restarts copy in one step.
+BACKUP_MAX_RESTARTS = int(os.getenv("BACKUP_MAX_RESTARTS", "5"))
+# zstd | gzip | none
+BACKUP_COMPRESSION = os.getenv("BACKUP_COMPRESSION", "zstd" if zstandard else "gzip").strip().lower()
+BACKUP_ZSTD_LEVEL = int(os.getenv("BACKUP_ZSTD_LEVEL", "10"))
+BACKUP_GZIP_LEVEL = int(os.getenv("BACKUP_GZIP_LEVEL", "6"))
+
+_BACKUP_SUFFIXES = (".sqlite", ".sqlite.zst", ".sqlite.gz")
+_CHUNK = 1024 * 1024
+
+_state_lock = threading.Lock()
+_state = {"running": False, "phase": None, "reason": None, "started_at": None,
+          "pages_total": 0, "pages_done": 0, "last": None}
+_history = deque(maxlen=20)
+_sched_thread = None
+_sched_pid = None
+
+def _is_backup(name):
+    return name.startswith("app-") and name.endswith(_BACKUP_SUFFIXES)
+
+def list_backups(backups_dir=None):
+    backups_dir = backups_dir or BACKUP_DIR
+    out = []
+    try:
+        for f in sorted((f for f in os.listdir(backups_dir) if _is_backup(f)), reverse=True):
+            st = os.stat(os.path.join(backups_dir, f))
+            out.append({"name": f, "bytes": st.st_size, "mtime": int(st.st_mtime)})
+    except FileNotFoundError:
+        pass
+    return out
+
+def _prune_old_backups(backups_dir, keep=10):
+    # Names embed a UTC timestamp, so a reverse name sort is newest-first.
+    try:
+        files = [f for f in os.listdir(backups_dir) if _is_backup(f)]
+        files.sort(reverse=True)
+        for f in files[keep:]:
+            try: os.remove(os.path.join(backups_dir, f))
+            except Exception: pass
+    except Exception:
+        pass
+
+def _compress(src, method):
+    if method == "zstd" and zstandard is not None:
+        dest = src + ".zst"
+        cctx = zstandard.ZstdCompressor(level=BACKUP_ZSTD_LEVEL, threads=-1)
+        with open(src, "rb") as fi, open(dest + ".part", "wb") as fo:
+            cctx.copy_stream(fi, fo, read_size=_CHUNK, write_size=_CHUNK)
+    elif method in ("gzip", "zstd"):
+        dest = src + ".gz"
+        with open(src, "rb") as fi, gzip.open(dest + ".part", "wb", compresslevel=BACKUP_GZIP_LEVEL) as fo:
+            shutil.copyfileobj(fi, fo, _CHUNK)
+    else:
+        return src
+    os.replace(dest + ".part", dest)
+    os.remove(src)
+    return dest
+
+def _status_path(backups_dir=None):
+    return os.path.join(backups_dir or BACKUP_DIR, "status.json")
+
+def _publish(backups_dir):
+    # called with _state_lock held
+    st = dict(_state, history=list(_history), host=socket.gethostname(), pid=os.getpid(),
+              published_at=time.time())
+    tmp = _status_path(backups_dir) + f".{os.getpid()}.tmp"
+    try:
+        with open(tmp, "w") as fh:
+            json.dump(st, fh)
+        os.replace(tmp, _status_path(backups_dir))
+    except OSError as e:
+        print("[BACKUP] status write failed:", repr(e))
+
+def _update(backups_dir=None, **kw):
+    with _state_lock:
+        _state.update(kw)
+        if backups_dir:
+            _publish(backups_dir)
+
+_last_publish = [0.0]
+
+def _progress_to(backups_dir):
+    def _progress(status, remaining, total):
+        now = time.time()
+        with _state_lock:
+            _state.update(pages_total=total, pages_done=total - remaining)
+            if now - _last_publish[0] >= 1.0 or not remaining:
+                _last_publish[0] = now
+                _publish(backups_dir)
+    return _progress
+
+def _acquire_dir_lock(backups_dir):
+    # Several gunicorn workers run the scheduler; only one of them backs up at a time.
+    if fcntl is None:
+        return None, True
+    fh = open(os.path.join(backups_dir, ".lock"), "w")
+    try:
+        fcntl.flock(fh, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return fh, True
+    except OSError:
+        fh.close()
+        return None, False
+
+def run_backup(reason="manual", backups_dir=None, keep=None):
+    """
+    Take one backup now (blocking). Returns the result dict that is also
+    published as status()["last"]; returns None if another backup is running.
+    """
+    backups_dir = backups_dir or BACKUP_DIR
+    keep = BACKUP_KEEP if keep is None else keep
+    os.makedirs(backups_dir, exist_ok=True)
+    with _state_lock:
+        if _state["running"]:
+            return None
+        _state.update(running=True, phase="lock", reason=reason, started_at=time.time(),
+                      pages_total=0, pages_done=0)
+    lock_fh, ok = _acquire_dir_lock(backups_dir)
+    if not ok:
+        _update(running=False, phase=None)
+        print("[BACKUP] skipped: another process is backing up")
+        return None
+
+    with _state_lock:
+        # pick up the runs other workers published before this one
+        _history.extendleft(reversed(_shared_history(backups_dir)))
+        _dedupe_history()
+    t0 = time.time()
+    result = {"reason": reason, "started_at": int(t0), "ok": False}
+    try:
+        ts = datetime.utcnow().strftime("%Y%m%d-%H%M%S")
+        while any(f.startswith(f"app-{ts}.") for f in os.listdir(backups_dir)):
+            time.sleep(1)  # names are second-resolution; never overwrite a backup
+            ts = datetime.utcnow().strftime("%Y%m%d-%H%M%S")
+        raw = os.path.join(backups_dir, f"app-{ts}.sqlite")
+        _update(backups_dir, phase="copy")
+        snapshot_to(raw, pages=BACKUP_PAGES_PER_STEP, sleep=BACKUP_STEP_SLEEP_MS / 1000.0,
+                    progress=_progress_to(backups_dir), max_restarts=BACKUP_MAX_RESTARTS)
+        t1 = time.time()
+        raw_bytes = os.path.getsize(raw)
+        _update(backups_dir, phase="compress")
+        path = _compress(raw, BACKUP_COMPRESSION)
+        t2 = time.time()
+        _update(backups_dir, phase="prune")
+        _prune_old_backups(backups_dir, keep=keep)
+        result.update(ok=True, name=os.path.basename(path), raw_bytes=raw_bytes,
+                      bytes=os.path.getsize(path), compression=BACKUP_COMPRESSION,
+                      copy_ms=int((t1 - t0) * 1000), compress_ms=int((t2 - t1) * 1000))
+        print(f"[BACKUP] {result['name']} {raw_bytes}B -> {result['bytes']}B "
+              f"(copy {result['copy_ms']}ms, compress {result['compress_ms']}ms)")
+    except Exception as e:
+        result["error"] = repr(e)
+        print("[BACKUP] failed:", repr(e))
+    finally:
+        result["duration_ms"] = int((time.time() - t0) * 1000)
+        if lock_fh is not None:
+            lock_fh.close()
+        with _state_lock:
+            _state.update(running=False, phase=None, last=result)
+            _history.appendleft(result)
+            _publish(backups_dir)
+    return result
+
+def start_backup_async(reason="manual"):
+    """Kick off run_backup() in a background thread. False if one is already running."""
+    with _state_lock:
+        if _state["running"]:
+            return False
+    shared = _read_shared()
+    if shared and shared.get("running") and _alive(shared):
+        return False  # another worker has it
+    threading.Thread(target=run_backup, args=(reason,), name="db-backup", daemon=True).start()
+    return True
+
+def _read_shared(backups_dir=None):
+    try:
+        with open(_status_path(backups_dir)) as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return None
+
+def _shared_history(backups_dir):
+    return (_read_shared(backups_dir) or {}).get("history") or []
+
+def _dedupe_history():
+    seen, keep = set(), []
+    for r in _history:
+        k = (r.get("started_at"), r.get("name"), r.get("reason"))
+        if k not in seen:
+            seen.add(k)
+            keep.append(r)
+    _history.clear()
+    _history.extend(keep)
+
+def _alive(st):
+    if st.get("host") != socket.gethostname():
+        return True  # can't tell; trust the file
+    try:
+        os.kill(int(st["pid"]), 0)
+        return True
+    except (OSError, KeyError, TypeError, ValueError):
+        return False
+
+def status():
+    with _state_lock:
+        st = dict(_state)
+        st["history"] = list(_history)
+    shared = _read_shared()
+    if shared and not st["running"]:
+        # another worker may be running the backup, or ran the latest one
+        if shared.get("running") and not _alive(shared):
+            shared.update(running=False, phase=None, stale=True)
+        if shared.get("running") or (shared.get("published_at") or 0) > (st["started_at"] or 0):
+            st.update({k: shared.get(k) for k in ("running", "phase", "reason", "started_at",
+                                                   "pages_total", "pages_done", "last", "history",
+                                                   "host", "pid")})
+    if st["running"] and st["started_at"]:
+        st["elapsed_ms"] = int((time.time() - st["started_at"]) * 1000)
+    if st["pages_total"]:
+        st["percent"] = round(100.0 * st["pages_done"] / st["pages_total"], 1)
+    st.update(compression=BACKUP_COMPRESSION, keep=BACKUP_KEEP, interval_hours=BACKUP_INTERVAL_HOURS)
+    return st
+
+def _seconds_until_due(interval):
+    newest = list_backups()
+    if not newest:
+        return 0.0
+    return max(0.0, newest[0]["mtime"] + interval - time.time())
+
+def _scheduler_loop(interval):
+    # Small startup delay so a fresh deploy's workers aren't backing up while warming.
+    time.sleep(60)
+    while True:
+        wait = _seconds_until_due(interval)
+        if wait > 0:
+            time.sleep(min(wait, 3600))
+            continue
+        run_backup(reason="scheduled")
+        time.sleep(60)
+
+def start_backup_scheduler():
+    """Start the background backup schedule once per process (BACKUP_INTERVAL_HOURS=0 disables)."""
+    global _sched_thread, _sched_pid
+    if BACKUP_INTERVAL_HOURS <= 0:
+        return None
+    if _sched_thread is not None and _sched_pid == os.getpid() and _sched_thread.is_alive():
+        return _sched_thread
+    _sched_pid = os.getpid()
+    _sched_thread = threading.Thread(target=_scheduler_loop, args=(BACKUP_INTERVAL_HOURS * 3600,),
+                                     name="db-backup-scheduler", daemon=True)
+    _sched_thread.start()
+    return _sched_thread
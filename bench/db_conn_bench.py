@@ -0,0 +1,47 @@
+"""
+Connection overhead per request: fresh sqlite3.connect + PRAGMAs (current
+behaviour) vs. the pooled db.conn() mode (SQLITE_POOL=true).
+
+A "request" opens N connections and runs one indexed lookup on each, which is
+roughly what fulfill_session does for a single checkout.
+
+    python bench/db_conn_bench.py [--requests 2000] [--conns 6]
+"""
+import os, sys, time, argparse, tempfile, statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--requests", type=int, default=2000)
+    ap.add_argument("--conns", type=int, default=6, help="conn() calls per request")
+    args = ap.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="izza-bench-")
+    os.environ["SQLITE_DB_PATH"] = os.path.join(tmp, "app.sqlite")
+    import db
+    db.init_db()
+    with db.conn() as cx:
+        cx.execute("INSERT INTO users(pi_uid, pi_username, created_at) VALUES('u1','bench',0)")
+
+    def run(pooled):
+        db.POOL_ENABLED = pooled
+        samples = []
+        for _ in range(args.requests):
+            t0 = time.perf_counter()
+            for _ in range(args.conns):
+                with db.conn() as cx:
+                    cx.execute("SELECT * FROM users WHERE id=1").fetchone()
+            samples.append((time.perf_counter() - t0) * 1e6)
+        db.close_pool()
+        return samples
+
+    print(f"db={db.DB_PATH} requests={args.requests} conns/request={args.conns}")
+    for label, pooled in (("before (connect per call)", False), ("after  (pooled)", True)):
+        s = sorted(run(pooled))
+        p50 = statistics.median(s)
+        p99 = s[int(len(s) * 0.99) - 1]
+        print(f"{label:28s} p50={p50:8.1f}us  p99={p99:8.1f}us  per conn()={p50 / args.conns:7.1f}us")
+
+if __name__ == "__main__":
+    main()
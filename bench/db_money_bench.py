@@ -0,0 +1,106 @@
+"""
+Money aggregates on a database with 1M orders: REAL columns summed in
+SQLite (then Decimal-quantized in Python, as before) vs. the INTEGER stroop
+mirrors from migration 0006. Covers the merchant 30-day stats query, a
+per-merchant GROUP BY report, and qpi()/quantize_pi() in a Python loop.
+Also reports how far the REAL sums drift from the exact integer sums.
+
+    python bench/db_money_bench.py [--orders 1000000] [--merchants 500]
+"""
+import os, sys, time, random, argparse, tempfile
+from decimal import Decimal, ROUND_HALF_UP
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+Q = Decimal("0.0000001")
+
+def old_qpi(x):
+    return float(Decimal(str(x)).quantize(Q, rounding=ROUND_HALF_UP))
+
+def best(fn, runs):
+    out, t = None, None
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        out = fn()
+        ms = (time.perf_counter() - t0) * 1000
+        t = ms if t is None else min(t, ms)
+    return t, out
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--orders", type=int, default=1_000_000)
+    ap.add_argument("--merchants", type=int, default=500)
+    ap.add_argument("--runs", type=int, default=5)
+    args = ap.parse_args()
+
+    import db
+    db.DB_PATH = os.path.join(tempfile.mkdtemp(prefix="izza-money-"), "app.sqlite")
+    db.migrate(verbose=False)
+    rnd = random.Random(3)
+    now = int(time.time())
+    t0 = time.time()
+    with db.conn() as cx:
+        batch = []
+        for i in range(args.orders):
+            amt = round(rnd.uniform(0.01, 50), 7)
+            fee = round(amt * 0.01, 7)
+            batch.append((rnd.randint(1, args.merchants), amt, fee, round(amt - fee, 7),
+                          "paid" if rnd.random() < 0.9 else "pending", now - rnd.randint(0, 90 * 86400)))
+            if len(batch) == 50_000:
+                cx.executemany("INSERT INTO orders(merchant_id, pi_amount, pi_fee, pi_merchant_net, status, created_at) "
+                               "VALUES(?,?,?,?,?,?)", batch)
+                batch = []
+        if batch:
+            cx.executemany("INSERT INTO orders(merchant_id, pi_amount, pi_fee, pi_merchant_net, status, created_at) "
+                           "VALUES(?,?,?,?,?,?)", batch)
+    print(f"loaded {args.orders} orders in {time.time() - t0:.1f}s (insert triggers fill the stroop columns)")
+
+    since = now - 30 * 86400
+    cx = db.conn_ro()
+    mid = 7
+
+    def stats_real():
+        r = cx.execute("SELECT COALESCE(SUM(pi_amount),0), COALESCE(SUM(pi_fee),0) FROM orders "
+                       "WHERE merchant_id=? AND status='paid' AND created_at>=?", (mid, since)).fetchone()
+        return old_qpi(r[0]), old_qpi(r[1])
+
+    def stats_int():
+        r = cx.execute("SELECT COALESCE(SUM(pi_amount_stroops),0), COALESCE(SUM(pi_fee_stroops),0) FROM orders "
+                       "WHERE merchant_id=? AND status='paid' AND created_at>=?", (mid, since)).fetchone()
+        return db.from_stroops(r[0]), db.from_stroops(r[1])
+
+    def report_real():
+        return {m: old_qpi(g) for m, g in cx.execute(
+            "SELECT merchant_id, SUM(pi_amount) FROM orders WHERE status='paid' GROUP BY merchant_id")}
+
+    def report_int():
+        return {m: db.from_stroops(g) for m, g in cx.execute(
+            "SELECT merchant_id, SUM(pi_amount_stroops) FROM orders WHERE status='paid' GROUP BY merchant_id")}
+
+    def total_real():
+        return cx.execute("SELECT SUM(pi_amount) FROM orders").fetchone()[0]
+
+    def total_int():
+        return cx.execute("SELECT SUM(pi_amount_stroops) FROM orders").fetchone()[0]
+
+    for label, a, b in (("merchant 30d stats", stats_real, stats_int),
+                        ("GROUP BY merchant", report_real, report_int),
+                        ("SUM all orders", total_real, total_int)):
+        ta, ra = best(a, args.runs)
+        tb, rb = best(b, args.runs)
+        print(f"{label:20s} REAL {ta:9.2f}ms   stroops {tb:9.2f}ms")
+
+    real_total = total_real()
+    exact = total_int()
+    print(f"REAL SUM drift vs exact: {abs(Decimal(repr(real_total)) - Decimal(exact) / db.STROOPS_PER_PI)} Pi")
+    rep_r, rep_i = report_real(), report_int()
+    print(f"merchants whose 7-dp gross differs (REAL vs exact): {sum(1 for m in rep_r if rep_r[m] != rep_i[m])}")
+
+    vals = [r[0] for r in cx.execute("SELECT pi_amount * 1.0000001 FROM orders LIMIT 200000")]
+    ta, _ = best(lambda: [old_qpi(v) for v in vals], 3)
+    tb, _ = best(lambda: [db.quantize_pi(v) for v in vals], 3)
+    print(f"qpi x{len(vals):<7d}       Decimal {ta:7.1f}ms   stroops {tb:7.1f}ms")
+    cx.close()
+
+if __name__ == "__main__":
+    main()
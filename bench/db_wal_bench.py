@@ -0,0 +1,92 @@
+"""
+Mixed read/write contention: bot-engine style writers (log_trade /
+upsert_position) against storefront style readers, journal_mode=DELETE
+(current default) vs. WAL + conn_ro(). Reports read/write p50/p99 and the
+number of "database is locked" failures.
+
+    python bench/db_wal_bench.py [--seconds 5] [--readers 8] [--writers 2]
+"""
+import os, sys, time, argparse, tempfile, threading, sqlite3
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def pct(s, p):
+    if not s:
+        return 0.0
+    s = sorted(s)
+    return s[min(len(s) - 1, int(len(s) * p))]
+
+def run(db, mode, args):
+    db.DB_PATH = os.path.join(tempfile.mkdtemp(prefix="izza-wal-"), "app.sqlite")
+    db.JOURNAL_MODE = mode
+    db.POOL_ENABLED = False
+    db.migrate(verbose=False)
+    with db.conn() as cx:
+        cx.execute("INSERT INTO users(id, pi_uid, pi_username, created_at) VALUES(1,'u1','bench',0)")
+        cx.execute("INSERT INTO merchants(id, owner_user_id, slug, business_name, pi_wallet) VALUES(1,1,'s','Shop','w')")
+        cx.executemany(
+            "INSERT INTO items(merchant_id, link_id, title, pi_price, stock_qty, active) VALUES(1,?,?,1.0,10,1)",
+            [(f"l{i}", f"Item {i}") for i in range(2000)],
+        )
+        cx.execute("INSERT INTO bot_accounts(id, username, wallet_pub) VALUES(1,'bench','G')")
+        cx.execute("INSERT INTO bot_buckets(id, account_id, name) VALUES(1,1,'b')")
+
+    stop = time.time() + args.seconds
+    reads, writes = [], []
+    errors = {"read": 0, "write": 0}
+    mu = threading.Lock()
+
+    def writer():
+        n = 0
+        while time.time() < stop:
+            t0 = time.perf_counter()
+            try:
+                with db.conn() as cx:
+                    cx.execute(
+                        "INSERT INTO bot_trades(account_id, bucket_id, side, amount, price, ts) VALUES(1,1,'buy',1,1,?)",
+                        (int(time.time()),),
+                    )
+                    cx.execute(
+                        "INSERT INTO bot_bucket_allocations(account_id, bucket_id, amount) VALUES(1,1,?) "
+                        "ON CONFLICT(account_id, bucket_id) DO UPDATE SET amount=excluded.amount",
+                        (n,),
+                    )
+                    time.sleep(args.hold_ms / 1000.0)  # work done while the txn is open
+                with mu: writes.append((time.perf_counter() - t0) * 1000)
+            except sqlite3.OperationalError:
+                with mu: errors["write"] += 1
+            n += 1
+
+    def reader():
+        factory = db.conn_ro if mode == "WAL" else db.conn
+        while time.time() < stop:
+            t0 = time.perf_counter()
+            try:
+                with factory() as cx:
+                    cx.execute("SELECT * FROM merchants WHERE slug='s'").fetchone()
+                    cx.execute("SELECT * FROM items WHERE merchant_id=1 AND active=1 ORDER BY id DESC LIMIT 50").fetchall()
+                with mu: reads.append((time.perf_counter() - t0) * 1000)
+            except sqlite3.OperationalError:
+                with mu: errors["read"] += 1
+
+    threads = [threading.Thread(target=writer) for _ in range(args.writers)]
+    threads += [threading.Thread(target=reader) for _ in range(args.readers)]
+    for t in threads: t.start()
+    for t in threads: t.join()
+
+    print(f"{mode:7s} reads={len(reads):6d} p50={pct(reads, .5):7.2f}ms p99={pct(reads, .99):7.2f}ms err={errors['read']:4d} | "
+          f"writes={len(writes):5d} p50={pct(writes, .5):7.2f}ms p99={pct(writes, .99):7.2f}ms err={errors['write']}")
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--seconds", type=float, default=5)
+    ap.add_argument("--readers", type=int, default=8)
+    ap.add_argument("--writers", type=int, default=2)
+    ap.add_argument("--hold-ms", type=float, default=2.0, help="time each write txn stays open")
+    args = ap.parse_args()
+    import db
+    for mode in ("DELETE", "WAL"):
+        run(db, mode, args)
+
+if __name__ == "__main__":
+    main()
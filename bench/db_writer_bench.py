@@ -0,0 +1,81 @@
+"""
+50 concurrent writers doing bot-engine style small write transactions
+(log_trade + update_cash_for_bucket): today's one-connection-per-write
+behaviour vs. the single-writer group-commit queue (db.run_write).
+Reports committed writes/sec, p50/p99 latency and "database is locked" failures.
+
+    python bench/db_writer_bench.py [--writers 50] [--seconds 5] [--journal WAL]
+"""
+import os, sys, time, argparse, tempfile, threading, sqlite3
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def pct(s, p):
+    if not s:
+        return 0.0
+    s = sorted(s)
+    return s[min(len(s) - 1, int(len(s) * p))]
+
+def write_trade(cx, n):
+    cx.execute(
+        "INSERT INTO bot_trades(account_id, bucket_id, side, amount, price, ts) VALUES(1,1,'buy',1,1,?)",
+        (n,),
+    )
+    cx.execute("UPDATE bot_bucket_allocations SET amount = amount + 1 WHERE account_id=1 AND bucket_id=1")
+
+def run(db, label, queued, args):
+    db.close_pool()
+    db.DB_PATH = os.path.join(tempfile.mkdtemp(prefix="izza-writer-"), "app.sqlite")
+    db.JOURNAL_MODE = args.journal
+    db.POOL_ENABLED = True
+    db.WRITE_QUEUE_ENABLED = queued
+    db.migrate(verbose=False)
+    with db.conn() as cx:
+        cx.execute("INSERT INTO bot_accounts(id, username, wallet_pub) VALUES(1,'bench','G')")
+        cx.execute("INSERT INTO bot_buckets(id, account_id, name) VALUES(1,1,'b')")
+        cx.execute("INSERT INTO bot_bucket_allocations(account_id, bucket_id, amount) VALUES(1,1,0)")
+
+    stop = time.time() + args.seconds
+    lat, errors = [], [0]
+    mu = threading.Lock()
+
+    def writer():
+        n = 0
+        while time.time() < stop:
+            t0 = time.perf_counter()
+            try:
+                if queued:
+                    db.run_write(write_trade, n)
+                else:
+                    with db.conn() as cx:
+                        write_trade(cx, n)
+                with mu: lat.append((time.perf_counter() - t0) * 1000)
+            except sqlite3.OperationalError:
+                with mu: errors[0] += 1
+            n += 1
+
+    threads = [threading.Thread(target=writer) for _ in range(args.writers)]
+    t0 = time.time()
+    for t in threads: t.start()
+    for t in threads: t.join()
+    elapsed = time.time() - t0
+
+    with db.conn() as cx:
+        rows = cx.execute("SELECT COUNT(*) FROM bot_trades").fetchone()[0]
+    print(f"{label:8s} {args.journal:6s} writers={args.writers} commits/s={len(lat) / elapsed:8.0f} "
+          f"p50={pct(lat, .5):7.2f}ms p99={pct(lat, .99):8.2f}ms locked={errors[0]:5d} rows={rows}")
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--writers", type=int, default=50)
+    ap.add_argument("--seconds", type=float, default=5)
+    ap.add_argument("--journal", default="WAL", choices=["DELETE", "WAL"])
+    ap.add_argument("--busy-ms", type=int, default=3000, help="SQLITE_BUSY_TIMEOUT_MS for direct writers")
+    args = ap.parse_args()
+    import db
+    db.BUSY_TIMEOUT_MS = args.busy_ms
+    run(db, "direct", False, args)
+    run(db, "queued", True, args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Cost of resolving the merchant/item a store, cart or checkout request starts
+from: a conn_ro() query per call (before) vs. entity_cache (after, warm).
+
+    python bench/entity_cache_bench.py [--merchants 500] [--runs 2000]
+"""
+import os, sys, time, random, argparse, tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# same statement checkout() ran before entity_cache
+CHECKOUT = """SELECT items.*, merchants.business_name, merchants.logo_url, merchants.id AS mid,
+                     merchants.slug AS mslug, merchants.colorway AS colorway
+              FROM items JOIN merchants ON merchants.id = items.merchant_id
+              WHERE link_id=? AND active=1"""
+
+def per_call(fn, keys):
+    t0 = time.perf_counter()
+    for k in keys:
+        fn(k)
+    return (time.perf_counter() - t0) / len(keys) * 1e6
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--merchants", type=int, default=500)
+    ap.add_argument("--runs", type=int, default=2000)
+    args = ap.parse_args()
+
+    import db
+    db.DB_PATH = os.path.join(tempfile.mkdtemp(prefix="izza-entity-"), "app.sqlite")
+    db.migrate(verbose=False)
+    import entity_cache as ec
+    with db.conn() as cx:
+        cx.execute("INSERT INTO users(id, pi_uid, pi_username, role) VALUES(1, 'bench', 'bench', 'user')")
+        cx.executemany("INSERT INTO merchants(id, owner_user_id, slug, business_name, pi_wallet) VALUES(?,1,?,?,'G')",
+                       [(m, f"shop-{m}", f"Shop {m}") for m in range(1, args.merchants + 1)])
+        cx.executemany("INSERT INTO items(merchant_id, link_id, title, pi_price, stock_qty, active) VALUES(?,?,?,1,5,1)",
+                       [((i % args.merchants) + 1, f"L{i}", f"Item {i}") for i in range(args.merchants * 20)])
+
+    rnd = random.Random(3)
+    slugs = [f"shop-{rnd.randint(1, args.merchants)}" for _ in range(args.runs)]
+    links = [f"L{rnd.randint(0, args.merchants * 20 - 1)}" for _ in range(args.runs)]
+
+    def slug_query(slug):
+        with db.conn_ro() as cx:
+            return cx.execute("SELECT * FROM merchants WHERE slug=?", (slug,)).fetchone()
+
+    def checkout_query(link):
+        with db.conn_ro() as cx:
+            return cx.execute(CHECKOUT, (link,)).fetchone()
+
+    for name, before, after, keys in (("merchant by slug", slug_query, ec.merchant_by_slug, slugs),
+                                      ("checkout link", checkout_query, ec.checkout_item, links)):
+        for k in keys:
+            after(k)  # warm
+        b = per_call(before, keys)
+        a = per_call(after, keys)
+        print(f"{name:18s} query {b:8.1f}us   cached {a:6.1f}us   ({b / a:6.1f}x)")
+    print(ec.stats())
+
+if __name__ == "__main__":
+    main()
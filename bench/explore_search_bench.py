@@ -0,0 +1,98 @@
+"""
+/explore search on a database with 500k items: the old LIKE '%q%' queries
+(full scan + join, ORDER BY id DESC LIMIT/OFFSET) vs. the FTS5 index from
+migration 0007 (bm25-ranked prefix match, search.py), for full words, short
+typeahead prefixes and a miss. Also times the insert triggers.
+
+    python bench/explore_search_bench.py [--items 500000] [--merchants 2000]
+"""
+import os, sys, time, random, argparse, tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+WORDS = ("red blue green black white vintage handmade leather cotton wool silk ceramic wooden "
+         "shirt mug hoodie scarf ring bracelet poster print sticker candle soap lamp chair bowl "
+         "plate jacket hat sock bag wallet notebook pen card game token sword shield potion").split()
+
+OLD_PRODUCTS = """SELECT items.*,
+                         merchants.slug          AS m_slug,
+                         merchants.business_name AS m_name,
+                         merchants.colorway      AS m_colorway,
+                         merchants.theme_mode    AS m_theme
+                  FROM items
+                  JOIN merchants ON merchants.id = items.merchant_id
+                  WHERE items.active=1
+                    AND (items.title LIKE ? OR merchants.business_name LIKE ?)
+                  ORDER BY items.id DESC
+                  LIMIT ? OFFSET ?"""
+OLD_MERCHANTS = """SELECT slug, business_name, logo_url, theme_mode, colorway
+                   FROM merchants
+                   WHERE business_name LIKE ? OR slug LIKE ?
+                   ORDER BY id DESC
+                   LIMIT 50"""
+
+def best(fn, runs):
+    out, t = None, None
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        out = fn()
+        ms = (time.perf_counter() - t0) * 1000
+        t = ms if t is None else min(t, ms)
+    return t, out
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--items", type=int, default=500_000)
+    ap.add_argument("--merchants", type=int, default=2000)
+    ap.add_argument("--runs", type=int, default=5)
+    args = ap.parse_args()
+
+    import db, search
+    db.DB_PATH = os.path.join(tempfile.mkdtemp(prefix="izza-fts-"), "app.sqlite")
+    db.migrate(verbose=False)
+    rnd = random.Random(5)
+    t0 = time.time()
+    with db.conn() as cx:
+        cx.execute("INSERT INTO users(id, pi_uid, pi_username, role) VALUES(1, 'bench', 'bench', 'user')")
+        cx.executemany("INSERT INTO merchants(id, owner_user_id, slug, business_name, pi_wallet) VALUES(?,1,?,?,'G')",
+                       [(m, f"shop-{m}", f"{rnd.choice(WORDS).title()} {rnd.choice(WORDS).title()} Shop {m}")
+                        for m in range(1, args.merchants + 1)])
+        batch = []
+        for i in range(1, args.items + 1):
+            title = " ".join(rnd.choice(WORDS) for _ in range(3)).title()
+            desc = " ".join(rnd.choice(WORDS) for _ in range(12))
+            batch.append((rnd.randint(1, args.merchants), f"L{i}", title, desc, f"SKU-{i:07d}",
+                          1.0, 5, 1 if rnd.random() < 0.9 else 0))
+            if len(batch) == 50_000:
+                cx.executemany("INSERT INTO items(merchant_id, link_id, title, description, sku, pi_price, stock_qty, active) "
+                               "VALUES(?,?,?,?,?,?,?,?)", batch)
+                batch = []
+        if batch:
+            cx.executemany("INSERT INTO items(merchant_id, link_id, title, description, sku, pi_price, stock_qty, active) "
+                           "VALUES(?,?,?,?,?,?,?,?)", batch)
+    print(f"loaded {args.items} items / {args.merchants} merchants in {time.time() - t0:.1f}s "
+          f"(insert triggers fill items_fts)")
+
+    cx = db.conn_ro()
+    with cx:
+        pass
+    cases = [("word", "leather"), ("two words", "red mug"), ("prefix 3", "can"),
+             ("prefix 2", "ha"), ("merchant", "shop 1234"), ("sku", "SKU-0004242"), ("miss", "zebra")]
+    print(f"{'query':12s} {'q':14s} {'LIKE page':>10s} {'FTS page':>10s} {'LIKE p40':>10s} {'FTS p40':>10s} {'suggest':>9s}")
+    for label, q in cases:
+        like = f"%{q}%"
+        def old(offset):
+            cx.execute(OLD_MERCHANTS, (like, like)).fetchall()
+            return cx.execute(OLD_PRODUCTS, (like, like, 12, offset)).fetchall()
+        def new(offset):
+            search.search_merchants(cx, q, 50)
+            return search.search_items(cx, q, 12, offset)
+        t_old, _ = best(lambda: old(0), args.runs)
+        t_new, _ = best(lambda: new(0), args.runs)
+        t_old40, _ = best(lambda: old(12 * 39), args.runs)
+        t_new40, _ = best(lambda: new(12 * 39), args.runs)
+        t_sug, _ = best(lambda: search.suggest(cx, q, 8), args.runs)
+        print(f"{label:12s} {q:14s} {t_old:8.1f}ms {t_new:8.1f}ms {t_old40:8.1f}ms {t_new40:8.1f}ms {t_sug:7.1f}ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+DB time to fulfill one paid cart: the per-line loop fulfill_session ran
+(before) vs. fulfillment.write_paid_session (after), for a 50-line cart of
+plain and NFT items.
+
+Crafted-voucher and IC-credit lines are left out: the old loop wrote those
+through a second connection that waits on the open transaction's lock.
+
+    python bench/fulfillment_bench.py [--lines 50] [--nft-every 5] [--runs 30]
+"""
+import os, sys, json, time, uuid, sqlite3, argparse, tempfile, statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--lines", type=int, default=50)
+    ap.add_argument("--nft-every", type=int, default=5, help="every Nth line is an NFT item")
+    ap.add_argument("--runs", type=int, default=30)
+    args = ap.parse_args()
+
+    import db
+    db.DB_PATH = os.path.join(tempfile.mkdtemp(prefix="izza-fulfill-"), "app.sqlite")
+    # The baseline schema declares orders.pi_tx_hash UNIQUE, which rejects the
+    # second line of any multi-line cart. Create orders without it (migrations
+    # add the other columns) so both versions can write a whole cart.
+    raw = sqlite3.connect(db.DB_PATH)
+    raw.execute("""CREATE TABLE orders(id INTEGER PRIMARY KEY, merchant_id INTEGER, item_id INTEGER, qty INTEGER,
+                   buyer_email TEXT, buyer_name TEXT, shipping_json TEXT, pi_amount REAL, pi_fee REAL,
+                   pi_merchant_net REAL, pi_tx_hash TEXT, payout_status TEXT, status TEXT, tracking_carrier TEXT,
+                   tracking_number TEXT, tracking_url TEXT, buyer_token TEXT)""")
+    raw.close()
+    db.migrate(verbose=False)
+    import fulfillment
+    from merchant_stats import record_orders
+    from page_cache import bump as bump_pages
+    db.ensure_all_registered()
+
+    n_listings = args.runs * 2 + 2  # per NFT item per version
+    with db.conn() as cx:
+        cx.execute("INSERT INTO users(id, pi_uid, pi_username, role) VALUES(1, 'bench', 'bench', 'user')")
+        cx.execute("INSERT INTO merchants(id, owner_user_id, slug, business_name, pi_wallet) VALUES(1,1,'shop','Shop','G')")
+        cx.execute("INSERT INTO nft_collections(id, merchant_id, code, issuer, total_supply) VALUES(1,1,'ART','GISSUER',1000000)")
+        for i in range(1, args.lines + 1):
+            nft = i % args.nft_every == 0
+            cx.execute("INSERT INTO items(id, merchant_id, link_id, title, pi_price, stock_qty, active, is_nft) "
+                       "VALUES(?,1,?,?,1.5,1000000,1,?)", (i, f"L{i}", f"Item {i}", int(nft)))
+            if nft:
+                cx.executemany("INSERT INTO nft_listings(collection_id, serial, seller_user_id, price_pi, status, item_id) "
+                               "VALUES(1,?,1,1.5,'active',?)", [(i * 10000 + k, i) for k in range(n_listings * 2)])
+    lines = [{"item_id": i, "qty": 1, "price": 1.5} for i in range(1, args.lines + 1)]
+    fee_total = 0.01 * 1.5 * args.lines
+
+    def new_session():
+        sid = uuid.uuid4().hex
+        with db.conn() as cx:
+            cx.execute("INSERT INTO sessions(id, merchant_id, expected_pi, state, created_at, line_items_json, user_id) "
+                       "VALUES(?,1,?,'initiated',?,?,1)", (sid, 1.5 * args.lines, int(time.time()), json.dumps(lines)))
+            return cx.execute("SELECT * FROM sessions WHERE id=?", (sid,)).fetchone()
+
+    def before(s):
+        # statements of the old per-line loop, in order
+        item_ids = [int(li["item_id"]) for li in lines]
+        with db.conn() as cx:
+            by_id = {int(r["id"]): r for r in cx.execute(
+                f"SELECT * FROM items WHERE id IN ({','.join('?' for _ in item_ids)})", item_ids)}
+        total = sum(float(li["price"]) * int(li["qty"]) for li in lines) or 1.0
+        sold, bumped = [], False
+        with db.conn() as cx:
+            for li in lines:
+                it = by_id.get(int(li["item_id"]))
+                qty = int(li["qty"])
+                gross = float(li["price"]) * qty
+                fee = fee_total * (gross / total)
+                if it and not it["allow_backorder"]:
+                    cx.execute("UPDATE items SET stock_qty=? WHERE id=?", (max(0, it["stock_qty"] - qty), it["id"]))
+                    if not bumped:
+                        bump_pages(cx, 1)
+                        bumped = True
+                cur = cx.execute(
+                    """INSERT INTO orders(merchant_id, item_id, qty, buyer_email, buyer_name, shipping_json,
+                         pi_amount, pi_fee, pi_merchant_net, pi_tx_hash, payout_status, status, buyer_token,
+                         buyer_user_id, created_at)
+                       VALUES (?,?,?,?,?,?,?,?,?,?,'pending','paid',?,?,?)""",
+                    (1, it["id"], qty, None, None, "{}", gross, fee, gross - fee, s["id"],
+                     uuid.uuid4().hex, 1, int(time.time())))
+                order_id = cur.lastrowid
+                sold.append((gross, fee, gross - fee))
+                avail = cx.execute("SELECT id FROM nft_listings WHERE item_id=? AND status IN ('active','listed') "
+                                   "ORDER BY id ASC LIMIT ?", (it["id"], qty)).fetchall()
+                if avail and len(avail) == qty:
+                    urow = cx.execute("SELECT COALESCE(NULLIF(username,''), NULLIF(pi_username,'')) AS un "
+                                      "FROM users WHERE id=?", (1,)).fetchone()
+                    cx.executemany("UPDATE nft_listings SET status='sold', order_id=?, buyer_user_id=?, "
+                                   "buyer_username=?, sold_at=? WHERE id=?",
+                                   [(order_id, 1, urow["un"], int(time.time()), r["id"]) for r in avail])
+                fulfillment._insert_nft_pending_claims(cx, [order_id])  # was one call per order
+            record_orders(cx, 1, sold)
+            cx.execute("UPDATE sessions SET state='paid', pi_tx_hash=? WHERE id=?", (s["id"], s["id"]))
+
+    def after(s):
+        with db.conn() as cx:
+            fulfillment.write_paid_session(cx, s, s["id"], lines, fee_total, None, None, {}, 1)
+
+    import contextlib, io
+    timings = {}
+    for name, fn in (("before", before), ("after", after), ("before", before), ("after", after)):
+        out = []
+        for _ in range(args.runs // 2):
+            s = new_session()
+            with contextlib.redirect_stdout(io.StringIO()):  # per-line [fulfill] logs
+                t0 = time.perf_counter()
+                fn(s)
+                out.append((time.perf_counter() - t0) * 1000)
+        timings.setdefault(name, []).extend(out)
+    b, a = statistics.median(timings["before"]), statistics.median(timings["after"])
+    print(f"{args.lines}-line cart ({args.lines // args.nft_every} NFT lines): "
+          f"per-line loop {b:7.2f}ms   batched {a:7.2f}ms   ({b / a:4.1f}x)")
+    with db.conn_ro() as cx:
+        print("orders", cx.execute("SELECT count(*) FROM orders").fetchone()[0],
+              "claims", cx.execute("SELECT count(*) FROM nft_pending_claims").fetchone()[0])
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Per-page CPU of the old after_request i18n injector (decode the whole body,
+lowercase it, rfind </body>, splice a ~4 KB inline script, re-encode) vs. the
+{{ i18n_boot_tag }} template global that replaced it, on storefront-sized pages.
+
+    python bench/i18n_inject_bench.py [--items 50 500 2000] [--runs 200]
+"""
+import os, sys, time, argparse, statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask, Response
+
+ITEM = """
+    <div class="card">
+      <img src="/media/item-{i}.jpg" alt="Item {i}" loading="lazy">
+      <div class="t">Hand-made item number {i} — limited run</div>
+      <div class="p">{p:.7f} π</div>
+      <form method="post" action="/store/shop/add?cid=abc"><input type="hidden" name="item_id" value="{i}">
+        <button class="btn">Add to cart</button></form>
+    </div>"""
+
+def page(n, tag=""):
+    cards = "".join(ITEM.format(i=i, p=i * 0.37) for i in range(n))
+    return f"<!doctype html><html lang=\"en\"><head><title>Shop</title></head><body><div class=\"grid\">{cards}</div>{tag}\n</body></html>"
+
+def legacy_inject(resp, snippet):
+    ctype = resp.headers.get("Content-Type", "")
+    if resp.status_code == 200 and "text/html" in ctype:
+        body = resp.get_data(as_text=True)
+        if 'data-no-global-i18n="1"' not in body and "__IZZA_I18N_BOOTED__" not in body:
+            i = body.lower().rfind("</body>")
+            if i != -1:
+                body = body[:i] + snippet + body[i:]
+                resp.set_data(body)
+                resp.headers["Content-Length"] = str(len(body.encode("utf-8")))
+    return resp
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--items", type=int, nargs="+", default=[50, 500, 2000])
+    ap.add_argument("--runs", type=int, default=200)
+    args = ap.parse_args()
+
+    from i18n_boot import I18N_BOOT_FILE, install
+    with open(I18N_BOOT_FILE, encoding="utf-8") as f:
+        snippet = "<script>\n" + f.read() + "</script>\n"
+    app = Flask(__name__)
+    install(app)
+
+    with app.test_request_context("/store/shop"):
+        for n in args.items:
+            old_tpl = app.jinja_env.from_string(page(n))
+            new_tpl = app.jinja_env.from_string(page(n, "{{ i18n_boot_tag }}"))
+            before, after = [], []
+            for _ in range(args.runs):
+                t0 = time.perf_counter()
+                legacy_inject(Response(old_tpl.render(), mimetype="text/html"), snippet)
+                before.append((time.perf_counter() - t0) * 1e6)
+                t0 = time.perf_counter()
+                Response(new_tpl.render(), mimetype="text/html")
+                after.append((time.perf_counter() - t0) * 1e6)
+            kb = len(page(n).encode("utf-8")) / 1024
+            b, a = statistics.median(before), statistics.median(after)
+            print(f"items={n:5d} page={kb:7.1f}KB  render+inject {b:8.0f}us   render+tag {a:8.0f}us   saved {b - a:7.0f}us/page")
+
+if __name__ == "__main__":
+    main()
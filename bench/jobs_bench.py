@@ -0,0 +1,58 @@
+"""
+Job queue costs: what enqueue() adds to the request's transaction, and how
+fast worker threads drain a backlog (handler sleeps --handler-ms, standing in
+for SMTP / Horizon). Before the queue, fulfill_session paid the handler time
+inline: one email plus one claimables POST per NFT order.
+
+    python bench/jobs_bench.py [--jobs 500] [--workers 4] [--handler-ms 20]
+"""
+import os, sys, time, argparse, tempfile, statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--jobs", type=int, default=500)
+    ap.add_argument("--workers", type=int, default=4)
+    ap.add_argument("--handler-ms", type=float, default=20)
+    args = ap.parse_args()
+
+    import db
+    db.DB_PATH = os.path.join(tempfile.mkdtemp(prefix="izza-jobs-"), "app.sqlite")
+    db.migrate(verbose=False)
+    import jobs
+
+    @jobs.handler("bench")
+    def _sleep(p):
+        time.sleep(args.handler_ms / 1000)
+
+    # enqueue cost inside an already-open write transaction (as fulfill_session does)
+    per = []
+    with db.conn() as cx:
+        cx.execute("CREATE TABLE t(x)")
+        for i in range(args.jobs):
+            cx.execute("INSERT INTO t VALUES(?)", (i,))
+            t0 = time.perf_counter()
+            jobs.enqueue(cx, "bench", {"i": i, "to": "buyer@example.com", "subject": "x" * 60})
+            per.append((time.perf_counter() - t0) * 1e6)
+    print(f"enqueue: median {statistics.median(per):.1f}us per job "
+          f"(inline handler would be {args.handler_ms:.0f}ms)")
+
+    import contextlib, io
+    with contextlib.redirect_stdout(io.StringIO()):  # per-job [JOBS] lines
+        t0 = time.time()
+        jobs.start_workers(args.workers)
+        jobs.wake()
+        while True:
+            with db.conn_ro() as cx:
+                left = cx.execute("SELECT COUNT(*) FROM jobs WHERE state!='done'").fetchone()[0]
+            if not left:
+                break
+            time.sleep(0.05)
+        secs = time.time() - t0
+    print(f"drain: {args.jobs} jobs with {args.workers} workers in {secs:.2f}s "
+          f"({args.jobs / secs:.0f}/s, serial floor {args.jobs * args.handler_ms / 1000:.1f}s)")
+    print(jobs.stats()["this_process"])
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Cost of one page at increasing depth: LIMIT/OFFSET (what explore used) vs.
+the keyset cursors from pagination.py, on the /explore listing (500k items)
+and one buyer's /api/orders purchases (200k orders).
+
+    python bench/keyset_pagination_bench.py [--items 500000] [--orders 200000]
+"""
+import os, sys, time, random, argparse, tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# same statement as app._purchases_page (importing app needs the full deploy env)
+PURCHASES = """SELECT o.id, o.item_id, o.qty, o.pi_amount AS amount, o.status, o.pi_tx_hash,
+                      i.title, m.business_name AS store
+               FROM orders o JOIN items i ON i.id = o.item_id JOIN merchants m ON m.id = o.merchant_id
+               WHERE o.buyer_user_id = ? {cond} ORDER BY o.id DESC LIMIT ? {offset}"""
+
+EXPLORE = """SELECT items.*, merchants.slug AS m_slug, merchants.business_name AS m_name,
+                    merchants.colorway AS m_colorway, merchants.theme_mode AS m_theme
+             FROM items JOIN merchants ON merchants.id = items.merchant_id
+             WHERE items.active=1 {cond}
+             ORDER BY items.id DESC LIMIT ? {offset}"""
+
+def best(fn, runs):
+    t = None
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        fn()
+        ms = (time.perf_counter() - t0) * 1000
+        t = ms if t is None else min(t, ms)
+    return t
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--items", type=int, default=500_000)
+    ap.add_argument("--orders", type=int, default=200_000)
+    ap.add_argument("--runs", type=int, default=5)
+    args = ap.parse_args()
+
+    import db
+    from pagination import encode_cursor, decode_cursor, page_of
+    db.DB_PATH = os.path.join(tempfile.mkdtemp(prefix="izza-keyset-"), "app.sqlite")
+    db.migrate(verbose=False)
+    rnd = random.Random(9)
+    t0 = time.time()
+    with db.conn() as cx:
+        cx.execute("INSERT INTO users(id, pi_uid, pi_username, role) VALUES(1, 'bench', 'bench', 'user')")
+        cx.executemany("INSERT INTO merchants(id, owner_user_id, slug, business_name, pi_wallet) VALUES(?,1,?,?,'G')",
+                       [(m, f"shop-{m}", f"Shop {m}") for m in range(1, 501)])
+        cx.executemany("INSERT INTO items(merchant_id, link_id, title, pi_price, stock_qty, active) VALUES(?,?,?,1,5,?)",
+                       ((rnd.randint(1, 500), f"L{i}", f"Item {i}", 1 if rnd.random() < 0.9 else 0)
+                        for i in range(args.items)))
+        cx.executemany("INSERT INTO orders(merchant_id, item_id, buyer_user_id, qty, pi_amount, status) "
+                       "VALUES(?,?,?,1,1,'paid')",
+                       ((rnd.randint(1, 500), rnd.randint(1, args.items), 1 if i % 2 else 2)
+                        for i in range(args.orders * 2)))
+    print(f"loaded {args.items} items, {args.orders * 2} orders in {time.time() - t0:.1f}s")
+
+    cx = db.conn_ro()
+    with cx:
+        pass
+
+    print(f"{'listing':10s} {'page':>6s} {'OFFSET':>10s} {'keyset':>10s}")
+    size = 12
+    for page in (1, 100, 1000, 10000, 30000):
+        off = (page - 1) * size
+        row = cx.execute(EXPLORE.format(cond="", offset="OFFSET ?"), (1, max(0, off - 1))).fetchone()
+        if row is None:
+            break
+        key = row["id"] + 1 if off == 0 else row["id"]
+        t_off = best(lambda: cx.execute(EXPLORE.format(cond="", offset="OFFSET ?"), (size, off)).fetchall(), args.runs)
+        t_key = best(lambda: cx.execute(EXPLORE.format(cond="AND items.id < ?", offset=""), (key, size + 1)).fetchall(), args.runs)
+        print(f"{'explore':10s} {page:6d} {t_off:8.2f}ms {t_key:8.2f}ms")
+
+    size = 100
+    for page in (1, 10, 100, 1000, 1999):
+        off = (page - 1) * size
+        t_off = best(lambda: cx.execute(PURCHASES.format(cond="", offset="OFFSET ?"), (1, size, off)).fetchall(), args.runs)
+        # the cursor a client holds after walking to this depth
+        anchor = cx.execute("SELECT id FROM orders WHERE buyer_user_id=1 ORDER BY id DESC LIMIT 1 OFFSET ?",
+                            (max(0, off - 1),)).fetchone()
+        cur = encode_cursor("purchases", (anchor["id"] + (0 if off else 1),))
+        def keyset():
+            after = decode_cursor(cur, "purchases")
+            rows = cx.execute(PURCHASES.format(cond="AND o.id < ?", offset=""), (1, after[0], size + 1)).fetchall()
+            return page_of(rows, size, "purchases", lambda r: (r["id"],))
+        t_key = best(keyset, args.runs)
+        print(f"{'purchases':10s} {page:6d} {t_off:8.2f}ms {t_key:8.2f}ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Merchant dashboard 30-day stats: the orders + sessions scans
+_merchant_30d_stats ran (before) vs. merchant_daily_stats (after), for a
+busy merchant and a quiet one. Also times the full backfill.
+
+    python bench/merchant_stats_bench.py [--orders 300000] [--sessions 900000]
+"""
+import os, sys, time, random, argparse, tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# the statements _merchant_30d_stats ran before the rollup
+ORDERS_30D = """SELECT COALESCE(SUM(pi_amount_stroops),0) AS gross, COALESCE(SUM(pi_fee_stroops),0) AS fee
+                FROM orders WHERE merchant_id=? AND status='paid' AND created_at>=?"""
+SESSIONS_30D = "SELECT COUNT(*) AS n FROM sessions WHERE merchant_id=? AND created_at>=?"
+
+def best(fn, runs):
+    t = None
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        fn()
+        ms = (time.perf_counter() - t0) * 1000
+        t = ms if t is None else min(t, ms)
+    return t
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--orders", type=int, default=300_000)
+    ap.add_argument("--sessions", type=int, default=900_000)
+    ap.add_argument("--merchants", type=int, default=200)
+    ap.add_argument("--runs", type=int, default=20)
+    args = ap.parse_args()
+
+    import db
+    db.DB_PATH = os.path.join(tempfile.mkdtemp(prefix="izza-mstats-"), "app.sqlite")
+    db.migrate(verbose=False)
+    import merchant_stats as ms
+
+    rnd = random.Random(5)
+    now = int(time.time())
+    # merchant 1 takes a third of the traffic
+    pick = lambda: 1 if rnd.random() < 0.33 else rnd.randint(2, args.merchants)
+    when = lambda: now - rnd.randint(0, 365 * 24 * 3600)
+    t0 = time.time()
+    with db.conn() as cx:
+        cx.execute("INSERT INTO users(id, pi_uid, pi_username, role) VALUES(1, 'bench', 'bench', 'user')")
+        cx.executemany("INSERT INTO merchants(id, owner_user_id, slug, business_name, pi_wallet) VALUES(?,1,?,?,'G')",
+                       [(m, f"shop-{m}", f"Shop {m}") for m in range(1, args.merchants + 1)])
+        cx.executemany("INSERT INTO orders(merchant_id, item_id, qty, pi_amount, pi_fee, pi_merchant_net, status, created_at) "
+                       "VALUES(?,1,1,?,?,?,'paid',?)",
+                       ((pick(), 2.5, 0.025, 2.475, when()) for _ in range(args.orders)))
+        cx.executemany("INSERT INTO sessions(id, merchant_id, qty, expected_pi, state, created_at) VALUES(?,?,1,2.5,'initiated',?)",
+                       ((f"s{i}", pick(), when()) for i in range(args.sessions)))
+    print(f"loaded {args.orders} orders, {args.sessions} sessions in {time.time() - t0:.1f}s")
+
+    t0 = time.time()
+    with db.conn() as cx:
+        n = ms.rebuild(cx)
+    print(f"backfill: {n} merchant-day rows in {(time.time() - t0) * 1000:.0f}ms")
+
+    since = now - 30 * 24 * 3600
+    for mid, label in ((1, "busy"), (args.merchants, "quiet")):
+        def scans():  # own connection, like window() and the old _merchant_30d_stats
+            with db.conn_ro() as cx:
+                cx.execute(ORDERS_30D, (mid, since)).fetchone()
+                cx.execute(SESSIONS_30D, (mid, since)).fetchone()
+        before = best(scans, args.runs)
+        after = best(lambda: ms.window(mid, 30), args.runs)
+        print(f"merchant {mid:4d} ({label:5s})  scans {before:8.2f}ms   rollup {after:6.2f}ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Per-request cost of /store/<slug> and /explore: query + Jinja render on every
+hit (before) vs. page_cache.cached() + fill() of the per-user slots (after),
+for storefronts of increasing size. Also shows the cost of a miss right
+after a write bumped the merchant's generation.
+
+    python bench/page_cache_bench.py [--items 20 200 1000] [--runs 300]
+"""
+import os, sys, time, argparse, tempfile, statistics
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--items", type=int, nargs="+", default=[20, 200, 1000])
+    ap.add_argument("--runs", type=int, default=300)
+    args = ap.parse_args()
+
+    import db
+    db.DB_PATH = os.path.join(tempfile.mkdtemp(prefix="izza-pagecache-"), "app.sqlite")
+    db.migrate(verbose=False)
+    import page_cache
+    db.ensure_registered("cache_generations")
+    from flask import Flask, render_template
+    from markupsafe import Markup
+    from image_variants import thumb_url
+    from i18n_boot import install
+
+    app = Flask(__name__, template_folder=os.path.join(ROOT, "templates"))
+    app.jinja_env.filters["thumb"] = thumb_url
+    app.jinja_env.globals["slot"] = page_cache.slot
+    install(app)
+
+    with db.conn() as cx:
+        cx.execute("INSERT INTO users(id, pi_uid, pi_username, role) VALUES(1, 'bench', 'bench', 'user')")
+        for n in args.items:
+            cx.execute("INSERT INTO merchants(id, owner_user_id, slug, business_name, pi_wallet, colorway, description) "
+                       "VALUES(?,1,?,?,'G','cw-blue','A shop')", (n, f"shop-{n}", f"Shop {n}"))
+            cx.executemany("INSERT INTO items(merchant_id, link_id, title, description, image_url, pi_price, stock_qty, active) "
+                           "VALUES(?,?,?,?,?,?,?,1)",
+                           [(n, f"L{n}-{i}", f"Item {i}", "Hand-made, limited run " * 3,
+                             f"/media/{i:032x}.jpg", 1.25 + i, i % 7) for i in range(n)])
+
+    def store_uncached(mid):
+        with db.conn_ro() as cx:
+            m = cx.execute("SELECT * FROM merchants WHERE id=?", (mid,)).fetchone()
+            items = cx.execute("SELECT * FROM items WHERE merchant_id=? AND active=1 ORDER BY id DESC", (mid,)).fetchall()
+        html = render_template("store.html", m=m, items=items, app_base="", colorway=m["colorway"])
+        return page_cache.fill(html, cid="abc123", t_qs="?t=tok", t_input=Markup('<input type="hidden" name="t" value="tok">'))
+
+    def store_cached(mid):
+        with db.conn_ro() as cx:
+            m = cx.execute("SELECT * FROM merchants WHERE id=?", (mid,)).fetchone()
+        html = page_cache.cached(("store", mid, m["colorway"], m["theme_mode"]), [page_cache.merchant_scope(mid)],
+                                 lambda: store_uncached(mid))
+        return page_cache.fill(html, cid="abc123", t_qs="?t=tok", t_input=Markup('<input type="hidden" name="t" value="tok">'))
+
+    def timed(fn, runs):
+        out = []
+        for _ in range(runs):
+            t0 = time.perf_counter()
+            fn()
+            out.append((time.perf_counter() - t0) * 1e6)
+        return statistics.median(out)
+
+    with app.test_request_context("/store/x?t=tok"):
+        for n in args.items:
+            store_cached(n)
+            before = timed(lambda: store_uncached(n), args.runs)
+            after = timed(lambda: store_cached(n), args.runs)
+            def miss():
+                with db.conn() as cx:
+                    page_cache.bump(cx, n)
+                store_cached(n)
+            missed = timed(miss, max(10, args.runs // 10))
+            kb = len(store_cached(n).encode("utf-8")) / 1024
+            print(f"store items={n:5d} page={kb:6.1f}KB  render {before:8.0f}us   cached {after:6.0f}us "
+                  f"({before / after:5.1f}x)   miss after bump {missed:8.0f}us")
+    print(page_cache.stats())
+
+if __name__ == "__main__":
+    main()
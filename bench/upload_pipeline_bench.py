@@ -0,0 +1,114 @@
+"""
+Throughput of concurrent 12 MP (4000x3000) JPEG uploads: the old in-thread
+path of upload() (verify, re-open, exif_transpose, thumbnail, encode, all under
+the GIL) vs. upload_pipeline.store_upload() on its process pool. Latency is
+time until the canonical file is on disk; derivative rendering continues in
+the pool afterwards and is drained before the next round.
+
+    python bench/upload_pipeline_bench.py [--clients 8] [--uploads 32] [--workers 4]
+"""
+import os, sys, time, shutil, hashlib, argparse, tempfile, statistics, threading
+from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image, ImageOps
+
+def make_jpegs(n):
+    """n distinct 12 MP photos-ish JPEGs (noise over a gradient, so they don't dedupe)."""
+    base = Image.linear_gradient("L").resize((4000, 3000)).convert("RGB")
+    out = []
+    for i in range(n):
+        noise = Image.effect_noise((4000, 3000), 20 + i % 10).convert("RGB")
+        img = Image.blend(base, noise, 0.35)
+        b = BytesIO()
+        img.save(b, "JPEG", quality=90)
+        out.append(b.getvalue())
+    return out
+
+def legacy_upload(raw, upload_dir):
+    bio = BytesIO(raw)
+    img = Image.open(bio)
+    img.verify()
+    bio.seek(0)
+    img = Image.open(bio)
+    img = ImageOps.exif_transpose(img)
+    if max(img.size) > 2048:
+        img.thumbnail((2048, 2048))
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    buf = BytesIO()
+    img.save(buf, format="JPEG", quality=85, optimize=True, progressive=True)
+    data = buf.getvalue()
+    path = os.path.join(upload_dir, hashlib.sha256(data).hexdigest()[:32] + ".jpg")
+    with open(path, "wb") as f:
+        f.write(data)
+    return path
+
+def run(label, fn, blobs, clients, drain=None):
+    """Upload throughput/latency, plus how long a 1ms request elsewhere in the worker waits meanwhile."""
+    lat, lk = [], threading.Lock()
+    stop, probe = threading.Event(), []
+    def ping():
+        while not stop.is_set():
+            t0 = time.perf_counter()
+            sum(range(20000))  # ~1ms of pure-Python work, like rendering a small JSON response
+            probe.append(time.perf_counter() - t0)
+            time.sleep(0.01)
+    pinger = threading.Thread(target=ping, daemon=True)
+    pinger.start()
+    def one(raw):
+        t0 = time.perf_counter()
+        fn(raw)
+        with lk:
+            lat.append(time.perf_counter() - t0)
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as ex:
+        list(ex.map(one, blobs))
+    wall = time.perf_counter() - t0
+    stop.set()
+    pinger.join()
+    lat.sort()
+    probe.sort()
+    print(f"{label:26s} {len(blobs) / wall:6.2f} uploads/s   p50 {statistics.median(lat) * 1000:7.0f}ms"
+          f"   p95 {lat[min(len(lat) - 1, int(len(lat) * .95))] * 1000:7.0f}ms   wall {wall:6.1f}s"
+          f"   other-request p95 {probe[int(len(probe) * .95)] * 1000:6.1f}ms")
+    if drain:
+        drain()
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--clients", type=int, default=8, help="concurrent request threads")
+    ap.add_argument("--uploads", type=int, default=32)
+    ap.add_argument("--workers", type=int, default=min(4, os.cpu_count() or 1))
+    args = ap.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="upload-bench-")
+    os.environ["DATA_ROOT"] = tmp
+    os.environ["UPLOAD_WORKERS"] = str(args.workers)
+    import upload_pipeline
+
+    print(f"cpus={os.cpu_count()} workers={args.workers} clients={args.clients} uploads={args.uploads}")
+    blobs = make_jpegs(args.uploads)
+    print(f"payload {sum(map(len, blobs)) / len(blobs) / 1e6:.1f} MB/upload")
+    try:
+        old_dir = os.path.join(tmp, "legacy")
+        os.makedirs(old_dir)
+        run("in-thread (old upload())", lambda raw: legacy_upload(raw, old_dir), blobs, args.clients)
+
+        new_dir = os.path.join(tmp, "uploads")
+        os.makedirs(new_dir)
+        upload_pipeline._get_pool().submit(int).result()  # start the workers outside the timing
+        def drain():
+            t0 = time.perf_counter()
+            upload_pipeline._get_pool().shutdown(wait=True)
+            print(f"{'':26s} + {time.perf_counter() - t0:.1f}s draining "
+                  f"{upload_pipeline.stats()['variants_queued']} derivatives after the last response")
+        run("process pool (canonical)", lambda raw: upload_pipeline.store_upload(raw, new_dir), blobs,
+            args.clients, drain)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -34,9 +34,8 @@ import threading
 from dataclasses import dataclass
 from typing import Dict, Any, List, Tuple, Optional
 
-from decimal import Decimal, ROUND_HALF_UP  # <- extended import
-
-from db import conn
+from db import conn, run_write, from_stroops
+from db import quantize_pi as _quantize_pi
 from bot_markets import scan_markets_vs_pi
 from bot_trader import (
   market_buy,
@@ -181,18 +180,14 @@ def _now() -> int:
 # PI amount helper: clamp to 7 decimals (stroop precision)
 # ---------------------------------------------------------------------
 
-_PI_QUANTUM = Decimal("0.0000001")
-
 def quantize_pi(value: float) -> float:
   """
-  Clamp a PI amount to at most 7 decimal places using Decimal,
-  removing float noise like 0.0013799999998753698.
+  Clamp a PI amount to at most 7 decimal places (half-up, via integer
+  stroops), removing float noise like 0.0013799999998753698.
 
   Always returns a normal float with <= 7 decimal precision.
   """
-  d = Decimal(str(value))
-  dq = d.quantize(_PI_QUANTUM, rounding=ROUND_HALF_UP)
-  return float(dq)
+  return _quantize_pi(value)
 
 
 # ---------------------------------------------------------------------
@@ -633,7 +628,7 @@ def log_trade(
     except Exception:
       raw_json = None
 
-  with conn() as cx:
+  def _write(cx):
     cx.execute(
       """
       INSERT INTO bot_trades(
@@ -665,10 +660,12 @@ def log_trade(
       ),
     )
 
+  run_write(_write)
+
 
 def update_cash_for_bucket(bucket_id: int, delta_pi: float):
   ts = _now()
-  with conn() as cx:
+  def _write(cx):
     row = cx.execute(
       """
       SELECT id, amount
@@ -697,6 +694,8 @@ def update_cash_for_bucket(bucket_id: int, delta_pi: float):
       (new_amt, ts, row["id"]),
     )
 
+  run_write(_write)
+
 
 def upsert_position(bucket_id: int, market: MarketInfo, delta_qty: float, trade_price_pi: float):
   ts = _now()
@@ -708,7 +707,7 @@ def upsert_position(bucket_id: int, market: MarketInfo, delta_qty: float, trade_
   if abs(delta_qty) < 1e-12:
     return
 
-  with conn() as cx:
+  def _write(cx):
     row = cx.execute(
       """
       SELECT id, quantity, avg_price_pi
@@ -769,6 +768,8 @@ def upsert_position(bucket_id: int, market: MarketInfo, delta_qty: float, trade_
       (new_qty, new_avg, ts, pos_id),
     )
 
+  run_write(_write)
+
 
 # ---------------------------------------------------------------------
 # Drawdown + deposit / performance helpers
@@ -889,8 +890,8 @@ def compute_bucket_realized_pnl_pi(bucket_id: int) -> float:
         SELECT code,
                issuer,
                side,
-               SUM(amount_token) AS qty,
-               SUM(amount_pi)    AS pi
+               SUM(amount_token)       AS qty,
+               SUM(amount_pi_stroops)  AS pi
         FROM bot_trades
         WHERE bucket_id = ?
           AND created_at >= ?
@@ -906,8 +907,8 @@ def compute_bucket_realized_pnl_pi(bucket_id: int) -> float:
         SELECT code,
                issuer,
                side,
-               SUM(amount_token) AS qty,
-               SUM(amount_pi)    AS pi
+               SUM(amount_token)       AS qty,
+               SUM(amount_pi_stroops)  AS pi
         FROM bot_trades
         WHERE bucket_id = ?
         GROUP BY code, issuer, side
@@ -924,7 +925,7 @@ def compute_bucket_realized_pnl_pi(bucket_id: int) -> float:
     )
     side = (r["side"] or "").lower()
     qty = float(r["qty"] or 0.0)
-    pi = float(r["pi"] or 0.0)
+    pi = from_stroops(r["pi"])
     if side == "buy":
       d["buy_qty"] += qty
       d["buy_pi"] += pi
@@ -4,7 +4,8 @@ from flask import Blueprint, request, jsonify, abort, make_response, url_for, g,
 from stellar_sdk import (
     Asset, Keypair, Claimant, ClaimPredicate, TransactionBuilder
 )
-from db import conn as _conn
+from db import conn as _conn, register_schema, ensure_registered, run_write
+from i18n_boot import I18N_BOOT_TAG
 
 # Shared Horizon helpers
 from nft_api import (
@@ -72,59 +73,63 @@ def _has_column(cx: sqlite3.Connection, table: str, col: str) -> bool:
             return True
     return False
 
-def _ensure_tables():
-    with _db() as cx:
-        cx.execute("""
-        CREATE TABLE IF NOT EXISTS nft_creatures(
-          id INTEGER PRIMARY KEY,
-          code TEXT NOT NULL,
-          issuer TEXT NOT NULL,
-          owner_pub TEXT,
-          egg_seed TEXT,
-          palette TEXT,
-          pattern TEXT,
-          hatch_start INTEGER,
-          last_feed_at INTEGER,
-          last_hunger_at INTEGER,
-          hunger INTEGER DEFAULT 0,
-          stage TEXT,
-          meta_version INTEGER DEFAULT 1,
-          user_id INTEGER,
-          revive_progress INTEGER DEFAULT 0,
-          vault_izza TEXT,
-          -- NEW: burn bookkeeping
-          burned_at INTEGER,
-          burn_tx   TEXT,
-          UNIQUE(code, issuer)
-        )""")
-        for colstmt in [
-            ("last_hunger_at",  "ALTER TABLE nft_creatures ADD COLUMN last_hunger_at INTEGER"),
-            ("revive_progress", "ALTER TABLE nft_creatures ADD COLUMN revive_progress INTEGER DEFAULT 0"),
-            ("vault_izza",      "ALTER TABLE nft_creatures ADD COLUMN vault_izza TEXT"),
-            ("burned_at",       "ALTER TABLE nft_creatures ADD COLUMN burned_at INTEGER"),
-            ("burn_tx",         "ALTER TABLE nft_creatures ADD COLUMN burn_tx TEXT")
-        ]:
-            col, stmt = colstmt
-            if not _has_column(cx, "nft_creatures", col):
-                cx.execute(stmt)
-
-        cx.execute("CREATE INDEX IF NOT EXISTS idx_creat_owner ON nft_creatures(owner_pub)")
-        cx.execute("CREATE INDEX IF NOT EXISTS idx_creat_stage ON nft_creatures(stage)")
-        cx.execute("CREATE INDEX IF NOT EXISTS idx_creat_user  ON nft_creatures(user_id)")
-        cx.execute("CREATE INDEX IF NOT EXISTS idx_creat_burn  ON nft_creatures(burned_at)")
+@register_schema("creatures")
+def _creatures_schema(cx):
+    cx.execute("""
+    CREATE TABLE IF NOT EXISTS nft_creatures(
+      id INTEGER PRIMARY KEY,
+      code TEXT NOT NULL,
+      issuer TEXT NOT NULL,
+      owner_pub TEXT,
+      egg_seed TEXT,
+      palette TEXT,
+      pattern TEXT,
+      hatch_start INTEGER,
+      last_feed_at INTEGER,
+      last_hunger_at INTEGER,
+      hunger INTEGER DEFAULT 0,
+      stage TEXT,
+      meta_version INTEGER DEFAULT 1,
+      user_id INTEGER,
+      revive_progress INTEGER DEFAULT 0,
+      vault_izza TEXT,
+      -- NEW: burn bookkeeping
+      burned_at INTEGER,
+      burn_tx   TEXT,
+      UNIQUE(code, issuer)
+    )""")
+    for colstmt in [
+        ("last_hunger_at",  "ALTER TABLE nft_creatures ADD COLUMN last_hunger_at INTEGER"),
+        ("revive_progress", "ALTER TABLE nft_creatures ADD COLUMN revive_progress INTEGER DEFAULT 0"),
+        ("vault_izza",      "ALTER TABLE nft_creatures ADD COLUMN vault_izza TEXT"),
+        ("burned_at",       "ALTER TABLE nft_creatures ADD COLUMN burned_at INTEGER"),
+        ("burn_tx",         "ALTER TABLE nft_creatures ADD COLUMN burn_tx TEXT")
+    ]:
+        col, stmt = colstmt
+        if not _has_column(cx, "nft_creatures", col):
+            cx.execute(stmt)
+    cx.execute("CREATE INDEX IF NOT EXISTS idx_nft_creatures_issuer ON nft_creatures(issuer)")
+
+    cx.execute("CREATE INDEX IF NOT EXISTS idx_creat_owner ON nft_creatures(owner_pub)")
+    cx.execute("CREATE INDEX IF NOT EXISTS idx_creat_stage ON nft_creatures(stage)")
+    cx.execute("CREATE INDEX IF NOT EXISTS idx_creat_user  ON nft_creatures(user_id)")
+    cx.execute("CREATE INDEX IF NOT EXISTS idx_creat_burn  ON nft_creatures(burned_at)")
+
+    cx.execute("""
+    CREATE TABLE IF NOT EXISTS nft_collections(
+      id INTEGER PRIMARY KEY,
+      code TEXT NOT NULL,
+      issuer TEXT NOT NULL,
+      total_supply INTEGER,
+      decimals INTEGER,
+      status TEXT,
+      created_at INTEGER,
+      updated_at INTEGER,
+      UNIQUE(code, issuer)
+    )""")
 
-        cx.execute("""
-        CREATE TABLE IF NOT EXISTS nft_collections(
-          id INTEGER PRIMARY KEY,
-          code TEXT NOT NULL,
-          issuer TEXT NOT NULL,
-          total_supply INTEGER,
-          decimals INTEGER,
-          status TEXT,
-          created_at INTEGER,
-          updated_at INTEGER,
-          UNIQUE(code, issuer)
-        )""")
+def _ensure_tables():
+    ensure_registered("creatures")
 
 # ---------- username/pub fallback ----------
 def _norm_username(u: str | None) -> str | None:
@@ -206,12 +211,12 @@ def _apply_hunger_progress(row: sqlite3.Row) -> tuple[int, str, int, int, int]:
     return hunger, stage, last_feed_at, last_hunger_at, revive_progress
 
 def _persist_progress_if_changed(code: str, hunger: int, stage: str, last_feed_at: int, last_hunger_at: int, revive_progress: int):
-    with _db() as cx:
+    def _write(cx):
         cx.execute("""UPDATE nft_creatures
                       SET hunger=?, stage=?, last_feed_at=?, last_hunger_at=?, revive_progress=?
                       WHERE code=? AND issuer=?""",
                    (hunger, stage, last_feed_at, last_hunger_at, revive_progress, code, CREATURE_ISSUER_G))
-        cx.commit()
+    run_write(_write)
 
 # ---------- rarity & combat math ----------
 def _rarity_from(code_seed: str, hint: str = "") -> str:
@@ -1337,6 +1342,7 @@ def habitat_page(code):
   refresh();
   setInterval(refresh, {tick_ms});
 </script>
+{I18N_BOOT_TAG}
 </body></html>"""
     resp = make_response(html, 200)
     resp.headers["Cache-Control"] = "no-store"
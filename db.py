@@ -1,36 +1,655 @@
-import os, sqlite3, threading
+import os, re, math, queue, sqlite3, sys, threading, time
+from collections import deque
+from concurrent.futures import Future
+from decimal import Decimal, ROUND_HALF_UP
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
 
 DATA_ROOT = os.getenv("DATA_ROOT", "/var/data/izzapay")
 DB_PATH = os.getenv("SQLITE_DB_PATH", os.path.join(DATA_ROOT, "app.sqlite"))
 BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "3000"))
+# Migration backfills can hold the write lock for minutes on a big database.
+MIGRATE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_MIGRATE_BUSY_TIMEOUT_MS", str(30 * 60 * 1000)))
+
+# Pooled mode: keep a few open connections per thread and hand them back out
+# instead of reconnecting (and re-running the PRAGMAs) on every conn() call.
+POOL_ENABLED = os.getenv("SQLITE_POOL", "false").lower() == "true"
+POOL_MAX_IDLE = int(os.getenv("SQLITE_POOL_MAX_IDLE", "4"))
+
+# Journal mode. DELETE is the historical default; WAL lets readers keep going
+# while the bot engine / checkout are writing. WAL is opt-in.
+JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "DELETE").strip().upper() or "DELETE"
+# Pages before a committing writer checkpoints by itself (SQLite default 1000).
+# Set to 0 when the background checkpointer below is running.
+WAL_AUTOCHECKPOINT = int(os.getenv("SQLITE_WAL_AUTOCHECKPOINT", "1000"))
+CHECKPOINT_INTERVAL_SECS = float(os.getenv("SQLITE_CHECKPOINT_INTERVAL_SECS", "30"))
+CHECKPOINT_PASSIVE_MB = float(os.getenv("SQLITE_CHECKPOINT_PASSIVE_MB", "4"))
+CHECKPOINT_TRUNCATE_MB = float(os.getenv("SQLITE_CHECKPOINT_TRUNCATE_MB", "64"))
+
+# Query instrumentation (off by default). When on, conn()/conn_ro() hand out a
+# wrapper that records time, rows and call site per normalized statement.
+TRACE_ENABLED = os.getenv("SQLITE_TRACE", "false").lower() == "true"
+TRACE_SLOW_MS = float(os.getenv("SQLITE_SLOW_MS", "100"))
+TRACE_SLOW_LOG_SIZE = int(os.getenv("SQLITE_SLOW_LOG_SIZE", "200"))
+TRACE_SAMPLES = int(os.getenv("SQLITE_TRACE_SAMPLES", "512"))
+
+# Single-writer queue (off by default). run_write()/submit_write() closures are
+# executed by one writer thread that groups everything arriving within
+# SQLITE_WRITE_BATCH_MS into a single BEGIN IMMEDIATE ... COMMIT.
+WRITE_QUEUE_ENABLED = os.getenv("SQLITE_WRITE_QUEUE", "false").lower() == "true"
+WRITE_BATCH_MS = float(os.getenv("SQLITE_WRITE_BATCH_MS", "2"))
+WRITE_BATCH_MAX = int(os.getenv("SQLITE_WRITE_BATCH_MAX", "64"))
 
 _lock = threading.Lock()
+_pool_local = threading.local()
+_dirs_ready = False
+_ckpt_lock = threading.Lock()
+_ckpt_thread = None
+_ckpt_pid = None
 
 def _ensure_dirs():
+    global _dirs_ready
+    if _dirs_ready:
+        return
     try:
         os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
+        _dirs_ready = True
     except Exception:
         pass
 
-def conn():
-    _ensure_dirs()
+def _open(readonly=False):
     cx = sqlite3.connect(DB_PATH, check_same_thread=False, detect_types=sqlite3.PARSE_DECLTYPES)
     cx.row_factory = sqlite3.Row
 
     try:
-        cx.execute("PRAGMA journal_mode=DELETE;")
+        cx.execute(f"PRAGMA journal_mode={JOURNAL_MODE};")
     except Exception as e:
-        print("[DB] PRAGMA journal_mode=DELETE failed:", e)
+        print(f"[DB] PRAGMA journal_mode={JOURNAL_MODE} failed:", e)
 
     try:
         cx.execute("PRAGMA foreign_keys=ON;")
         cx.execute("PRAGMA synchronous=NORMAL;")
         cx.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS};")
+        if JOURNAL_MODE == "WAL":
+            cx.execute(f"PRAGMA wal_autocheckpoint={WAL_AUTOCHECKPOINT};")
+        if readonly:
+            cx.execute("PRAGMA query_only=ON;")
     except Exception as e:
         print("[DB] PRAGMA error:", e)
 
     return cx
 
+class PooledConnection:
+    """
+    Thin proxy around a pooled sqlite3 connection.
+    Behaves like the raw connection (execute, commit, `with ... as cx`), but
+    leaving the `with` block or calling close() returns it to the thread's pool.
+    """
+    __slots__ = ("_cx", "_ro")
+
+    def __init__(self, cx, readonly=False):
+        object.__setattr__(self, "_cx", cx)
+        object.__setattr__(self, "_ro", readonly)
+
+    def __getattr__(self, name):
+        cx = object.__getattribute__(self, "_cx")
+        if cx is None:
+            raise sqlite3.ProgrammingError("Cannot operate on a closed database.")
+        return getattr(cx, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._cx, name, value)
+
+    def __enter__(self):
+        self._cx.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            return self._cx.__exit__(exc_type, exc, tb)
+        finally:
+            self.close()
+
+    def close(self):
+        cx = object.__getattribute__(self, "_cx")
+        if cx is not None:
+            object.__setattr__(self, "_cx", None)
+            _checkin(cx, self._ro)
+
+def _idle(readonly=False):
+    # Connections must never cross a fork (gunicorn preload), so the idle lists
+    # are reset whenever we find ourselves in a new process.
+    pid = os.getpid()
+    if getattr(_pool_local, "pid", None) != pid:
+        _pool_local.pid = pid
+        _pool_local.idle = {False: [], True: []}
+    return _pool_local.idle[readonly]
+
+def _checkin(cx, readonly=False):
+    try:
+        # Never hand out a connection with a half-finished transaction.
+        if cx.in_transaction:
+            cx.rollback()
+    except Exception:
+        try: cx.close()
+        except Exception: pass
+        return
+    idle = _idle(readonly)
+    if len(idle) < POOL_MAX_IDLE:
+        idle.append(cx)
+    else:
+        cx.close()
+
+def _checkout(readonly=False):
+    idle = _idle(readonly)
+    while idle:
+        cx = idle.pop()
+        try:
+            cx.execute("SELECT 1").fetchone()
+            cx.row_factory = sqlite3.Row
+            return PooledConnection(cx, readonly)
+        except Exception as e:
+            print("[DB] pooled connection failed health check, reopening:", e)
+            try: cx.close()
+            except Exception: pass
+    return PooledConnection(_open(readonly), readonly)
+
+def close_pool():
+    """Close the idle pooled connections held by the calling thread."""
+    for readonly in (False, True):
+        idle = _idle(readonly)
+        while idle:
+            try: idle.pop().close()
+            except Exception: pass
+
+def conn():
+    _ensure_dirs()
+    cx = _checkout() if POOL_ENABLED else _open()
+    if TRACE_ENABLED:
+        return TracedConnection(cx)
+    return cx
+
+def conn_ro():
+    """
+    Read-only connection for GET handlers (PRAGMA query_only=ON).
+    In WAL mode these never wait on the writer; any write raises.
+    """
+    _ensure_dirs()
+    cx = _checkout(readonly=True) if POOL_ENABLED else _open(readonly=True)
+    if TRACE_ENABLED:
+        return TracedConnection(cx)
+    return cx
+
+# ----------------- Query instrumentation -----------------
+_trace_lock = threading.Lock()
+_trace_stats = {}
+_slow_log = deque(maxlen=TRACE_SLOW_LOG_SIZE)
+_trace_since = time.time()
+_DB_FILE = os.path.abspath(__file__)
+
+_RE_STR = re.compile(r"'(?:[^']|'')*'")
+_RE_NUM = re.compile(r"\b\d+(?:\.\d+)?\b")
+_RE_INLIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_RE_WS = re.compile(r"\s+")
+
+def normalize_sql(sql):
+    """Collapse literals, IN-lists and whitespace so equivalent statements share a bucket."""
+    s = _RE_STR.sub("?", sql or "")
+    s = _RE_NUM.sub("?", s)
+    s = _RE_INLIST.sub("(?+)", s)
+    return _RE_WS.sub(" ", s).strip()[:400]
+
+def _call_site():
+    f = sys._getframe(2)
+    while f is not None and os.path.abspath(f.f_code.co_filename) == _DB_FILE:
+        f = f.f_back
+    if f is None:
+        return "?"
+    return f"{os.path.basename(f.f_code.co_filename)}:{f.f_lineno} {f.f_code.co_name}"
+
+def _record(sql, ms, rows, site):
+    key = normalize_sql(sql)
+    with _trace_lock:
+        st = _trace_stats.get(key)
+        if st is None:
+            st = _trace_stats[key] = {"calls": 0, "total_ms": 0.0, "max_ms": 0.0, "rows": 0,
+                                      "samples": deque(maxlen=TRACE_SAMPLES), "sites": {}}
+        st["calls"] += 1
+        st["total_ms"] += ms
+        st["rows"] += rows
+        if ms > st["max_ms"]:
+            st["max_ms"] = ms
+        st["samples"].append(ms)
+        st["sites"][site] = st["sites"].get(site, 0) + 1
+        if ms >= TRACE_SLOW_MS:
+            _slow_log.append({"at": int(time.time()), "ms": round(ms, 2), "rows": rows,
+                              "site": site, "sql": _RE_WS.sub(" ", sql).strip()[:1000]})
+    if ms >= TRACE_SLOW_MS:
+        print(f"[DB] slow query {ms:.1f}ms rows={rows} at {site}: {key[:200]}")
+
+class TracedCursor:
+    """
+    Cursor wrapper. Time spent in execute() and in the fetches is charged to one
+    call; the call is recorded once the cursor is exhausted or dropped.
+    """
+    __slots__ = ("_cur", "_sql", "_site", "_ms", "_rows", "_open")
+
+    def __init__(self, cur):
+        self._cur = cur
+        self._open = False
+
+    def _start(self, sql, site):
+        self._finish()
+        self._sql, self._site, self._ms, self._rows, self._open = sql, site, 0.0, 0, True
+
+    def _finish(self):
+        if self._open:
+            self._open = False
+            rows = self._rows
+            if not rows and self._cur.rowcount > 0:
+                rows = self._cur.rowcount
+            _record(self._sql, self._ms, rows, self._site)
+
+    def execute(self, sql, params=()):
+        self._start(sql, _call_site())
+        t0 = time.perf_counter()
+        try:
+            self._cur.execute(sql, params)
+        finally:
+            self._ms += (time.perf_counter() - t0) * 1000
+        if self._cur.description is None:
+            self._finish()
+        return self
+
+    def executemany(self, sql, seq):
+        self._start(sql, _call_site())
+        t0 = time.perf_counter()
+        try:
+            self._cur.executemany(sql, seq)
+        finally:
+            self._ms += (time.perf_counter() - t0) * 1000
+        self._finish()
+        return self
+
+    def executescript(self, script):
+        self._start(script, _call_site())
+        t0 = time.perf_counter()
+        try:
+            self._cur.executescript(script)
+        finally:
+            self._ms += (time.perf_counter() - t0) * 1000
+        self._finish()
+        return self
+
+    def fetchone(self):
+        t0 = time.perf_counter()
+        row = self._cur.fetchone()
+        self._ms += (time.perf_counter() - t0) * 1000
+        if row is None:
+            self._finish()
+        else:
+            self._rows += 1
+        return row
+
+    def fetchmany(self, size=None):
+        t0 = time.perf_counter()
+        rows = self._cur.fetchmany(size) if size is not None else self._cur.fetchmany()
+        self._ms += (time.perf_counter() - t0) * 1000
+        self._rows += len(rows)
+        if not rows:
+            self._finish()
+        return rows
+
+    def fetchall(self):
+        t0 = time.perf_counter()
+        rows = self._cur.fetchall()
+        self._ms += (time.perf_counter() - t0) * 1000
+        self._rows += len(rows)
+        self._finish()
+        return rows
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        row = self.fetchone()
+        if row is None:
+            raise StopIteration
+        return row
+
+    def close(self):
+        self._finish()
+        self._cur.close()
+
+    def __getattr__(self, name):
+        return getattr(self._cur, name)
+
+    def __del__(self):
+        try:
+            self._finish()
+        except Exception:
+            pass
+
+class TracedConnection:
+    """Connection wrapper used when SQLITE_TRACE=true; everything else is delegated."""
+    __slots__ = ("_cx",)
+
+    def __init__(self, cx):
+        object.__setattr__(self, "_cx", cx)
+
+    def __getattr__(self, name):
+        return getattr(object.__getattribute__(self, "_cx"), name)
+
+    def __setattr__(self, name, value):
+        setattr(self._cx, name, value)
+
+    def __enter__(self):
+        self._cx.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return self._cx.__exit__(exc_type, exc, tb)
+
+    def cursor(self):
+        return TracedCursor(self._cx.cursor())
+
+    def execute(self, sql, params=()):
+        return TracedCursor(self._cx.cursor()).execute(sql, params)
+
+    def executemany(self, sql, seq):
+        return TracedCursor(self._cx.cursor()).executemany(sql, seq)
+
+    def executescript(self, script):
+        return TracedCursor(self._cx.cursor()).executescript(script)
+
+def _p95(samples):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+def query_stats(top=20):
+    """Snapshot of the instrumentation counters: top-N by total and by p95 time, plus slow log."""
+    with _trace_lock:
+        rows = []
+        for sql, st in _trace_stats.items():
+            sites = sorted(st["sites"].items(), key=lambda kv: -kv[1])[:5]
+            rows.append({
+                "sql": sql,
+                "calls": st["calls"],
+                "total_ms": round(st["total_ms"], 2),
+                "avg_ms": round(st["total_ms"] / st["calls"], 3),
+                "p95_ms": round(_p95(st["samples"]), 3),
+                "max_ms": round(st["max_ms"], 2),
+                "rows": st["rows"],
+                "sites": [{"site": k, "calls": v} for k, v in sites],
+            })
+        slow = list(_slow_log)
+    return {
+        "enabled": TRACE_ENABLED,
+        "since": int(_trace_since),
+        "statements": len(rows),
+        "slow_ms": TRACE_SLOW_MS,
+        "top_total": sorted(rows, key=lambda r: -r["total_ms"])[:top],
+        "top_p95": sorted(rows, key=lambda r: -r["p95_ms"])[:top],
+        "slow": slow[::-1],
+    }
+
+def reset_query_stats():
+    global _trace_since
+    with _trace_lock:
+        _trace_stats.clear()
+        _slow_log.clear()
+        _trace_since = time.time()
+
+# ----------------- Single-writer queue -----------------
+_wq = None
+_wq_pid = None
+_wq_lock = threading.Lock()
+_writer_ident = None
+_writer_cx = None
+
+def _writer_queue():
+    global _wq, _wq_pid
+    pid = os.getpid()
+    if _wq is None or _wq_pid != pid:
+        with _wq_lock:
+            if _wq is None or _wq_pid != pid:
+                q = queue.SimpleQueue()
+                threading.Thread(target=_writer_loop, args=(q,), name="sqlite-writer", daemon=True).start()
+                _wq, _wq_pid = q, pid
+    return _wq
+
+def _commit_batch(cx, batch):
+    # One transaction for the whole batch; each job gets a savepoint so a
+    # failing closure only undoes its own writes.
+    results = []
+    try:
+        cx.execute("BEGIN IMMEDIATE")
+        for fn, args, kwargs, fut in batch:
+            cx.execute("SAVEPOINT job")
+            try:
+                res = fn(TracedConnection(cx) if TRACE_ENABLED else cx, *args, **kwargs)
+            except Exception as e:
+                cx.execute("ROLLBACK TO job")
+                cx.execute("RELEASE job")
+                results.append((fut, False, e))
+            else:
+                cx.execute("RELEASE job")
+                results.append((fut, True, res))
+        cx.execute("COMMIT")
+    except Exception as e:
+        try: cx.rollback()
+        except Exception: pass
+        for _, _, _, fut in batch:
+            fut.set_exception(e)
+        raise
+    for fut, ok, val in results:
+        if ok:
+            fut.set_result(val)
+        else:
+            fut.set_exception(val)
+
+def _writer_loop(q):
+    global _writer_ident, _writer_cx
+    _writer_ident = threading.get_ident()
+    window = WRITE_BATCH_MS / 1000.0
+    cx = None
+    while True:
+        batch = [q.get()]
+        deadline = time.monotonic() + window
+        while len(batch) < WRITE_BATCH_MAX:
+            try:
+                left = deadline - time.monotonic()
+                batch.append(q.get(timeout=left) if left > 0 else q.get_nowait())
+            except queue.Empty:
+                break
+        try:
+            if cx is None:
+                _ensure_dirs()
+                cx = _writer_cx = _open()
+            _commit_batch(cx, batch)
+        except Exception as e:
+            print(f"[DB] writer batch of {len(batch)} failed:", e)
+            for _, _, _, fut in batch:
+                if not fut.done():
+                    fut.set_exception(e)
+            try: cx.close()
+            except Exception: pass
+            cx = None
+
+def submit_write(fn, *args, **kwargs):
+    """
+    Queue fn(cx, *args, **kwargs) for the writer thread and return a Future.
+    fn must not commit/rollback itself. Without SQLITE_WRITE_QUEUE it runs
+    immediately in its own transaction; from inside another write closure it
+    joins the writer's open transaction.
+    """
+    if WRITE_QUEUE_ENABLED and threading.get_ident() == _writer_ident:
+        fut = Future()
+        try:
+            fut.set_result(fn(_writer_cx, *args, **kwargs))
+        except Exception as e:
+            fut.set_exception(e)
+        return fut
+    if not WRITE_QUEUE_ENABLED:
+        fut = Future()
+        try:
+            with conn() as cx:
+                fut.set_result(fn(cx, *args, **kwargs))
+        except Exception as e:
+            fut.set_exception(e)
+        return fut
+    fut = Future()
+    _writer_queue().put((fn, args, kwargs, fut))
+    return fut
+
+def run_write(fn, *args, **kwargs):
+    """Blocking form of submit_write(): returns fn's result or raises its exception."""
+    return submit_write(fn, *args, **kwargs).result()
+
+# ----------------- Money (integer stroops) -----------------
+# Pi amounts are mirrored as INTEGER stroops (1 Pi = 10^7 stroops) next to the
+# legacy REAL columns. Triggers from migration 0006 keep them in sync, so
+# SUM()/GROUP BY can run on exact integers inside SQLite.
+STROOPS_PER_PI = 10_000_000
+MONEY_COLUMNS = {
+    "orders": ("pi_amount", "pi_fee", "pi_merchant_net"),
+    "fee_ledger": ("amount",),
+    "bot_trades": ("amount_pi",),
+    "bot_bucket_allocations": ("amount",),
+}
+_STROOP = Decimal("0.0000001")
+
+def to_stroops(x):
+    """Pi amount (float/str/Decimal/None) -> int stroops, rounded half-up like Decimal(str(x))."""
+    if x is None:
+        return 0
+    if isinstance(x, (str, Decimal)):
+        return int(Decimal(x).quantize(_STROOP, rounding=ROUND_HALF_UP).scaleb(7))
+    n = float(x) * STROOPS_PER_PI
+    frac = abs(n - math.trunc(n))
+    if abs(frac - 0.5) < 1e-6:
+        # too close to a tie for float math; settle it exactly
+        return int(Decimal(str(x)).quantize(_STROOP, rounding=ROUND_HALF_UP).scaleb(7))
+    return int(math.floor(n + 0.5)) if n >= 0 else -int(math.floor(-n + 0.5))
+
+def from_stroops(n):
+    """int stroops -> float Pi (identical to float(Decimal(...).quantize(1e-7)))."""
+    return (n or 0) / STROOPS_PER_PI
+
+def quantize_pi(x):
+    """Round a Pi amount to 7 decimals (half-up) without a Decimal round-trip."""
+    return to_stroops(x) / STROOPS_PER_PI
+
+def stroops_col(col):
+    return f"{col}_stroops"
+
+# ----------------- WAL checkpointing -----------------
+def checkpoint(mode="PASSIVE"):
+    """Run a WAL checkpoint now. Returns (busy, wal_frames, checkpointed_frames)."""
+    mode = (mode or "PASSIVE").upper()
+    if mode not in ("PASSIVE", "FULL", "RESTART", "TRUNCATE"):
+        raise ValueError(f"bad checkpoint mode: {mode}")
+    cx = _open()
+    try:
+        row = cx.execute(f"PRAGMA wal_checkpoint({mode});").fetchone()
+        return tuple(row) if row else (0, -1, -1)
+    finally:
+        cx.close()
+
+def _wal_size():
+    try:
+        return os.path.getsize(DB_PATH + "-wal")
+    except OSError:
+        return 0
+
+def _checkpoint_loop():
+    passive_bytes = int(CHECKPOINT_PASSIVE_MB * 1024 * 1024)
+    truncate_bytes = int(CHECKPOINT_TRUNCATE_MB * 1024 * 1024)
+    while True:
+        time.sleep(CHECKPOINT_INTERVAL_SECS)
+        size = _wal_size()
+        if size < passive_bytes:
+            continue
+        mode = "TRUNCATE" if size >= truncate_bytes else "PASSIVE"
+        try:
+            t0 = time.time()
+            busy, frames, done = checkpoint(mode)
+            if busy or mode == "TRUNCATE":
+                print(f"[DB] checkpoint {mode}: wal={size}B frames={frames} done={done} "
+                      f"busy={busy} in {int((time.time() - t0) * 1000)}ms")
+        except Exception as e:
+            print("[DB] checkpoint failed:", e)
+
+def start_checkpointer():
+    """
+    Start the background WAL checkpoint thread once per process.
+    No-op unless SQLITE_JOURNAL_MODE=WAL and SQLITE_CHECKPOINT_INTERVAL_SECS > 0.
+    """
+    global _ckpt_thread, _ckpt_pid
+    if JOURNAL_MODE != "WAL" or CHECKPOINT_INTERVAL_SECS <= 0:
+        return None
+    with _ckpt_lock:
+        if _ckpt_thread is not None and _ckpt_pid == os.getpid() and _ckpt_thread.is_alive():
+            return _ckpt_thread
+        _ckpt_pid = os.getpid()
+        _ckpt_thread = threading.Thread(target=_checkpoint_loop, name="sqlite-checkpointer", daemon=True)
+        _ckpt_thread.start()
+        return _ckpt_thread
+
+# ----------------- Snapshots -----------------
+class _BackupRestarted(Exception):
+    pass
+
+def snapshot_to(dest_path, pages=-1, sleep=0.0, progress=None, max_restarts=None):
+    """
+    Write a consistent copy of the live database to dest_path using the SQLite
+    online backup API. Unlike copying the file, this includes frames still in
+    the -wal file and never captures a half-written transaction. The copy is
+    converted to a single self-contained file (journal_mode=DELETE).
+    pages/sleep throttle the copy (pages per step, seconds between steps);
+    progress(status, remaining, total) is called after each step.
+    A write from another connection restarts a stepped copy from page one;
+    after max_restarts of those it finishes in a single step (pages=-1).
+    """
+    _ensure_dirs()
+    tmp = dest_path + ".part"
+    restarts = [0, None]  # count, last remaining
+
+    def _step(status, remaining, total):
+        if restarts[1] is not None and remaining > restarts[1]:
+            restarts[0] += 1
+            if max_restarts is not None and restarts[0] > max_restarts:
+                raise _BackupRestarted()
+        restarts[1] = remaining
+        if progress:
+            progress(status, remaining, total)
+
+    src = _open(readonly=True)
+    dst = sqlite3.connect(tmp)
+    try:
+        try:
+            src.backup(dst, pages=pages, sleep=sleep, progress=_step)
+        except _BackupRestarted:
+            print(f"[DB] snapshot restarted {restarts[0]} times by writers; copying in one step")
+            src.backup(dst, pages=-1, progress=progress)
+        dst.execute("PRAGMA journal_mode=DELETE;")
+        dst.commit()
+    except Exception:
+        dst.close()
+        try: os.remove(tmp)
+        except OSError: pass
+        raise
+    finally:
+        dst.close()
+        src.close()
+    os.replace(tmp, dest_path)
+    return dest_path
+
 def _cols(cx, table):
     try:
         return {r["name"] for r in cx.execute(f"PRAGMA table_info({table})").fetchall()}
@@ -44,89 +663,109 @@ def _migrate_live_auction_wins(cx):
 
     SQLite cannot remove NOT NULL with ALTER TABLE, so we rebuild the table.
     """
-    try:
-        info = cx.execute("PRAGMA table_info(live_auction_wins)").fetchall()
-        if not info:
-            return
-
-        bad_lot_id = any(
-            r["name"] == "lot_id" and int(r["notnull"] or 0) == 1
-            for r in info
-        )
-
-        cols = {r["name"] for r in info}
-
-        missing_new_cols = any(c not in cols for c in (
-            "user_id", "card_title", "card_description", "card_image_url",
-            "status", "checkout_id"
-        ))
+    info = cx.execute("PRAGMA table_info(live_auction_wins)").fetchall()
+    if not info:
+        return
 
-        if not bad_lot_id and not missing_new_cols:
-            return
-
-        cx.execute("ALTER TABLE live_auction_wins RENAME TO live_auction_wins_old")
-
-        cx.execute("""
-            CREATE TABLE live_auction_wins(
-              id INTEGER PRIMARY KEY AUTOINCREMENT,
-              auction_id INTEGER NOT NULL,
-              user_id INTEGER,
-              username TEXT NOT NULL,
-              card_title TEXT,
-              card_description TEXT,
-              card_image_url TEXT,
-              winning_bid_pi REAL DEFAULT 0,
-              status TEXT NOT NULL DEFAULT 'won',
-              checkout_id INTEGER,
-              created_at INTEGER,
-              updated_at INTEGER
-            )
-        """)
+    bad_lot_id = any(
+        r["name"] == "lot_id" and int(r["notnull"] or 0) == 1
+        for r in info
+    )
 
-        old_cols = _cols(cx, "live_auction_wins_old")
+    cols = {r["name"] for r in info}
 
-        select_auction_id = "auction_id" if "auction_id" in old_cols else "0"
-        select_user_id = "user_id" if "user_id" in old_cols else "NULL"
-        select_username = "username" if "username" in old_cols else "'unknown'"
-        select_card_title = "card_title" if "card_title" in old_cols else "'Auction win'"
-        select_card_description = "card_description" if "card_description" in old_cols else "''"
-        select_card_image_url = "card_image_url" if "card_image_url" in old_cols else "''"
-        select_winning_bid_pi = "winning_bid_pi" if "winning_bid_pi" in old_cols else "0"
-        select_status = "status" if "status" in old_cols else "'won'"
-        select_checkout_id = "checkout_id" if "checkout_id" in old_cols else "NULL"
-        select_created_at = "created_at" if "created_at" in old_cols else "strftime('%s','now')"
-        select_updated_at = "updated_at" if "updated_at" in old_cols else "strftime('%s','now')"
+    missing_new_cols = any(c not in cols for c in (
+        "user_id", "card_title", "card_description", "card_image_url",
+        "status", "checkout_id"
+    ))
 
-        cx.execute(f"""
-            INSERT INTO live_auction_wins(
-              auction_id, user_id, username, card_title, card_description,
-              card_image_url, winning_bid_pi, status, checkout_id, created_at, updated_at
-            )
-            SELECT
-              {select_auction_id},
-              {select_user_id},
-              {select_username},
-              COALESCE({select_card_title}, 'Auction win'),
-              COALESCE({select_card_description}, ''),
-              COALESCE({select_card_image_url}, ''),
-              COALESCE({select_winning_bid_pi}, 0),
-              COALESCE({select_status}, 'won'),
-              {select_checkout_id},
-              COALESCE({select_created_at}, strftime('%s','now')),
-              COALESCE({select_updated_at}, strftime('%s','now'))
-            FROM live_auction_wins_old
-        """)
+    if not bad_lot_id and not missing_new_cols:
+        return
 
-        cx.execute("DROP TABLE live_auction_wins_old")
-        print("[DB] live_auction_wins migrated away from old lot_id schema")
+    cx.execute("ALTER TABLE live_auction_wins RENAME TO live_auction_wins_old")
 
-    except Exception as e:
-        print("[DB] live_auction_wins migration failed:", e)
-
-def init_db():
-    _ensure_dirs()
-    with _lock, conn() as cx:
-        cx.executescript("""
+    cx.execute("""
+        CREATE TABLE live_auction_wins(
+          id INTEGER PRIMARY KEY AUTOINCREMENT,
+          auction_id INTEGER NOT NULL,
+          user_id INTEGER,
+          username TEXT NOT NULL,
+          card_title TEXT,
+          card_description TEXT,
+          card_image_url TEXT,
+          winning_bid_pi REAL DEFAULT 0,
+          status TEXT NOT NULL DEFAULT 'won',
+          checkout_id INTEGER,
+          created_at INTEGER,
+          updated_at INTEGER
+        )
+    """)
+
+    old_cols = _cols(cx, "live_auction_wins_old")
+
+    select_auction_id = "auction_id" if "auction_id" in old_cols else "0"
+    select_user_id = "user_id" if "user_id" in old_cols else "NULL"
+    select_username = "username" if "username" in old_cols else "'unknown'"
+    select_card_title = "card_title" if "card_title" in old_cols else "'Auction win'"
+    select_card_description = "card_description" if "card_description" in old_cols else "''"
+    select_card_image_url = "card_image_url" if "card_image_url" in old_cols else "''"
+    select_winning_bid_pi = "winning_bid_pi" if "winning_bid_pi" in old_cols else "0"
+    select_status = "status" if "status" in old_cols else "'won'"
+    select_checkout_id = "checkout_id" if "checkout_id" in old_cols else "NULL"
+    select_created_at = "created_at" if "created_at" in old_cols else "strftime('%s','now')"
+    select_updated_at = "updated_at" if "updated_at" in old_cols else "strftime('%s','now')"
+
+    cx.execute(f"""
+        INSERT INTO live_auction_wins(
+          auction_id, user_id, username, card_title, card_description,
+          card_image_url, winning_bid_pi, status, checkout_id, created_at, updated_at
+        )
+        SELECT
+          {select_auction_id},
+          {select_user_id},
+          {select_username},
+          COALESCE({select_card_title}, 'Auction win'),
+          COALESCE({select_card_description}, ''),
+          COALESCE({select_card_image_url}, ''),
+          COALESCE({select_winning_bid_pi}, 0),
+          COALESCE({select_status}, 'won'),
+          {select_checkout_id},
+          COALESCE({select_created_at}, strftime('%s','now')),
+          COALESCE({select_updated_at}, strftime('%s','now'))
+        FROM live_auction_wins_old
+    """)
+
+    cx.execute("DROP TABLE live_auction_wins_old")
+    print("[DB] live_auction_wins migrated away from old lot_id schema")
+
+# ----------------- Schema migrations -----------------
+# Every schema change is a numbered step recorded in schema_migrations.
+# Boot only runs steps that have not been applied yet (one SELECT when the
+# database is current). Steps run inside BEGIN IMMEDIATE, so concurrent
+# workers serialise and a failing step leaves nothing half-applied.
+# Steps 1-4 are written to be idempotent because databases created before
+# the runner existed already carry most of that schema.
+
+def _run_script(cx, script):
+    """executescript() COMMITs first, so split and run statement-by-statement instead."""
+    buf = ""
+    for line in script.splitlines(keepends=True):
+        buf += line
+        if sqlite3.complete_statement(buf):
+            if buf.strip():
+                cx.execute(buf)
+            buf = ""
+    if buf.strip():
+        cx.execute(buf)
+
+def _add_column(cx, table, coldef):
+    name = coldef.split()[0]
+    cols = _cols(cx, table)
+    if cols and name not in cols:
+        cx.execute(f"ALTER TABLE {table} ADD COLUMN {coldef}")
+
+def _m0001_baseline(cx):
+    _run_script(cx, """
         CREATE TABLE IF NOT EXISTS users(
           id INTEGER PRIMARY KEY,
           pi_uid TEXT UNIQUE,
@@ -614,95 +1253,89 @@ def init_db():
           FOREIGN KEY(bucket_id) REFERENCES bot_buckets(id)
         );
         CREATE INDEX IF NOT EXISTS idx_bot_trades_bucket_ts ON bot_trades(bucket_id, ts);
-        """)
-
-        _migrate_live_auction_wins(cx)
-
-        cx.execute("""
-          CREATE UNIQUE INDEX IF NOT EXISTS uniq_nft_listings_active_serial
-          ON nft_listings(collection_id, serial)
-          WHERE status='active' AND serial IS NOT NULL;
-        """)
-        cx.execute("""
-          CREATE UNIQUE INDEX IF NOT EXISTS uniq_nft_listings_active_primary
-          ON nft_listings(collection_id)
-          WHERE status='active' AND serial IS NULL;
-        """)
-
-def ensure_schema():
-    with _lock, conn() as cx:
-        for sql in [
-            "ALTER TABLE sessions ADD COLUMN pi_username TEXT",
-            "ALTER TABLE sessions ADD COLUMN checkout_path TEXT",
-            "ALTER TABLE sessions ADD COLUMN pi_payment_id TEXT",
-            "ALTER TABLE sessions ADD COLUMN cart_id TEXT",
-            "ALTER TABLE sessions ADD COLUMN line_items_json TEXT",
-            "ALTER TABLE sessions ADD COLUMN user_id INTEGER",
-            "ALTER TABLE orders ADD COLUMN buyer_user_id INTEGER",
-            "ALTER TABLE orders ADD COLUMN created_at INTEGER",
-            "ALTER TABLE users ADD COLUMN username TEXT",
-            "ALTER TABLE merchants ADD COLUMN pi_wallet_address TEXT",
-            "ALTER TABLE merchants ADD COLUMN pi_handle TEXT",
-            "ALTER TABLE merchants ADD COLUMN colorway TEXT",
-            "ALTER TABLE merchants ADD COLUMN description TEXT",
-            "ALTER TABLE merchants ADD COLUMN banner_url TEXT",
-            "ALTER TABLE merchants ADD COLUMN font_family TEXT",
-            "ALTER TABLE merchants ADD COLUMN custom_css TEXT",
-            "ALTER TABLE items ADD COLUMN is_nft INTEGER DEFAULT 0",
-            "ALTER TABLE items ADD COLUMN nft_kind TEXT",
-            "ALTER TABLE items ADD COLUMN nft_size INTEGER",
-            "ALTER TABLE items ADD COLUMN nft_prefix TEXT",
-            "ALTER TABLE items ADD COLUMN nft_tag TEXT",
-            "ALTER TABLE items ADD COLUMN nft_assets_json TEXT",
-            "ALTER TABLE items ADD COLUMN nft_vault_json TEXT",
-            "ALTER TABLE items ADD COLUMN nft_commission_bp INTEGER",
-            "ALTER TABLE items ADD COLUMN claim_kind TEXT",
-            "ALTER TABLE items ADD COLUMN meta_type TEXT",
-            "ALTER TABLE items ADD COLUMN category TEXT",
-            "ALTER TABLE items ADD COLUMN fulfillment_kind TEXT",
-            "ALTER TABLE items ADD COLUMN crafted_item_id INTEGER",
-            "ALTER TABLE items ADD COLUMN svg_code TEXT",
-            "ALTER TABLE nft_collections ADD COLUMN royalty_bp INTEGER",
-            "ALTER TABLE nft_collections ADD COLUMN backing_template_izza TEXT",
-            "ALTER TABLE nft_tokens ADD COLUMN backing_izza TEXT",
-            "ALTER TABLE nft_tokens ADD COLUMN backing_asset_code TEXT",
-            "ALTER TABLE nft_tokens ADD COLUMN backing_asset_issuer TEXT",
-            "ALTER TABLE nft_listings ADD COLUMN item_id INTEGER",
-            "ALTER TABLE nft_listings ADD COLUMN buyer_username TEXT",
-            "ALTER TABLE bot_trades ADD COLUMN amount_pi REAL",
-            "ALTER TABLE bot_trades ADD COLUMN created_at INTEGER",
-            "ALTER TABLE bot_buckets ADD COLUMN paused_until INTEGER",
-            "ALTER TABLE bot_buckets ADD COLUMN liquidation_status TEXT",
-            "ALTER TABLE live_auctions ADD COLUMN image_url TEXT",
-            "ALTER TABLE live_auctions ADD COLUMN playback_url TEXT",
-            "ALTER TABLE live_auctions ADD COLUMN stream_status TEXT DEFAULT 'offline'",
-            "ALTER TABLE live_auctions ADD COLUMN created_by_username TEXT",
-            "ALTER TABLE live_auction_wins ADD COLUMN user_id INTEGER",
-            "ALTER TABLE live_auction_wins ADD COLUMN card_title TEXT",
-            "ALTER TABLE live_auction_wins ADD COLUMN card_description TEXT",
-            "ALTER TABLE live_auction_wins ADD COLUMN card_image_url TEXT",
-            "ALTER TABLE live_auction_wins ADD COLUMN winning_bid_pi REAL DEFAULT 0",
-            "ALTER TABLE live_auction_wins ADD COLUMN status TEXT DEFAULT 'won'",
-            "ALTER TABLE live_auction_wins ADD COLUMN checkout_id INTEGER",
-            "ALTER TABLE live_auction_wins ADD COLUMN updated_at INTEGER",
-            "ALTER TABLE live_auction_checkouts ADD COLUMN user_id INTEGER",
-            "ALTER TABLE live_auction_checkouts ADD COLUMN merchant_id INTEGER",
-            "ALTER TABLE live_auction_checkouts ADD COLUMN item_id INTEGER",
-            "ALTER TABLE live_auction_checkouts ADD COLUMN link_id TEXT",
-            "ALTER TABLE live_auction_checkouts ADD COLUMN total_pi REAL DEFAULT 0",
-            "ALTER TABLE live_auction_checkouts ADD COLUMN wins_json TEXT DEFAULT '[]'",
-            "ALTER TABLE live_auction_checkouts ADD COLUMN status TEXT DEFAULT 'pending'",
-            "ALTER TABLE live_auction_checkouts ADD COLUMN created_at INTEGER",
-            "ALTER TABLE live_auction_checkouts ADD COLUMN updated_at INTEGER",
-        ]:
-            try:
-                cx.execute(sql)
-            except Exception:
-                pass
-
-        _migrate_live_auction_wins(cx)
-
-        cx.executescript("""
+    """)
+
+    cx.execute("""
+      CREATE UNIQUE INDEX IF NOT EXISTS uniq_nft_listings_active_serial
+      ON nft_listings(collection_id, serial)
+      WHERE status='active' AND serial IS NOT NULL;
+    """)
+    cx.execute("""
+      CREATE UNIQUE INDEX IF NOT EXISTS uniq_nft_listings_active_primary
+      ON nft_listings(collection_id)
+      WHERE status='active' AND serial IS NULL;
+    """)
+
+_LEGACY_COLUMNS = [
+    ("sessions", "pi_username TEXT"),
+    ("sessions", "checkout_path TEXT"),
+    ("sessions", "pi_payment_id TEXT"),
+    ("sessions", "cart_id TEXT"),
+    ("sessions", "line_items_json TEXT"),
+    ("sessions", "user_id INTEGER"),
+    ("orders", "buyer_user_id INTEGER"),
+    ("orders", "created_at INTEGER"),
+    ("users", "username TEXT"),
+    ("merchants", "pi_wallet_address TEXT"),
+    ("merchants", "pi_handle TEXT"),
+    ("merchants", "colorway TEXT"),
+    ("merchants", "description TEXT"),
+    ("merchants", "banner_url TEXT"),
+    ("merchants", "font_family TEXT"),
+    ("merchants", "custom_css TEXT"),
+    ("items", "is_nft INTEGER DEFAULT 0"),
+    ("items", "nft_kind TEXT"),
+    ("items", "nft_size INTEGER"),
+    ("items", "nft_prefix TEXT"),
+    ("items", "nft_tag TEXT"),
+    ("items", "nft_assets_json TEXT"),
+    ("items", "nft_vault_json TEXT"),
+    ("items", "nft_commission_bp INTEGER"),
+    ("items", "claim_kind TEXT"),
+    ("items", "meta_type TEXT"),
+    ("items", "category TEXT"),
+    ("items", "fulfillment_kind TEXT"),
+    ("items", "crafted_item_id INTEGER"),
+    ("items", "svg_code TEXT"),
+    ("nft_collections", "royalty_bp INTEGER"),
+    ("nft_collections", "backing_template_izza TEXT"),
+    ("nft_tokens", "backing_izza TEXT"),
+    ("nft_tokens", "backing_asset_code TEXT"),
+    ("nft_tokens", "backing_asset_issuer TEXT"),
+    ("nft_listings", "item_id INTEGER"),
+    ("nft_listings", "buyer_username TEXT"),
+    ("bot_trades", "amount_pi REAL"),
+    ("bot_trades", "created_at INTEGER"),
+    ("bot_buckets", "paused_until INTEGER"),
+    ("bot_buckets", "liquidation_status TEXT"),
+    ("live_auctions", "image_url TEXT"),
+    ("live_auctions", "playback_url TEXT"),
+    ("live_auctions", "stream_status TEXT DEFAULT 'offline'"),
+    ("live_auctions", "created_by_username TEXT"),
+    ("live_auction_wins", "user_id INTEGER"),
+    ("live_auction_wins", "card_title TEXT"),
+    ("live_auction_wins", "card_description TEXT"),
+    ("live_auction_wins", "card_image_url TEXT"),
+    ("live_auction_wins", "winning_bid_pi REAL DEFAULT 0"),
+    ("live_auction_wins", "status TEXT DEFAULT 'won'"),
+    ("live_auction_wins", "checkout_id INTEGER"),
+    ("live_auction_wins", "updated_at INTEGER"),
+    ("live_auction_checkouts", "user_id INTEGER"),
+    ("live_auction_checkouts", "merchant_id INTEGER"),
+    ("live_auction_checkouts", "item_id INTEGER"),
+    ("live_auction_checkouts", "link_id TEXT"),
+    ("live_auction_checkouts", "total_pi REAL DEFAULT 0"),
+    ("live_auction_checkouts", "wins_json TEXT DEFAULT '[]'"),
+    ("live_auction_checkouts", "status TEXT DEFAULT 'pending'"),
+    ("live_auction_checkouts", "created_at INTEGER"),
+    ("live_auction_checkouts", "updated_at INTEGER"),
+]
+
+def _m0002_legacy_columns(cx):
+    for table, coldef in _LEGACY_COLUMNS:
+        _add_column(cx, table, coldef)
+
+    _run_script(cx, """
         CREATE TABLE IF NOT EXISTS izza_airdrop_wallets(
           id INTEGER PRIMARY KEY AUTOINCREMENT,
           username TEXT NOT NULL UNIQUE,
@@ -743,4 +1376,376 @@ def ensure_schema():
         BEGIN
           UPDATE users SET username = NEW.pi_username WHERE id = NEW.id;
         END;
+    """)
+
+def _m0003_live_auction_wins_rebuild(cx):
+    _migrate_live_auction_wins(cx)
+
+def _m0004_app_boot_tables(cx):
+    # Previously created by module-level blocks in app.py on every import.
+    _run_script(cx, """
+    CREATE TABLE IF NOT EXISTS crafting_credit_claims(
+      order_id   INTEGER PRIMARY KEY,   -- 1 row per order, prevents duplicates
+      user_id    INTEGER NOT NULL,
+      claimed_at INTEGER NOT NULL
+    );
+    CREATE UNIQUE INDEX IF NOT EXISTS uniq_collectible_claims ON collectible_claims(order_id, user_id);
+
+    CREATE TABLE IF NOT EXISTS dynamic_overrides(
+      id INTEGER PRIMARY KEY AUTOINCREMENT,
+      user_id INTEGER NOT NULL,
+      link_id TEXT NOT NULL,
+      price_pi REAL NOT NULL,
+      ctx TEXT,
+      created_at INTEGER NOT NULL,
+      UNIQUE(user_id, link_id)
+    );
+
+    CREATE TABLE IF NOT EXISTS carts(
+      id TEXT PRIMARY KEY,
+      merchant_id INTEGER NOT NULL,
+      created_at INTEGER NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS cart_items(
+      id INTEGER PRIMARY KEY AUTOINCREMENT,
+      cart_id TEXT NOT NULL,
+      item_id INTEGER NOT NULL,
+      qty INTEGER NOT NULL
+    );
+
+    -- payout_requests throttle log (one row per request)
+    CREATE TABLE IF NOT EXISTS payout_requests(
+      id INTEGER PRIMARY KEY,
+      merchant_id INTEGER NOT NULL,
+      requested_at INTEGER NOT NULL,
+      FOREIGN KEY(merchant_id) REFERENCES merchants(id)
+    );
+    CREATE INDEX IF NOT EXISTS idx_payout_requests_merchant_time ON payout_requests(merchant_id, requested_at);
+
+    CREATE TABLE IF NOT EXISTS crafted_items(
+      id INTEGER PRIMARY KEY AUTOINCREMENT,
+      user_id INTEGER NOT NULL,
+      name TEXT NOT NULL,
+      sku TEXT,
+      image TEXT,
+      meta_json TEXT,
+      created_at INTEGER NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_crafted_items_user ON crafted_items(user_id);
+    """)
+
+    _add_column(cx, "users", "ic_credits INTEGER DEFAULT 0")
+    _add_column(cx, "items", "description TEXT")
+    # live auction wins keep a nullable lot_id after the 0003 rebuild
+    _add_column(cx, "live_auction_wins", "lot_id INTEGER DEFAULT 0")
+
+def _m0005_advisor_indexes(cx):
+    # From `python index_advisor.py`: each one turns a full scan / temp B-tree
+    # on a request path into an index search.
+    _run_script(cx, """
+    CREATE INDEX IF NOT EXISTS idx_orders_merchant_created ON orders(merchant_id, created_at);
+    CREATE INDEX IF NOT EXISTS idx_orders_merchant_id ON orders(merchant_id, id DESC);
+    CREATE INDEX IF NOT EXISTS idx_orders_buyer_user ON orders(buyer_user_id, id DESC);
+    CREATE INDEX IF NOT EXISTS idx_orders_buyer_token ON orders(buyer_token);
+    CREATE INDEX IF NOT EXISTS idx_sessions_merchant_created ON sessions(merchant_id, created_at);
+    CREATE INDEX IF NOT EXISTS idx_items_merchant_active ON items(merchant_id, active, id DESC);
+    CREATE INDEX IF NOT EXISTS idx_merchants_owner ON merchants(owner_user_id);
+    CREATE INDEX IF NOT EXISTS idx_carts_merchant ON carts(merchant_id);
+    CREATE INDEX IF NOT EXISTS idx_cart_items_cart ON cart_items(cart_id);
+    CREATE INDEX IF NOT EXISTS idx_user_wallets_pub ON user_wallets(pub);
+    CREATE INDEX IF NOT EXISTS idx_user_wallets_username_lower ON user_wallets(lower(username));
+    CREATE INDEX IF NOT EXISTS idx_nft_tokens_owner_wallet ON nft_tokens(owner_wallet_pub, serial);
+    CREATE INDEX IF NOT EXISTS idx_nft_pending_user_lower ON nft_pending_claims(lower(buyer_username), status, created_at);
+    CREATE INDEX IF NOT EXISTS idx_bot_trades_account ON bot_trades(account_id);
+    CREATE INDEX IF NOT EXISTS idx_bot_deposits_account_asset ON bot_deposits(account_id, asset_code, asset_issuer);
+    """)
+
+def _m0006_money_stroops(cx):
+    for table, cols in MONEY_COLUMNS.items():
+        have = _cols(cx, table)
+        cols = [c for c in cols if c in have]
+        if not cols:
+            continue
+        for c in cols:
+            _add_column(cx, table, f"{stroops_col(c)} INTEGER")
+        sets = ", ".join(f"{stroops_col(c)}=CAST(ROUND({c} * {STROOPS_PER_PI}) AS INTEGER)" for c in cols)
+        cx.execute(f"UPDATE {table} SET {sets}")
+        new_sets = ", ".join(f"{stroops_col(c)}=CAST(ROUND(NEW.{c} * {STROOPS_PER_PI}) AS INTEGER)" for c in cols)
+        cx.execute(f"""
+          CREATE TRIGGER IF NOT EXISTS trg_{table}_stroops_ins AFTER INSERT ON {table}
+          BEGIN UPDATE {table} SET {new_sets} WHERE rowid=NEW.rowid; END
+        """)
+        cx.execute(f"""
+          CREATE TRIGGER IF NOT EXISTS trg_{table}_stroops_upd AFTER UPDATE OF {", ".join(cols)} ON {table}
+          BEGIN UPDATE {table} SET {new_sets} WHERE rowid=NEW.rowid; END
         """)
+
+def _m0007_explore_fts(cx):
+    # Full-text indexes for /explore (see search.py). items_fts.rowid = items.id
+    # and only active items are indexed; merchants_fts.rowid = merchants.id.
+    # Triggers keep both in sync, including the merchant name copied onto
+    # every item row.
+    _run_script(cx, """
+    CREATE VIRTUAL TABLE IF NOT EXISTS items_fts USING fts5(
+      title, description, sku, merchant,
+      tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    );
+    CREATE VIRTUAL TABLE IF NOT EXISTS merchants_fts USING fts5(
+      business_name, slug,
+      tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    );
+
+    CREATE TRIGGER IF NOT EXISTS trg_items_fts_ins AFTER INSERT ON items WHEN NEW.active=1 BEGIN
+      INSERT INTO items_fts(rowid, title, description, sku, merchant)
+      VALUES(NEW.id, NEW.title, NEW.description, NEW.sku,
+             (SELECT business_name FROM merchants WHERE id=NEW.merchant_id));
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_items_fts_upd AFTER UPDATE OF title, description, sku, merchant_id, active ON items BEGIN
+      DELETE FROM items_fts WHERE rowid=OLD.id;
+      INSERT INTO items_fts(rowid, title, description, sku, merchant)
+      SELECT NEW.id, NEW.title, NEW.description, NEW.sku,
+             (SELECT business_name FROM merchants WHERE id=NEW.merchant_id)
+      WHERE NEW.active=1;
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_items_fts_del AFTER DELETE ON items BEGIN
+      DELETE FROM items_fts WHERE rowid=OLD.id;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_merchants_fts_ins AFTER INSERT ON merchants BEGIN
+      INSERT INTO merchants_fts(rowid, business_name, slug) VALUES(NEW.id, NEW.business_name, NEW.slug);
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_merchants_fts_upd AFTER UPDATE OF business_name, slug ON merchants BEGIN
+      DELETE FROM merchants_fts WHERE rowid=OLD.id;
+      INSERT INTO merchants_fts(rowid, business_name, slug) VALUES(NEW.id, NEW.business_name, NEW.slug);
+      UPDATE items_fts SET merchant=NEW.business_name
+       WHERE rowid IN (SELECT id FROM items WHERE merchant_id=NEW.id);
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_merchants_fts_del AFTER DELETE ON merchants BEGIN
+      DELETE FROM merchants_fts WHERE rowid=OLD.id;
+    END;
+
+    DELETE FROM items_fts;
+    INSERT INTO items_fts(rowid, title, description, sku, merchant)
+      SELECT items.id, items.title, items.description, items.sku, merchants.business_name
+      FROM items LEFT JOIN merchants ON merchants.id = items.merchant_id
+      WHERE items.active=1;
+    DELETE FROM merchants_fts;
+    INSERT INTO merchants_fts(rowid, business_name, slug) SELECT id, business_name, slug FROM merchants;
+    INSERT INTO items_fts(items_fts) VALUES('optimize');
+    """)
+
+def _m0008_merchant_daily_stats(cx):
+    # Per merchant per UTC day sales rollup read by the dashboards; kept up
+    # to date by the order/session writers (see merchant_stats.py).
+    _run_script(cx, """
+    CREATE TABLE IF NOT EXISTS merchant_daily_stats(
+      merchant_id INTEGER NOT NULL,
+      day TEXT NOT NULL,                 -- UTC 'YYYY-MM-DD'
+      gross_stroops INTEGER NOT NULL DEFAULT 0,
+      fee_stroops INTEGER NOT NULL DEFAULT 0,
+      net_stroops INTEGER NOT NULL DEFAULT 0,
+      orders INTEGER NOT NULL DEFAULT 0,
+      sessions INTEGER NOT NULL DEFAULT 0,
+      PRIMARY KEY(merchant_id, day)
+    ) WITHOUT ROWID;
+    -- backfill; same query as merchant_stats.rebuild() at the time of writing
+    INSERT INTO merchant_daily_stats(merchant_id, day, gross_stroops, fee_stroops, net_stroops, orders, sessions)
+    SELECT merchant_id, day, SUM(gross), SUM(fee), SUM(net), SUM(n_orders), SUM(n_sessions)
+    FROM (
+      SELECT o.merchant_id, date(COALESCE(o.created_at, s.ts), 'unixepoch') AS day,
+             COALESCE(o.pi_amount_stroops, 0) AS gross, COALESCE(o.pi_fee_stroops, 0) AS fee,
+             COALESCE(o.pi_merchant_net_stroops, 0) AS net, 1 AS n_orders, 0 AS n_sessions
+      FROM orders o
+      LEFT JOIN (SELECT pi_tx_hash, MIN(created_at) AS ts FROM sessions
+                 WHERE pi_tx_hash IS NOT NULL GROUP BY pi_tx_hash) s ON s.pi_tx_hash = o.pi_tx_hash
+      WHERE o.status='paid' AND COALESCE(o.created_at, s.ts) IS NOT NULL
+      UNION ALL
+      SELECT merchant_id, date(created_at, 'unixepoch'), 0, 0, 0, 0, 1
+      FROM sessions WHERE created_at IS NOT NULL
+    )
+    WHERE merchant_id IS NOT NULL
+    GROUP BY merchant_id, day;
+    """)
+
+def _m0009_jobs(cx):
+    # Durable queue for post-commit side effects (see jobs.py).
+    _run_script(cx, """
+    CREATE TABLE IF NOT EXISTS jobs(
+      id INTEGER PRIMARY KEY,
+      kind TEXT NOT NULL,
+      payload_json TEXT NOT NULL,
+      state TEXT NOT NULL DEFAULT 'queued',   -- queued | running | done | dead
+      attempts INTEGER NOT NULL DEFAULT 0,
+      max_attempts INTEGER NOT NULL,
+      run_after INTEGER NOT NULL,
+      lease_owner TEXT,
+      lease_until INTEGER,
+      last_error TEXT,
+      created_at INTEGER NOT NULL,
+      updated_at INTEGER NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_jobs_state_run_after ON jobs(state, run_after);
+    """)
+
+MIGRATIONS = [
+    (1, "baseline schema", _m0001_baseline),
+    (2, "legacy column patches", _m0002_legacy_columns),
+    (3, "rebuild live_auction_wins without NOT NULL lot_id", _m0003_live_auction_wins_rebuild),
+    (4, "app boot tables and columns", _m0004_app_boot_tables),
+    (5, "indexes from index_advisor", _m0005_advisor_indexes),
+    (6, "integer stroop money columns", _m0006_money_stroops),
+    (7, "explore full-text search", _m0007_explore_fts),
+    (8, "merchant daily stats rollup", _m0008_merchant_daily_stats),
+    (9, "background job queue", _m0009_jobs),
+]
+
+_migrated_pid = None
+
+def _ensure_migrations_table(cx):
+    cx.execute("""
+      CREATE TABLE IF NOT EXISTS schema_migrations(
+        version INTEGER PRIMARY KEY,
+        name TEXT NOT NULL,
+        applied_at INTEGER NOT NULL,
+        duration_ms INTEGER
+      )
+    """)
+
+def applied_migrations(cx=None):
+    """Return {version: row} for every recorded migration."""
+    own = cx is None
+    cx = cx or _open()
+    try:
+        _ensure_migrations_table(cx)
+        return {r["version"]: r for r in cx.execute("SELECT * FROM schema_migrations ORDER BY version")}
+    finally:
+        if own:
+            cx.close()
+
+def migrate(dry_run=False, verbose=True):
+    """
+    Apply pending migrations in version order.
+    dry_run=True only returns the plan: [(version, name), ...] of pending steps.
+    Otherwise returns [(version, name, duration_ms), ...] of the steps applied now.
+    """
+    global _migrated_pid
+    _ensure_dirs()
+    # Gunicorn workers boot together; the first one migrates while the rest
+    # wait here instead of timing out on the write lock and failing the boot.
+    lock_fh = None
+    if fcntl is not None and not dry_run:
+        lock_fh = open(DB_PATH + ".migrate.lock", "w")
+        fcntl.flock(lock_fh, fcntl.LOCK_EX)
+    cx = _open()
+    cx.isolation_level = None  # explicit BEGIN/COMMIT below
+    cx.execute(f"PRAGMA busy_timeout={MIGRATE_BUSY_TIMEOUT_MS};")  # other writers (bot engine) still queue
+    try:
+        done = applied_migrations(cx)
+        pending = [(v, name, fn) for v, name, fn in MIGRATIONS if v not in done]
+        if dry_run:
+            return [(v, name) for v, name, _ in pending]
+
+        ran = []
+        for version, name, fn in pending:
+            cx.execute("BEGIN IMMEDIATE")
+            try:
+                # another worker may have applied it while we waited for the lock
+                if cx.execute("SELECT 1 FROM schema_migrations WHERE version=?", (version,)).fetchone():
+                    cx.execute("COMMIT")
+                    continue
+                t0 = time.time()
+                fn(cx)
+                ms = int((time.time() - t0) * 1000)
+                cx.execute(
+                    "INSERT INTO schema_migrations(version, name, applied_at, duration_ms) VALUES(?,?,?,?)",
+                    (version, name, int(time.time()), ms)
+                )
+                cx.execute("COMMIT")
+            except Exception as e:
+                cx.execute("ROLLBACK")
+                print(f"[DB] migration {version:04d} ({name}) failed, rolled back:", e)
+                raise
+            ran.append((version, name, ms))
+            if verbose:
+                print(f"[DB] migration {version:04d} applied: {name} ({ms}ms)")
+        _migrated_pid = os.getpid()
+        return ran
+    finally:
+        cx.close()
+        if lock_fh is not None:
+            lock_fh.close()
+
+# ----------------- Module schema registry -----------------
+# Blueprints declare the tables they own once with @register_schema("name").
+# ensure_registered("name") runs that declaration a single time per process
+# and database file; every later call is a set lookup, so request handlers
+# never issue DDL. init_db() runs everything registered so far at boot.
+_schemas = {}
+_schemas_done = set()
+_schemas_lock = threading.Lock()
+
+def register_schema(name):
+    """Decorator: fn(cx) creates/patches a module's tables. Must be idempotent."""
+    def deco(fn):
+        _schemas[name] = fn
+        return fn
+    return deco
+
+def ensure_registered(name, path=None):
+    path = path or DB_PATH
+    key = (os.getpid(), path, name)
+    if key in _schemas_done:
+        return
+    with _schemas_lock:
+        if key in _schemas_done:
+            return
+        if path == DB_PATH:
+            cx = _open()
+        else:
+            cx = sqlite3.connect(path, check_same_thread=False)
+            cx.row_factory = sqlite3.Row
+            cx.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS};")
+        try:
+            with cx:
+                _schemas[name](cx)
+        finally:
+            cx.close()
+        _schemas_done.add(key)
+
+def ensure_all_registered():
+    for name in list(_schemas):
+        try:
+            ensure_registered(name)
+        except Exception as e:
+            print(f"[DB] schema '{name}' failed:", e)
+
+def init_db():
+    # Schema lives in MIGRATIONS; once applied, later calls in the same process are free.
+    if _migrated_pid != os.getpid():
+        with _lock:
+            migrate()
+    ensure_all_registered()
+
+def ensure_schema():
+    init_db()
+
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser(description="IZZA PAY schema migrations")
+    ap.add_argument("command", choices=["status", "plan", "migrate"], nargs="?", default="status")
+    args = ap.parse_args()
+    print(f"database: {DB_PATH}")
+    if args.command == "migrate":
+        ran = migrate()
+        print(f"applied {len(ran)} migration(s)")
+    elif args.command == "plan":
+        plan = migrate(dry_run=True)
+        for v, name in plan:
+            print(f"  pending {v:04d}  {name}")
+        print(f"{len(plan)} pending")
+    else:
+        done = applied_migrations()
+        for v, name, _ in MIGRATIONS:
+            r = done.get(v)
+            state = f"applied {r['applied_at']} ({r['duration_ms']}ms)" if r else "pending"
+            print(f"  {v:04d}  {name:52s} {state}")
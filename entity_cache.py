@@ -0,0 +1,146 @@
+# entity_cache.py
+# Read-through cache for merchants and items rows.
+#
+# Storefront, cart, signin and checkout pages all start by resolving a
+# merchant by slug or an item by link_id; those rows change rarely. They are
+# kept in a small in-process LRU with a TTL, keyed by id, with slug/link_id
+# aliases. Code that changes a merchants or items row calls
+# invalidate_merchant()/invalidate_item() after its commit; other workers
+# catch up when the TTL runs out. Anything that writes back what it read
+# (owner edits, cart adds, the price a checkout session is created at) reads
+# with fresh=True.
+import os, time, threading
+from collections import OrderedDict
+
+from db import conn_ro
+
+ENTITY_CACHE_SIZE = int(os.getenv("ENTITY_CACHE_SIZE", "4096"))
+ENTITY_CACHE_TTL = float(os.getenv("ENTITY_CACHE_TTL", "30"))  # seconds; 0 disables
+
+_lock = threading.Lock()
+_rows = OrderedDict()   # ("merchant" | "item", id) -> (expires_at, row, alias)
+_alias = {}             # ("slug", v) | ("link", v) -> ("merchant" | "item", id)
+_ALIAS_COL = {"merchant": ("slug", "slug"), "item": ("link", "link_id")}
+_stats = {"merchant_hits": 0, "merchant_misses": 0, "item_hits": 0, "item_misses": 0, "invalidations": 0}
+
+def _bump(k, n=1):
+    with _lock:
+        _stats[k] += n
+
+def _get(key):
+    if ENTITY_CACHE_TTL <= 0:
+        return None
+    with _lock:
+        hit = _rows.get(key)
+        if not hit:
+            return None
+        if hit[0] < time.time():
+            _drop(key)
+            return None
+        _rows.move_to_end(key)
+        return hit[1]
+
+def _drop(key):
+    ent = _rows.pop(key, None)
+    if ent and _alias.get(ent[2]) == key:
+        del _alias[ent[2]]
+
+def _put(kind, row):
+    if ENTITY_CACHE_TTL <= 0 or row is None:
+        return
+    key = (kind, int(row["id"]))
+    tag, col = _ALIAS_COL[kind]
+    with _lock:
+        _drop(key)  # the slug/link_id may have changed
+        alias = (tag, str(row[col])) if row[col] else None
+        _rows[key] = (time.time() + ENTITY_CACHE_TTL, row, alias)
+        if alias:
+            _alias[alias] = key
+        while len(_rows) > ENTITY_CACHE_SIZE:
+            _drop(next(iter(_rows)))
+
+def _lookup(kind, key, where, arg, fresh):
+    if not fresh:
+        with _lock:
+            target = key if key[0] == kind else _alias.get(key)
+        row = _get(target) if target else None
+        if row is not None:
+            _bump(kind + "_hits")
+            return row
+    _bump(kind + "_misses")
+    with conn_ro() as cx:
+        row = cx.execute(f"SELECT * FROM {kind}s WHERE {where}", (arg,)).fetchone()
+    _put(kind, row)
+    return row
+
+def merchant_by_id(merchant_id, fresh=False):
+    """merchants row, or None."""
+    try:
+        merchant_id = int(merchant_id)
+    except (TypeError, ValueError):
+        return None
+    return _lookup("merchant", ("merchant", merchant_id), "id=?", merchant_id, fresh)
+
+def merchant_by_slug(slug, fresh=False):
+    if not slug:
+        return None
+    return _lookup("merchant", ("slug", str(slug)), "slug=?", str(slug), fresh)
+
+def item_by_id(item_id, fresh=False):
+    """items row (active or not), or None."""
+    try:
+        item_id = int(item_id)
+    except (TypeError, ValueError):
+        return None
+    return _lookup("item", ("item", item_id), "id=?", item_id, fresh)
+
+def item_by_link(link_id, fresh=False):
+    if not link_id:
+        return None
+    return _lookup("item", ("link", str(link_id)), "link_id=?", str(link_id), fresh)
+
+def checkout_item(link_id, fresh=False):
+    """
+    The active item behind a checkout link plus its merchant's branding, in
+    the shape of the old items x merchants join (mid, mslug, business_name,
+    logo_url, colorway), or None.
+    """
+    i = item_by_link(link_id, fresh)
+    if i is None or not i["active"]:
+        return None
+    m = merchant_by_id(i["merchant_id"], fresh)
+    if m is None:
+        return None
+    out = dict(i)
+    out.update(business_name=m["business_name"], logo_url=m["logo_url"], mid=m["id"],
+               mslug=m["slug"], colorway=m["colorway"])
+    return out
+
+def invalidate_item(item_id=None):
+    """Forget one item (or every item when item_id is None) in this worker."""
+    _bump("invalidations")
+    with _lock:
+        if item_id is None:
+            for k in [k for k in _rows if k[0] == "item"]:
+                _drop(k)
+        else:
+            _drop(("item", int(item_id)))
+
+def invalidate_merchant(merchant_id, items=False):
+    """Forget a merchant in this worker; items=True also drops its cached items."""
+    _bump("invalidations")
+    merchant_id = int(merchant_id)
+    with _lock:
+        _drop(("merchant", merchant_id))
+        if items:
+            for k in [k for k, v in _rows.items() if k[0] == "item" and v[1]["merchant_id"] == merchant_id]:
+                _drop(k)
+
+def stats():
+    with _lock:
+        out = dict(_stats)
+        out.update(size=len(_rows), max_size=ENTITY_CACHE_SIZE, ttl_s=ENTITY_CACHE_TTL)
+    for kind in ("merchant", "item"):
+        lookups = out[kind + "_hits"] + out[kind + "_misses"]
+        out[kind + "_hit_ratio"] = round(out[kind + "_hits"] / lookups, 4) if lookups else None
+    return out
@@ -0,0 +1,75 @@
+# file_serving.py
+# Serve files from disk without reading them into memory.
+#
+# Default mode streams through send_file (wsgi.file_wrapper, i.e. sendfile(2)
+# under gunicorn) with ETag / Last-Modified validation and byte ranges.
+# Behind nginx or Apache the worker can hand the transfer off instead:
+#
+#   SEND_FILE_MODE=x-accel     X-Accel-Redirect to an internal nginx location
+#   SEND_FILE_MODE=x-sendfile  X-Sendfile with the absolute path
+#
+# X_ACCEL_LOCATIONS maps directories to internal locations for x-accel, e.g.
+#   X_ACCEL_LOCATIONS="/var/data/izzapay/uploads=/_uploads/,/app/static=/_static/"
+# Files outside every mapped directory are streamed by the worker as usual.
+import os, re, mimetypes
+from flask import Response, request, send_file
+
+SEND_FILE_MODE = os.getenv("SEND_FILE_MODE", "").strip().lower()
+
+def _parse_locations(raw):
+    out = []
+    for part in (raw or "").split(","):
+        if "=" in part:
+            d, loc = part.split("=", 1)
+            d, loc = os.path.abspath(d.strip()), loc.strip()
+            if d and loc:
+                out.append((d, loc if loc.endswith("/") else loc + "/"))
+    return out
+
+X_ACCEL_LOCATIONS = _parse_locations(os.getenv("X_ACCEL_LOCATIONS", ""))
+
+_HASH_NAME = re.compile(r"^([0-9a-f]{32}|[0-9a-f]{64})(\.[A-Za-z0-9]+)?$")
+
+def content_etag(path):
+    """Strong ETag for content-hashed filenames (<sha>.ext); None for anything else."""
+    m = _HASH_NAME.match(os.path.basename(path))
+    return m.group(1) if m else None
+
+def _accel_uri(path):
+    for d, loc in X_ACCEL_LOCATIONS:
+        if path.startswith(d + os.sep):
+            return loc + os.path.relpath(path, d).replace(os.sep, "/")
+    return None
+
+def send_local(path, mimetype=None, max_age=86400, immutable=False, etag=None):
+    """
+    Response for an existing file at `path` (already validated by the caller).
+    etag=None derives a strong ETag from a content-hash filename when possible.
+    """
+    mimetype = mimetype or mimetypes.guess_type(path)[0] or "application/octet-stream"
+    etag = etag or content_etag(path)
+    cache = f"public, max-age={int(max_age)}" + (", immutable" if immutable else "")
+
+    handoff = None
+    if SEND_FILE_MODE == "x-accel":
+        uri = _accel_uri(path)
+        if uri:
+            handoff = ("X-Accel-Redirect", uri)
+    elif SEND_FILE_MODE == "x-sendfile":
+        handoff = ("X-Sendfile", path)
+
+    if handoff:
+        st = os.stat(path)
+        resp = Response(mimetype=mimetype)
+        resp.headers[handoff[0]] = handoff[1]
+        resp.last_modified = int(st.st_mtime)
+        if etag:
+            resp.set_etag(etag)
+        resp.headers["Cache-Control"] = cache
+        # 304s are answered here; ranges and the body are left to the proxy
+        return resp.make_conditional(request, accept_ranges=False)
+
+    resp = send_file(path, mimetype=mimetype, etag=etag if etag else True,
+                     conditional=True, max_age=max_age)
+    resp.headers["Cache-Control"] = cache
+    return resp
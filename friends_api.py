@@ -2,7 +2,7 @@
 import time, sqlite3
 from typing import Optional
 from flask import Blueprint, request, jsonify, abort, session
-from db import conn as _conn
+from db import conn as _conn, register_schema, ensure_registered
 
 bp = Blueprint("friends", __name__)
 
@@ -22,49 +22,53 @@ def _current_user() -> Optional[str]:
     u = _norm_username(session.get("pi_username"))
     return u
 
+@register_schema("friends")
+def _friends_schema(cx):
+    cx.execute("""
+    CREATE TABLE IF NOT EXISTS friend_requests(
+      id INTEGER PRIMARY KEY,
+      from_user TEXT NOT NULL,
+      to_user   TEXT NOT NULL,
+      status    TEXT NOT NULL DEFAULT 'pending',  -- pending|accepted|declined|cancelled|auto_accepted
+      created_at INTEGER NOT NULL,
+      decided_at INTEGER,
+      UNIQUE(from_user, to_user) ON CONFLICT IGNORE
+    )""")
+    cx.execute("CREATE INDEX IF NOT EXISTS idx_fr_to   ON friend_requests(to_user)")
+    cx.execute("CREATE INDEX IF NOT EXISTS idx_fr_from ON friend_requests(from_user)")
+    cx.execute("CREATE INDEX IF NOT EXISTS idx_fr_to_status   ON friend_requests(to_user, status, created_at DESC)")
+    cx.execute("CREATE INDEX IF NOT EXISTS idx_fr_from_status ON friend_requests(from_user, status, created_at DESC)")
+    cx.execute("""
+    CREATE TABLE IF NOT EXISTS friendships(
+      id INTEGER PRIMARY KEY,
+      u1 TEXT NOT NULL,
+      u2 TEXT NOT NULL,
+      created_at INTEGER NOT NULL,
+      UNIQUE(u1,u2) ON CONFLICT IGNORE
+    )""")
+    cx.execute("CREATE INDEX IF NOT EXISTS idx_fs_u1 ON friendships(u1)")
+    cx.execute("CREATE INDEX IF NOT EXISTS idx_fs_u2 ON friendships(u2)")
+    cx.execute("""
+    CREATE TABLE IF NOT EXISTS battle_requests(
+      id INTEGER PRIMARY KEY,
+      from_user TEXT NOT NULL,
+      to_user   TEXT NOT NULL,
+      creature_code TEXT NOT NULL,   -- sender's chosen creature
+      status    TEXT NOT NULL DEFAULT 'pending',  -- pending|accepted|declined|cancelled
+      created_at INTEGER NOT NULL,
+      decided_at INTEGER
+    )""")
+    cx.execute("CREATE INDEX IF NOT EXISTS idx_br_to   ON battle_requests(to_user)")
+    cx.execute("CREATE INDEX IF NOT EXISTS idx_br_from ON battle_requests(from_user)")
+    cx.execute("CREATE INDEX IF NOT EXISTS idx_br_to_status ON battle_requests(to_user, status, created_at DESC)")
+    # Users table is pre-existing in your project
+    cx.execute("CREATE INDEX IF NOT EXISTS idx_users_pi_username ON users(pi_username)")
+
 def _ensure_social_tables():
-    with _db() as cx:
-        cx.execute("""
-        CREATE TABLE IF NOT EXISTS friend_requests(
-          id INTEGER PRIMARY KEY,
-          from_user TEXT NOT NULL,
-          to_user   TEXT NOT NULL,
-          status    TEXT NOT NULL DEFAULT 'pending',  -- pending|accepted|declined|cancelled|auto_accepted
-          created_at INTEGER NOT NULL,
-          decided_at INTEGER,
-          UNIQUE(from_user, to_user) ON CONFLICT IGNORE
-        )""")
-        cx.execute("CREATE INDEX IF NOT EXISTS idx_fr_to   ON friend_requests(to_user)")
-        cx.execute("CREATE INDEX IF NOT EXISTS idx_fr_from ON friend_requests(from_user)")
-        cx.execute("""
-        CREATE TABLE IF NOT EXISTS friendships(
-          id INTEGER PRIMARY KEY,
-          u1 TEXT NOT NULL,
-          u2 TEXT NOT NULL,
-          created_at INTEGER NOT NULL,
-          UNIQUE(u1,u2) ON CONFLICT IGNORE
-        )""")
-        cx.execute("CREATE INDEX IF NOT EXISTS idx_fs_u1 ON friendships(u1)")
-        cx.execute("CREATE INDEX IF NOT EXISTS idx_fs_u2 ON friendships(u2)")
-        cx.execute("""
-        CREATE TABLE IF NOT EXISTS battle_requests(
-          id INTEGER PRIMARY KEY,
-          from_user TEXT NOT NULL,
-          to_user   TEXT NOT NULL,
-          creature_code TEXT NOT NULL,   -- sender's chosen creature
-          status    TEXT NOT NULL DEFAULT 'pending',  -- pending|accepted|declined|cancelled
-          created_at INTEGER NOT NULL,
-          decided_at INTEGER
-        )""")
-        cx.execute("CREATE INDEX IF NOT EXISTS idx_br_to   ON battle_requests(to_user)")
-        cx.execute("CREATE INDEX IF NOT EXISTS idx_br_from ON battle_requests(from_user)")
-        cx.commit()
+    ensure_registered("friends")
 
 def _ensure_users_index():
-    with _db() as cx:
-        # Users table is pre-existing in your project
-        cx.execute("CREATE INDEX IF NOT EXISTS idx_users_pi_username ON users(pi_username)")
-        cx.commit()
+    ensure_registered("friends")
 
 def _are_friends(a: str, b: str) -> bool:
     u1, u2 = sorted([a, b])
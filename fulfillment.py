@@ -0,0 +1,389 @@
+# fulfillment.py
+# The database half of fulfill_session: everything a paid checkout session
+# writes, in the caller's single transaction.
+#
+# Lookups are hoisted out of the per-line loop (items, available NFT listings,
+# crafted items, buyer username: one query each) and writes are batched with
+# executemany (stock decrements, orders, NFT listings, vouchers), so a cart
+# costs about the same number of statements whatever its size. Order rows get
+# their buyer_token up front; one SELECT on idx_orders_buyer_token maps them
+# back to ids. Nothing in here opens a second write connection: that would
+# wait on this transaction's own lock.
+#
+# Side effects that talk to other services (emails, NFT claimables) are not
+# run here: the caller enqueues jobs in the same transaction (see jobs.py).
+import os, re, json, time, uuid, sqlite3
+
+import requests
+from urllib3.exceptions import NewConnectionError
+
+from db import conn, register_schema
+from jobs import handler as job_handler
+from merchant_stats import record_orders
+from page_cache import bump as bump_pages
+
+APP_BASE_URL = os.getenv("APP_BASE_URL", "https://izzapay.onrender.com").rstrip("/")
+
+@register_schema("fulfillment.vouchers")
+def _vouchers_schema(cx):
+    cx.execute("""
+        CREATE TABLE IF NOT EXISTS vouchers(
+          id INTEGER PRIMARY KEY AUTOINCREMENT,
+          token TEXT UNIQUE NOT NULL,
+          user_id INTEGER,
+          kind TEXT NOT NULL,
+          payload TEXT NOT NULL,
+          used INTEGER NOT NULL DEFAULT 0,
+          created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+          used_at TIMESTAMP
+        )
+    """)
+
+def _marks(seq):
+    return ",".join("?" * len(seq))
+
+def _insert_nft_pending_claims(cx, order_ids):
+    """
+    Enqueue pending NFT claims for the given orders: one row per (order,
+    issuer) with assets_json like ["CODE001","CODE002",...]. If only the
+    username is known at checkout, buyer_pub is left '' and backfilled later.
+    Returns the order ids that got a claim row.
+    """
+    # All listings sold by these orders
+    rows = cx.execute(
+        f"""
+        SELECT nl.order_id AS order_id,
+               nl.serial AS serial,
+               COALESCE(nl.buyer_user_id, 0) AS buyer_user_id,
+               nl.buyer_username AS buyer_username,
+               nc.code AS collection_code,
+               nc.issuer AS issuer
+        FROM nft_listings nl
+        JOIN nft_collections nc ON nc.id = nl.collection_id
+        WHERE nl.order_id IN ({_marks(order_ids)}) AND nl.status='sold'
+        ORDER BY nl.id ASC
+        """,
+        list(order_ids)
+    ).fetchall()
+
+    def _san(s: str) -> str:
+        return re.sub(r"[^A-Z0-9]", "", (s or "").upper())
+
+    # Group codes by (order, issuer)
+    groups = {}
+    for r in rows:
+        code   = _san(r["collection_code"])
+        serial = r["serial"]
+        token_code = f"{code}{int(serial):03d}" if serial is not None else code
+        slot = groups.setdefault((r["order_id"], r["issuer"]), {
+            "assets": [],
+            "buyer_user_id": r["buyer_user_id"] or None,
+            "buyer_username": (r["buyer_username"] or "").strip() or None
+        })
+        slot["assets"].append(token_code)
+
+    # Try to resolve pubs now (ok to leave empty; we backfill on read)
+    pubs = {}
+    for uid in {g["buyer_user_id"] for g in groups.values() if g["buyer_user_id"]}:
+        try:
+            w = cx.execute(
+                """
+                SELECT uw.pub
+                FROM user_wallets uw
+                JOIN users u
+                  ON u.username = uw.username
+                  OR u.pi_username = uw.username
+                WHERE u.id=? LIMIT 1
+                """,
+                (uid,)
+            ).fetchone()
+            if w and w["pub"]:
+                pubs[uid] = w["pub"]
+        except Exception:
+            pass
+
+    # One row per (order_id, issuer); ignore if already present
+    now = int(time.time())
+    cx.executemany(
+        """
+        INSERT OR IGNORE INTO nft_pending_claims
+          (order_id, buyer_user_id, buyer_username, buyer_pub,
+           issuer, assets_json, status, created_at)
+        VALUES (?, ?, ?, ?, ?, ?, 'pending', ?)
+        """,
+        [(oid, g["buyer_user_id"], g["buyer_username"], pubs.get(g["buyer_user_id"], ''), issuer,
+          json.dumps(g["assets"], separators=(",",":")), now)
+         for (oid, issuer), g in groups.items()]
+    )
+    return sorted({oid for oid, _ in groups})
+
+def _never_sent(e):
+    # refused, DNS or connect timeout: the request never reached the app
+    if isinstance(e, requests.ConnectTimeout):
+        return True
+    reason = getattr(e.args[0], "reason", None) if e.args else None
+    return isinstance(e, requests.ConnectionError) and isinstance(reason, NewConnectionError)
+
+def _issue_nft_claimables_for_order(order_id: int, buyer_user_id: int) -> bool:
+    """
+    On-chain step for a paid NFT order: POST the order's assets to
+    /api/nft/claim as claimables, one call per issuer.
+
+    /api/nft/claim pays on-chain and is not idempotent, so the one failure
+    raised (for the job to retry) is a first POST that never reached the app.
+    Anything else is logged; the order's nft_pending_claims row stays for the
+    buyer to claim.
+    """
+    # Resolve buyer pub (match on either username or pi_username)
+    with conn() as cx:
+        w = cx.execute(
+            """
+            SELECT uw.pub
+            FROM user_wallets uw
+            JOIN users u
+              ON u.username = uw.username
+              OR u.pi_username = uw.username
+            WHERE u.id=? LIMIT 1
+            """,
+            (buyer_user_id,)
+        ).fetchone()
+        if not w or not (w["pub"] or "").startswith("G"):
+            print(f"[nft_claimables] no buyer pub for user_id={buyer_user_id}")
+            return False
+        buyer_pub = w["pub"]
+
+        # Gather assets for this order (same mapping as insert helper)
+        rows = cx.execute(
+            """
+            SELECT t.serial, c.code AS collection_code, c.issuer AS issuer
+            FROM nft_listings l
+            JOIN nft_collections c ON c.id = l.collection_id
+            JOIN nft_tokens t      ON t.collection_id = c.id AND t.serial = l.serial
+            WHERE l.order_id=? AND l.status='sold'
+            """,
+            (order_id,)
+        ).fetchall()
+
+    if not rows:
+        print(f"[nft_claimables] order_id={order_id} has no sold rows")
+        return False
+
+    def _san(s: str) -> str:
+        return re.sub(r"[^A-Z0-9]", "", (s or "").upper())
+
+    by_issuer = {}
+    for r in rows:
+        code = f"{_san(r['collection_code'])}{int(r['serial']):03d}"
+        by_issuer.setdefault(r["issuer"], []).append(code[:12])
+
+    posted = 0
+    for issuer_g, codes in by_issuer.items():
+        try:
+            print(f"[nft_claimables] POST /api/nft/claim order_id={order_id} "
+                  f"buyer_pub={buyer_pub} issuer={issuer_g} assets={codes}")
+            r = requests.post(
+                f"{APP_BASE_URL}/api/nft/claim",
+                json={"buyer_pub": buyer_pub, "assets": codes, "issuer": issuer_g, "as_claimable": True},
+                timeout=12
+            )
+            posted += 1
+            if r.status_code != 200:
+                print(f"[nft_claimables] issuer={issuer_g} order_id={order_id} status={r.status_code}")
+        except Exception as e:
+            if not posted and _never_sent(e):
+                raise
+            posted += 1
+            print(f"[nft_claimables] soft-fail issuer={issuer_g} order_id={order_id}: {e}")
+    return True
+
+@job_handler("nft_claimables")
+def _nft_claimables_job(p):
+    _issue_nft_claimables_for_order(int(p["order_id"]), int(p["buyer_user_id"]))
+
+def _ic_award(it, qty):
+    """IC credits a line grants: crafted_item_id 'ic:<n>', else a sku like 'IC500'."""
+    if not it:
+        return 0
+    cid = str(it["crafted_item_id"] or "").strip().lower()
+    if cid.startswith("ic:"):
+        try:
+            unit = int(cid.split(":", 1)[1] or "0")
+        except ValueError:
+            unit = 0
+        if unit > 0:
+            return unit * qty
+    sku = (it["sku"] or "").strip().lower()
+    if sku.startswith("ic"):
+        match = re.search(r"(\d+)", sku)
+        if match and int(match.group(1)) > 0:
+            return int(match.group(1)) * qty
+    return 0
+
+def write_paid_session(cx, s, tx_hash, lines, fee_total, buyer_email, buyer_name, shipping, buyer_user_id):
+    """
+    Write a paid session inside cx's transaction: stock, orders, NFT listings
+    and pending claims, crafted-item vouchers, IC credits, the merchant's
+    daily stats, page-cache generation and the session's paid state.
+
+    Returns {"items": {id: item dict}, "order_ids", "nft_order_ids", "stock_items",
+    "ic_awarded", "vouchers"}.
+    """
+    now = int(time.time())
+    item_ids = sorted({int(li["item_id"]) for li in lines})
+    by_id = {int(r["id"]): dict(r) for r in
+             cx.execute(f"SELECT * FROM items WHERE id IN ({_marks(item_ids)})", item_ids)}
+
+    total_snapshot_gross = sum(float(li["price"]) * int(li["qty"]) for li in lines) or 1.0
+    ship_json = json.dumps(shipping)
+    orders, stock, sold, ic_awarded = [], {}, [], 0
+    for li in lines:
+        it = by_id.get(int(li["item_id"]))
+        qty = int(li["qty"])
+        line_gross = float(li["price"]) * qty
+        # Split the session-level fee proportionally across lines
+        line_fee   = float(fee_total) * (line_gross / total_snapshot_gross)
+        line_net   = line_gross - line_fee
+        if it and not it["allow_backorder"]:
+            stock[it["id"]] = stock.get(it["id"], 0) + qty
+        orders.append((s["merchant_id"], (it["id"] if it else None), qty, buyer_email, buyer_name, ship_json,
+                       float(line_gross), float(line_fee), float(line_net), tx_hash,
+                       uuid.uuid4().hex, buyer_user_id, now))
+        sold.append((line_gross, line_fee, line_net))
+        ic_awarded += _ic_award(it, qty) if buyer_user_id else 0
+
+    # ----------------- Stock -----------------
+    if stock:
+        cx.executemany("UPDATE items SET stock_qty=MAX(0, stock_qty - ?) WHERE id=?",
+                       [(q, iid) for iid, q in stock.items()])
+        bump_pages(cx, s["merchant_id"])  # storefront/explore show stock
+
+    # ----------------- Orders -----------------
+    cx.executemany(
+        """INSERT INTO orders(
+             merchant_id, item_id, qty, buyer_email, buyer_name, shipping_json,
+             pi_amount, pi_fee, pi_merchant_net, pi_tx_hash,
+             payout_status, status, buyer_token, buyer_user_id, created_at
+           )
+           VALUES (?,?,?,?,?,?,?,?,?,?,'pending','paid',?,?,?)""",
+        orders
+    )
+    tokens = [o[10] for o in orders]
+    id_of = {r["buyer_token"]: r["id"] for r in
+             cx.execute(f"SELECT id, buyer_token FROM orders WHERE buyer_token IN ({_marks(tokens)})", tokens)}
+    order_ids = [id_of[t] for t in tokens]
+    for o, oid in zip(orders, order_ids):
+        print(f"[fulfill] order_id={oid} item_id={o[1]} qty={o[2]} "
+              f"gross={o[6]:.7f} fee={o[7]:.7f} net={o[8]:.7f}")
+
+    # ----------------- Mark NFT listings as sold -----------------
+    # status 'active' or 'listed' counts as available; lines take listings in id order
+    need = {}
+    for o in orders:
+        if o[1] is not None:
+            need[o[1]] = need.get(o[1], 0) + o[2]
+    avail = {}
+    if need:
+        for r in cx.execute(
+            f"""WITH need(item_id, n) AS (VALUES {",".join("(?,?)" for _ in need)})
+                SELECT l.id, l.item_id FROM (
+                  SELECT id, item_id, ROW_NUMBER() OVER (PARTITION BY item_id ORDER BY id) AS rn
+                  FROM nft_listings
+                  WHERE item_id IN (SELECT item_id FROM need) AND status IN ('active','listed')
+                ) l JOIN need ON need.item_id = l.item_id
+                WHERE l.rn <= need.n
+                ORDER BY l.id""",
+            [v for kv in need.items() for v in kv]
+        ):
+            avail.setdefault(r["item_id"], []).append(r["id"])
+    marks, nft_orders = [], []
+    for o, oid in zip(orders, order_ids):
+        pool = avail.get(o[1]) or []
+        if len(pool) >= o[2]:
+            ids, avail[o[1]] = pool[:o[2]], pool[o[2]:]
+            marks.extend((oid, lid) for lid in ids)
+            nft_orders.append(oid)
+            print(f"[fulfill][nft] marked SOLD {len(ids)} listings item_id={o[1]} order_id={oid} ids={ids}")
+        elif pool:
+            print(f"[fulfill][nft] expected {o[2]} listings but found {len(pool)} "
+                  f"for item_id={o[1]} — nothing marked sold")
+    if marks:
+        urow = cx.execute(
+            "SELECT COALESCE(NULLIF(username,''), NULLIF(pi_username,'')) AS un FROM users WHERE id=?",
+            (buyer_user_id,)
+        ).fetchone()
+        buyer_un = (urow["un"] if urow and urow["un"] else None)
+        cx.executemany(
+            "UPDATE nft_listings SET status='sold', order_id=?, buyer_user_id=?, buyer_username=?, sold_at=? "
+            "WHERE id=?",
+            [(oid, buyer_user_id, buyer_un, now, lid) for oid, lid in marks]
+        )
+        try:
+            claimed = _insert_nft_pending_claims(cx, nft_orders)
+            print(f"[fulfill][nft] claim rows ensured for order_ids={claimed}")
+        except Exception as e:
+            print(f"[fulfill][nft] pending-claim insert failed order_ids={nft_orders}: {e}")
+
+    # ----------------- Crafted items -> vouchers -----------------
+    crafting = [(o, by_id[o[1]]) for o in orders
+                if o[1] is not None and by_id[o[1]]["fulfillment_kind"] == "crafting" and by_id[o[1]]["crafted_item_id"]]
+    vouchers = []
+    if crafting:
+        cids = sorted({str(it["crafted_item_id"]).strip() for _, it in crafting})
+        try:
+            crafted = {str(r["id"]): r for r in cx.execute(
+                "SELECT id, name, COALESCE(svg,'') AS svg, COALESCE(meta,'{}') AS meta "
+                f"FROM crafted_items WHERE id IN ({_marks(cids)})", cids)}
+        except sqlite3.Error as e:
+            print(f"[fulfill][craft] crafted item lookup failed, no vouchers: {e}")
+            crafting = []
+        for o, it in crafting:
+            crafted_id = str(it["crafted_item_id"]).strip()
+            c_row = crafted.get(crafted_id)
+            try:
+                c_meta = json.loads(c_row["meta"]) if c_row and c_row["meta"] else {}
+            except Exception:
+                c_meta = {}
+            payload = json.dumps({
+                "kind": "crafted_item",
+                "title": it["title"] or (c_row and c_row["name"]) or "Crafted Item",
+                "crafted_item_id": crafted_id,
+                "ic": int(c_meta.get("price_ic") or 500),
+                "meta": c_meta,
+                "svg": (c_row["svg"] if c_row else "") or "",
+            })
+            vouchers.extend((uuid.uuid4().hex, payload) for _ in range(o[2]))
+    # The payment is already taken: a failed side grant (vouchers, IC) is
+    # undone on its own savepoint and logged; the orders still commit.
+    if vouchers:
+        uid = int(buyer_user_id) if buyer_user_id else None
+        cx.execute("SAVEPOINT vouchers")
+        try:
+            cx.executemany("INSERT INTO vouchers(token, user_id, kind, payload) VALUES(?,?,'crafted_item',?)",
+                           [(tok, uid, payload) for tok, payload in vouchers])
+            cx.executemany("INSERT INTO voucher_redirects(token, session_id, payment_id, created_at, used) "
+                           "VALUES(?,?,?,?,0)",
+                           [(tok, s["id"], tx_hash, now) for tok, _ in vouchers])
+            print(f"[fulfill][craft] vouchers created n={len(vouchers)}")
+        except Exception as e:
+            cx.execute("ROLLBACK TO vouchers")
+            print(f"[fulfill][craft] voucher create error session_id={s['id']}: {e}")
+            vouchers = []
+        cx.execute("RELEASE vouchers")
+
+    # ----------------- IC credits -----------------
+    if ic_awarded:
+        cx.execute("SAVEPOINT ic_credits")
+        try:
+            cx.execute("UPDATE users SET ic_credits=MAX(0, COALESCE(ic_credits, 0) + ?) WHERE id=?",
+                       (ic_awarded, int(buyer_user_id)))
+            print(f"[fulfill][ic] awarded={ic_awarded} user_id={buyer_user_id}")
+        except Exception as e:
+            cx.execute("ROLLBACK TO ic_credits")
+            print(f"[fulfill][ic] award error user_id={buyer_user_id} ic={ic_awarded}: {e}")
+            ic_awarded = 0
+        cx.execute("RELEASE ic_credits")
+
+    record_orders(cx, s["merchant_id"], sold)
+    cx.execute("UPDATE sessions SET state='paid', pi_tx_hash=? WHERE id=?", (tx_hash, s["id"]))
+    return {"items": by_id, "order_ids": order_ids, "nft_order_ids": nft_orders, "stock_items": list(stock),
+            "ic_awarded": ic_awarded, "vouchers": len(vouchers)}
@@ -4,8 +4,10 @@ import json  # <-- ADDED
 from datetime import timedelta
 from flask import Flask, render_template, session, request, redirect, url_for, jsonify
 from dotenv import load_dotenv
-from db import conn
-import requests  # <-- ADDED for LibreTranslate proxy
+from db import conn, register_schema, ensure_registered
+from identity import user_by_id
+from i18n_boot import install as install_i18n_boot
+from translation_memory import translate_one as tm_translate_one
 import time
 
 load_dotenv()
@@ -87,9 +89,7 @@ def current_user_row():
             uid = verify_login_token(tok)
     if not uid:
         return None
-    with conn() as cx:
-        row = cx.execute("SELECT * FROM users WHERE id=?", (uid,)).fetchone()
-        return row
+    return user_by_id(uid)
 
 
 def _is_admin(urow) -> bool:
@@ -205,6 +205,42 @@ def _get_profile(user_id=None):
     return profile
 
 
+@register_schema("game.crafts_feed")
+def _crafts_feed_schema(cx):
+    cx.execute("""
+    CREATE TABLE IF NOT EXISTS crafted_items(
+      id INTEGER PRIMARY KEY AUTOINCREMENT,
+      user_id INTEGER NOT NULL,
+      name TEXT,
+      svg TEXT,
+      sku TEXT,
+      image TEXT,
+      meta TEXT,
+      created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )""")
+    cx.execute("""
+    CREATE TABLE IF NOT EXISTS ic_orders(
+      id INTEGER PRIMARY KEY AUTOINCREMENT,
+      user_id INTEGER NOT NULL,
+      title TEXT,
+      svg TEXT,
+      part TEXT,
+      created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )""")
+    cx.execute("""
+    CREATE TABLE IF NOT EXISTS pi_orders(
+      order_id TEXT PRIMARY KEY,
+      user_id INTEGER NOT NULL,
+      title TEXT,
+      thumb_url TEXT,
+      store TEXT,
+      crafted_item_id TEXT,
+      claimed INTEGER DEFAULT 0,
+      created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )""")
+    cx.execute("CREATE INDEX IF NOT EXISTS idx_ic_orders_user ON ic_orders(user_id, id DESC)")
+    cx.execute("CREATE INDEX IF NOT EXISTS idx_pi_orders_user ON pi_orders(user_id, created_at DESC)")
+
 # -------------------- routes --------------------
 @app.get("/api/crafts/feed")
 def crafts_feed():
@@ -213,19 +249,9 @@ def crafts_feed():
         return jsonify(ok=True, creations=[], purchases_ic=[], purchases_pi=[])
 
     uid = u["id"]
+    ensure_registered("game.crafts_feed")
     with conn() as cx:
         # Creations (items the player minted)
-        cx.execute("""
-        CREATE TABLE IF NOT EXISTS crafted_items(
-          id INTEGER PRIMARY KEY AUTOINCREMENT,
-          user_id INTEGER NOT NULL,
-          name TEXT,
-          svg TEXT,
-          sku TEXT,
-          image TEXT,
-          meta TEXT,
-          created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )""")
         rows_c = cx.execute(
             "SELECT id, name, COALESCE(sku,'') AS sku, COALESCE(image,'') AS image, COALESCE(meta,'{}') AS meta "
             "FROM crafted_items WHERE user_id=? ORDER BY id DESC LIMIT 500",
@@ -240,15 +266,6 @@ def crafts_feed():
         } for r in rows_c]
 
         # IC purchases (from your in-game shop)
-        cx.execute("""
-        CREATE TABLE IF NOT EXISTS ic_orders(
-          id INTEGER PRIMARY KEY AUTOINCREMENT,
-          user_id INTEGER NOT NULL,
-          title TEXT,
-          svg TEXT,
-          part TEXT,
-          created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )""")
         rows_ic = cx.execute(
             "SELECT id, COALESCE(title,'') AS title, COALESCE(svg,'') AS svg, COALESCE(part,'') AS part "
             "FROM ic_orders WHERE user_id=? ORDER BY id DESC LIMIT 500",
@@ -262,17 +279,6 @@ def crafts_feed():
         } for r in rows_ic]
 
         # Pi purchases (from your Pi checkout bridge; keep 'claimed' flag)
-        cx.execute("""
-        CREATE TABLE IF NOT EXISTS pi_orders(
-          order_id TEXT PRIMARY KEY,
-          user_id INTEGER NOT NULL,
-          title TEXT,
-          thumb_url TEXT,
-          store TEXT,
-          crafted_item_id TEXT,
-          claimed INTEGER DEFAULT 0,
-          created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )""")
         rows_pi = cx.execute(
             "SELECT order_id, COALESCE(title,'') AS title, COALESCE(thumb_url,'') AS thumb_url, "
             "COALESCE(store,'') AS store, COALESCE(crafted_item_id,'') AS crafted_item_id, "
@@ -610,150 +616,9 @@ def api_wallet_me():
     return jsonify({"ok": True, "coins": 0, "crafting": 0})
 
 
-# -------- Auto-translate injector (global) --------
-I18N_SNIPPET = r"""
-<script>
-if(!window.__IZZA_I18N_BOOTED__){
-  window.__IZZA_I18N_BOOTED__=true;
-
-  // Same-origin proxy — main app serves /api/translate
-  window.TRANSLATE_TEXT = async (text, from, to) => {
-    try {
-      const r = await fetch('/api/translate', {
-        method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ text, from, to })
-      });
-      const j = await r.json();
-      return (j && j.ok && typeof j.text === 'string') ? j.text : text;
-    } catch {
-      return text;
-    }
-  };
-
-  (function(){
-    const LANG_KEY='izzaLang';
-
-    // >>> ONLY RUN IF USER PICKED A LANGUAGE <<<
-    const raw = localStorage.getItem(LANG_KEY);
-    if (!raw) return; // user hasn't chosen — do nothing
-
-    const to   = String(raw).slice(0,5);
-    const from = (document.documentElement.getAttribute('lang')||'en').slice(0,5);
-    if (!to || to === from) return; // nothing to translate — do nothing
-
-    if (typeof window.TRANSLATE_TEXT!=='function'){ window.TRANSLATE_TEXT=async t=>t; }
-
-    // Elements to always skip
-    const SKIP_TAGS=new Set(['SCRIPT','STYLE','NOSCRIPT','CODE','PRE','TEXTAREA','INPUT','SELECT','OPTION']);
-
-    // --- Sensitive text detectors (avoid touching keys / hashes) ---
-    function isLikelyStellarPubKey(s){
-      const t=s.replace(/\s+/g,'').trim();
-      return /^G[A-Z2-7]{55}$/.test(t);
-    }
-    function isLongBase32ish(s){
-      const t=s.replace(/\s+/g,'').trim();
-      return /^[A-Z0-9]{30,}$/.test(t);
-    }
-    function isLongHexHash(s){
-      const t=s.replace(/\s+/g,'').trim();
-      return /^[a-fA-F0-9]{40,}$/.test(t);
-    }
-    function isSensitiveText(s){
-      if(!s || s.length<10) return false;
-      return isLikelyStellarPubKey(s) || isLongBase32ish(s) || isLongHexHash(s);
-    }
-
-    function collect(root){
-      const nodes=[];
-      const w=document.createTreeWalker(
-        root,
-        NodeFilter.SHOW_TEXT,
-        { acceptNode(n){
-            const p=n.parentElement;
-            if(!p) return NodeFilter.FILTER_REJECT;
-            if(SKIP_TAGS.has(p.tagName)) return NodeFilter.FILTER_REJECT;
-            if(p.closest('[data-no-i18n="1"]')) return NodeFilter.FILTER_REJECT;
-
-            const s=n.nodeValue;
-            if(!s || !s.trim()) return NodeFilter.FILTER_REJECT;
-
-            if(isSensitiveText(s)) return NodeFilter.FILTER_REJECT;
-
-            return NodeFilter.FILTER_ACCEPT;
-          }
-        }
-      );
-      let n; while((n=w.nextNode())) nodes.push(n);
-      return nodes;
-    }
-
-    async function translate(nodes){
-      for(const n of nodes){
-        try{
-          const p=n.parentElement;
-          if(!p || p.closest('[data-no-i18n="1"]')) continue;
-          if(isSensitiveText(n.nodeValue)) continue;
-
-          const orig=(p?.dataset?.i18nOriginal) ?? n.nodeValue;
-          const out=await window.TRANSLATE_TEXT(orig,from,to);
-          if(p && p.dataset && !p.dataset.i18nOriginal) p.dataset.i18nOriginal=orig;
-          if(typeof out==='string' && out && out!==n.nodeValue) n.nodeValue=out;
-        }catch{}
-      }
-    }
-
-    async function run(){ await translate(collect(document.body)); }
-
-    const mo=new MutationObserver(muts=>{
-      const batch=[];
-      for(const m of muts){
-        if(m.type==='childList'){
-          m.addedNodes && m.addedNodes.forEach(nd=>{
-            if(nd.nodeType===1) batch.push(...collect(nd));
-            else if(nd.nodeType===3) batch.push(nd);
-          });
-        } else if(m.type==='characterData' && m.target && m.target.nodeType===3){
-          batch.push(m.target);
-        }
-      }
-      if(batch.length) translate(batch);
-    });
-
-    function arm(){ try{ mo.observe(document.body,{childList:true,characterData:true,subtree:true}); }catch{} }
-
-    if(document.readyState==='loading'){
-      document.addEventListener('DOMContentLoaded',()=>{ run(); arm(); },{once:true});
-    } else { run(); arm(); }
-  })();
-}
-</script>
-"""
-
-@app.after_request
-def _inject_i18n(resp):
-    try:
-        # Only mutate HTML pages, status 200, and only if not opted-out.
-        ctype = resp.headers.get("Content-Type", "")
-        if resp.status_code == 200 and "text/html" in ctype:
-            body = resp.get_data(as_text=True)
-            # allow opt-out by putting data-no-global-i18n="1" in the document
-            if 'data-no-global-i18n="1"' not in body and "__IZZA_I18N_BOOTED__" not in body:
-                lower = body.lower()
-                i = lower.rfind("</body>")
-                if i != -1:
-                    body = body[:i] + I18N_SNIPPET + body[i:]
-                    resp.set_data(body)
-                    try:
-                        resp.headers["Content-Length"] = str(len(body.encode("utf-8")))
-                    except Exception:
-                        pass
-    except Exception:
-        # never break the response if injection fails
-        pass
-    return resp
-# -------- /Auto-translate injector --------
+# -------- Auto-translate bootstrap --------
+# static/js/i18n-boot.js, included by templates via {{ i18n_boot_tag }}
+install_i18n_boot(app)
 
 # ===== Crafting Land API (lives under /izza-game/api/crafting) =====
 from flask import Blueprint, current_app
@@ -1338,26 +1203,8 @@ def game_translate_api():
         if not LIBRE_EP:
             return {"ok": True, "text": text}
 
-        r = requests.post(
-            f"{LIBRE_EP}/translate",
-            timeout=12,
-            json={
-                "q": text,
-                "source": ("auto" if src == "auto" else src),
-                "target": dest,
-                "format": "text"
-            }
-        )
-        if r.status_code == 200:
-            try:
-                out = r.json().get("translatedText")
-                if isinstance(out, str) and out:
-                    return {"ok": True, "text": out}
-            except Exception:
-                pass
-
-        # Fallback to original text on any unexpected response
-        return {"ok": True, "text": text}
+        # translation memory falls back to the original text on any upstream failure
+        return {"ok": True, "text": tm_translate_one(text, src, dest)}
     except Exception:
         # Fail-open: return original text so the UI still renders
         return {"ok": True, "text": text}
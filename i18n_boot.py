@@ -0,0 +1,35 @@
+# i18n_boot.py
+# Auto-translate bootstrap, served as a static, content-versioned JS file.
+#
+# Pages include it through the `i18n_boot_tag` template global (templates put
+# {{ i18n_boot_tag }} just before </body>; pages that opt out simply leave it
+# out). The URL carries a hash of the file, so browsers cache it forever and
+# a deploy that changes the script changes the URL.
+import os, hashlib
+from flask import Response, request
+from markupsafe import Markup
+
+I18N_BOOT_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static", "js", "i18n-boot.js")
+
+with open(I18N_BOOT_FILE, "rb") as _f:
+    _BODY = _f.read()
+
+I18N_BOOT_VERSION = hashlib.sha1(_BODY).hexdigest()[:12]
+I18N_BOOT_URL = f"/i18n/boot.{I18N_BOOT_VERSION}.js"
+I18N_BOOT_TAG = Markup(f'<script src="{I18N_BOOT_URL}" defer></script>')
+
+def serve_boot_js(ver):
+    resp = Response(_BODY, mimetype="application/javascript")
+    if ver == I18N_BOOT_VERSION:
+        resp.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+    else:
+        # stale page asking for an old version: hand out the current one, don't pin it
+        resp.headers["Cache-Control"] = "no-cache"
+    resp.set_etag(I18N_BOOT_VERSION)
+    return resp.make_conditional(request)
+
+def install(flask_app, serve=False):
+    """Expose {{ i18n_boot_tag }} to templates; serve=True also registers the JS route."""
+    flask_app.jinja_env.globals["i18n_boot_tag"] = I18N_BOOT_TAG
+    if serve:
+        flask_app.add_url_rule("/i18n/boot.<ver>.js", "i18n_boot_js", serve_boot_js)
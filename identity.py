@@ -0,0 +1,147 @@
+# identity.py
+# One place to turn a user id / pi_uid / username into a users row.
+#
+# Two layers:
+#   - flask.g: a row is looked up at most once per request, however many
+#     helpers ask for it (current_user_row, fulfill_session, mp_api, ...)
+#   - a small in-process LRU with a TTL, shared by requests in this worker.
+#     Code that changes a users row calls invalidate_user(uid); other workers
+#     catch up when the TTL runs out.
+import os, time, threading
+from collections import OrderedDict
+from flask import g, has_request_context
+
+from db import conn_ro
+
+IDENTITY_CACHE_SIZE = int(os.getenv("IDENTITY_CACHE_SIZE", "2048"))
+IDENTITY_CACHE_TTL = float(os.getenv("IDENTITY_CACHE_TTL", "30"))  # seconds; 0 disables the LRU
+
+_lock = threading.Lock()
+_rows = OrderedDict()   # uid -> (expires_at, row)
+_alias = {}             # ("pi_uid", v) | ("name", v) -> uid
+_stats = {"lookups": 0, "request_hits": 0, "lru_hits": 0, "queries": 0, "invalidations": 0}
+
+def _norm_name(v):
+    return str(v or "").strip().lstrip("@").lower()
+
+def _bump(k, n=1):
+    with _lock:
+        _stats[k] += n
+
+def _req_memo():
+    if not has_request_context():
+        return None
+    memo = getattr(g, "_identity_rows", None)
+    if memo is None:
+        memo = g._identity_rows = {}
+    return memo
+
+def _lru_get(uid):
+    if IDENTITY_CACHE_TTL <= 0:
+        return None
+    with _lock:
+        hit = _rows.get(uid)
+        if not hit:
+            return None
+        if hit[0] < time.time():
+            _rows.pop(uid, None)
+            return None
+        _rows.move_to_end(uid)
+        return hit[1]
+
+def _lru_put(row):
+    if IDENTITY_CACHE_TTL <= 0 or row is None:
+        return
+    uid = int(row["id"])
+    keys = row.keys()
+    with _lock:
+        _rows[uid] = (time.time() + IDENTITY_CACHE_TTL, row)
+        _rows.move_to_end(uid)
+        if "pi_uid" in keys and row["pi_uid"]:
+            _alias[("pi_uid", str(row["pi_uid"]))] = uid
+        if "pi_username" in keys and row["pi_username"]:
+            _alias[("name", _norm_name(row["pi_username"]))] = uid
+        while len(_rows) > IDENTITY_CACHE_SIZE:
+            old, _ = _rows.popitem(last=False)
+            for k in [k for k, v in _alias.items() if v == old]:
+                _alias.pop(k, None)
+
+def _fetch(where, arg):
+    _bump("queries")
+    with conn_ro() as cx:
+        return cx.execute(f"SELECT * FROM users WHERE {where}", (arg,)).fetchone()
+
+def user_by_id(uid):
+    """users row for uid, or None."""
+    try:
+        uid = int(uid)
+    except (TypeError, ValueError):
+        return None
+    _bump("lookups")
+    memo = _req_memo()
+    if memo is not None and uid in memo:
+        _bump("request_hits")
+        return memo[uid]
+    row = _lru_get(uid)
+    if row is not None:
+        _bump("lru_hits")
+    else:
+        row = _fetch("id=?", uid)
+        _lru_put(row)
+    if memo is not None:
+        memo[uid] = row
+    return row
+
+def _by_alias(key, where, arg):
+    with _lock:
+        uid = _alias.get(key)
+    if uid is not None:
+        row = user_by_id(uid)
+        if row is not None:
+            return row
+    _bump("lookups")
+    row = _fetch(where, arg)
+    if row is not None:
+        _lru_put(row)
+        memo = _req_memo()
+        if memo is not None:
+            memo[int(row["id"])] = row
+    return row
+
+def user_by_pi_uid(pi_uid):
+    if not pi_uid:
+        return None
+    return _by_alias(("pi_uid", str(pi_uid)), "pi_uid=?", str(pi_uid))
+
+def user_by_username(username):
+    """Case-insensitive, ignores a leading '@'."""
+    want = _norm_name(username)
+    if not want:
+        return None
+    return _by_alias(("name", want), "LOWER(REPLACE(pi_username,'@',''))=?", want)
+
+def invalidate_user(uid=None):
+    """Forget a user (or everyone when uid is None) in this worker and this request."""
+    _bump("invalidations")
+    with _lock:
+        if uid is None:
+            _rows.clear()
+            _alias.clear()
+        else:
+            uid = int(uid)
+            _rows.pop(uid, None)
+            for k in [k for k, v in _alias.items() if v == uid]:
+                _alias.pop(k, None)
+    memo = _req_memo()
+    if memo is not None:
+        if uid is None:
+            memo.clear()
+        else:
+            memo.pop(uid, None)
+
+def stats():
+    with _lock:
+        out = dict(_stats)
+        out.update(size=len(_rows), max_size=IDENTITY_CACHE_SIZE, ttl_s=IDENTITY_CACHE_TTL)
+    out["saved"] = out["request_hits"] + out["lru_hits"]
+    return out
@@ -0,0 +1,262 @@
+# image_variants.py
+# Resized / re-encoded derivatives for /uimg (?w=&h=&fit=&fmt=).
+#
+# A derivative is rendered once with Pillow and stored content-addressed under
+# VARIANT_DIR (next to the uploads dir): the file name is a hash of the source
+# identity plus the normalized parameters, so the same request always maps to
+# the same immutable file. Rendering is capped per process
+# (IMG_VARIANT_CONCURRENCY); when every slot stays busy for IMG_VARIANT_WAIT_S
+# the caller gets None and serves the original instead of queueing.
+#
+# Any source (remote /uimg URLs included) can be asked for many sizes, so the
+# directory is byte-bounded like uimg_cache: past IMG_VARIANT_MAX_BYTES the
+# least-recently-served files go first (serving touches a file's mtime) and
+# are simply re-rendered if asked for again.
+import os, hashlib, tempfile, threading
+from io import BytesIO
+from urllib.parse import quote
+
+from PIL import Image, ImageOps
+
+DATA_ROOT = os.getenv("DATA_ROOT", "/var/data/izzapay")
+VARIANT_DIR = os.getenv("IMG_VARIANT_DIR", os.path.join(DATA_ROOT, "variants"))
+IMG_VARIANT_CONCURRENCY = int(os.getenv("IMG_VARIANT_CONCURRENCY", "2"))
+IMG_VARIANT_WAIT_S = float(os.getenv("IMG_VARIANT_WAIT_S", "3"))
+IMG_VARIANT_MAX_BYTES = int(os.getenv("IMG_VARIANT_MAX_BYTES", str(1024 * 1024 * 1024)))
+IMG_VARIANT_MAX_DIM = 2048   # same cap as upload()
+IMG_VARIANT_STEP = 32        # sizes are rounded up to this, so callers can't mint endless variants
+_VERSION = "1"               # bump to re-render every derivative
+
+FITS = ("contain", "cover")
+FORMATS = {"webp": ("WEBP", "webp", "image/webp"),
+           "avif": ("AVIF", "avif", "image/avif"),
+           "jpeg": ("JPEG", "jpg", "image/jpeg"),
+           "jpg":  ("JPEG", "jpg", "image/jpeg"),
+           "png":  ("PNG", "png", "image/png")}
+_SOURCE_FMT = {"JPEG": "jpeg", "PNG": "png", "WEBP": "webp", "GIF": "png"}
+
+_slots = threading.BoundedSemaphore(max(1, IMG_VARIANT_CONCURRENCY))
+_key_locks = {}
+_key_locks_mu = threading.Lock()
+_stats = {"hits": 0, "rendered": 0, "busy": 0, "errors": 0, "evicted": 0}
+_total = None            # bytes in VARIANT_DIR, scanned lazily
+
+def _bump(k):
+    with _key_locks_mu:
+        _stats[k] += 1
+
+def _files():
+    for root, _, files in os.walk(VARIANT_DIR):
+        for f in files:
+            if not f.endswith(".part"):
+                yield os.path.join(root, f)
+
+def _scan_total():
+    total = 0
+    for p in _files():
+        try: total += os.path.getsize(p)
+        except OSError: pass
+    return total
+
+def account(path):
+    """Count a newly rendered derivative against IMG_VARIANT_MAX_BYTES, evicting if over."""
+    global _total
+    try:
+        size = os.path.getsize(path)
+    except OSError:
+        return
+    with _key_locks_mu:
+        if _total is None:
+            _total = _scan_total()
+        else:
+            _total += size
+        over = _total > IMG_VARIANT_MAX_BYTES
+    if over:
+        _evict()
+
+def _evict():
+    """Drop least-recently-served derivatives until the directory is back under 90% of its cap."""
+    global _total
+    files = []
+    for p in _files():
+        try:
+            st = os.stat(p)
+            files.append((st.st_mtime, st.st_size, p))
+        except OSError:
+            pass
+    files.sort()
+    total = sum(f[1] for f in files)
+    target = int(IMG_VARIANT_MAX_BYTES * 0.9)
+    n = 0
+    for _, size, p in files:
+        if total <= target:
+            break
+        try:
+            os.remove(p)
+            total -= size
+            n += 1
+        except OSError:
+            pass
+    with _key_locks_mu:
+        _total = total
+        _stats["evicted"] += n
+
+def _dim(v):
+    try:
+        v = int(v)
+    except (TypeError, ValueError):
+        return None
+    if v <= 0:
+        return None
+    v = -(-v // IMG_VARIANT_STEP) * IMG_VARIANT_STEP
+    return min(v, IMG_VARIANT_MAX_DIM)
+
+def parse_params(args):
+    """Normalized (w, h, fit, fmt) from request args, or None when no variant was asked for."""
+    w, h = _dim(args.get("w")), _dim(args.get("h"))
+    fmt = (args.get("fmt") or "").strip().lower() or None
+    if fmt is not None and fmt not in FORMATS:
+        fmt = None
+    if not (w or h or fmt):
+        return None
+    fit = (args.get("fit") or "contain").strip().lower()
+    if fit not in FITS or not (w and h):
+        fit = "contain"
+    return w, h, fit, fmt
+
+def source_id(path):
+    """Identity of a source file: content hash in the name if there is one, else path+mtime+size."""
+    stem = os.path.basename(path).split(".", 1)[0]
+    if len(stem) in (32, 64) and all(c in "0123456789abcdef" for c in stem):
+        return stem
+    st = os.stat(path)
+    return hashlib.sha1(f"{os.path.abspath(path)}|{st.st_mtime_ns}|{st.st_size}".encode()).hexdigest()
+
+def _key_lock(key):
+    with _key_locks_mu:
+        lk = _key_locks.get(key)
+        if lk is None:
+            lk = _key_locks[key] = threading.Lock()
+        return lk
+
+def _render(src_path, w, h, fit, pil_fmt):
+    with Image.open(src_path) as img:
+        if img.format == "JPEG" and (w or h):
+            img.draft("RGB", (w or 1, h or 1))  # let libjpeg decode at a reduced scale
+        img = ImageOps.exif_transpose(img)
+        if fit == "cover":
+            if img.width >= w and img.height >= h:
+                img = ImageOps.fit(img, (w, h), method=Image.LANCZOS)
+            else:
+                img.thumbnail((w, h), Image.LANCZOS)
+        elif w or h:
+            img.thumbnail((w or IMG_VARIANT_MAX_DIM, h or IMG_VARIANT_MAX_DIM), Image.LANCZOS)
+        has_alpha = "A" in img.mode or (img.mode == "P" and "transparency" in img.info)
+        buf = BytesIO()
+        if pil_fmt == "JPEG":
+            if has_alpha:
+                bg = Image.new("RGB", img.size, (255, 255, 255))
+                bg.paste(img.convert("RGBA"), mask=img.convert("RGBA").split()[-1])
+                img = bg
+            elif img.mode != "RGB":
+                img = img.convert("RGB")
+            img.save(buf, format="JPEG", quality=82, optimize=True, progressive=True)
+        elif pil_fmt == "PNG":
+            if img.mode not in ("RGB", "RGBA", "L", "LA"):
+                img = img.convert("RGBA" if has_alpha else "RGB")
+            img.save(buf, format="PNG", optimize=True)
+        else:
+            if img.mode not in ("RGB", "RGBA"):
+                img = img.convert("RGBA" if has_alpha else "RGB")
+            if pil_fmt == "WEBP":
+                img.save(buf, format="WEBP", quality=80, method=4)
+            else:
+                img.save(buf, format="AVIF", quality=60)
+        return buf.getvalue()
+
+def get_variant(src_path, params, src_id=None):
+    """
+    (path, etag, mimetype) of the derivative for `params` (from parse_params),
+    rendering it if needed. None when the source can't or shouldn't be
+    resized (SVG, animated GIF, unreadable) or all render slots are busy.
+    """
+    w, h, fit, fmt = params
+    if src_path.lower().endswith(".svg"):
+        return None
+    try:
+        src_id = src_id or source_id(src_path)
+        if fmt is None:
+            with Image.open(src_path) as probe:
+                if getattr(probe, "is_animated", False):
+                    return None
+                fmt = _SOURCE_FMT.get(probe.format or "", "png")
+    except Exception:
+        _bump("errors")
+        return None
+    path, key, mimetype = variant_target(src_id, (w, h, fit, fmt))
+    try:
+        os.utime(path, None)  # LRU clock; fails when not rendered (or evicted)
+        _bump("hits")
+        return path, key, mimetype
+    except OSError:
+        pass
+
+    if not _slots.acquire(timeout=IMG_VARIANT_WAIT_S):
+        _bump("busy")
+        return None
+    try:
+        with _key_lock(key):
+            if not os.path.exists(path):  # another thread may have just rendered it
+                render_to(src_path, (w, h, fit, fmt), path)
+                _bump("rendered")
+                account(path)
+        return path, key, mimetype
+    except Exception as e:
+        _bump("errors")
+        print("[IMG] variant render failed:", repr(e))
+        return None
+    finally:
+        _slots.release()
+        with _key_locks_mu:
+            _key_locks.pop(key, None)
+
+def variant_target(src_id, params):
+    """(path, key, mimetype) where the derivative for params (fmt resolved) lives."""
+    w, h, fit, fmt = params
+    pil_fmt, ext, mimetype = FORMATS[fmt]
+    key = hashlib.sha256(f"{src_id}|{w}|{h}|{fit}|{pil_fmt}|{_VERSION}".encode()).hexdigest()[:32]
+    return os.path.join(VARIANT_DIR, key[:2], f"{key}.{ext}"), key, mimetype
+
+def render_to(src_path, params, path):
+    """Render one derivative and move it into place atomically. Safe to run in a worker process."""
+    w, h, fit, fmt = params
+    data = _render(src_path, w, h, fit, FORMATS[fmt][0])
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".part")
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+    return path
+
+def thumb_url(u, w=None, h=None, fmt="webp", fit=None):
+    """Jinja filter: /uimg URL for a derivative of an image URL at most w wide / h high."""
+    u = (u or "").strip()
+    if not u or not (w or h):
+        return u
+    for origin in ("https://izzapay.onrender.com",):
+        if u.startswith(origin + "/media/"):
+            u = u[len(origin):]
+    if not (u.startswith(("/media/", "/static/", "https://", "http://"))):
+        return u
+    if u.lower().split("?", 1)[0].endswith(".svg"):
+        return u if u.startswith("/") else f"/uimg?src={quote(u, safe='')}"
+    out = f"/uimg?src={quote(u, safe='')}"
+    for k, v in (("w", w), ("h", h), ("fit", fit), ("fmt", fmt)):
+        if v:
+            out += f"&{k}={v}"
+    return out
+
+def stats():
+    with _key_locks_mu:
+        return dict(_stats, concurrency=IMG_VARIANT_CONCURRENCY, dir=VARIANT_DIR,
+                    bytes_cached=_total, max_bytes=IMG_VARIANT_MAX_BYTES)
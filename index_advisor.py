@@ -0,0 +1,436 @@
+# index_advisor.py
+#
+# Index advisor for the SQL in this codebase.
+#   1. pulls every SELECT/UPDATE/DELETE string literal out of the *.py modules
+#   2. builds a scratch database (all migrations + every CREATE TABLE literal)
+#      and fills each table with synthetic rows, or uses a copy you pass in
+#   3. runs EXPLAIN QUERY PLAN and flags full table scans and temp B-trees
+#   4. proposes an index per flagged query (equality columns, then the
+#      range / ORDER BY column; lower(col) becomes an expression index),
+#      keeps only the ones that actually change the plan, and times the
+#      query before and after
+#   5. prints a db.py migration with the surviving indexes
+#
+#   python index_advisor.py                      # scratch db, 5000 rows/table
+#   python index_advisor.py --db /path/backup.sqlite --rows 0
+#   python index_advisor.py --out /tmp/m.py --verbose
+#
+# Never point --db at the live file: candidate indexes are created in it.
+
+import os, re, ast, sys, time, random, shutil, argparse, sqlite3, tempfile
+from datetime import date
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+SKIP_DIRS = {"bench", "static", "templates", "node_modules", "izza_token", "__pycache__", ".git"}
+
+_QUERY_HEAD = re.compile(r"^\s*(SELECT|WITH|UPDATE|DELETE)\b", re.I)
+_DDL_HEAD = re.compile(r"^\s*CREATE\s+(TABLE|UNIQUE\s+INDEX|INDEX)\b", re.I)
+_KEYWORDS = {"WHERE", "JOIN", "LEFT", "INNER", "OUTER", "CROSS", "ON", "ORDER", "GROUP",
+             "LIMIT", "SET", "USING", "AS", "NATURAL", "UNION", "HAVING", "WINDOW"}
+
+# ----------------- extraction -----------------
+def _literal(node):
+    if isinstance(node, ast.Constant) and isinstance(node.value, str):
+        return node.value
+    if isinstance(node, ast.JoinedStr):
+        # f-strings: interpolations become '?' (IN-lists, LIMITs); table-name
+        # interpolations won't parse and are reported as skipped.
+        parts = []
+        for v in node.values:
+            parts.append(v.value if isinstance(v, ast.Constant) else "?")
+        return "".join(parts)
+    return None
+
+def extract_sql(root=ROOT):
+    """Return (queries, ddl): lists of (sql, "file:line")."""
+    queries, ddl, seen = [], [], set()
+    for dirpath, dirnames, files in os.walk(root):
+        dirnames[:] = [d for d in dirnames if d not in SKIP_DIRS]
+        for fn in sorted(files):
+            if not fn.endswith(".py") or fn == os.path.basename(__file__):
+                continue
+            path = os.path.join(dirpath, fn)
+            try:
+                tree = ast.parse(open(path, encoding="utf-8").read(), path)
+            except (SyntaxError, UnicodeDecodeError):
+                continue
+            rel = os.path.relpath(path, root)
+            for node in ast.walk(tree):
+                s = _literal(node)
+                if not s:
+                    continue
+                where = f"{rel}:{node.lineno}"
+                if _QUERY_HEAD.match(s):
+                    key = " ".join(s.split())
+                    if key not in seen:
+                        seen.add(key)
+                        queries.append((s.strip(), where))
+                elif _DDL_HEAD.search(s):
+                    ddl.append((s, where))
+    return queries, ddl
+
+# ----------------- scratch database -----------------
+_LOW_CARD = re.compile(r"(status|state|role|side|kind|type|mode|tier|currency|source|visible|active|used|is_\w+)$")
+_TIME_COL = re.compile(r"(_at|_ts|^ts|time|date)$")
+
+def _synth(col, ctype, i, n, rnd):
+    name = col.lower()
+    t = (ctype or "").upper()
+    if _LOW_CARD.search(name):
+        return rnd.choice(["pending", "active", "paid", "done", "cancelled"]) if "TEXT" in t or not t \
+            else rnd.randint(0, 3)
+    if _TIME_COL.search(name):
+        return 1_700_000_000 + i * 60 if "TEXT" not in t else f"2024-01-01 00:{i % 60:02d}:00"
+    if "INT" in t:
+        return rnd.randint(1, max(1, n // 20)) if name.endswith("_id") else rnd.randint(0, 1_000_000)
+    if any(k in t for k in ("REAL", "FLOA", "DOUB", "NUM", "DEC")):
+        return round(rnd.random() * 100, 4)
+    if "BLOB" in t:
+        return None
+    if name.endswith(("_id", "uid", "pub", "slug", "token", "code", "username")):
+        return f"{name}-{rnd.randint(1, max(1, n // 5))}"
+    return f"{name}-{i}-{rnd.randint(0, 9999)}"
+
+def _populate(cx, rows, seed=7):
+    rnd = random.Random(seed)
+    tables = [r[0] for r in cx.execute(
+        "SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%' "
+        "AND name != 'schema_migrations' AND sql NOT LIKE 'CREATE VIRTUAL%'")]
+    for t in tables:
+        info = cx.execute(f"PRAGMA table_info({t})").fetchall()
+        cols = [r for r in info if not (r[5] == 1 and (r[2] or "").upper() == "INTEGER")]
+        if not cols:
+            continue
+        names = ", ".join(f'"{r[1]}"' for r in cols)
+        marks = ", ".join("?" for _ in cols)
+        data = [tuple(_synth(r[1], r[2], i, rows, rnd) for r in cols) for i in range(rows)]
+        try:
+            cx.executemany(f"INSERT OR IGNORE INTO {t}({names}) VALUES({marks})", data)
+        except sqlite3.Error as e:
+            print(f"[ADVISOR] could not populate {t}: {e}")
+    cx.commit()
+
+def build_scratch(ddl, rows):
+    import db
+    path = os.path.join(tempfile.mkdtemp(prefix="izza-advisor-"), "scratch.sqlite")
+    db.DB_PATH = path
+    db.migrate(verbose=False)
+    cx = sqlite3.connect(path)
+    for sql, _ in ddl:
+        try:
+            cx.execute(sql)
+        except sqlite3.Error:
+            pass  # already created by a migration, or an f-string we can't run
+    cx.commit()
+    cx.execute("PRAGMA foreign_keys=OFF")
+    if rows:
+        _populate(cx, rows)
+    return cx, path
+
+# ----------------- plans -----------------
+class _Null(dict):
+    def __missing__(self, key):
+        return None
+
+def _bind(cx, sql, params=None):
+    if params is not None:
+        return params
+    if re.search(r"[:@$][A-Za-z_]\w*", re.sub(r"'[^']*'", "", sql)):
+        return _Null()
+    return [None] * _param_count(cx, sql)
+
+def _param_count(cx, sql):
+    try:
+        cx.execute("EXPLAIN " + sql, [])
+        return 0
+    except sqlite3.ProgrammingError as e:
+        m = re.search(r"uses (\d+)", str(e))
+        if m:
+            return int(m.group(1))
+        raise
+
+def explain(cx, sql, params=None):
+    return [r[3] for r in cx.execute("EXPLAIN QUERY PLAN " + sql, _bind(cx, sql, params)).fetchall()]
+
+def flags(plan):
+    out = []
+    for d in plan:
+        m = re.match(r"SCAN (\w+)(?: AS \w+)?$", d)
+        if m and m.group(1) not in ("CONSTANT",):
+            out.append(("scan", m.group(1)))
+        elif d.startswith("USE TEMP B-TREE"):
+            out.append(("temp", d[len("USE TEMP B-TREE FOR "):]))
+    return out
+
+def _tables_in(sql):
+    """[(table, alias)] for every FROM/JOIN/UPDATE/DELETE FROM target."""
+    out = []
+    for m in re.finditer(r"\b(?:FROM|JOIN|UPDATE)\s+([A-Za-z_]\w*)(?:\s+(?:AS\s+)?([A-Za-z_]\w*))?", sql, re.I):
+        alias = m.group(2)
+        if alias and alias.upper() in _KEYWORDS:
+            alias = None
+        out.append((m.group(1), alias or m.group(1)))
+    return out
+
+def _clause(sql, head, stops):
+    m = re.search(rf"\b{head}\b(.*)", sql, re.I | re.S)
+    if not m:
+        return ""
+    body = m.group(1)
+    cut = re.search(rf"\b({'|'.join(stops)})\b", body, re.I)
+    return body[:cut.start()] if cut else body
+
+def recommend(cx, sql, table):
+    """Propose (table, [column exprs]) for one scanned table (or alias), or None."""
+    for t, a in _tables_in(sql):
+        if a.lower() == table.lower():
+            table = t
+            break
+    cols = {r[1].lower() for r in cx.execute(f"PRAGMA table_info({table})")}
+    if not cols:
+        return None
+    refs = [a.lower() for t, a in _tables_in(sql) if t.lower() == table.lower()]
+    many = len({t.lower() for t, _ in _tables_in(sql)}) > 1
+    preds = " ".join(re.findall(r"\bWHERE\b(.*?)(?=\bGROUP\b|\bORDER\b|\bLIMIT\b|\)\s*$|$)", sql, re.I | re.S))
+    preds += " " + " ".join(re.findall(r"\bON\b(.*?)(?=\bWHERE\b|\bJOIN\b|\bLEFT\b|\bGROUP\b|\bORDER\b|$)", sql, re.I | re.S))
+
+    def own(q, c):
+        c = c.lower()
+        if c not in cols:
+            return False
+        return (q or "").lower() in refs if q else not many or c not in ("id",)
+
+    eq, rng = [], []
+    for m in re.finditer(r"\b(lower|upper)\(\s*(?:(\w+)\.)?(\w+)\s*\)\s*=", preds, re.I):
+        if own(m.group(2), m.group(3)):
+            e = f"{m.group(1).lower()}({m.group(3).lower()})"
+            if e not in eq: eq.append(e)
+    for m in re.finditer(r"(?<![\w(.])(?:(\w+)\.)?(\w+)\s*(=|==|\bIN\b|\bIS\b(?!\s+NOT)|>=|<=|>|<|\bBETWEEN\b)", preds, re.I):
+        q, c, op = m.group(1), m.group(2), m.group(3).upper()
+        if not own(q, c) or c.lower() == "id":
+            continue
+        c = c.lower()
+        if op in ("=", "==", "IN", "IS"):
+            if c not in eq: eq.append(c)
+        elif c not in rng:
+            rng.append(c)
+    order = []
+    for part in _clause(sql, "ORDER BY", ["LIMIT", "OFFSET"]).split(","):
+        m = re.match(r"\s*(?:(\w+)\.)?(\w+)\s*(ASC|DESC)?\s*$", part, re.I)
+        if m and own(m.group(1), m.group(2)):
+            order.append(m.group(2).lower() + (" DESC" if (m.group(3) or "").upper() == "DESC" else ""))
+    rng = [c for c in rng if c not in eq]
+    tail = []
+    if order and all(o.split()[0] not in eq for o in order):
+        tail = order[:2]
+    elif rng:
+        tail = rng[:1]
+    idx = eq[:3] + [t for t in tail if t.split()[0] not in eq]
+    return (table, idx) if idx else None
+
+def _index_name(table, exprs):
+    parts = [re.sub(r"\W+", "_", e.replace(" DESC", "")).strip("_") for e in exprs]
+    return f"idx_{table}_{'_'.join(parts)}"[:60]
+
+def _sample_params(cx, sql):
+    """Bind each ? to a real value from the column it is compared with (NULL if unknown)."""
+    if re.search(r"[:@$][A-Za-z_]\w*", re.sub(r"'[^']*'", "", sql)):
+        return None
+    try:
+        n = _param_count(cx, sql)
+    except sqlite3.Error:
+        return None
+    tables = [t for t, _ in _tables_in(sql)]
+    vals = []
+    for m in re.finditer(r"\?", sql):
+        before = sql[:m.start()]
+        cm = re.search(r"(?:(\w+)\.)?(\w+)\s*\)?\s*(?:=|==|<|>|<=|>=|!=|\bIN\s*\(|\bLIKE|lower\()\s*\(?\s*$", before, re.I)
+        val = None
+        lim = re.search(r"\b(LIMIT|OFFSET)\s*$", before, re.I)
+        if lim:
+            vals.append(50 if lim.group(1).upper() == "LIMIT" else 0)
+            continue
+        if cm:
+            for t in tables:
+                try:
+                    r = cx.execute(f'SELECT "{cm.group(2)}" FROM {t} WHERE "{cm.group(2)}" IS NOT NULL '
+                                   f"ORDER BY random() LIMIT 1").fetchone()
+                except sqlite3.Error:
+                    continue
+                if r:
+                    val = r[0]
+                    break
+        vals.append(val)
+    return (vals + [None] * n)[:n]
+
+def _time(cx, sql, params, runs):
+    best = None
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        try:
+            if sql.lstrip().upper().startswith(("SELECT", "WITH")):
+                cx.execute(sql, params).fetchall()
+            else:
+                cx.execute("SAVEPOINT t")
+                cx.execute(sql, params)
+                cx.execute("ROLLBACK TO t")
+                cx.execute("RELEASE t")
+        except sqlite3.Error:
+            return None
+        ms = (time.perf_counter() - t0) * 1000
+        best = ms if best is None else min(best, ms)
+    return best
+
+# ----------------- driver -----------------
+def analyse(cx, queries, runs=5, verbose=False):
+    cx.isolation_level = None
+    flagged, skipped = [], 0
+    for sql, where in queries:
+        try:
+            plan = explain(cx, sql)
+        except sqlite3.Error as e:
+            skipped += 1
+            if verbose:
+                print(f"[ADVISOR] skip {where}: {e}")
+            continue
+        f = flags(plan)
+        if f:
+            flagged.append({"sql": sql, "where": where, "plan": plan, "flags": f})
+
+    candidates = {}
+    for q in flagged:
+        for kind, table in q["flags"]:
+            if kind != "scan":
+                continue
+            rec = recommend(cx, q["sql"], table)
+            if rec:
+                key = (rec[0], tuple(rec[1]))
+                candidates.setdefault(key, []).append(q)
+        temp_only = all(k == "temp" for k, _ in q["flags"])
+        if temp_only:
+            for t, _ in _tables_in(q["sql"])[:1]:
+                rec = recommend(cx, q["sql"], t)
+                if rec:
+                    candidates.setdefault((rec[0], tuple(rec[1])), []).append(q)
+
+    existing = {r[0] for r in cx.execute("SELECT name FROM sqlite_master WHERE type='index'")}
+    for q in flagged:
+        q["params"] = _sample_params(cx, q["sql"])
+        q["before_ms"] = _time(cx, q["sql"], q["params"] if q["params"] is not None else _bind(cx, q["sql"]), runs)
+
+    accepted = []
+    for (table, exprs), qs in sorted(candidates.items(), key=lambda kv: -len(kv[0][1])):
+        if any(t == table and list(e[:len(exprs)]) == list(exprs) for t, e, _ in accepted):
+            continue  # an accepted wider index already serves this prefix
+        name = _index_name(table, exprs)
+        if name in existing:
+            continue
+        qs = [q for q in qs if len(flags(explain(cx, q["sql"]))) == len(q["flags"])]
+        if not qs:
+            continue  # already fixed by an index accepted earlier in this run
+        ddl = f"CREATE INDEX IF NOT EXISTS {name} ON {table}({', '.join(exprs)})"
+        try:
+            cx.execute(ddl)
+            cx.execute(f"ANALYZE {name}")
+        except sqlite3.Error as e:
+            if verbose:
+                print(f"[ADVISOR] {ddl} failed: {e}")
+            continue
+        helped = []
+        for q in qs:
+            after = explain(cx, q["sql"])
+            if len(flags(after)) < len(q["flags"]):
+                helped.append((q, after))
+        if helped:
+            # keep it only if it also pays off in wall time (plans alone can mislead,
+            # e.g. an ORDER BY index for a query that returns the whole table)
+            before = sum(q.get("before_ms") or 0 for q, _ in helped)
+            after = 0.0
+            for q, _ in helped:
+                ms = _time(cx, q["sql"], q["params"] if q["params"] is not None else _bind(cx, q["sql"]), runs)
+                after += ms if ms is not None else (q.get("before_ms") or 0)
+            if before and after > before * 0.9:
+                cx.execute(f"DROP INDEX {name}")
+                if verbose:
+                    print(f"[ADVISOR] {name}: plan improves but {before:.2f}ms -> {after:.2f}ms, dropped")
+                continue
+            accepted.append((table, exprs, name))
+            for q, after in helped:
+                q.setdefault("indexes", []).append(name)
+                q["after_plan"] = after
+        else:
+            cx.execute(f"DROP INDEX {name}")
+
+    for q in flagged:
+        if not q.get("indexes"):
+            after = explain(cx, q["sql"])
+            if len(flags(after)) < len(q["flags"]):
+                q["indexes"], q["after_plan"] = ["(served by an index above)"], after
+        if q.get("indexes"):
+            q["after_ms"] = _time(cx, q["sql"], q["params"] if q["params"] is not None else _bind(cx, q["sql"]), runs)
+    return flagged, accepted, skipped
+
+def migration_text(accepted, version):
+    lines = [f"# Generated by index_advisor.py on {date.today().isoformat()}",
+             f"def _m{version:04d}_advisor_indexes(cx):",
+             '    _run_script(cx, """']
+    for table, exprs, name in accepted:
+        lines.append(f"    CREATE INDEX IF NOT EXISTS {name} ON {table}({', '.join(exprs)});")
+    lines += ['    """)', "",
+              f'# MIGRATIONS: ({version}, "indexes from index_advisor", _m{version:04d}_advisor_indexes),']
+    return "\n".join(lines) + "\n"
+
+def main():
+    ap = argparse.ArgumentParser(description="EXPLAIN QUERY PLAN driven index advisor")
+    ap.add_argument("--db", help="copy of a real database to analyse (a scratch copy is made)")
+    ap.add_argument("--rows", type=int, default=5000, help="synthetic rows per table (scratch db)")
+    ap.add_argument("--runs", type=int, default=5, help="timing runs per query (best of)")
+    ap.add_argument("--version", type=int, help="migration number to emit (default: next free)")
+    ap.add_argument("--out", help="write the migration here instead of stdout")
+    ap.add_argument("--verbose", action="store_true")
+    args = ap.parse_args()
+
+    sys.path.insert(0, ROOT)
+    import db
+    queries, ddl = extract_sql()
+    print(f"[ADVISOR] {len(queries)} distinct queries, {len(ddl)} DDL literals")
+    if args.db:
+        path = os.path.join(tempfile.mkdtemp(prefix="izza-advisor-"), "copy.sqlite")
+        shutil.copyfile(args.db, path)
+        db.DB_PATH = path
+        db.migrate(verbose=False)
+        cx = sqlite3.connect(path)
+        if args.rows:
+            _populate(cx, args.rows)
+    else:
+        cx, path = build_scratch(ddl, args.rows)
+    cx.execute("ANALYZE")
+    cx.commit()
+
+    flagged, accepted, skipped = analyse(cx, queries, runs=args.runs, verbose=args.verbose)
+    print(f"[ADVISOR] {len(flagged)} flagged, {skipped} not explainable (dynamic SQL)\n")
+    for q in sorted(flagged, key=lambda q: -(q.get("before_ms") or 0)):
+        if not q.get("indexes") and not args.verbose:
+            continue
+        head = " ".join(q["sql"].split())[:110]
+        b, a = q.get("before_ms"), q.get("after_ms")
+        timing = f"{b:.2f}ms -> {a:.2f}ms" if b is not None and a is not None else "untimed"
+        print(f"{q['where']}: {timing}  {', '.join(q.get('indexes') or ['(no index helps)'])}")
+        print(f"    {head}")
+        print(f"    before: {' | '.join(q['plan'])}")
+        if q.get("after_plan"):
+            print(f"    after:  {' | '.join(q['after_plan'])}")
+
+    version = args.version or (max(v for v, _, _ in db.MIGRATIONS) + 1)
+    text = migration_text(accepted, version)
+    if args.out:
+        with open(args.out, "w") as fh:
+            fh.write(text)
+        print(f"\n[ADVISOR] wrote {len(accepted)} index(es) to {args.out}")
+    else:
+        print("\n" + text)
+    cx.close()
+    shutil.rmtree(os.path.dirname(path), ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -82,6 +82,7 @@ def init_tables():
           updated_at INTEGER
         );
         """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_izza_crates_wallet ON izza_crates(wallet_pub, opened, id)")
         conn.execute("""
         CREATE UNIQUE INDEX IF NOT EXISTS idx_izza_airdrop_wallets_username
         ON izza_airdrop_wallets(username);
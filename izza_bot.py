@@ -5,7 +5,8 @@ from decimal import Decimal, ROUND_HALF_UP
 
 import requests
 from flask import Blueprint, render_template, jsonify, request
-from db import conn
+from db import conn, conn_ro, from_stroops
+from pagination import decode_cursor, page_of
 
 try:
     from bot_markets import scan_markets_vs_pi
@@ -642,7 +643,7 @@ def trading_summary():
 
     uname = username.strip().lstrip("@").lower()
 
-    with conn() as cx:
+    with conn_ro() as cx:
         acct = cx.execute(
             """
             SELECT id, username, wallet_pub,
@@ -685,7 +686,7 @@ def trading_summary():
             )
 
     # Fetch buckets and trades once
-    with conn() as cx:
+    with conn_ro() as cx:
         rows = cx.execute(
             """
             SELECT b.id, b.name, b.objective, b.risk_level, b.volatility,
@@ -712,11 +713,12 @@ def trading_summary():
                   bucket_id,
                   code,
                   issuer,
-                  side,
-                  amount_pi,
-                  amount_token
+                  LOWER(side)            AS side,
+                  SUM(amount_pi_stroops) AS amount_pi_stroops,
+                  SUM(amount_token)      AS amount_token
                 FROM bot_trades
                 WHERE bucket_id IN ({placeholders})
+                GROUP BY bucket_id, code, issuer, LOWER(side)
                 """,
                 bucket_ids,
             ).fetchall()
@@ -729,7 +731,7 @@ def trading_summary():
         code = tr["code"]
         issuer = tr["issuer"]
         side = (tr["side"] or "").lower()
-        amt_pi = float(tr["amount_pi"] or 0.0)
+        amt_pi = from_stroops(tr["amount_pi_stroops"])
         amt_token = float(tr["amount_token"] or 0.0)
 
         key = (b_id, code, issuer)
@@ -1633,16 +1635,16 @@ def bucket_liquidate():
             row = cx.execute(
                 """
                 SELECT
-                  SUM(CASE WHEN LOWER(side) = 'buy'  THEN amount_pi ELSE 0 END) AS buy_pi,
-                  SUM(CASE WHEN LOWER(side) = 'sell' THEN amount_pi ELSE 0 END) AS sell_pi
+                  SUM(CASE WHEN LOWER(side) = 'buy'  THEN amount_pi_stroops ELSE 0 END) AS buy_pi,
+                  SUM(CASE WHEN LOWER(side) = 'sell' THEN amount_pi_stroops ELSE 0 END) AS sell_pi
                 FROM bot_trades
                 WHERE bucket_id = ?
                 """,
                 (bucket_id,),
             ).fetchone()
         if row:
-            buy_pi = float(row["buy_pi"] or 0.0)
-            sell_pi = float(row["sell_pi"] or 0.0)
+            buy_pi = from_stroops(row["buy_pi"])
+            sell_pi = from_stroops(row["sell_pi"])
             if sell_pi > 0 and buy_pi > 0 and abs(buy_pi) > 1e-9:
                 realized_pnl = sell_pi - buy_pi
                 perf_pct = 100.0 * realized_pnl / buy_pi
@@ -2133,7 +2135,7 @@ def list_buckets():
 
     uname = username.strip().lstrip("@").lower()
 
-    with conn() as cx:
+    with conn_ro() as cx:
         acct = cx.execute(
             "SELECT id FROM bot_accounts WHERE username = ?",
             (uname,),
@@ -2163,9 +2165,10 @@ def list_buckets():
 @izza_bot_bp.route("/api/trading/trades", methods=["GET"])
 def list_trades():
     """
-    GET /api/trading/trades?username=...&limit=50
+    GET /api/trading/trades?username=...&limit=50&cursor=...
 
-    Returns the most recent trades across all buckets for this user.
+    Returns the most recent trades across all buckets for this user, newest
+    first, plus next_cursor for the page after this one (null on the last).
     Only reads from bot_trades + joins with bot_buckets + bot_accounts.
     """
     username = (request.args.get("username") or "").strip()
@@ -2183,15 +2186,20 @@ def list_trades():
     if limit_i > 200:
         limit_i = 200
 
+    cursor = request.args.get("cursor") or ""
+    after = decode_cursor(cursor, "trades")
+    if cursor and after is None:
+        return jsonify(ok=False, error="bad cursor")
+
     uname = username.strip().lstrip("@").lower()
 
-    with conn() as cx:
+    with conn_ro() as cx:
         acct = cx.execute(
             "SELECT id FROM bot_accounts WHERE username = ?",
             (uname,),
         ).fetchone()
         if not acct:
-            return jsonify(ok=True, trades=[])
+            return jsonify(ok=True, trades=[], next_cursor=None)
 
         rows = cx.execute(
             """
@@ -2214,12 +2222,13 @@ def list_trades():
               ON b.id = t.bucket_id
             JOIN bot_accounts a
               ON a.id = b.account_id
-           WHERE a.id = ?
+           WHERE t.account_id = ? AND a.id = ? AND t.id < ?
            ORDER BY t.id DESC
            LIMIT ?
             """,
-            (acct["id"], limit_i),
+            (acct["id"], acct["id"], after[0] if after else 1 << 62, limit_i + 1),
         ).fetchall()
+    rows, next_cursor = page_of(rows, limit_i, "trades", lambda r: (r["id"],))
 
     trades = []
     for r in rows:
@@ -2244,7 +2253,7 @@ def list_trades():
             }
         )
 
-    return jsonify(ok=True, trades=trades)
+    return jsonify(ok=True, trades=trades, next_cursor=next_cursor)
 
 
 # ======================================================================
@@ -2275,9 +2284,13 @@ def _compute_bucket_positions(bucket_id: int) -> list[dict]:
     with conn() as cx:
         rows = cx.execute(
             """
-            SELECT code, issuer, side, amount_pi, amount_token
+            SELECT code, issuer,
+                   LOWER(side)            AS side,
+                   SUM(amount_pi_stroops) AS amount_pi_stroops,
+                   SUM(amount_token)      AS amount_token
             FROM bot_trades
             WHERE bucket_id = ?
+            GROUP BY code, issuer, LOWER(side)
             """,
             (bucket_id,),
         ).fetchall()
@@ -2287,7 +2300,7 @@ def _compute_bucket_positions(bucket_id: int) -> list[dict]:
         code = r["code"]
         issuer = r["issuer"]
         side = (r["side"] or "").lower()
-        amt_pi = float(r["amount_pi"] or 0.0)
+        amt_pi = from_stroops(r["amount_pi_stroops"])
         amt_token = float(r["amount_token"] or 0.0)
 
         key = (code, issuer)
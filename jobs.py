@@ -0,0 +1,252 @@
+# jobs.py
+# Durable queue for side effects that follow a committed write: buyer and
+# admin emails, NFT claimables, payout notifications. Requests only insert a
+# row; worker threads do the slow SMTP / HTTP part.
+#
+# enqueue(cx, kind, payload) writes the job in the caller's transaction, so a
+# job exists exactly when the rows it follows up on were committed. Workers
+# lease one job at a time with a guarded UPDATE (several gunicorn workers or a
+# separate `--work` process can share the table). A handler that raises is
+# retried with exponential backoff; after max_attempts the job is parked as
+# 'dead' with its last error until it is retried by hand. A lease that runs
+# out (worker killed mid-job) makes the job claimable again, so handlers must
+# tolerate running twice.
+#
+#   python jobs.py --work                  # run workers here (set JOBS_WORKERS=0 in the app)
+#   python jobs.py --list dead
+#   python jobs.py --retry-dead [--kind email]
+#
+# Job states: queued -> running -> done | queued (retry) | dead.
+import os, sys, json, time, uuid, random, socket, argparse, threading
+
+import db
+from db import conn, conn_ro
+from emailer import send_email
+
+JOBS_WORKERS = int(os.getenv("JOBS_WORKERS", "2"))  # threads per process; 0 = enqueue only
+JOBS_POLL_S = float(os.getenv("JOBS_POLL_S", "2"))
+JOBS_LEASE_S = int(os.getenv("JOBS_LEASE_S", "120"))  # must outlast a handler's own timeouts
+JOBS_MAX_ATTEMPTS = int(os.getenv("JOBS_MAX_ATTEMPTS", "8"))
+JOBS_BACKOFF_S = float(os.getenv("JOBS_BACKOFF_S", "15"))  # 15s, 30s, 1m, 2m ... per failed attempt
+JOBS_BACKOFF_MAX_S = float(os.getenv("JOBS_BACKOFF_MAX_S", "3600"))
+
+# a job is due when queued and past run_after, or running on an expired lease
+_DUE = "((state='queued' AND run_after<=?) OR (state='running' AND lease_until<?))"
+
+_handlers = {}
+_wake = threading.Event()
+_state_lock = threading.Lock()
+_counts = {"claimed": 0, "done": 0, "retried": 0, "dead": 0, "lost_lease": 0}
+_threads = []
+_pid = None
+
+def _bump(k):
+    with _state_lock:
+        _counts[k] += 1
+
+def handler(kind):
+    """Decorator: fn(payload dict) runs jobs of this kind. Raise to retry."""
+    def deco(fn):
+        _handlers[kind] = fn
+        return fn
+    return deco
+
+def enqueue(cx, kind, payload, delay=0, max_attempts=None):
+    """Add a job in cx's transaction. Call wake() after the commit to skip the poll wait."""
+    now = int(time.time())
+    cur = cx.execute(
+        """INSERT INTO jobs(kind, payload_json, state, attempts, max_attempts, run_after, created_at, updated_at)
+           VALUES(?,?,'queued',0,?,?,?,?)""",
+        (kind, json.dumps(payload, separators=(",", ":")), int(max_attempts or JOBS_MAX_ATTEMPTS),
+         now + int(delay), now, now)
+    )
+    return cur.lastrowid
+
+def wake():
+    _wake.set()
+
+def backoff(attempts):
+    """Seconds before retry number `attempts` (1-based), +/-20% jitter."""
+    return min(JOBS_BACKOFF_MAX_S, JOBS_BACKOFF_S * 2 ** (attempts - 1)) * random.uniform(0.8, 1.2)
+
+def claim(cx, owner):
+    """Lease the next due job for owner on cx. Returns the job row or None."""
+    now = int(time.time())
+    ids = [r["id"] for r in cx.execute(
+        f"SELECT id FROM jobs WHERE {_DUE} ORDER BY run_after, id LIMIT 8", (now, now))]
+    for jid in ids:
+        # another worker may have taken it since the read; the WHERE re-checks
+        with cx:
+            cur = cx.execute(
+                f"""UPDATE jobs SET state='running', lease_owner=?, lease_until=?,
+                           attempts=attempts+1, updated_at=?
+                    WHERE id=? AND {_DUE}""",
+                (owner, now + JOBS_LEASE_S, now, jid, now, now)
+            )
+            if cur.rowcount == 1:
+                _bump("claimed")
+                return cx.execute("SELECT * FROM jobs WHERE id=?", (jid,)).fetchone()
+    return None
+
+def _finish(cx, job, owner, state, run_after=None, error=None):
+    with cx:
+        cur = cx.execute(
+            """UPDATE jobs SET state=?, run_after=COALESCE(?, run_after), last_error=?,
+                       lease_owner=NULL, lease_until=NULL, updated_at=?
+               WHERE id=? AND lease_owner=?""",
+            (state, run_after, error, int(time.time()), job["id"], owner)
+        )
+    if cur.rowcount != 1:
+        # lease expired and someone else picked the job up; their outcome wins
+        _bump("lost_lease")
+        print(f"[JOBS] job {job['id']} ({job['kind']}) lost its lease before {state}")
+        return False
+    return True
+
+def run_job(cx, job, owner):
+    """Run a leased job and record the outcome on cx."""
+    fn = _handlers.get(job["kind"])
+    t0 = time.time()
+    try:
+        if fn is None:
+            raise LookupError(f"no handler for kind {job['kind']!r}")
+        if job["attempts"] > job["max_attempts"]:
+            raise RuntimeError("lease expired on the last attempt")
+        fn(json.loads(job["payload_json"]))
+    except Exception as e:
+        err = repr(e)[:2000]
+        if job["attempts"] >= job["max_attempts"]:
+            if _finish(cx, job, owner, "dead", error=err):
+                _bump("dead")
+                print(f"[JOBS] job {job['id']} ({job['kind']}) dead after {job['attempts']} attempts: {err}")
+        else:
+            delay = backoff(job["attempts"])
+            if _finish(cx, job, owner, "queued", run_after=int(time.time() + delay), error=err):
+                _bump("retried")
+                print(f"[JOBS] job {job['id']} ({job['kind']}) attempt {job['attempts']} failed, "
+                      f"retry in {int(delay)}s: {err}")
+        return False
+    if _finish(cx, job, owner, "done"):
+        _bump("done")
+        print(f"[JOBS] job {job['id']} ({job['kind']}) done in {int((time.time() - t0) * 1000)}ms")
+    return True
+
+def work_once(cx=None, name="cli"):
+    """Claim and run one due job. Returns False when nothing was due."""
+    if cx is None:
+        # a raw connection: claim() and _finish() each use `with cx:`, which
+        # would hand a pooled conn() back to the pool after the first block
+        cx = db._open()
+        try:
+            return work_once(cx, name)
+        finally:
+            cx.close()
+    owner = f"{socket.gethostname()}:{os.getpid()}:{name}:{uuid.uuid4().hex[:8]}"
+    job = claim(cx, owner)
+    if job is None:
+        return False
+    run_job(cx, job, owner)
+    return True
+
+def _worker_loop(n):
+    cx = None
+    while True:
+        try:
+            # one connection for the thread's life; workers poll constantly
+            cx = cx or db._open()
+            busy = work_once(cx, f"w{n}")
+        except Exception as e:
+            print("[JOBS] worker error:", repr(e))
+            if cx is not None:
+                try: cx.close()
+                except Exception: pass
+            cx, busy = None, False
+        if not busy:
+            _wake.wait(JOBS_POLL_S)
+            _wake.clear()
+
+def start_workers(n=None):
+    """Start n (default JOBS_WORKERS) daemon worker threads once per process."""
+    global _threads, _pid
+    n = JOBS_WORKERS if n is None else n
+    if n <= 0:
+        return []
+    with _state_lock:
+        if _pid == os.getpid() and any(t.is_alive() for t in _threads):
+            return _threads
+        _pid = os.getpid()
+        _threads = [threading.Thread(target=_worker_loop, args=(i,), name=f"jobs-{i}", daemon=True)
+                    for i in range(n)]
+    for t in _threads:
+        t.start()
+    return _threads
+
+def retry_dead(kind=None, job_id=None):
+    """Requeue dead jobs (all, one kind, or one id) with a fresh attempt budget. Returns the count."""
+    now = int(time.time())
+    with conn() as cx:
+        cur = cx.execute(
+            """UPDATE jobs SET state='queued', attempts=0, run_after=?, updated_at=?
+               WHERE state='dead' AND (? IS NULL OR kind=?) AND (? IS NULL OR id=?)""",
+            (now, now, kind, kind, job_id, job_id)
+        )
+    if cur.rowcount:
+        wake()
+    return cur.rowcount
+
+def list_jobs(state="dead", kind=None, limit=50):
+    with conn_ro() as cx:
+        rows = cx.execute(
+            """SELECT id, kind, state, attempts, max_attempts, run_after, last_error, created_at, updated_at
+               FROM jobs WHERE state=? AND (? IS NULL OR kind=?) ORDER BY id DESC LIMIT ?""",
+            (state, kind, kind, int(limit))
+        ).fetchall()
+    return [dict(r) for r in rows]
+
+def stats():
+    now = int(time.time())
+    with conn_ro() as cx:
+        by = {}
+        for r in cx.execute("SELECT kind, state, COUNT(*) AS n FROM jobs GROUP BY kind, state"):
+            by.setdefault(r["kind"], {})[r["state"]] = r["n"]
+        oldest = cx.execute("SELECT MIN(run_after) FROM jobs WHERE state='queued' AND run_after<=?",
+                            (now,)).fetchone()[0]
+    with _state_lock:
+        counts = dict(_counts)
+    return {"workers": sum(t.is_alive() for t in _threads) if _pid == os.getpid() else 0,
+            "by_kind": by, "oldest_due_s": (now - oldest) if oldest else 0, "this_process": counts}
+
+# ----------------- Built-in handlers -----------------
+@handler("email")
+def _email_job(p):
+    # send_email logs and returns False instead of raising
+    if not send_email(p["to"], p["subject"], p["html"], reply_to=p.get("reply_to")):
+        raise RuntimeError("send_email failed")
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Durable background job queue")
+    ap.add_argument("--work", action="store_true", help="run worker threads until interrupted")
+    ap.add_argument("--workers", type=int, default=max(1, JOBS_WORKERS))
+    ap.add_argument("--list", metavar="STATE", help="list jobs in this state (queued, running, done, dead)")
+    ap.add_argument("--retry-dead", action="store_true", help="requeue dead jobs")
+    ap.add_argument("--kind", help="only jobs of this kind")
+    ap.add_argument("--id", type=int, help="only this job id (with --retry-dead)")
+    args = ap.parse_args()
+    # Run against the importable `jobs` module, not this __main__ copy: that is
+    # the registry fulfillment's @handler lands in.
+    import jobs
+    import fulfillment  # registers the nft_claimables handler
+    if args.retry_dead:
+        print(f"[JOBS] requeued {jobs.retry_dead(args.kind, args.id)} dead jobs")
+    if args.list:
+        print(json.dumps(jobs.list_jobs(args.list, args.kind), indent=2))
+    if args.work:
+        jobs.start_workers(args.workers)
+        print(f"[JOBS] {args.workers} workers running, Ctrl-C to stop")
+        try:
+            while True:
+                time.sleep(60)
+        except KeyboardInterrupt:
+            sys.exit(0)
+    if not (args.work or args.list or args.retry_dead):
+        print(json.dumps(jobs.stats(), indent=2))
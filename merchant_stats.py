@@ -0,0 +1,125 @@
+# merchant_stats.py
+# Per-merchant, per-UTC-day sales rollup behind the merchant dashboards.
+#
+# merchant_daily_stats (migration 0008) holds gross / fee / net (integer
+# stroops), paid orders and checkout sessions per merchant per day. The
+# writers add to today's row in the same transaction as the rows they insert:
+# fulfill_session -> record_orders(), the checkout session inserts ->
+# record_session(). A dashboard window of N days then reads at most N rows.
+#
+# rebuild() recomputes rows from orders and sessions. retention.py archives
+# old sessions, so only rebuild windows whose source rows are still live;
+# --backfill defaults to the sessions retention window:
+#
+#   python merchant_stats.py --backfill                    # days still in sessions
+#   python merchant_stats.py --backfill --days 60 --merchant 12
+#   python merchant_stats.py --backfill --all              # every day (drops archived counts)
+#   python merchant_stats.py --merchant 12                 # print the 30-day window
+import time, argparse
+from datetime import datetime, timezone
+
+from db import conn, conn_ro, to_stroops, from_stroops
+
+DAY = 24 * 3600
+
+def utc_day(ts=None):
+    """'YYYY-MM-DD' of a unix timestamp (default now), in UTC."""
+    return datetime.fromtimestamp(int(time.time() if ts is None else ts), timezone.utc).strftime("%Y-%m-%d")
+
+def _add(cx, merchant_id, ts, gross=0, fee=0, net=0, orders=0, sessions=0):
+    cx.execute(
+        """INSERT INTO merchant_daily_stats(merchant_id, day, gross_stroops, fee_stroops, net_stroops, orders, sessions)
+           VALUES(?,?,?,?,?,?,?)
+           ON CONFLICT(merchant_id, day) DO UPDATE SET
+             gross_stroops = gross_stroops + excluded.gross_stroops,
+             fee_stroops   = fee_stroops   + excluded.fee_stroops,
+             net_stroops   = net_stroops   + excluded.net_stroops,
+             orders        = orders        + excluded.orders,
+             sessions      = sessions      + excluded.sessions""",
+        (int(merchant_id), utc_day(ts), gross, fee, net, orders, sessions)
+    )
+
+def record_orders(cx, merchant_id, lines, ts=None):
+    """Count paid orders rows in the caller's transaction. lines: [(gross, fee, net)] in Pi, one per row."""
+    if not lines:
+        return
+    _add(cx, merchant_id, ts,
+         gross=sum(to_stroops(g) for g, _, _ in lines),
+         fee=sum(to_stroops(f) for _, f, _ in lines),
+         net=sum(to_stroops(n) for _, _, n in lines),
+         orders=len(lines))
+
+def record_session(cx, merchant_id, ts=None):
+    """Count one checkout session in the caller's transaction."""
+    _add(cx, merchant_id, ts, sessions=1)
+
+def rebuild(cx, merchant_id=None, since_day=None):
+    """
+    Recompute rows from orders and sessions, for every merchant and day
+    unless narrowed. Orders without created_at are dated by their session.
+    Returns the number of rows written.
+    """
+    args = (merchant_id, merchant_id, since_day, since_day)
+    cx.execute("DELETE FROM merchant_daily_stats WHERE (? IS NULL OR merchant_id=?) AND (? IS NULL OR day>=?)", args)
+    cur = cx.execute(
+        """INSERT INTO merchant_daily_stats(merchant_id, day, gross_stroops, fee_stroops, net_stroops, orders, sessions)
+           SELECT merchant_id, day, SUM(gross), SUM(fee), SUM(net), SUM(n_orders), SUM(n_sessions)
+           FROM (
+             SELECT o.merchant_id, date(COALESCE(o.created_at, s.ts), 'unixepoch') AS day,
+                    COALESCE(o.pi_amount_stroops, 0) AS gross, COALESCE(o.pi_fee_stroops, 0) AS fee,
+                    COALESCE(o.pi_merchant_net_stroops, 0) AS net, 1 AS n_orders, 0 AS n_sessions
+             FROM orders o
+             LEFT JOIN (SELECT pi_tx_hash, MIN(created_at) AS ts FROM sessions
+                        WHERE pi_tx_hash IS NOT NULL GROUP BY pi_tx_hash) s ON s.pi_tx_hash = o.pi_tx_hash
+             WHERE o.status='paid' AND COALESCE(o.created_at, s.ts) IS NOT NULL
+             UNION ALL
+             SELECT merchant_id, date(created_at, 'unixepoch'), 0, 0, 0, 0, 1
+             FROM sessions WHERE created_at IS NOT NULL
+           )
+           WHERE merchant_id IS NOT NULL AND (? IS NULL OR merchant_id=?) AND (? IS NULL OR day>=?)
+           GROUP BY merchant_id, day""",
+        args
+    )
+    return cur.rowcount
+
+def window(merchant_id, days=30, now=None):
+    """
+    Totals over the last `days` UTC days, today included:
+    {since_ts, gross, fee, net (Pi), orders, sessions}.
+    """
+    now = int(time.time() if now is None else now)
+    since_ts = (now // DAY - (days - 1)) * DAY
+    with conn_ro() as cx:
+        row = cx.execute(
+            """SELECT COALESCE(SUM(gross_stroops), 0) AS gross, COALESCE(SUM(fee_stroops), 0) AS fee,
+                      COALESCE(SUM(net_stroops), 0) AS net, COALESCE(SUM(orders), 0) AS orders,
+                      COALESCE(SUM(sessions), 0) AS sessions
+               FROM merchant_daily_stats WHERE merchant_id=? AND day>=?""",
+            (int(merchant_id), utc_day(since_ts))
+        ).fetchone()
+    return {"since_ts": since_ts, "gross": from_stroops(row["gross"]), "fee": from_stroops(row["fee"]),
+            "net": from_stroops(row["net"]), "orders": int(row["orders"]), "sessions": int(row["sessions"])}
+
+if __name__ == "__main__":
+    import json
+    ap = argparse.ArgumentParser(description="Merchant daily sales rollup")
+    ap.add_argument("--backfill", action="store_true", help="recompute rows from orders and sessions")
+    ap.add_argument("--days", type=int, help="only the last N days (default: the sessions retention window)")
+    ap.add_argument("--all", action="store_true",
+                    help="rebuild every day, even those whose sessions retention has archived")
+    ap.add_argument("--merchant", type=int, help="only this merchant id")
+    args = ap.parse_args()
+    if args.backfill:
+        days = args.days
+        if days is None and not args.all:
+            from retention import POLICIES
+            keep = POLICIES["sessions"]["days"]
+            days = int(keep) if keep > 0 else None  # retention off: every row is still live
+        since = utc_day(time.time() - (days - 1) * DAY) if days else None
+        t0 = time.time()
+        with conn() as cx:
+            n = rebuild(cx, args.merchant, since)
+        print(f"[STATS] rebuilt {n} merchant-day rows since {since or 'the beginning'} "
+              f"in {int((time.time() - t0) * 1000)}ms")
+    if args.merchant is not None:
+        print(json.dumps(window(args.merchant, args.days or 30), indent=2))
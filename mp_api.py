@@ -4,7 +4,8 @@
 
 from typing import Optional, Tuple, Dict, Any, List
 from flask import Blueprint, jsonify, request, session
-from db import conn
+from db import conn, register_schema, ensure_registered, run_write
+from identity import user_by_id, user_by_pi_uid, user_by_username
 import time
 
 mp_bp = Blueprint("mp", __name__)
@@ -39,17 +40,14 @@ def _session_debug_keys():
     except Exception:
         return []
 
+def _ids(row):
+    return (int(row["id"]), row["pi_uid"], row["pi_username"]) if row else None
+
 def _lookup_user_by_id(uid):
     if not uid:
         return None
     try:
-        with conn() as cx:
-            row = cx.execute(
-                "SELECT id, pi_uid, pi_username FROM users WHERE id=?",
-                (int(uid),)
-            ).fetchone()
-            if row:
-                return int(row["id"]), row["pi_uid"], row["pi_username"]
+        return _ids(user_by_id(uid))
     except Exception as e:
         _log(f"lookup by id failed: {e}")
     return None
@@ -58,13 +56,7 @@ def _lookup_user_by_pi_uid(pi_uid):
     if not pi_uid:
         return None
     try:
-        with conn() as cx:
-            row = cx.execute(
-                "SELECT id, pi_uid, pi_username FROM users WHERE pi_uid=?",
-                (str(pi_uid),)
-            ).fetchone()
-            if row:
-                return int(row["id"]), row["pi_uid"], row["pi_username"]
+        return _ids(user_by_pi_uid(pi_uid))
     except Exception as e:
         _log(f"lookup by pi_uid failed: {e}")
     return None
@@ -72,17 +64,8 @@ def _lookup_user_by_pi_uid(pi_uid):
 def _lookup_user_by_username(username):
     if not username:
         return None
-    want = str(username).strip().lstrip("@").lower()
-    if not want:
-        return None
     try:
-        with conn() as cx:
-            row = cx.execute(
-                "SELECT id, pi_uid, pi_username FROM users WHERE LOWER(REPLACE(pi_username,'@',''))=?",
-                (want,)
-            ).fetchone()
-            if row:
-                return int(row["id"]), row["pi_uid"], row["pi_username"]
+        return _ids(user_by_username(username))
     except Exception as e:
         _log(f"lookup by username failed: {e}")
     return None
@@ -144,9 +127,8 @@ def _current_user_ids() -> Optional[Tuple[int, str, str]]:
     return None
 
 def _username_by_id(uid: int) -> Optional[str]:
-    with conn() as cx:
-        r = cx.execute("SELECT pi_username FROM users WHERE id=?", (uid,)).fetchone()
-        return r["pi_username"] if r else None
+    r = user_by_id(uid)
+    return r["pi_username"] if r else None
 
 _WORLDS = ("1", "2", "3", "4")
 _WORLD_OF: Dict[int, str] = {}
@@ -186,34 +168,37 @@ def _presence_for(uid: int) -> Dict[str, Any]:
     active = bool(st) and (time.time() - last) <= _PRES_TTL
     return {"active": bool(active), "lastSeen": int(last * 1000) if last else 0, "world": w}
 
+@register_schema("mp")
+def _mp_schema(cx):
+    cx.executescript("""
+    CREATE TABLE IF NOT EXISTS mp_friend_requests(
+      id INTEGER PRIMARY KEY AUTOINCREMENT,
+      from_user INTEGER NOT NULL,
+      to_user INTEGER NOT NULL,
+      status TEXT NOT NULL DEFAULT 'pending',
+      created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+      UNIQUE(from_user, to_user)
+    );
+    CREATE TABLE IF NOT EXISTS mp_invites(
+      id INTEGER PRIMARY KEY AUTOINCREMENT,
+      from_user INTEGER NOT NULL,
+      to_user INTEGER NOT NULL,
+      mode TEXT,
+      status TEXT NOT NULL DEFAULT 'pending',
+      ttl_sec INTEGER NOT NULL DEFAULT 1800,
+      created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE TABLE IF NOT EXISTS mp_ranks(
+      user_id INTEGER PRIMARY KEY,
+      br10_w INTEGER DEFAULT 0, br10_l INTEGER DEFAULT 0,
+      v1_w INTEGER DEFAULT 0, v1_l INTEGER DEFAULT 0,
+      v2_w INTEGER DEFAULT 0, v2_l INTEGER DEFAULT 0,
+      v3_w INTEGER DEFAULT 0, v3_l INTEGER DEFAULT 0
+    );
+    """)
+
 def _ensure_schema():
-    with conn() as cx:
-        cx.executescript("""
-        CREATE TABLE IF NOT EXISTS mp_friend_requests(
-          id INTEGER PRIMARY KEY AUTOINCREMENT,
-          from_user INTEGER NOT NULL,
-          to_user INTEGER NOT NULL,
-          status TEXT NOT NULL DEFAULT 'pending',
-          created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-          UNIQUE(from_user, to_user)
-        );
-        CREATE TABLE IF NOT EXISTS mp_invites(
-          id INTEGER PRIMARY KEY AUTOINCREMENT,
-          from_user INTEGER NOT NULL,
-          to_user INTEGER NOT NULL,
-          mode TEXT,
-          status TEXT NOT NULL DEFAULT 'pending',
-          ttl_sec INTEGER NOT NULL DEFAULT 1800,
-          created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        );
-        CREATE TABLE IF NOT EXISTS mp_ranks(
-          user_id INTEGER PRIMARY KEY,
-          br10_w INTEGER DEFAULT 0, br10_l INTEGER DEFAULT 0,
-          v1_w INTEGER DEFAULT 0, v1_l INTEGER DEFAULT 0,
-          v2_w INTEGER DEFAULT 0, v2_l INTEGER DEFAULT 0,
-          v3_w INTEGER DEFAULT 0, v3_l INTEGER DEFAULT 0
-        );
-        """)
+    ensure_registered("mp")
 
 def _user_id_by_username(username: str):
     user = _lookup_user_by_username(username)
@@ -477,9 +462,10 @@ def mp_friends_request():
     if to_id == me:
         return jsonify({"ok": False, "error": "cannot_friend_self"}), 400
 
-    with conn() as cx:
-        if _is_friend(me, to_id):
-            return jsonify({"ok": True, "already": "friends"})
+    if _is_friend(me, to_id):
+        return jsonify({"ok": True, "already": "friends"})
+
+    def _write(cx):
         try:
             cx.execute(
                 "INSERT INTO mp_friend_requests(from_user,to_user,status) VALUES(?,?, 'pending')",
@@ -492,6 +478,7 @@ def mp_friends_request():
                 WHERE ((from_user=? AND to_user=?) OR (from_user=? AND to_user=?))
                   AND status!='accepted'
             """, (me, to_id, to_id, me))
+    run_write(_write)
 
     return jsonify({"ok": True})
 
@@ -507,26 +494,27 @@ def mp_friends_accept():
     req_id = data.get("requestId")
     from_name = (data.get("from") or data.get("username") or "").strip()
 
-    with conn() as cx:
+    from_id = None if req_id else _user_id_by_username(from_name)
+
+    def _write(cx):
         row = None
         if req_id:
             row = cx.execute(
                 "SELECT * FROM mp_friend_requests WHERE id=? AND to_user=? AND status='pending'",
                 (int(req_id), me)
             ).fetchone()
-        else:
-            from_id = _user_id_by_username(from_name)
-            if from_id:
-                row = cx.execute(
-                    "SELECT * FROM mp_friend_requests WHERE from_user=? AND to_user=? AND status='pending'",
-                    (from_id, me)
-                ).fetchone()
-
+        elif from_id:
+            row = cx.execute(
+                "SELECT * FROM mp_friend_requests WHERE from_user=? AND to_user=? AND status='pending'",
+                (from_id, me)
+            ).fetchone()
         if not row:
-            return jsonify({"ok": False, "error": "request_not_found"}), 404
-
+            return False
         cx.execute("UPDATE mp_friend_requests SET status='accepted' WHERE id=?", (row["id"],))
+        return True
 
+    if not run_write(_write):
+        return jsonify({"ok": False, "error": "request_not_found"}), 404
     return jsonify({"ok": True})
 
 @mp_bp.post("/friends/decline")
@@ -541,24 +529,25 @@ def mp_friends_decline():
     req_id = data.get("requestId")
     from_name = (data.get("from") or data.get("username") or "").strip()
 
-    with conn() as cx:
+    from_id = None if req_id else _user_id_by_username(from_name)
+
+    def _write(cx):
         row = None
         if req_id:
             row = cx.execute(
                 "SELECT * FROM mp_friend_requests WHERE id=? AND to_user=? AND status='pending'",
                 (int(req_id), me)
             ).fetchone()
-        else:
-            from_id = _user_id_by_username(from_name)
-            if from_id:
-                row = cx.execute(
-                    "SELECT * FROM mp_friend_requests WHERE from_user=? AND to_user=? AND status='pending'",
-                    (from_id, me)
-                ).fetchone()
-
+        elif from_id:
+            row = cx.execute(
+                "SELECT * FROM mp_friend_requests WHERE from_user=? AND to_user=? AND status='pending'",
+                (from_id, me)
+            ).fetchone()
         if not row:
-            return jsonify({"ok": False, "error": "request_not_found"}), 404
-
+            return False
         cx.execute("UPDATE mp_friend_requests SET status='declined' WHERE id=?", (row["id"],))
+        return True
 
+    if not run_write(_write):
+        return jsonify({"ok": False, "error": "request_not_found"}), 404
     return jsonify({"ok": True})
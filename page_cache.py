@@ -0,0 +1,133 @@
+# page_cache.py
+# Rendered-page cache for /explore and /store/<slug>.
+#
+# Pages are cached per worker (LRU, PAGE_CACHE_SIZE entries) under their key
+# plus the current generation of every scope they depend on. Writers bump a
+# scope's generation in the same transaction as the change (bump()), so the
+# next request in any worker misses and re-renders; old entries just age out.
+# Scopes: "merchant:<id>" for one storefront, "catalog" for cross-merchant
+# pages such as explore. Generations read from the table are reused for
+# PAGE_CACHE_GEN_TTL seconds, so other workers see a write within that window.
+# A bump in this worker remembers the generation it wrote: until a read
+# returns it (the caller committed), this worker re-reads instead of reusing
+# the old value. PAGE_CACHE_TTL bounds staleness for writers that don't bump.
+# The table is created at boot (init_db), never from inside a write.
+#
+# Per-user bits (cart id, bearer token) never enter the cache: templates
+# emit {{ slot('name') }} placeholders and fill() splices the values in on
+# every request.
+import os, time, secrets, threading
+from collections import OrderedDict
+
+from markupsafe import Markup, escape
+
+from db import conn_ro, register_schema
+
+PAGE_CACHE_SIZE = int(os.getenv("PAGE_CACHE_SIZE", "500"))
+PAGE_CACHE_TTL = int(os.getenv("PAGE_CACHE_TTL", "300"))
+PAGE_CACHE_GEN_TTL = float(os.getenv("PAGE_CACHE_GEN_TTL", "1"))
+CATALOG = "catalog"
+
+_lock = threading.Lock()
+_lru = OrderedDict()     # (key, gens) -> (stored_at, html)
+_gens = {}               # scope -> (read_at, gen)
+_pending = {}            # scope -> gen bumped here, not yet seen committed
+_stats = {"hits": 0, "misses": 0, "expired": 0}
+
+@register_schema("cache_generations")
+def _generations_schema(cx):
+    cx.execute("""
+    CREATE TABLE IF NOT EXISTS cache_generations(
+      scope TEXT PRIMARY KEY,
+      gen INTEGER NOT NULL
+    )""")
+
+def merchant_scope(merchant_id):
+    return f"merchant:{int(merchant_id)}"
+
+def bump(cx, merchant_id=None):
+    """Invalidate the catalog pages, and one merchant's pages, from inside the caller's write."""
+    scopes = [CATALOG] + ([merchant_scope(merchant_id)] if merchant_id is not None else [])
+    cx.executemany("INSERT INTO cache_generations(scope, gen) VALUES(?, 1) "
+                   "ON CONFLICT(scope) DO UPDATE SET gen=gen+1", [(s,) for s in scopes])
+    marks = ",".join("?" * len(scopes))
+    bumped = dict(cx.execute(f"SELECT scope, gen FROM cache_generations WHERE scope IN ({marks})",
+                             scopes).fetchall())
+    with _lock:
+        for s in scopes:
+            _gens.pop(s, None)
+            _pending[s] = max(_pending.get(s, 0), bumped[s])
+
+def _generations(scopes):
+    now = time.time()
+    out, missing = {}, []
+    with _lock:
+        for s in scopes:
+            g = _gens.get(s)
+            if g is not None and now - g[0] < PAGE_CACHE_GEN_TTL:
+                out[s] = g[1]
+            else:
+                missing.append(s)
+    if missing:
+        marks = ",".join("?" * len(missing))
+        with conn_ro() as cx:
+            got = dict(cx.execute(f"SELECT scope, gen FROM cache_generations WHERE scope IN ({marks})",
+                                  missing).fetchall())
+        with _lock:
+            for s in missing:
+                out[s] = got.get(s, 0)
+                if out[s] < _pending.get(s, 0):
+                    continue  # our bump isn't committed yet (or rolled back): don't reuse this value
+                _pending.pop(s, None)
+                _gens[s] = (now, out[s])
+    return tuple(out[s] for s in scopes)
+
+# ----------------- slots -----------------
+_NONCE = secrets.token_hex(8)  # per process, so page content can't forge a slot
+
+def slot(name):
+    """Jinja global: placeholder for a per-request value, replaced by fill()."""
+    return Markup(f"<!--{_NONCE}:{name}-->")
+
+def fill(html, **values):
+    """Splice per-request values into a cached page. Plain strings are escaped; Markup is inserted as is."""
+    for k, v in values.items():
+        html = html.replace(f"<!--{_NONCE}:{k}-->", str(escape(v if v is not None else "")))
+    return html
+
+# ----------------- cache -----------------
+
+def cached(key, scopes, render):
+    """html for key, rendering with render() only when a scope changed or the entry expired."""
+    if PAGE_CACHE_SIZE <= 0:
+        return render()
+    try:
+        full = (key, _generations(list(scopes)))
+    except Exception as e:
+        print("[PAGECACHE] generation lookup failed:", repr(e))
+        return render()
+    now = time.time()
+    with _lock:
+        ent = _lru.get(full)
+        if ent is not None:
+            if now - ent[0] < PAGE_CACHE_TTL:
+                _lru.move_to_end(full)
+                _stats["hits"] += 1
+                return ent[1]
+            del _lru[full]
+            _stats["expired"] += 1
+        _stats["misses"] += 1
+    html = render()
+    with _lock:
+        _lru[full] = (now, html)
+        while len(_lru) > PAGE_CACHE_SIZE:
+            _lru.popitem(last=False)
+    return html
+
+def stats():
+    with _lock:
+        out = dict(_stats, size=len(_lru), bytes=sum(len(v[1]) for v in _lru.values()))
+    lookups = out["hits"] + out["misses"]
+    out.update(hit_ratio=round(out["hits"] / lookups, 4) if lookups else None,
+               max_entries=PAGE_CACHE_SIZE, ttl_s=PAGE_CACHE_TTL, gen_ttl_s=PAGE_CACHE_GEN_TTL)
+    return out
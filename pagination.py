@@ -0,0 +1,40 @@
+# pagination.py
+# Opaque keyset cursors for listing endpoints.
+#
+# A cursor is the sort key of the last row on the previous page, e.g. (id,)
+# or (score, id), serialized as url-safe base64 JSON and tagged with the
+# listing it belongs to. The next page is "rows strictly after that key" in
+# the listing's stable order, so every page is an index seek plus page-size
+# rows, however deep it is. Cursors carry no authority: each endpoint still
+# filters by the current user/merchant.
+import json, base64
+
+def encode_cursor(kind, key):
+    raw = json.dumps([kind, list(key)], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode("ascii")
+
+def decode_cursor(token, kind, arity=1):
+    """Sort key tuple from a cursor made by encode_cursor(kind, ...); None if missing or not ours."""
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        k, key = json.loads(raw)
+    except Exception:
+        return None
+    if k != kind or not isinstance(key, list) or len(key) != arity:
+        return None
+    if not all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in key):
+        return None
+    return tuple(key)
+
+def page_of(rows, limit, kind, key):
+    """
+    Split rows fetched with LIMIT limit+1 into (page, next_cursor).
+    key(row) -> sort key tuple of a row.
+    """
+    rows = list(rows)
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(kind, key(rows[-1]))
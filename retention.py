@@ -0,0 +1,295 @@
+# retention.py
+# Retention / archival for tables that only ever grow.
+#
+# Rows older than a table's retention window are moved, a bounded chunk per
+# transaction, into monthly archive files (<ARCHIVE_DIR>/archive-YYYY-MM.sqlite,
+# month taken from the row's own timestamp). After a run the live database
+# gets an incremental vacuum so the freed pages go back to the filesystem.
+#
+#   python retention.py                 # run every policy
+#   python retention.py --dry-run       # only count what would move
+#   python retention.py --table carts
+#   python retention.py --enable-incremental-vacuum   # one-off, takes a full VACUUM
+#
+# Archives are plain SQLite files; open them with open_archives_ro().
+import os, time, sqlite3, argparse, threading
+from datetime import datetime, timezone
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+import db
+
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", os.path.join(db.DATA_ROOT, "archive"))
+RETENTION_CHUNK = int(os.getenv("RETENTION_CHUNK", "500"))
+RETENTION_PAUSE_MS = float(os.getenv("RETENTION_PAUSE_MS", "20"))
+# Max chunks per table per run, so one run never monopolises the writer.
+RETENTION_MAX_CHUNKS = int(os.getenv("RETENTION_MAX_CHUNKS", "200"))
+RETENTION_INTERVAL_HOURS = float(os.getenv("RETENTION_INTERVAL_HOURS", "24"))
+VACUUM_PAGES = int(os.getenv("RETENTION_VACUUM_PAGES", "0"))  # 0 = all free pages
+
+def _days(table, default):
+    return float(os.getenv(f"RETENTION_{table.upper()}_DAYS", str(default)))
+
+# table -> policy. days <= 0 disables the table.
+#   ts:       INTEGER unix-seconds column that decides age and archive month
+#   where:    extra condition a row must meet to be archived
+#   children: [(table, fk column)] rows moved together with their parent
+POLICIES = {
+    # dashboards read merchant_daily_stats; rebuilds only cover live sessions
+    "sessions": {"days": _days("sessions", 90), "ts": "created_at"},
+    "carts": {"days": _days("carts", 30), "ts": "created_at", "children": [("cart_items", "cart_id")]},
+    "voucher_redirects": {"days": _days("voucher_redirects", 30), "ts": "created_at"},
+    "live_auction_bids": {"days": _days("live_auction_bids", 180), "ts": "created_at"},
+    # finished jobs only; dead ones stay until retried or removed by hand
+    "jobs": {"days": _days("jobs", 14), "ts": "updated_at", "where": "state='done'"},
+    # Realized PnL sums every trade since a bucket's first deposit, so trades
+    # are only archived when explicitly enabled (RETENTION_BOT_TRADES_DAYS).
+    "bot_trades": {"days": _days("bot_trades", 0), "ts": "created_at"},
+}
+
+_state_lock = threading.Lock()
+_last_report = None
+_sched_thread = None
+_sched_pid = None
+
+def archive_path(month):
+    return os.path.join(ARCHIVE_DIR, f"archive-{month}.sqlite")
+
+def list_archives():
+    try:
+        return sorted(f for f in os.listdir(ARCHIVE_DIR) if f.startswith("archive-") and f.endswith(".sqlite"))
+    except FileNotFoundError:
+        return []
+
+def open_archives_ro(months=None):
+    """
+    Read-only connection over the archive files. The first month is `main`;
+    the others are attached as a_YYYY_MM. Live data is not included.
+    """
+    names = [f"archive-{m}.sqlite" for m in months] if months else list_archives()
+    if not names:
+        raise FileNotFoundError("no archive files")
+    cx = sqlite3.connect(f"file:{os.path.join(ARCHIVE_DIR, names[0])}?mode=ro", uri=True, check_same_thread=False)
+    cx.row_factory = sqlite3.Row
+    for n in names[1:]:
+        alias = "a_" + n[len("archive-"):-len(".sqlite")].replace("-", "_")
+        cx.execute(f"ATTACH DATABASE ? AS {alias}", (f"file:{os.path.join(ARCHIVE_DIR, n)}?mode=ro",))
+    return cx
+
+def _month(ts):
+    return datetime.fromtimestamp(int(ts or 0), tz=timezone.utc).strftime("%Y-%m")
+
+def _cols(cx, schema, table):
+    return [r[1] for r in cx.execute(f"PRAGMA {schema}.table_info({table})")]
+
+def _ensure_archive_table(cx, table):
+    """Create/extend arc.<table> to match main.<table>; unique on the primary key for idempotent reruns."""
+    main_cols = _cols(cx, "main", table)
+    arc_cols = _cols(cx, "arc", table)
+    if not arc_cols:
+        cx.execute(f"CREATE TABLE arc.{table} AS SELECT * FROM main.{table} WHERE 0")
+        pk = [r[1] for r in sorted(cx.execute(f"PRAGMA main.table_info({table})"), key=lambda r: r[5]) if r[5]]
+        if pk:
+            cx.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS arc.ux_{table}_pk ON {table}({', '.join(pk)})")
+    else:
+        for c in main_cols:
+            if c not in arc_cols:
+                cx.execute(f'ALTER TABLE arc.{table} ADD COLUMN "{c}"')
+    return main_cols
+
+def _move(cx, table, rowids, children):
+    """Copy rows (and their children) into arc.* and delete them from main, inside the caller's txn."""
+    marks = ",".join("?" * len(rowids))
+    cols = ", ".join(f'"{c}"' for c in _ensure_archive_table(cx, table))
+    keys = None
+    if children:
+        keys = [r[0] for r in cx.execute(f"SELECT id FROM main.{table} WHERE rowid IN ({marks})", rowids)]
+    moved = {table: cx.execute(f"INSERT OR IGNORE INTO arc.{table}({cols}) SELECT {cols} FROM main.{table} "
+                               f"WHERE rowid IN ({marks})", rowids).rowcount}
+    for child, fk in children or []:
+        if not keys or not _cols(cx, "main", child):
+            continue
+        kmarks = ",".join("?" * len(keys))
+        ccols = ", ".join(f'"{c}"' for c in _ensure_archive_table(cx, child))
+        moved[child] = cx.execute(f"INSERT OR IGNORE INTO arc.{child}({ccols}) SELECT {ccols} FROM main.{child} "
+                                  f"WHERE {fk} IN ({kmarks})", keys).rowcount
+        cx.execute(f"DELETE FROM main.{child} WHERE {fk} IN ({kmarks})", keys)
+    cx.execute(f"DELETE FROM main.{table} WHERE rowid IN ({marks})", rowids)
+    return moved
+
+def archive_table(cx, table, policy, now=None, dry_run=False):
+    """Archive one table. Returns {"rows": {table: n, child: n}, "chunks": n, "months": [...]}."""
+    out = {"rows": {}, "chunks": 0, "months": []}
+    if policy["days"] <= 0 or not _cols(cx, "main", table):
+        return out
+    ts, where = policy["ts"], policy.get("where")
+    cutoff = int((now or time.time()) - policy["days"] * 86400)
+    cond = f"{ts} IS NOT NULL AND {ts} < ?" + (f" AND ({where})" if where else "")
+    if dry_run:
+        n = cx.execute(f"SELECT COUNT(*) FROM main.{table} WHERE {cond}", (cutoff,)).fetchone()[0]
+        out["rows"][table] = n
+        return out
+
+    months = set()
+    for _ in range(RETENTION_MAX_CHUNKS):
+        rows = cx.execute(f"SELECT rowid, {ts} FROM main.{table} WHERE {cond} LIMIT ?",
+                          (cutoff, RETENTION_CHUNK)).fetchall()
+        if not rows:
+            break
+        by_month = {}
+        for rid, t in rows:
+            by_month.setdefault(_month(t), []).append(rid)
+        for month, rowids in by_month.items():
+            os.makedirs(ARCHIVE_DIR, exist_ok=True)
+            cx.execute("ATTACH DATABASE ? AS arc", (archive_path(month),))
+            try:
+                cx.execute("BEGIN IMMEDIATE")
+                try:
+                    moved = _move(cx, table, rowids, policy.get("children"))
+                    cx.execute("COMMIT")
+                except Exception:
+                    cx.execute("ROLLBACK")
+                    raise
+            finally:
+                cx.execute("DETACH DATABASE arc")
+            for t, n in moved.items():
+                out["rows"][t] = out["rows"].get(t, 0) + n
+            months.add(month)
+        out["chunks"] += 1
+        if RETENTION_PAUSE_MS > 0:
+            time.sleep(RETENTION_PAUSE_MS / 1000.0)  # let queued writers in between chunks
+    out["months"] = sorted(months)
+    return out
+
+def _page_stats(cx):
+    return {
+        "page_size": cx.execute("PRAGMA page_size").fetchone()[0],
+        "page_count": cx.execute("PRAGMA page_count").fetchone()[0],
+        "freelist": cx.execute("PRAGMA freelist_count").fetchone()[0],
+    }
+
+def incremental_vacuum(cx, pages=0):
+    """Release free pages. Needs auto_vacuum=INCREMENTAL; otherwise only reports them."""
+    before = _page_stats(cx)
+    mode = cx.execute("PRAGMA auto_vacuum").fetchone()[0]
+    if mode == 2:
+        # The pragma frees one page per step and execute() only steps once; executescript() runs it to completion.
+        cx.executescript(f"PRAGMA incremental_vacuum({int(pages)});" if pages else "PRAGMA incremental_vacuum;")
+        if db.JOURNAL_MODE == "WAL":
+            cx.execute("PRAGMA wal_checkpoint(PASSIVE)")
+    after = _page_stats(cx)
+    return {
+        "auto_vacuum": {0: "none", 1: "full", 2: "incremental"}.get(mode, mode),
+        "pages_before": before["page_count"],
+        "pages_after": after["page_count"],
+        "free_pages_before": before["freelist"],
+        "free_pages_after": after["freelist"],
+        "pages_reclaimed": before["page_count"] - after["page_count"],
+        "bytes_reclaimed": (before["page_count"] - after["page_count"]) * after["page_size"],
+    }
+
+def enable_incremental_vacuum():
+    """One-off switch to auto_vacuum=INCREMENTAL. Runs a full VACUUM: do it in a maintenance window."""
+    cx = db._open()
+    cx.isolation_level = None
+    try:
+        cx.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        t0 = time.time()
+        cx.execute("VACUUM")
+        return {"auto_vacuum": cx.execute("PRAGMA auto_vacuum").fetchone()[0],
+                "vacuum_ms": int((time.time() - t0) * 1000)}
+    finally:
+        cx.close()
+
+def _acquire_lock():
+    if fcntl is None:
+        return None, True
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    fh = open(os.path.join(ARCHIVE_DIR, ".lock"), "w")
+    try:
+        fcntl.flock(fh, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return fh, True
+    except OSError:
+        fh.close()
+        return None, False
+
+def run_retention(tables=None, dry_run=False, vacuum=True):
+    """Apply every (or the named) policy, then incremental-vacuum. Returns a report dict."""
+    global _last_report
+    lock_fh, ok = _acquire_lock() if not dry_run else (None, True)
+    if not ok:
+        print("[RETENTION] skipped: another process is running retention")
+        return None
+    t0 = time.time()
+    report = {"started_at": int(t0), "dry_run": dry_run, "tables": {}}
+    cx = db._open()
+    cx.isolation_level = None  # explicit BEGIN/COMMIT; ATTACH needs autocommit
+    try:
+        for table, policy in POLICIES.items():
+            if tables and table not in tables:
+                continue
+            t1 = time.time()
+            try:
+                res = archive_table(cx, table, policy, dry_run=dry_run)
+                res["ms"] = int((time.time() - t1) * 1000)
+            except Exception as e:
+                res = {"error": repr(e)}
+                print(f"[RETENTION] {table} failed:", repr(e))
+            report["tables"][table] = res
+        if vacuum and not dry_run:
+            report["vacuum"] = incremental_vacuum(cx, VACUUM_PAGES)
+    finally:
+        cx.close()
+        if lock_fh is not None:
+            lock_fh.close()
+    report["duration_ms"] = int((time.time() - t0) * 1000)
+    moved = sum(sum(r.get("rows", {}).values()) for r in report["tables"].values())
+    if not dry_run:
+        v = report.get("vacuum") or {}
+        print(f"[RETENTION] archived {moved} rows in {report['duration_ms']}ms, "
+              f"reclaimed {v.get('pages_reclaimed', 0)} pages ({v.get('auto_vacuum')})")
+        with _state_lock:
+            _last_report = report
+    return report
+
+def last_report():
+    with _state_lock:
+        return _last_report
+
+def _scheduler_loop(interval):
+    time.sleep(300)
+    while True:
+        try:
+            run_retention()
+        except Exception as e:
+            print("[RETENTION] run failed:", repr(e))
+        time.sleep(interval)
+
+def start_retention_scheduler():
+    """Run retention every RETENTION_INTERVAL_HOURS in a daemon thread (0 disables)."""
+    global _sched_thread, _sched_pid
+    if RETENTION_INTERVAL_HOURS <= 0:
+        return None
+    if _sched_thread is not None and _sched_pid == os.getpid() and _sched_thread.is_alive():
+        return _sched_thread
+    _sched_pid = os.getpid()
+    _sched_thread = threading.Thread(target=_scheduler_loop, args=(RETENTION_INTERVAL_HOURS * 3600,),
+                                     name="db-retention", daemon=True)
+    _sched_thread.start()
+    return _sched_thread
+
+if __name__ == "__main__":
+    import json
+    ap = argparse.ArgumentParser(description="Archive expired rows into monthly SQLite files")
+    ap.add_argument("--dry-run", action="store_true")
+    ap.add_argument("--table", action="append", help="limit to this table (repeatable)")
+    ap.add_argument("--no-vacuum", action="store_true")
+    ap.add_argument("--enable-incremental-vacuum", action="store_true")
+    args = ap.parse_args()
+    if args.enable_incremental_vacuum:
+        print(json.dumps(enable_incremental_vacuum(), indent=2))
+    else:
+        print(json.dumps(run_retention(args.table, dry_run=args.dry_run, vacuum=not args.no_vacuum), indent=2))
@@ -0,0 +1,118 @@
+# search.py
+# Full-text search for /explore and its typeahead, on the FTS5 tables from
+# migration 0007 (items_fts holds active items only, merchants_fts).
+#
+# User input never reaches MATCH as syntax: it is split into word tokens,
+# each one quoted and ANDed, and the last one is a prefix ("red sh" ->
+# "red" "sh"*), so partially typed words match. Results are ranked by bm25
+# with per-column weights. bm25 has to score every match, so matches are
+# ranked in windows of SEARCH_RANK_WINDOW, newest window first: rare terms are
+# ranked over everything, and a page of a very common term never scores more
+# than a window or two. Pages are keyset cursors over (window, score, id).
+import os, re
+
+SEARCH_MAX_TERMS = 8
+SEARCH_RANK_WINDOW = int(os.getenv("SEARCH_RANK_WINDOW", "2000"))
+# bm25 column weights: title, description, sku, merchant
+ITEM_WEIGHTS = (10.0, 2.0, 6.0, 4.0)
+# business_name, slug
+MERCHANT_WEIGHTS = (10.0, 4.0)
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+def fts_query(q):
+    """FTS5 MATCH expression for free text, or None when there is nothing to search for."""
+    terms = _TOKEN.findall((q or "").lower())[:SEARCH_MAX_TERMS]
+    if not terms:
+        return None
+    return " ".join(f'"{t}"' for t in terms) + "*"
+
+ITEM_COLUMNS = """items.*,
+       merchants.slug          AS m_slug,
+       merchants.business_name AS m_name,
+       merchants.colorway      AS m_colorway,
+       merchants.theme_mode    AS m_theme"""
+
+def _item_hits(cx, match, limit, after):
+    """
+    Up to limit (rowid, score, hi) hits after the sort key `after`. Matches are
+    taken in windows of SEARCH_RANK_WINDOW, newest first; hi is the exclusive
+    rowid upper bound of a hit's window, so (hi, score, id) orders every match.
+    """
+    w = ", ".join(str(x) for x in ITEM_WEIGHTS)
+    hi, score, last_id = after or (1 << 62, None, None)
+    hits = []
+    while len(hits) < limit:
+        lo, top, n = cx.execute(
+            """SELECT coalesce(min(rowid), 0), coalesce(max(rowid), 0), count(*) FROM
+                 (SELECT rowid FROM items_fts WHERE items_fts MATCH ? AND rowid < ?
+                  ORDER BY rowid DESC LIMIT ?)""",
+            (match, hi, SEARCH_RANK_WINDOW)
+        ).fetchone()
+        if not n:
+            break
+        hi = top + 1  # pin the window so items added later don't shift it
+        rows = cx.execute(
+            f"""SELECT id, score FROM
+                  (SELECT rowid AS id, bm25(items_fts, {w}) AS score FROM items_fts
+                   WHERE items_fts MATCH ?1 AND rowid < ?2 AND rowid >= ?3)
+                WHERE ?4 IS NULL OR score > ?4 OR (score = ?4 AND id < ?5)
+                ORDER BY score, id DESC
+                LIMIT ?6""",
+            (match, hi, lo, score, last_id, limit - len(hits))
+        ).fetchall()
+        hits.extend((r[0], r[1], hi) for r in rows)
+        if n < SEARCH_RANK_WINDOW:
+            break
+        hi, score, last_id = lo, None, None
+    return hits
+
+def search_items(cx, q, limit, after=None):
+    """
+    Active items matching q, best match first: ([rows], next_key). next_key
+    is the (hi, score, id) sort key to pass back as `after` for the next
+    page, or None on the last page.
+    """
+    match = fts_query(q)
+    if not match:
+        return [], None
+    hits = _item_hits(cx, match, limit + 1, after)
+    more = len(hits) > limit
+    hits = hits[:limit]
+    if not hits:
+        return [], None
+    ids = [h[0] for h in hits]
+    marks = ",".join("?" * len(ids))
+    by_id = {r["id"]: r for r in cx.execute(
+        f"""SELECT {ITEM_COLUMNS}
+            FROM items
+            JOIN merchants ON merchants.id = items.merchant_id
+            WHERE items.id IN ({marks}) AND items.active=1""", ids)}
+    rows = [by_id[i] for i in ids if i in by_id]
+    last = hits[-1]
+    return rows, ((last[2], last[1], last[0]) if more else None)
+
+def search_merchants(cx, q, limit):
+    match = fts_query(q)
+    if not match:
+        return []
+    w = ", ".join(str(x) for x in MERCHANT_WEIGHTS)
+    return cx.execute(
+        f"""SELECT merchants.slug, merchants.business_name, merchants.logo_url,
+                   merchants.theme_mode, merchants.colorway
+            FROM merchants_fts
+            JOIN merchants ON merchants.id = merchants_fts.rowid
+            WHERE merchants_fts MATCH ?
+            ORDER BY bm25(merchants_fts, {w}), merchants.id DESC
+            LIMIT ?""",
+        (match, limit)
+    ).fetchall()
+
+def suggest(cx, q, limit=8):
+    """Typeahead payload: a few stores and products for a partial query."""
+    stores = [{"slug": r["slug"], "name": r["business_name"], "logo_url": r["logo_url"]}
+              for r in search_merchants(cx, q, min(limit, 4))]
+    products = [{"title": r["title"], "link_id": r["link_id"], "store": r["m_slug"],
+                 "store_name": r["m_name"], "image_url": r["image_url"], "pi_price": r["pi_price"]}
+                for r in search_items(cx, q, limit)[0]]
+    return {"stores": stores, "products": products}
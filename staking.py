@@ -8,6 +8,7 @@ from stellar_sdk import (
     Server, Keypair, Asset, TransactionBuilder,
     Claimant, ClaimPredicate, StrKey, exceptions as sx
 )
+from db import register_schema, ensure_registered
 
 bp_stake = Blueprint("stake", __name__)
 log = logging.getLogger(__name__)
@@ -60,8 +61,8 @@ server = Server(HORIZON_URL)
 _SQLITE_PATH = _getenv("SQLITE_DB_PATH", "/var/data/izzapay/app.sqlite") or "/var/data/izzapay/app.sqlite"
 _vote_lock = threading.Lock()
 
-def _vote_cx():
-    cx = sqlite3.connect(_SQLITE_PATH, check_same_thread=False)
+@register_schema("staking.vote_intents")
+def _vote_schema(cx):
     cx.execute("""CREATE TABLE IF NOT EXISTS vote_intents(
       id INTEGER PRIMARY KEY AUTOINCREMENT,
       round_end INTEGER NOT NULL,
@@ -71,12 +72,17 @@ def _vote_cx():
       weight7    TEXT NOT NULL,
       created_at INTEGER NOT NULL
     )""")
+    cx.execute("CREATE INDEX IF NOT EXISTS idx_vote_intents_round ON vote_intents(round_end, proposal)")
+    cx.execute("CREATE INDEX IF NOT EXISTS idx_vote_intents_pub ON vote_intents(pub, round_end)")
     # Backfill safety, older tables may lack weight7
     try:
         cx.execute("ALTER TABLE vote_intents ADD COLUMN weight7 TEXT")
     except Exception:
         pass
-    return cx
+
+def _vote_cx():
+    ensure_registered("staking.vote_intents", path=_SQLITE_PATH)
+    return sqlite3.connect(_SQLITE_PATH, check_same_thread=False)
 
 def _vote_add(round_end, proposal, pub, amount7, weight7):
     with _vote_lock:
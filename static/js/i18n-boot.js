@@ -0,0 +1,151 @@
+if(!window.__IZZA_I18N_BOOTED__){
+  window.__IZZA_I18N_BOOTED__=true;
+
+  // Same-origin proxy — main app serves /api/translate
+  window.TRANSLATE_TEXT = async (text, from, to) => {
+    try {
+      const r = await fetch('/api/translate', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ text, from, to })
+      });
+      const j = await r.json();
+      return (j && j.ok && typeof j.text === 'string') ? j.text : text;
+    } catch {
+      return text;
+    }
+  };
+
+  // Many strings in one round trip; same order back, originals on any failure.
+  window.TRANSLATE_BATCH = async (texts, from, to) => {
+    try {
+      const r = await fetch('/api/translate/batch', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ texts, from, to })
+      });
+      const j = await r.json();
+      return (j && j.ok && Array.isArray(j.texts) && j.texts.length === texts.length) ? j.texts : texts;
+    } catch {
+      return texts;
+    }
+  };
+
+  (function(){
+    const LANG_KEY='izzaLang';
+
+    // >>> ONLY RUN IF USER PICKED A LANGUAGE <<<
+    const raw = localStorage.getItem(LANG_KEY);
+    if (!raw) return; // user hasn't chosen — do nothing
+
+    const to   = String(raw).slice(0,5);
+    const from = (document.documentElement.getAttribute('lang')||'en').slice(0,5);
+    if (!to || to === from) return; // nothing to translate — do nothing
+
+    if (typeof window.TRANSLATE_TEXT!=='function'){ window.TRANSLATE_TEXT=async t=>t; }
+
+    // Elements to always skip
+    const SKIP_TAGS=new Set(['SCRIPT','STYLE','NOSCRIPT','CODE','PRE','TEXTAREA','INPUT','SELECT','OPTION']);
+
+    // --- Sensitive text detectors (avoid touching keys / hashes) ---
+    function isLikelyStellarPubKey(s){
+      const t=s.replace(/\s+/g,'').trim();
+      return /^G[A-Z2-7]{55}$/.test(t);
+    }
+    function isLongBase32ish(s){
+      const t=s.replace(/\s+/g,'').trim();
+      return /^[A-Z0-9]{30,}$/.test(t);
+    }
+    function isLongHexHash(s){
+      const t=s.replace(/\s+/g,'').trim();
+      return /^[a-fA-F0-9]{40,}$/.test(t);
+    }
+    function isSensitiveText(s){
+      if(!s || s.length<10) return false;
+      return isLikelyStellarPubKey(s) || isLongBase32ish(s) || isLongHexHash(s);
+    }
+
+    function collect(root){
+      const nodes=[];
+      const w=document.createTreeWalker(
+        root,
+        NodeFilter.SHOW_TEXT,
+        { acceptNode(n){
+            const p=n.parentElement;
+            if(!p) return NodeFilter.FILTER_REJECT;
+            if(SKIP_TAGS.has(p.tagName)) return NodeFilter.FILTER_REJECT;
+            if(p.closest('[data-no-i18n="1"]')) return NodeFilter.FILTER_REJECT;
+
+            const s=n.nodeValue;
+            if(!s || !s.trim()) return NodeFilter.FILTER_REJECT;
+
+            if(isSensitiveText(s)) return NodeFilter.FILTER_REJECT;
+
+            return NodeFilter.FILTER_ACCEPT;
+          }
+        }
+      );
+      let n; while((n=w.nextNode())) nodes.push(n);
+      return nodes;
+    }
+
+    // Keep requests under the server's limits (TRANSLATE_BATCH_MAX / _MAX_CHARS).
+    const BATCH_MAX=100, BATCH_CHARS=15000;
+    const applied=new WeakMap();  // node -> text we wrote, so our own writes aren't re-sent
+
+    async function translate(nodes){
+      const todo=[];
+      for(const n of nodes){
+        try{
+          const p=n.parentElement;
+          if(!p || p.closest('[data-no-i18n="1"]')) continue;
+          if(isSensitiveText(n.nodeValue)) continue;
+          if(applied.get(n)===n.nodeValue) continue;
+          todo.push({ n, p, orig:(p?.dataset?.i18nOriginal) ?? n.nodeValue });
+        }catch{}
+      }
+      let i=0;
+      while(i<todo.length){
+        const chunk=[]; let chars=0;
+        while(i<todo.length && chunk.length<BATCH_MAX && (chunk.length===0 || chars+todo[i].orig.length<=BATCH_CHARS)){
+          chars+=todo[i].orig.length; chunk.push(todo[i++]);
+        }
+        const outs=await window.TRANSLATE_BATCH(chunk.map(t=>t.orig),from,to);
+        chunk.forEach((t,k)=>{
+          try{
+            const out=outs[k];
+            if(t.p && t.p.dataset && !t.p.dataset.i18nOriginal) t.p.dataset.i18nOriginal=t.orig;
+            if(typeof out==='string' && out && out!==t.n.nodeValue){ t.n.nodeValue=out; }
+            applied.set(t.n, t.n.nodeValue);
+          }catch{}
+        });
+      }
+    }
+
+    async function run(){ await translate(collect(document.body)); }
+
+    // Mutations arrive in bursts (render loops, infinite scroll); flush each burst as one batch.
+    let pending=new Set(), flushTimer=null;
+    function flush(){ flushTimer=null; const b=[...pending]; pending=new Set(); if(b.length) translate(b); }
+
+    const mo=new MutationObserver(muts=>{
+      for(const m of muts){
+        if(m.type==='childList'){
+          m.addedNodes && m.addedNodes.forEach(nd=>{
+            if(nd.nodeType===1) collect(nd).forEach(x=>pending.add(x));
+            else if(nd.nodeType===3) pending.add(nd);
+          });
+        } else if(m.type==='characterData' && m.target && m.target.nodeType===3){
+          pending.add(m.target);
+        }
+      }
+      if(pending.size && !flushTimer) flushTimer=setTimeout(flush,50);
+    });
+
+    function arm(){ try{ mo.observe(document.body,{childList:true,characterData:true,subtree:true}); }catch{} }
+
+    if(document.readyState==='loading'){
+      document.addEventListener('DOMContentLoaded',()=>{ run(); arm(); },{once:true});
+    } else { run(); arm(); }
+  })();
+}
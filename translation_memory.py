@@ -0,0 +1,284 @@
+# translation_memory.py
+# Translation memory in front of the LibreTranslate service (LIBRE_EP).
+#
+# Lookups go LRU (per worker) -> translation_memory table (shared) -> upstream.
+# Concurrent misses for the same string are single-flighted: one caller asks
+# upstream, the others wait for its answer. Only real upstream answers are
+# stored; failures fall back to the original text and are retried next time.
+#
+#   python translation_memory.py --warm --to es,fr,ko    # pre-translate the catalog
+#   python translation_memory.py --stats
+import os, time, hashlib, threading, argparse
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import requests
+
+from db import conn_ro, register_schema, ensure_registered, run_write
+
+LIBRE_EP = os.getenv("LIBRE_EP", "https://izzatranslate.onrender.com").rstrip("/")
+TM_CACHE_SIZE = int(os.getenv("TM_CACHE_SIZE", "20000"))
+TM_UPSTREAM_TIMEOUT = float(os.getenv("TM_UPSTREAM_TIMEOUT", "15"))
+TRANSLATE_BATCH_CONCURRENCY = int(os.getenv("TRANSLATE_BATCH_CONCURRENCY", "4"))
+TM_WARM_CHUNK = int(os.getenv("TM_WARM_CHUNK", "50"))
+
+_pool = ThreadPoolExecutor(max_workers=max(1, TRANSLATE_BATCH_CONCURRENCY), thread_name_prefix="translate")
+
+@register_schema("translation_memory")
+def _tm_schema(cx):
+    cx.execute("""
+    CREATE TABLE IF NOT EXISTS translation_memory(
+      key TEXT PRIMARY KEY,          -- sha1(source \\0 target \\0 text)
+      source TEXT NOT NULL,
+      target TEXT NOT NULL,
+      text TEXT NOT NULL,
+      translated TEXT NOT NULL,
+      created_at INTEGER NOT NULL
+    )""")
+
+def tm_key(text, src, tgt):
+    return hashlib.sha1(f"{src}\0{tgt}\0{text}".encode("utf-8")).hexdigest()
+
+# ----------------- upstream -----------------
+def _upstream_one(q, src, tgt):
+    try:
+        r = requests.post(f"{LIBRE_EP}/translate",
+                          json={"q": q, "source": src, "target": tgt, "format": "text"},
+                          timeout=TM_UPSTREAM_TIMEOUT)
+        if r.status_code == 200:
+            j = r.json()
+            out = j.get("translatedText") or j.get("translated_text")
+            if isinstance(out, str) and out:
+                return out
+    except Exception:
+        pass
+    return None
+
+def _upstream_many(texts, src, tgt):
+    """
+    LibreTranslate's native batch form (q as a list) first, then one call per
+    string, TRANSLATE_BATCH_CONCURRENCY at a time. None marks a failure.
+    """
+    t0 = time.time()
+    try:
+        if len(texts) > 1:
+            try:
+                r = requests.post(f"{LIBRE_EP}/translate",
+                                  json={"q": texts, "source": src, "target": tgt, "format": "text"},
+                                  timeout=TM_UPSTREAM_TIMEOUT * 2)
+                if r.status_code == 200:
+                    out = r.json().get("translatedText")
+                    if isinstance(out, list) and len(out) == len(texts):
+                        return [o if isinstance(o, str) and o else None for o in out]
+            except Exception:
+                pass
+        return list(_pool.map(lambda q: _upstream_one(q, src, tgt), texts))
+    finally:
+        _observe_upstream((time.time() - t0) * 1000, len(texts))
+
+# ----------------- metrics -----------------
+_mlock = threading.Lock()
+_metrics = {"lookups": 0, "lru_hits": 0, "db_hits": 0, "misses": 0, "coalesced": 0,
+            "upstream_calls": 0, "upstream_texts": 0, "upstream_failures": 0, "upstream_ms_total": 0.0}
+_upstream_ms = deque(maxlen=500)
+
+def _count(**kw):
+    with _mlock:
+        for k, v in kw.items():
+            _metrics[k] += v
+
+def _observe_upstream(ms, n):
+    with _mlock:
+        _metrics["upstream_calls"] += 1
+        _metrics["upstream_texts"] += n
+        _metrics["upstream_ms_total"] += ms
+        _upstream_ms.append(ms)
+
+def stats():
+    with _mlock:
+        out = dict(_metrics)
+        lat = sorted(_upstream_ms)
+    hits = out["lru_hits"] + out["db_hits"]
+    out["hit_ratio"] = round(hits / out["lookups"], 4) if out["lookups"] else None
+    out["upstream_ms_total"] = round(out["upstream_ms_total"], 1)
+    if lat:
+        out["upstream_ms"] = {"p50": round(lat[len(lat) // 2], 1),
+                              "p95": round(lat[min(len(lat) - 1, int(len(lat) * .95))], 1),
+                              "max": round(lat[-1], 1), "samples": len(lat)}
+    with _lru_lock:
+        out["lru_size"] = len(_lru)
+    out["lru_max"] = TM_CACHE_SIZE
+    return out
+
+# ----------------- memory -----------------
+_lru_lock = threading.Lock()
+_lru = OrderedDict()     # key -> translated
+_inflight = {}           # key -> Future
+
+def _lru_get(k):
+    with _lru_lock:
+        v = _lru.get(k)
+        if v is not None:
+            _lru.move_to_end(k)
+        return v
+
+def _lru_put(k, v):
+    with _lru_lock:
+        _lru[k] = v
+        _lru.move_to_end(k)
+        while len(_lru) > TM_CACHE_SIZE:
+            _lru.popitem(last=False)
+
+def _db_get(keys):
+    ensure_registered("translation_memory")
+    out = {}
+    with conn_ro() as cx:
+        for i in range(0, len(keys), 500):
+            part = keys[i:i + 500]
+            marks = ",".join("?" * len(part))
+            for r in cx.execute(f"SELECT key, translated FROM translation_memory WHERE key IN ({marks})", part):
+                out[r["key"]] = r["translated"]
+    return out
+
+def _db_put(rows):
+    def _write(cx):
+        cx.executemany("INSERT OR REPLACE INTO translation_memory(key, source, target, text, translated, created_at) "
+                       "VALUES(?,?,?,?,?,?)", rows)
+    ensure_registered("translation_memory")
+    run_write(_write)
+
+def translate_many(texts, src, tgt, failed=None):
+    """
+    Translate a list of strings (already stripped, may repeat), same order back.
+    Untranslatable entries come back unchanged; pass a set as `failed` to get
+    their indexes.
+    """
+    texts = list(texts)
+    if not texts:
+        return []
+    keys = [tm_key(t, src, tgt) for t in texts]
+    result = {}
+    _count(lookups=len(set(keys)))
+
+    missing = []
+    for k in dict.fromkeys(keys):
+        v = _lru_get(k)
+        if v is not None:
+            result[k] = v
+            _count(lru_hits=1)
+        else:
+            missing.append(k)
+
+    if missing:
+        try:
+            found = _db_get(missing)
+        except Exception as e:
+            print("[TM] db lookup failed:", repr(e))
+            found = {}
+        for k, v in found.items():
+            result[k] = v
+            _lru_put(k, v)
+        _count(db_hits=len(found))
+        missing = [k for k in missing if k not in found]
+
+    if missing:
+        text_of = dict(zip(keys, texts))
+        mine, waits = [], []
+        with _lru_lock:
+            for k in missing:
+                f = _inflight.get(k)
+                if f is None:
+                    _inflight[k] = Future()
+                    mine.append(k)
+                else:
+                    waits.append((k, f))
+        _count(misses=len(mine), coalesced=len(waits))
+        if mine:
+            outs = [None] * len(mine)
+            try:
+                outs = _upstream_many([text_of[k] for k in mine], src, tgt)
+            finally:
+                rows, now = [], int(time.time())
+                with _lru_lock:
+                    futs = [_inflight.pop(k) for k in mine]
+                for k, out, f in zip(mine, outs, futs):
+                    if out is not None:
+                        result[k] = out
+                        _lru_put(k, out)
+                        rows.append((k, src, tgt, text_of[k], out, now))
+                    f.set_result(out)
+                n_failed = len(mine) - len(rows)
+                if n_failed:
+                    _count(upstream_failures=n_failed)
+                if rows:
+                    try:
+                        _db_put(rows)
+                    except Exception as e:
+                        print("[TM] store failed:", repr(e))
+        for k, f in waits:
+            try:
+                out = f.result(timeout=TM_UPSTREAM_TIMEOUT * 2 + 5)
+            except Exception:
+                out = None
+            if out is not None:
+                result[k] = out
+
+    if failed is not None:
+        failed.update(i for i, k in enumerate(keys) if k not in result)
+    return [result.get(k, t) for k, t in zip(keys, texts)]
+
+def translate_one(text, src, tgt):
+    return translate_many([text], src, tgt)[0]
+
+# ----------------- warm-up -----------------
+def catalog_texts():
+    """Distinct storefront strings: active item titles/descriptions, merchant names/descriptions."""
+    seen = {}
+    with conn_ro() as cx:
+        cols = {r[1] for r in cx.execute("PRAGMA table_info(items)")}
+        icols = [c for c in ("title", "description") if c in cols]
+        mcols = {r[1] for r in cx.execute("PRAGMA table_info(merchants)")}
+        mcols = [c for c in ("business_name", "description") if c in mcols]
+        if icols:
+            for r in cx.execute(f"SELECT {', '.join(icols)} FROM items WHERE active=1"):
+                for v in r:
+                    if isinstance(v, str) and v.strip():
+                        seen[v.strip()] = None
+        if mcols:
+            for r in cx.execute(f"SELECT {', '.join(mcols)} FROM merchants"):
+                for v in r:
+                    if isinstance(v, str) and v.strip():
+                        seen[v.strip()] = None
+    return list(seen)
+
+def warm_catalog(targets, src="auto", progress=None):
+    """Pre-translate catalog_texts() into each target language. Returns per-target counts."""
+    texts = catalog_texts()
+    report = {"texts": len(texts), "targets": {}}
+    for tgt in targets:
+        t0 = time.time()
+        before = stats()["upstream_texts"]
+        for i in range(0, len(texts), TM_WARM_CHUNK):
+            translate_many(texts[i:i + TM_WARM_CHUNK], src, tgt)
+            if progress:
+                progress(tgt, min(i + TM_WARM_CHUNK, len(texts)), len(texts))
+        report["targets"][tgt] = {"upstream_texts": stats()["upstream_texts"] - before,
+                                  "ms": int((time.time() - t0) * 1000)}
+        print(f"[TM] warmed {tgt}: {len(texts)} texts, {report['targets'][tgt]['upstream_texts']} sent upstream")
+    return report
+
+if __name__ == "__main__":
+    import json
+    ap = argparse.ArgumentParser(description="Translation memory tools")
+    ap.add_argument("--warm", action="store_true", help="pre-translate the catalog")
+    ap.add_argument("--to", default="", help="comma-separated target languages")
+    ap.add_argument("--from", dest="src", default="auto")
+    ap.add_argument("--stats", action="store_true")
+    args = ap.parse_args()
+    if args.warm:
+        targets = [t.strip()[:5] for t in args.to.split(",") if t.strip()]
+        if not targets:
+            ap.error("--warm needs --to")
+        print(json.dumps(warm_catalog(targets, args.src), indent=2))
+    if args.stats or not args.warm:
+        print(json.dumps(stats(), indent=2))
@@ -0,0 +1,249 @@
+# uimg_cache.py
+# Disk cache for remote images proxied by /uimg.
+#
+# Layout under UIMG_CACHE_DIR:
+#   blobs/ab/<sha256 of content>      image bytes (content-addressed, shared by URLs)
+#   urls/cd/<sha256 of url>.json      {url, blob, ctype, size, etag, last_modified, fetched_at}
+#
+# Entries are fresh for UIMG_CACHE_TTL seconds; after that they are
+# revalidated upstream with If-None-Match / If-Modified-Since. Blobs are
+# evicted least-recently-served first once the total passes UIMG_CACHE_MAX_BYTES
+# (serving touches the blob's mtime). The same pass deletes url metas that
+# point at a removed blob or weren't fetched for UIMG_META_MAX_AGE seconds. Concurrent misses for one URL share a
+# single upstream fetch per worker; files are written via rename so workers
+# never see partial objects.
+import os, json, time, hashlib, tempfile, threading
+from concurrent.futures import Future
+
+import requests
+from requests.adapters import HTTPAdapter
+
+DATA_ROOT = os.getenv("DATA_ROOT", "/var/data/izzapay")
+UIMG_CACHE_DIR = os.getenv("UIMG_CACHE_DIR", os.path.join(DATA_ROOT, "uimg-cache"))
+UIMG_CACHE_MAX_BYTES = int(os.getenv("UIMG_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+UIMG_MAX_OBJECT_BYTES = int(os.getenv("UIMG_MAX_OBJECT_BYTES", str(8 * 1024 * 1024)))
+UIMG_CACHE_TTL = int(os.getenv("UIMG_CACHE_TTL", "86400"))
+UIMG_META_MAX_AGE = int(os.getenv("UIMG_META_MAX_AGE", str(30 * 86400)))  # not requested since
+UIMG_FETCH_TIMEOUT = float(os.getenv("UIMG_FETCH_TIMEOUT", "10"))
+_CHUNK = 64 * 1024
+
+_session = requests.Session()
+_session.headers["User-Agent"] = "izzapay-image-proxy"
+_session.mount("https://", HTTPAdapter(pool_connections=16, pool_maxsize=32))
+_session.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=8))
+
+_lock = threading.Lock()
+_inflight = {}           # url key -> Future
+_total = None            # bytes in blobs/, scanned lazily
+_stats = {"hits": 0, "misses": 0, "revalidated": 0, "refetched": 0, "coalesced": 0,
+          "too_large": 0, "errors": 0, "evicted": 0, "metas_pruned": 0, "bytes_fetched": 0}
+
+def _bump(k, n=1):
+    with _lock:
+        _stats[k] += n
+
+def _url_key(url):
+    return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+def _meta_path(k):
+    return os.path.join(UIMG_CACHE_DIR, "urls", k[:2], k + ".json")
+
+def blob_path(h):
+    return os.path.join(UIMG_CACHE_DIR, "blobs", h[:2], h)
+
+def _read_meta(k):
+    try:
+        with open(_meta_path(k), "r", encoding="utf-8") as f:
+            m = json.load(f)
+        if os.path.exists(blob_path(m["blob"])):
+            return m
+    except (OSError, ValueError, KeyError):
+        pass
+    return None
+
+def _write_meta(k, meta):
+    path = _meta_path(k)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".part")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    os.replace(tmp, path)
+
+def _scan_total():
+    total = 0
+    for root, _, files in os.walk(os.path.join(UIMG_CACHE_DIR, "blobs")):
+        for f in files:
+            try: total += os.path.getsize(os.path.join(root, f))
+            except OSError: pass
+    return total
+
+def _account(delta):
+    global _total
+    with _lock:
+        if _total is None:
+            _total = _scan_total()  # already includes the blob just stored
+        else:
+            _total += delta
+        over = _total > UIMG_CACHE_MAX_BYTES
+    if over:
+        _evict()
+
+def _evict():
+    """Drop least-recently-served blobs until the cache is back under 90% of its cap."""
+    global _total
+    blobs = []
+    for root, _, files in os.walk(os.path.join(UIMG_CACHE_DIR, "blobs")):
+        for f in files:
+            p = os.path.join(root, f)
+            try:
+                st = os.stat(p)
+                blobs.append((st.st_mtime, st.st_size, p))
+            except OSError:
+                pass
+    blobs.sort()
+    total = sum(b[1] for b in blobs)
+    target = int(UIMG_CACHE_MAX_BYTES * 0.9)
+    n = 0
+    for _, size, p in blobs:
+        if total <= target:
+            break
+        try:
+            os.remove(p)
+            total -= size
+            n += 1
+        except OSError:
+            pass
+    with _lock:
+        _total = total
+        _stats["evicted"] += n
+    _prune_metas()
+
+def _prune_metas():
+    """Delete url metas whose blob is gone or that aged out; otherwise one file per URL ever proxied piles up."""
+    # a URL requested past its TTL is revalidated, which rewrites fetched_at
+    cutoff = time.time() - UIMG_CACHE_TTL - UIMG_META_MAX_AGE
+    n = 0
+    for root, _, files in os.walk(os.path.join(UIMG_CACHE_DIR, "urls")):
+        for f in files:
+            if not f.endswith(".json"):
+                continue
+            p = os.path.join(root, f)
+            try:
+                with open(p, "r", encoding="utf-8") as fh:
+                    m = json.load(fh)
+                if m.get("fetched_at", 0) >= cutoff and os.path.exists(blob_path(m["blob"])):
+                    continue
+            except (OSError, ValueError, KeyError, TypeError, AttributeError):
+                pass  # unreadable: as good as gone
+            try:
+                os.remove(p)
+                n += 1
+            except OSError:
+                pass
+    _bump("metas_pruned", n)
+
+def _fetch(url, k, old):
+    """Fetch (or revalidate) url upstream. Returns the new meta, or None."""
+    headers = {}
+    if old:
+        if old.get("etag"):
+            headers["If-None-Match"] = old["etag"]
+        if old.get("last_modified"):
+            headers["If-Modified-Since"] = old["last_modified"]
+    with _session.get(url, stream=True, timeout=UIMG_FETCH_TIMEOUT, headers=headers) as r:
+        if r.status_code == 304 and old:
+            meta = dict(old, fetched_at=int(time.time()))
+            _write_meta(k, meta)
+            _bump("revalidated")
+            return meta
+        if r.status_code != 200:
+            return None
+        clen = r.headers.get("Content-Length")
+        if clen and clen.isdigit() and int(clen) > UIMG_MAX_OBJECT_BYTES:
+            _bump("too_large")
+            return None
+        tmp_dir = os.path.join(UIMG_CACHE_DIR, "tmp")
+        os.makedirs(tmp_dir, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=tmp_dir)
+        h, size = hashlib.sha256(), 0
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for chunk in r.iter_content(_CHUNK):
+                    size += len(chunk)
+                    if size > UIMG_MAX_OBJECT_BYTES:
+                        _bump("too_large")
+                        raise ValueError("object too large")
+                    h.update(chunk)
+                    f.write(chunk)
+            digest = h.hexdigest()
+            dest = blob_path(digest)
+            if os.path.exists(dest):
+                os.remove(tmp)
+            else:
+                os.makedirs(os.path.dirname(dest), exist_ok=True)
+                os.replace(tmp, dest)
+                _account(size)
+        except BaseException:
+            try: os.remove(tmp)
+            except OSError: pass
+            raise
+        meta = {"url": url, "blob": digest, "size": size,
+                "ctype": r.headers.get("Content-Type", "image/png"),
+                "etag": r.headers.get("ETag"), "last_modified": r.headers.get("Last-Modified"),
+                "fetched_at": int(time.time())}
+        _write_meta(k, meta)
+        _bump("refetched" if old else "misses")
+        _bump("bytes_fetched", size)
+        return meta
+
+def get(url):
+    """
+    Cached entry for a remote image: dict with blob path ('path'), 'ctype', 'etag'
+    (content hash, for clients) and 'size'; None if it can't be fetched.
+    """
+    k = _url_key(url)
+    meta = _read_meta(k)
+    if meta and time.time() - meta.get("fetched_at", 0) < UIMG_CACHE_TTL:
+        _bump("hits")
+        return _entry(meta)
+
+    with _lock:
+        fut = _inflight.get(k)
+        leader = fut is None
+        if leader:
+            fut = _inflight[k] = Future()
+    if not leader:
+        _bump("coalesced")
+        try:
+            res = fut.result(timeout=UIMG_FETCH_TIMEOUT * 2 + 5)
+        except Exception:
+            res = None
+        return _entry(res) if res else (_entry(meta) if meta else None)
+
+    res = None
+    try:
+        res = _fetch(url, k, meta)
+    except Exception:
+        _bump("errors")
+    finally:
+        with _lock:
+            _inflight.pop(k, None)
+        fut.set_result(res)
+    if res is None and meta:
+        return _entry(meta)  # upstream down or gone: keep serving the stale copy
+    return _entry(res) if res else None
+
+def _entry(meta):
+    path = blob_path(meta["blob"])
+    try:
+        os.utime(path, None)  # LRU clock
+    except OSError:
+        return None
+    return {"path": path, "ctype": meta.get("ctype") or "image/png", "etag": meta["blob"], "size": meta["size"]}
+
+def stats():
+    with _lock:
+        out = dict(_stats)
+        out["bytes_cached"] = _total
+    out.update(max_bytes=UIMG_CACHE_MAX_BYTES, max_object_bytes=UIMG_MAX_OBJECT_BYTES, ttl_s=UIMG_CACHE_TTL)
+    return out
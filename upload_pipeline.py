@@ -0,0 +1,217 @@
+# upload_pipeline.py
+# Bitmap uploads are decoded, normalized and encoded in a process pool.
+#
+# Each upload is decoded once, after a pixel-count guard that reads only the
+# header. It is then orientation-fixed, capped at 2048px and re-encoded. The
+# result goes to UPLOAD_DIR/<sha256[:32]>.<ext> via a rename, so readers never
+# see a partial file. The request returns as soon as that canonical file
+# exists. The standard /uimg derivatives (STANDARD_VARIANTS) are queued on the
+# same pool and rendered in parallel into image_variants' cache, so the first
+# storefront view of a new image doesn't have to render them.
+#
+#   UPLOAD_WORKERS=0              process uploads on the request thread (no pool)
+#   UPLOAD_POOL_START=forkserver  multiprocessing start method. The pool is created
+#                                 on first use, inside a web worker that already
+#                                 runs threads (jobs, backups), and forking that can
+#                                 copy a held lock into a child, so the default is
+#                                 forkserver under gunicorn. Elsewhere it is fork:
+#                                 spawn/forkserver re-import a script's __main__
+#                                 (python app.py) in every child.
+import os, sys, hashlib, tempfile, threading, multiprocessing
+from io import BytesIO
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FuturesTimeout
+from concurrent.futures.process import BrokenProcessPool
+
+from PIL import Image, ImageOps
+
+import image_variants
+
+UPLOAD_WORKERS = int(os.getenv("UPLOAD_WORKERS", str(min(4, os.cpu_count() or 1))))
+UPLOAD_POOL_START = os.getenv("UPLOAD_POOL_START", "")  # "" = forkserver under gunicorn, else fork
+UPLOAD_MAX_PIXELS = int(os.getenv("UPLOAD_MAX_PIXELS", str(40_000_000)))
+UPLOAD_TIMEOUT_S = float(os.getenv("UPLOAD_TIMEOUT_S", "30"))
+UPLOAD_MAX_DIM = 2048
+EXTENSIONS = {"JPEG": "jpg", "PNG": "png", "GIF": "gif", "WEBP": "webp"}
+
+# what explore/store ask for through the |thumb filter
+STANDARD_VARIANTS = [image_variants.parse_params(a) for a in (
+    {"w": "480", "fmt": "webp"},
+    {"w": "112", "fmt": "webp"},
+    {"h": "96", "fmt": "webp"},
+)]
+
+class UploadRejected(Exception):
+    """Not an image we accept; args[0] is the API error code."""
+
+_lock = threading.Lock()
+_pool = None
+_pool_pid = None
+_stats = {"processed": 0, "inline": 0, "rejected": 0, "timeouts": 0, "pool_restarts": 0,
+          "variants_queued": 0, "variant_errors": 0}
+
+def _bump(k, n=1):
+    with _lock:
+        _stats[k] += n
+
+# ----------------- worker side -----------------
+def write_atomic(path, data):
+    """Write data to path via a temp file + rename; a no-op if path already exists."""
+    if os.path.exists(path):
+        return path
+    d = os.path.dirname(path)
+    os.makedirs(d, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=d, suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        try: os.remove(tmp)
+        except OSError: pass
+        raise
+    return path
+
+def save_canonical(upload_dir, data, ext):
+    """Store bytes under their content hash. Returns the file name."""
+    name = f"{hashlib.sha256(data).hexdigest()[:32]}.{ext}"
+    write_atomic(os.path.join(upload_dir, name), data)
+    return name
+
+def _encode(img, ext):
+    mode = img.mode
+    has_alpha = ("A" in mode) or (mode in ("RGBA", "LA", "P"))
+    buf = BytesIO()
+    if ext == "jpg":
+        if has_alpha or mode != "RGB":
+            img = img.convert("RGB")
+        img.save(buf, format="JPEG", quality=85, optimize=True, progressive=True)
+    elif ext == "png":
+        if mode == "P":
+            img = img.convert("RGBA" if has_alpha else "RGB")
+        img.save(buf, format="PNG", optimize=True)
+    else:
+        if mode not in ("RGB", "RGBA"):
+            img = img.convert("RGBA" if has_alpha else "RGB")
+        img.save(buf, format="WEBP", quality=85, method=4)
+    return buf.getvalue()
+
+def process_image(raw, upload_dir):
+    """
+    Decode, normalize and store one uploaded bitmap. Returns the canonical file
+    name. Raises UploadRejected('invalid_image' | 'unsupported_format' |
+    'too_many_pixels'). Runs in a pool worker or inline.
+    """
+    try:
+        img = Image.open(BytesIO(raw))
+    except Exception:
+        raise UploadRejected("invalid_image")
+    with img:
+        ext = EXTENSIONS.get((img.format or "").upper())
+        if not ext:
+            raise UploadRejected("unsupported_format")
+        if img.width * img.height > UPLOAD_MAX_PIXELS:  # header only, nothing decoded yet
+            raise UploadRejected("too_many_pixels")
+        if ext == "gif" and getattr(img, "is_animated", False):
+            return save_canonical(upload_dir, raw, "gif")  # keep every frame as uploaded
+        try:
+            if max(img.size) > UPLOAD_MAX_DIM:
+                img.draft("RGB", (UPLOAD_MAX_DIM, UPLOAD_MAX_DIM))  # JPEG: decode at a reduced scale
+            img.load()
+        except Exception:
+            raise UploadRejected("invalid_image")
+        out = ImageOps.exif_transpose(img)
+        if max(out.size) > UPLOAD_MAX_DIM:
+            out.thumbnail((UPLOAD_MAX_DIM, UPLOAD_MAX_DIM))
+        if ext == "gif":
+            return save_canonical(upload_dir, raw, "gif")
+        return save_canonical(upload_dir, _encode(out, ext), ext)
+
+def render_variant(src_path, params):
+    """Pool task: one standard derivative of a freshly stored upload. Its path, or None if it existed."""
+    path, _, _ = image_variants.variant_target(image_variants.source_id(src_path), params)
+    if os.path.exists(path):
+        return None
+    return image_variants.render_to(src_path, params, path)
+
+# ----------------- request side -----------------
+def _start_method():
+    if UPLOAD_POOL_START:
+        return UPLOAD_POOL_START
+    return "forkserver" if "gunicorn" in sys.modules else "fork"
+
+def _get_pool():
+    global _pool, _pool_pid
+    if UPLOAD_WORKERS <= 0:
+        return None
+    with _lock:
+        if _pool is None or _pool_pid != os.getpid():  # never reuse a pool inherited over fork
+            ctx = multiprocessing.get_context(_start_method())
+            if ctx.get_start_method() == "forkserver":
+                ctx.set_forkserver_preload(["upload_pipeline"])  # PIL imported once, not per child
+            _pool = ProcessPoolExecutor(max_workers=UPLOAD_WORKERS, mp_context=ctx)
+            _pool_pid = os.getpid()
+        return _pool
+
+def _drop_pool(pool):
+    global _pool
+    with _lock:
+        if _pool is pool:
+            _pool = None
+            _stats["pool_restarts"] += 1
+    pool.shutdown(wait=False, cancel_futures=True)
+
+def _variant_done(fut):
+    if fut.cancelled() or fut.exception() is not None:
+        _bump("variant_errors")
+    elif fut.result():
+        image_variants.account(fut.result())  # byte cap is tracked in this process
+
+def _queue_variants(pool, src_path):
+    for params in STANDARD_VARIANTS:
+        try:
+            fut = pool.submit(render_variant, src_path, params)
+        except Exception:
+            return
+        _bump("variants_queued")
+        fut.add_done_callback(_variant_done)
+
+def store_upload(raw, upload_dir):
+    """
+    Canonical file name for an uploaded bitmap, once it is on disk. Standard
+    derivatives are still rendering in the background when this returns.
+    Raises UploadRejected (see process_image, plus 'busy' on timeout).
+    """
+    pool = _get_pool()
+    name = None
+    if pool is not None:
+        try:
+            name = pool.submit(process_image, raw, upload_dir).result(timeout=UPLOAD_TIMEOUT_S)
+        except UploadRejected:
+            _bump("rejected")
+            raise
+        except FuturesTimeout:
+            _bump("timeouts")  # pool saturated; redoing the work inline would only add load
+            raise UploadRejected("busy")
+        except BrokenProcessPool as e:
+            print("[UPLOAD] worker pool broke, processing inline:", repr(e))
+            _drop_pool(pool)
+            pool = None
+        except Exception as e:
+            print("[UPLOAD] pool processing failed, processing inline:", repr(e))
+            pool = None
+    if name is None:
+        _bump("inline")
+        try:
+            name = process_image(raw, upload_dir)
+        except UploadRejected:
+            _bump("rejected")
+            raise
+    _bump("processed")
+    if pool is not None and not name.endswith(".gif"):
+        _queue_variants(pool, os.path.join(upload_dir, name))
+    return name
+
+def stats():
+    with _lock:
+        return dict(_stats, workers=UPLOAD_WORKERS, start_method=_start_method(),
+                    max_pixels=UPLOAD_MAX_PIXELS)
@@ -8,7 +8,7 @@ from flask import (
     jsonify,
 )
 from time import time
-from db import conn
+from db import conn, register_schema, ensure_registered
 
 import os
 from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
@@ -249,7 +249,8 @@ def _linked_wallet_pub_for_username(uname: str) -> str:
 # WAR ZONE SHOP, schema + seed
 # ----------------------------------------------------------------------
 
-def _ensure_shop_schema(cx):
+@register_schema("warzone.shop")
+def _shop_schema(cx):
     cx.executescript(
         """
         CREATE TABLE IF NOT EXISTS warzone_shop_items(
@@ -308,6 +309,12 @@ def _ensure_shop_schema(cx):
         );
         """
     )
+    _seed_shop_if_empty(cx)
+    _seed_ammo_packs_if_empty(cx)
+
+
+def _ensure_shop_schema():
+    ensure_registered("warzone.shop")
 
 
 def _seed_shop_if_empty(cx):
@@ -645,8 +652,8 @@ def warzone_invite_player():
         return jsonify({"error": "invalid_target"}), 400
 
     now_ts = _now_i()
+    _ensure_shop_schema()
     with conn() as cx:
-        _ensure_shop_schema(cx)
         cx.execute(
             """
             INSERT OR IGNORE INTO warzone_invites
@@ -675,10 +682,8 @@ def warzone_ammo_current():
     if not uid:
         return jsonify({"ok": False, "error": "auth_required"}), 401
 
+    _ensure_shop_schema()
     with conn() as cx:
-        _ensure_shop_schema(cx)
-        _seed_shop_if_empty(cx)
-        _seed_ammo_packs_if_empty(cx)
 
         weapon_sku = _get_equipped_weapon_sku(cx, uid)
 
@@ -710,10 +715,8 @@ def warzone_shop():
     if slot not in ("weapons", "skins"):
         return jsonify({"error": "bad_slot"}), 400
 
+    _ensure_shop_schema()
     with conn() as cx:
-        _ensure_shop_schema(cx)
-        _seed_shop_if_empty(cx)
-        _seed_ammo_packs_if_empty(cx)
 
         equipped_sku = None
         if inv_uid != -1:
@@ -831,10 +834,8 @@ def warzone_purchase():
     if linked_pub != derived_pub:
         return jsonify({"error": "wallet_not_linked_for_user"}), 403
 
+    _ensure_shop_schema()
     with conn() as cx:
-        _ensure_shop_schema(cx)
-        _seed_shop_if_empty(cx)
-        _seed_ammo_packs_if_empty(cx)
 
         item = cx.execute(
             """
@@ -882,8 +883,8 @@ def warzone_purchase():
         return jsonify({"error": "payment_failed", "detail": str(e)}), 502
 
     now_ts = _now_i()
+    _ensure_shop_schema()
     with conn() as cx:
-        _ensure_shop_schema(cx)
         cx.execute(
             """
             INSERT OR IGNORE INTO warzone_inventory
@@ -973,10 +974,8 @@ def warzone_ammo_purchase():
     if linked_pub != derived_pub:
         return jsonify({"error": "wallet_not_linked_for_user"}), 403
 
+    _ensure_shop_schema()
     with conn() as cx:
-        _ensure_shop_schema(cx)
-        _seed_shop_if_empty(cx)
-        _seed_ammo_packs_if_empty(cx)
 
         pack = cx.execute(
             """
@@ -1022,8 +1021,8 @@ def warzone_ammo_purchase():
         return jsonify({"error": "payment_failed", "detail": str(e)}), 502
 
     now_ts = _now_i()
+    _ensure_shop_schema()
     with conn() as cx:
-        _ensure_shop_schema(cx)
 
         row = cx.execute(
             """
@@ -1076,10 +1075,8 @@ def warzone_equip():
         return jsonify({"error": "bad_request"}), 400
 
     now_ts = _now_i()
+    _ensure_shop_schema()
     with conn() as cx:
-        _ensure_shop_schema(cx)
-        _seed_shop_if_empty(cx)
-        _seed_ammo_packs_if_empty(cx)
 
         item = cx.execute(
             """